@@ -0,0 +1,188 @@
+"""Task activity log: changes buffered in memory and appended to the database in batches.
+
+Write routes record what they changed after their transaction commits::
+
+    await activity_log.record(task_id, user.id, "updated", {"status": ["pending", "completed"]})
+
+Entries wait in a ring buffer of at most ``capacity`` entries and a
+background task appends them to ``task_activity`` (migration
+0010_task_activity) with one executemany per ``batch_size``, every
+``flush_interval`` seconds or as soon as a batch is full.  The request never
+waits for that insert.
+
+What a crash can lose is bounded: the entries still buffered, at most
+``capacity`` and normally the last ``flush_interval`` seconds of changes.
+Stopping the app flushes the buffer.  When the buffer is full (the database
+is slow or down), recording waits up to ``block_timeout`` for the flusher to
+make room, which slows writers down to the rate the log can be written at;
+past that the oldest entry is overwritten and counted as dropped.
+"""
+import asyncio
+import json
+from collections import deque
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+import db
+from repositories import activity as queries
+from settings import settings
+
+
+class Entry(NamedTuple):
+    seq: int
+    task_id: int
+    actor_id: Optional[int]
+    action: str
+    changes: str
+    created_at: datetime
+
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def diff(before, after):
+    """``{field: [old, new]}`` for the fields whose value differs; either side may be None."""
+    before, after = before or {}, after or {}
+    return {
+        field: [before.get(field), after.get(field)]
+        for field in dict.fromkeys([*before, *after])
+        if before.get(field) != after.get(field)
+    }
+
+
+def entry_dict(row):
+    entry = dict(zip(queries.FIELDS, row))
+    entry["changes"] = json.loads(entry["changes"])
+    return entry
+
+
+class ActivityLog:
+    def __init__(self, capacity=10000, batch_size=500, flush_interval=1.0, block_timeout=1.0):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self._buffer = deque()
+        self._seq = 0
+        self._task = None
+        self._wakeup = None
+        self._drained = None
+        self._lock = None
+
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.failed_flushes = 0
+
+    async def record(self, task_id, actor_id, action, changes):
+        """Buffer one change; waits only while the buffer is full."""
+        self._ensure_started()
+        if len(self._buffer) >= self.capacity:
+            await self._make_room()
+        self._seq += 1
+        self._buffer.append(Entry(self._seq, task_id, actor_id, action,
+                                  json.dumps(changes, default=_json_default), datetime.now()))
+        self.recorded += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _make_room(self):
+        self.blocked += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.block_timeout
+        while len(self._buffer) >= self.capacity:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self._buffer.popleft()
+                self.dropped += 1
+                return
+            self._drained.clear()
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._drained.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def pending(self, task_id):
+        """Whether changes to ``task_id`` are buffered and not yet written."""
+        return any(entry.task_id == task_id for entry in self._buffer)
+
+    # Flushing
+    def _ensure_started(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._drained = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def start(self):
+        self._ensure_started()
+
+    async def stop(self):
+        """Stop the background task and write what is buffered."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not await self.flush():
+                # Database unavailable; entries stay buffered for the next attempt
+                await asyncio.sleep(self.flush_interval)
+
+    async def flush(self):
+        """Write every buffered entry in batches; returns False if a batch could not be written."""
+        if self._lock is None:
+            return True
+        async with self._lock:
+            while self._buffer:
+                batch = [self._buffer[i] for i in range(min(self.batch_size, len(self._buffer)))]
+                try:
+                    async with db.connection() as conn:
+                        await queries.insert_many(conn, [entry[1:] for entry in batch])
+                        await conn.commit()
+                except Exception:
+                    self.failed_flushes += 1
+                    return False
+                # Entries are removed once written; some may have been dropped meanwhile
+                last = batch[-1].seq
+                while self._buffer and self._buffer[0].seq <= last:
+                    self._buffer.popleft()
+                self.written += len(batch)
+                self._drained.set()
+        return True
+
+    def metrics(self):
+        return {
+            "buffered": len(self._buffer),
+            "capacity": self.capacity,
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "blocked": self.blocked,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+def log_from_settings(config=settings):
+    return ActivityLog(
+        capacity=config.activity_buffer_size,
+        batch_size=config.activity_batch_size,
+        flush_interval=config.activity_flush_interval,
+        block_timeout=config.activity_block_timeout,
+    )
+
+
+activity_log = log_from_settings()
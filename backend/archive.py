@@ -0,0 +1,118 @@
+"""Hot/cold archival: finished work moves out of the tables the routes read.
+
+Tasks completed (last updated) more than ARCHIVE_AFTER_DAYS ago move to
+``archived_tasks`` with their submissions and the submissions' attachments,
+and reports whose period ended before the same cutoff to
+``archived_progress_reports`` (migration 0011_archive).  The task,
+submission and report lists and exports read the hot tables only, unless
+asked for ``include_archived``; attachments still download, and report
+statistics still count archived tasks.  GET /sync/ sees archived rows as
+deleted, so clients keep only hot data.
+
+The archive.completed_work job moves ARCHIVE_BATCH_SIZE tasks and as many
+reports per transaction, committing each batch before picking the next, so
+locks are held for one batch at a time.  Progress is the data itself: a run
+stopped halfway keeps what it moved, and the next run or retry picks up the
+rest.
+"""
+import time
+from datetime import datetime, timedelta
+from typing import List, NamedTuple
+
+from repositories import archive as queries
+from settings import settings
+
+
+class Batch(NamedTuple):
+    task_ids: List[int]
+    submission_ids: List[int]
+    attachments: int
+    reports: int
+
+
+def cutoff(now=None, days=None):
+    """Work finished before this is archived."""
+    days = settings.archive_after_days if days is None else days
+    return (now or datetime.now()) - timedelta(days=days)
+
+
+async def move_batch(conn, before, batch_size):
+    """Move up to ``batch_size`` tasks and as many reports finished before ``before``; the caller commits."""
+    await queries.set_archiving(conn, True)
+    try:
+        task_ids = await queries.completed_tasks(conn, before, batch_size)
+        submission_ids, attachments = await queries.move_tasks(conn, task_ids) if task_ids else ([], 0)
+        report_ids = await queries.old_reports(conn, before.date(), batch_size)
+        reports = await queries.move_reports(conn, report_ids) if report_ids else 0
+    finally:
+        await queries.set_archiving(conn, False)
+    return Batch(task_ids, submission_ids, attachments, reports)
+
+
+class ArchiveStats:
+    """What archiving has moved since the process started, and how fast."""
+
+    def __init__(self):
+        self.runs = 0
+        self.batches = 0
+        self.tasks = 0
+        self.submissions = 0
+        self.attachments = 0
+        self.reports = 0
+        self.seconds = 0.0
+        self.last_run = None
+
+    def add(self, batch, seconds):
+        self.batches += 1
+        self.tasks += len(batch.task_ids)
+        self.submissions += len(batch.submission_ids)
+        self.attachments += batch.attachments
+        self.reports += batch.reports
+        self.seconds += seconds
+
+    def metrics(self):
+        return {
+            "runs": self.runs,
+            "batches": self.batches,
+            "tasks": self.tasks,
+            "submissions": self.submissions,
+            "attachments": self.attachments,
+            "reports": self.reports,
+            "seconds": round(self.seconds, 3),
+            "batch_ms": round(self.seconds * 1000 / self.batches, 1) if self.batches else None,
+            "last_run": self.last_run,
+        }
+
+
+archive_stats = ArchiveStats()
+
+
+async def run(conn, before, batch_size, after_batch=None):
+    """Archive everything finished before ``before``, one committed batch at a time.
+
+    ``after_batch(batch)`` is awaited after each commit.  Returns the totals
+    of this run.  A failed batch is left for the caller to roll back.
+    """
+    totals = {"before": before.isoformat(), "batches": 0, "tasks": 0, "submissions": 0, "attachments": 0,
+              "reports": 0}
+    started = time.perf_counter()
+    archive_stats.runs += 1
+    while True:
+        t0 = time.perf_counter()
+        batch = await move_batch(conn, before, batch_size)
+        await conn.commit()
+        if not batch.task_ids and not batch.reports:
+            break
+        archive_stats.add(batch, time.perf_counter() - t0)
+        totals["batches"] += 1
+        totals["tasks"] += len(batch.task_ids)
+        totals["submissions"] += len(batch.submission_ids)
+        totals["attachments"] += batch.attachments
+        totals["reports"] += batch.reports
+        if after_batch is not None:
+            await after_batch(batch)
+        if len(batch.task_ids) < batch_size and batch.reports < batch_size:
+            break
+    totals["seconds"] = round(time.perf_counter() - started, 3)
+    archive_stats.last_run = totals
+    return totals
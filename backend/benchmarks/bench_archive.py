@@ -0,0 +1,155 @@
+"""The read routes before and after archiving completed work, and the archival itself.
+
+Seeds tasks, submissions and reports, marks ``--completed`` of the tasks
+completed (all older than the cutoff), then times each read route, runs the
+archive.completed_work job and times the routes again: on the hot tables
+only, and with ``include_archived``.  Each round first bumps the table
+versions, as a write would, so no route is answered by the response cache.
+Reported for the archival are the rows moved, the time taken and the
+longest batch, which is how long the job holds its locks at a time.
+
+Exits non-zero if a route with ``include_archived`` does not return what it
+did before archiving, completed tasks are left in the hot tables, or a full
+list (GET /reports/, GET /dashboard/) is not faster on the hot tables.
+
+    python benchmarks/bench_archive.py --tasks 200000 --completed 0.8
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("AUTH_VERIFIER", "local")
+
+from common import seed, sqlite_database  # noqa: E402
+
+import archive  # noqa: E402
+import db  # noqa: E402
+import main  # noqa: E402
+import httpx  # noqa: E402
+
+# Route label -> (path, params); every one is timed on the hot tables and,
+# where it takes the option, with include_archived
+ROUTES = {
+    "GET /tasks/": ("/tasks/", {"limit": 50}),
+    "GET /tasks/?q=": ("/tasks/", {"limit": 50, "q": "Task 1234"}),
+    "GET /tasks/?deadline_from=": ("/tasks/", {"limit": 50, "deadline_from": "2024-03-01T00:00:00",
+                                              "deadline_to": "2024-03-02T00:00:00"}),
+    "GET /tasks/?assigned_to=": ("/tasks/", {"limit": 50, "assigned_to": 2}),
+    "GET /tasks/{task_id}/submissions/": ("/tasks/1/submissions/", {}),
+    "GET /reports/": ("/reports/", {}),
+    "GET /dashboard/": ("/dashboard/", {}),
+}
+# Compared as sets: rows tied on created_at come back in any order
+UNORDERED = {"GET /reports/"}
+
+
+async def timed(client, headers, path, params, rounds):
+    times, body = [], None
+    for _ in range(rounds):
+        await main.response_cache.bump("tasks", "users", "reports")
+        t0 = time.perf_counter()
+        response = await client.get(path, params=params, headers=headers)
+        times.append((time.perf_counter() - t0) * 1000)
+        assert response.status_code == 200, response.text
+        body = response.json()
+    return body, statistics.median(times)
+
+
+def comparable(label, body):
+    if label in UNORDERED:
+        return sorted(row["id"] for row in body)
+    return body
+
+
+async def time_routes(client, headers, rounds, include_archived=False):
+    results = {}
+    for label, (path, params) in ROUTES.items():
+        if include_archived:
+            if label == "GET /dashboard/":
+                continue
+            params = {**params, "include_archived": "true"}
+        results[label] = await timed(client, headers, path, params, rounds)
+    return results
+
+
+async def archive_all(batch_size):
+    """The job's totals, and the milliseconds of each batch, from one commit to the next."""
+    commits = [time.perf_counter()]
+
+    async def after_batch(batch):
+        commits.append(time.perf_counter())
+
+    async with db.connection() as conn:
+        totals = await archive.run(conn, archive.cutoff(), batch_size, after_batch)
+    return totals, [(end - start) * 1000 for start, end in zip(commits, commits[1:])]
+
+
+async def run(args):
+    admin = {"Authorization": f"Bearer {main.token_cache.verifier.issue({'uid': 'admin'})}"}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        # Warm the pool and the token cache
+        await client.get("/users/internees/", headers=admin)
+        before = await time_routes(client, admin, args.rounds)
+        totals, batch_ms = await archive_all(args.batch_size)
+        after = await time_routes(client, admin, args.rounds)
+        archived = await time_routes(client, admin, args.rounds, include_archived=True)
+    async with db.connection() as conn:
+        left = (await conn.fetchone("SELECT COUNT(*) FROM tasks WHERE status = 'completed'"))[0]
+    await db.database.aclose()
+    return before, after, archived, totals, batch_ms, left
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=200000)
+    parser.add_argument("--internees", type=int, default=500)
+    parser.add_argument("--submissions", type=int, default=50000)
+    parser.add_argument("--reports", type=int, default=5000)
+    parser.add_argument("--completed", type=float, default=0.8, help="Fraction of the tasks completed")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--driver", choices=["async", "thread"], default="async")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.tasks, args.internees, args.submissions, args.reports)
+        conn = sqlite3.connect(path)
+        # The oldest tasks are the completed ones, as past cohorts' would be
+        conn.execute("UPDATE tasks SET status = 'completed' WHERE id <= ?", (int(args.tasks * args.completed),))
+        conn.commit()
+        conn.close()
+        db.database = main.database = sqlite_database(path, args.driver)
+        before, after, archived, totals, batch_ms, left = asyncio.run(run(args))
+
+    print(f"{args.tasks} tasks ({args.completed:.0%} completed), {args.submissions} submissions, "
+          f"{args.reports} reports, median of {args.rounds} rounds")
+    print(f"archived {totals['tasks']} tasks, {totals['submissions']} submissions, {totals['reports']} reports "
+          f"in {totals['seconds']:.2f} s, {totals['batches']} batches of {args.batch_size}: "
+          f"median {statistics.median(batch_ms) if batch_ms else 0:.1f} ms, longest {max(batch_ms, default=0):.1f} ms")
+    print(f"{'route':<36} {'before ms':>10} {'hot ms':>10} {'archived ms':>12} {'rows before/hot':>16}")
+    failures = []
+    for label in ROUTES:
+        (old_body, old_ms), (hot_body, hot_ms) = before[label], after[label]
+        with_archive = archived.get(label)
+        archived_ms = f"{with_archive[1]:>12.1f}" if with_archive else f"{'-':>12}"
+        print(f"{label:<36} {old_ms:>10.1f} {hot_ms:>10.1f} {archived_ms} {len(old_body):>8}/{len(hot_body):<7}")
+        if with_archive and comparable(label, with_archive[0]) != comparable(label, old_body):
+            failures.append(f"{label}: include_archived does not return what the route did before archiving")
+        if label in ("GET /reports/", "GET /dashboard/") and hot_ms >= old_ms:
+            failures.append(f"{label}: not faster on the hot tables")
+    if left:
+        failures.append(f"{left} completed tasks were not archived")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
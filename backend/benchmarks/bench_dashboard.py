@@ -0,0 +1,129 @@
+"""GET /dashboard/ against the three calls the admin home made before it.
+
+The three-call path fetches GET /users/internees/, every page of GET /tasks/
+(at the largest page size) and GET /reports/, then groups tasks by assignee
+and status on the client as the Flutter app did.  Each round first bumps the
+table versions, as a write would, so neither path is answered by the
+response cache; the dashboard is also timed when cached.  The counts of both
+paths are compared for every internee.
+
+Exits non-zero if the counts differ or the dashboard is not faster.
+
+    python benchmarks/bench_dashboard.py --internees 1000 --tasks 100000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+os.environ.setdefault("AUTH_VERIFIER", "local")
+
+from common import STATUSES, seed, sqlite_database  # noqa: E402
+
+import db  # noqa: E402
+import main  # noqa: E402
+import httpx  # noqa: E402
+from pagination import MAX_PAGE_SIZE  # noqa: E402
+
+
+async def three_calls(client, headers):
+    internees = (await client.get("/users/internees/", headers=headers)).json()
+    all_tasks, cursor = [], None
+    while True:
+        params = {"limit": MAX_PAGE_SIZE, "fields": "assigned_to_id,status"}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/tasks/", params=params, headers=headers)
+        all_tasks.extend(response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    reports = (await client.get("/reports/", headers=headers)).json()
+
+    counts = Counter((task["assigned_to_id"], task["status"]) for task in all_tasks)
+    latest = {}
+    for report in reports:
+        # Reports created in the same second come back in any order
+        newest = latest.get(report["internee_name"])
+        if newest is None or (report["created_at"], report["id"]) > (newest["created_at"], newest["id"]):
+            latest[report["internee_name"]] = report
+    latest = {name: report["id"] for name, report in latest.items()}
+    return {
+        internee["id"]: {status: counts[internee["id"], status]
+                         for status in STATUSES}
+        for internee in internees
+    }, latest
+
+
+async def dashboard(client, headers):
+    rows = (await client.get("/dashboard/", headers=headers)).json()
+    return {
+        row["internee_id"]: {status: row[f"tasks_{status}"]
+                             for status in STATUSES}
+        for row in rows
+    }, {row["name"]: row["latest_report_id"] for row in rows if row["latest_report_id"] is not None}
+
+
+async def timed(rounds, fn, cold):
+    results, times = None, []
+    for _ in range(rounds):
+        if cold:
+            await main.response_cache.bump("tasks", "users", "reports")
+        t0 = time.perf_counter()
+        results = await fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return results, statistics.median(times)
+
+
+async def run(args):
+    admin = {"Authorization": f"Bearer {main.token_cache.verifier.issue({'uid': 'admin'})}"}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        # Warm the pool and the token cache
+        await client.get("/users/internees/", headers=admin)
+        old, old_ms = await timed(args.rounds, lambda: three_calls(client, admin), cold=True)
+        new, new_ms = await timed(args.rounds, lambda: dashboard(client, admin), cold=True)
+        _, cached_ms = await timed(args.rounds, lambda: dashboard(client, admin), cold=False)
+    await db.database.aclose()
+    return old, new, old_ms, new_ms, cached_ms
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=100000)
+    parser.add_argument("--internees", type=int, default=1000)
+    parser.add_argument("--submissions", type=int, default=20000)
+    parser.add_argument("--reports", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--driver", choices=["async", "thread"], default="async")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.tasks, args.internees, args.submissions, args.reports)
+        db.database = main.database = sqlite_database(path, args.driver)
+        old, new, old_ms, new_ms, cached_ms = asyncio.run(run(args))
+
+    print(f"{args.internees} internees, {args.tasks} tasks, median of {args.rounds} rounds")
+    print(f"{'three calls':<20} {old_ms:>10.1f} ms")
+    print(f"{'GET /dashboard/':<20} {new_ms:>10.1f} ms  ({old_ms / new_ms:.1f}x)")
+    print(f"{'  cached':<20} {cached_ms:>10.1f} ms")
+
+    failures = []
+    if old != new:
+        failures.append("task counts or latest reports differ between the two paths")
+    if len(old[0]) != args.internees:
+        failures.append(f"expected {args.internees} internees, got {len(old[0])}")
+    if new_ms >= old_ms:
+        failures.append("the dashboard was not faster than the three calls")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
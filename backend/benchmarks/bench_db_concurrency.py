@@ -0,0 +1,121 @@
+"""Repository calls in flight on one event loop, per database driver.
+
+Seeds a SQLite database and runs the same mix of repository reads from a
+rising number of concurrent callers, each checking a connection out of a pool
+sized to match.  ``thread`` is sqlite3 on the pool's executor, ``async`` is
+aiosqlite through AsyncDriverDatabase.  Throughput should grow with
+concurrency until the database itself (or the GIL) is the limit, and the
+peak number of calls in flight should track the concurrency level.
+
+    python benchmarks/bench_db_concurrency.py --tasks 20000 --levels 1 4 16 64
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from common import seed, sqlite_database
+
+from identity import UserIdentity  # noqa: E402
+from report_stats import internee_stats  # noqa: E402
+from repositories import reports, submissions, tasks  # noqa: E402
+
+ADMIN = UserIdentity(1, "admin", "admin@example.com", "Admin")
+
+
+def workload(internees):
+    """Repository reads behind the list and report routes, each ``call(conn, rng)``."""
+    async def task_page(conn, rng):
+        where, params = tasks.filters(ADMIN, assigned_to=2 + rng.randrange(internees))
+        return await tasks.fetch_page(conn, where, params, 50)
+
+    async def task_search(conn, rng):
+        where, params = tasks.filters(ADMIN, task_status="completed", q=f"Task {rng.randrange(100)}")
+        return await tasks.fetch_page(conn, where, params, 50)
+
+    async def task_submissions(conn, rng):
+        return await submissions.fetch_for_task(conn, 1 + rng.randrange(1000))
+
+    async def internee_reports(conn, rng):
+        return await reports.fetch_all(conn, 2 + rng.randrange(internees))
+
+    async def period_stats(conn, rng):
+        return await internee_stats(conn, "2024-01-01", "2024-03-31")
+
+    return [task_page, task_search, task_submissions, internee_reports, period_stats]
+
+
+async def measure(database, calls, concurrency, internees, seed_value):
+    rng = random.Random(seed_value)
+    plan = [rng.choice(workload(internees)) for _ in range(calls)]
+    latencies = []
+    in_flight = peak = 0
+    position = 0
+
+    async def worker():
+        nonlocal position, in_flight, peak
+        while position < len(plan):
+            call = plan[position]
+            position += 1
+            t0 = time.perf_counter()
+            conn = await database.acquire()
+            try:
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await call(conn, rng)
+            finally:
+                in_flight -= 1
+                await database.release(conn)
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "calls_per_s": calls / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "peak_in_flight": peak,
+    }
+
+
+async def run_driver(path, driver, args):
+    results = []
+    for level in args.levels:
+        database = sqlite_database(path, driver, size=level, max_overflow=0)
+        try:
+            # Warm the pool so connection setup is not timed
+            await measure(database, level * 2, level, args.internees, args.seed)
+            results.append((level, await measure(database, args.calls, level, args.internees, args.seed)))
+        finally:
+            await database.aclose()
+    return results
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--internees", type=int, default=50)
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--drivers", nargs="+", choices=["thread", "async"], default=["thread", "async"])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.tasks, args.internees, n_submissions=args.tasks // 4, n_reports=args.tasks // 20)
+
+        print(f"{'driver':<7} {'callers':>7} {'calls/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'in flight':>10}")
+        for driver in args.drivers:
+            for level, r in asyncio.run(run_driver(path, driver, args)):
+                print(f"{driver:<7} {level:>7} {r['calls_per_s']:>9.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+                      f"{r['peak_in_flight']:>10}")
+
+
+if __name__ == "__main__":
+    main_()
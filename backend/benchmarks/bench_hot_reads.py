@@ -0,0 +1,133 @@
+"""Hot read endpoints under concurrent load: request coalescing and rate limits.
+
+Coalescing: each round bumps the tasks version (as a write would), then
+fires ``--concurrency`` identical GET /tasks/ and GET /users/internees/
+requests at once, with coalescing off and then on.  Reported are the
+database queries per round (from Server-Timing) and the median latency.
+
+Rate limiting: one uid sends ``--burst-requests`` concurrent requests to a
+route limited to BURST, while a second uid sends a few of its own.  Exactly
+BURST of the first uid's requests may pass (give or take the refill during
+the run) and none of the second's may be limited.
+
+Exits non-zero if coalescing did not cut the queries or a limit was not
+enforced.
+
+    python benchmarks/bench_hot_reads.py --tasks 20000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("AUTH_VERIFIER", "local")
+
+from common import seed, sqlite_database  # noqa: E402
+
+import db  # noqa: E402
+import main  # noqa: E402
+import httpx  # noqa: E402
+from coalesce import single_flight  # noqa: E402
+from ratelimit import MemoryBucketStore, rate_limiter  # noqa: E402
+
+_DB_CALLS = re.compile(r'db;desc="(\d+) queries"')
+
+
+async def burst(client, url, headers, n):
+    async def one():
+        t0 = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        elapsed = (time.perf_counter() - t0) * 1000
+        match = _DB_CALLS.search(response.headers.get("server-timing", ""))
+        return response.status_code, int(match.group(1)) if match else 0, elapsed
+    return await asyncio.gather(*(one() for _ in range(n)))
+
+
+async def coalescing(client, admin, concurrency, rounds, routes):
+    single_flight.routes = frozenset(routes)
+    results = {}
+    for url, tables in (("/tasks/?limit=50", ("tasks", "users")), ("/users/internees/", ("users",))):
+        queries, latencies = [], []
+        for _ in range(rounds):
+            # A write between rounds, so the response cache cannot answer them
+            await main.response_cache.bump(*tables)
+            responses = await burst(client, url, admin, concurrency)
+            assert all(status == 200 for status, _, _ in responses), responses[:3]
+            queries.append(sum(calls for _, calls, _ in responses))
+            latencies.extend(elapsed for _, _, elapsed in responses)
+        results[url] = (statistics.mean(queries), statistics.median(latencies))
+    return results
+
+
+async def rate_limiting(client, admin, other, n, rate, burst_size):
+    rate_limiter.store = MemoryBucketStore()
+    rate_limiter.limits = {"GET /tasks/": (rate, burst_size)}
+    first, second = await asyncio.gather(
+        burst(client, "/tasks/?limit=1", admin, n),
+        burst(client, "/tasks/?limit=1", other, min(burst_size, 5)),
+    )
+    rate_limiter.limits = {}
+    passed = sum(status == 200 for status, _, _ in first)
+    limited = sum(status == 429 for status, _, _ in first)
+    other_limited = sum(status == 429 for status, _, _ in second)
+    return passed, limited, other_limited
+
+
+async def run(args):
+    verifier = main.token_cache.verifier
+    admin = {"Authorization": f"Bearer {verifier.issue({'uid': 'admin'})}"}
+    other = {"Authorization": f"Bearer {verifier.issue({'uid': 'internee-0'})}"}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        # Warm the pool and the token cache
+        await burst(client, "/users/internees/", admin, 4)
+        off = await coalescing(client, admin, args.concurrency, args.rounds, ())
+        on = await coalescing(client, admin, args.concurrency, args.rounds, ("GET /tasks/", "GET /users/internees/"))
+        limits = await rate_limiting(client, admin, other, args.burst_requests, args.rate, args.burst)
+    await db.database.aclose()
+    return off, on, limits
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--internees", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--driver", choices=["async", "thread"], default="async")
+    parser.add_argument("--burst-requests", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=1.0)
+    parser.add_argument("--burst", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.tasks, args.internees)
+        db.database = main.database = sqlite_database(path, args.driver)
+        off, on, (passed, limited, other_limited) = asyncio.run(run(args))
+
+    failures = []
+    print(f"{'route':<22} {'queries/round off':>18} {'on':>6} {'p50 ms off':>11} {'on':>8}")
+    for url in off:
+        print(f"{url:<22} {off[url][0]:>18.1f} {on[url][0]:>6.1f} {off[url][1]:>11.2f} {on[url][1]:>8.2f}")
+        if on[url][0] >= off[url][0]:
+            failures.append(f"coalescing did not reduce the queries of {url}")
+
+    print(f"rate limit {args.burst}/{args.rate}s: {passed} passed, {limited} limited of {args.burst_requests}; "
+          f"other uid limited {other_limited}")
+    if not args.burst <= passed <= args.burst + 2 or passed + limited != args.burst_requests:
+        failures.append(f"expected about {args.burst} requests to pass, {passed} did")
+    if other_limited:
+        failures.append("another uid was limited by the first uid's bucket")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
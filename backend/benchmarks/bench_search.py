@@ -0,0 +1,154 @@
+"""GET /search/ latency on a large task table, per search backend.
+
+Seeds SQLite with ``--tasks`` tasks (and a quarter as many submissions) whose
+text is drawn from a Zipf-distributed vocabulary, then times the same queries
+against the FTS5 index, the in-process index and, for reference, the LIKE
+scan behind ``GET /tasks/?q=`` that clients fall back on today.  Queries run
+as an admin (every document visible) and as an internee (scoped).  Also
+reports how long the in-process index takes to build, its size, and how long
+re-indexing a batch of changed tasks takes.
+
+    python benchmarks/bench_search.py --tasks 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from common import seed, sqlite_database
+
+import search  # noqa: E402
+from identity import UserIdentity  # noqa: E402
+from repositories import tasks  # noqa: E402
+
+ADMIN = UserIdentity(1, "admin", "admin@example.com", "Admin")
+INTERNEE = UserIdentity(2, "internee", "internee0@example.com", "Internee 0")
+
+QUERIES = {
+    "common word": "review",
+    "rare word": "kestrel",
+    "two words": "deploy checklist",
+    "prefix": "migr",
+    "three words + prefix": "weekly api summ",
+}
+
+
+def vocabulary(size, rng):
+    # Pronounceable made-up words, plus the ones the queries use
+    consonants, vowels = "bcdfghjklmnprstvwz", "aeiou"
+    words = {"".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(rng.randint(2, 4)))
+             for _ in range(size * 2)}
+    words = sorted(words)[:size]
+    # Query words at fixed ranks: common ones near the top, kestrel in the tail
+    for rank, word in ((3, "review"), (40, "deploy"), (60, "checklist"), (25, "migration"), (30, "migrate"),
+                       (10, "weekly"), (15, "api"), (20, "summary"), (size - 10, "kestrel")):
+        words[rank] = word
+    return words
+
+
+def fill_text(path, n_tasks, n_submissions, words, rng):
+    # Zipf-like: the word at rank r is drawn with weight 1 / (r + 1)
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+
+    def text(k):
+        return " ".join(rng.choices(words, weights, k=k))
+
+    conn = sqlite3.connect(path)
+    conn.executemany("UPDATE tasks SET title = ?, description = ? WHERE id = ?",
+                     ((text(5).capitalize(), text(30), i) for i in range(1, n_tasks + 1)))
+    conn.executemany("UPDATE task_submissions SET description = ? WHERE id = ?",
+                     ((text(20), i) for i in range(1, n_submissions + 1)))
+    conn.commit()
+    conn.close()
+
+
+async def time_queries(conn, run, repeat):
+    results = {}
+    for name, query in QUERIES.items():
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            rows = await run(conn, query)
+            samples.append((time.perf_counter() - t0) * 1000)
+        samples.sort()
+        results[name] = (statistics.median(samples), samples[max(0, int(len(samples) * 0.95) - 1)], len(rows))
+    return results
+
+
+async def run(path, args):
+    database = sqlite_database(path, args.driver)
+    index = search.SearchIndex("fulltext")
+    memory = search.SearchIndex("memory")
+    conn = await database.acquire()
+    try:
+        # Build the memory index once, outside the timed queries
+        t0 = time.perf_counter()
+        await memory.memory.ensure_current(conn)
+        build_s = time.perf_counter() - t0
+        # Its size from a second build, as tracing slows the build down
+        tracemalloc.start()
+        second = search.MemorySearch()
+        await second.ensure_current(conn)
+        size_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        del second
+
+        async def like(conn, query, user):
+            where, params = tasks.filters(user, q=query)
+            return await tasks.fetch_page(conn, where, params, args.limit)
+
+        cases = []
+        for who, user in (("admin", ADMIN), ("internee", INTERNEE)):
+            cases.append((f"fts5 / {who}", lambda c, q, u=user: index.search(c, u, q, args.limit)))
+            cases.append((f"memory / {who}", lambda c, q, u=user: memory.search(c, u, q, args.limit)))
+            cases.append((f"LIKE scan / {who}", lambda c, q, u=user: like(c, q, u)))
+        timings = [(name, await time_queries(conn, fn, args.repeat)) for name, fn in cases]
+
+        # Incremental upkeep: re-read and re-index a batch of changed tasks
+        changed = random.Random(args.seed).sample(range(1, args.tasks + 1), args.changed)
+        memory.tasks_changed(changed)
+        t0 = time.perf_counter()
+        await memory.memory.ensure_current(conn)
+        refresh_ms = (time.perf_counter() - t0) * 1000
+    finally:
+        await database.release(conn)
+        await database.aclose()
+    return build_s, size_mb, timings, refresh_ms
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=100000)
+    parser.add_argument("--internees", type=int, default=50)
+    parser.add_argument("--words", type=int, default=20000, help="Vocabulary size")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--changed", type=int, default=1000, help="Tasks re-indexed in the refresh timing")
+    parser.add_argument("--driver", choices=["thread", "async"], default="async")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        t0 = time.perf_counter()
+        seed(path, args.tasks, args.internees, n_submissions=args.tasks // 4)
+        fill_text(path, args.tasks, args.tasks // 4, vocabulary(args.words, rng), rng)
+        print(f"seeded {args.tasks} tasks, {args.tasks // 4} submissions in {time.perf_counter() - t0:.1f}s")
+
+        build_s, size_mb, timings, refresh_ms = asyncio.run(run(path, args))
+        print(f"memory index: built in {build_s:.2f}s, {size_mb:.0f} MB; "
+              f"re-indexing {args.changed} changed tasks took {refresh_ms:.1f} ms")
+        print(f"{'backend / caller':<22} {'query':<22} {'p50 ms':>8} {'p95 ms':>8} {'rows':>5}")
+        for name, results in timings:
+            for query, (p50, p95, rows) in results.items():
+                print(f"{name:<22} {query:<22} {p50:>8.2f} {p95:>8.2f} {rows:>5}")
+
+
+if __name__ == "__main__":
+    main_()
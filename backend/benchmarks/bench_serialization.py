@@ -0,0 +1,106 @@
+"""CPU time to turn list rows into a JSON response body, per 10k rows.
+
+Compares the old list route path (a dict built per row by indexing the tuple,
+then FastAPI's jsonable_encoder and JSONResponse) with RowsResponse (rows
+zipped with the field names and encoded by orjson), and with a ``?fields=``
+projection.  Rows carry datetimes, as pyodbc returns them from SQL Server.
+
+    python benchmarks/bench_serialization.py --rows 10000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import statements  # noqa: E402
+from serialization import RowsResponse, orjson  # noqa: E402
+
+
+def task_rows(n):
+    start = datetime(2024, 1, 1, 9, 30, 15, 250000)
+    return [
+        (i, f"Task {i}", "Write the weekly summary and attach the notes", "in_progress",
+         start + timedelta(days=30), "Admin", f"Internee {i % 50}", 2 + i % 50,
+         start + timedelta(seconds=i * 7), None)
+        for i in range(n)
+    ]
+
+
+def report_rows(n):
+    created = datetime(2024, 4, 1, 12, 0, 0, 500000)
+    return [
+        (i, f"Internee {i % 50}", "Admin", "2024-01-01", "2024-03-31", i % 20, i % 7, "Good",
+         None, created + timedelta(minutes=i))
+        for i in range(n)
+    ]
+
+
+def old_tasks(rows):
+    tasks = []
+    for row in rows:
+        tasks.append({
+            "id": row[0], "title": row[1], "description": row[2], "status": row[3], "deadline": row[4],
+            "created_by": row[5], "assigned_to": row[6], "assigned_to_id": row[7],
+            "created_at": row[8], "updated_at": row[9],
+        })
+    return JSONResponse(jsonable_encoder(tasks)).body
+
+
+def old_reports(rows):
+    reports = []
+    for row in rows:
+        reports.append({
+            "id": row[0], "internee_name": row[1], "generated_by": row[2], "period_start": row[3],
+            "period_end": row[4], "tasks_completed": row[5], "tasks_pending": row[6],
+            "overall_performance": row[7], "comments": row[8], "created_at": row[9],
+        })
+    return JSONResponse(jsonable_encoder(reports)).body
+
+
+def cpu_ms(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.process_time()
+        fn()
+        elapsed = (time.process_time() - t0) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tasks, reports = task_rows(args.rows), report_rows(args.rows)
+    projection = ("id", "title", "status")
+    cases = [
+        ("tasks: dict per row + jsonable_encoder", lambda: old_tasks(tasks)),
+        ("tasks: RowsResponse", lambda: RowsResponse(statements.TASK_FIELDS, tasks).body),
+        ("tasks: RowsResponse ?fields=id,title,status",
+         lambda: RowsResponse(statements.TASK_FIELDS, tasks, projection).body),
+        ("reports: dict per row + jsonable_encoder", lambda: old_reports(reports)),
+        ("reports: RowsResponse", lambda: RowsResponse(statements.REPORT_FIELDS, reports).body),
+    ]
+    # Both paths must produce the same document
+    assert json.loads(old_tasks(tasks[:100])) == json.loads(RowsResponse(statements.TASK_FIELDS, tasks[:100]).body)
+    assert json.loads(old_reports(reports[:100])) == json.loads(RowsResponse(statements.REPORT_FIELDS, reports[:100]).body)
+
+    print(f"encoder: {'orjson ' + orjson.__version__ if orjson else 'json (orjson not installed)'}, rows: {args.rows}")
+    print(f"{'case':<46} {'CPU ms':>9} {'per 10k':>9} {'KB':>8}")
+    for name, fn in cases:
+        ms = cpu_ms(fn, args.repeat)
+        size = len(fn()) / 1024
+        print(f"{name:<46} {ms:>9.1f} {ms * 10000 / args.rows:>9.1f} {size:>8.0f}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,96 @@
+"""Cold start of the app: importing main, running its startup, first response.
+
+Each run is a fresh interpreter against a seeded SQLite file, with local
+tokens so no Firebase or network access is involved.  Startup is the
+lifespan (pool warm-up, auth key prefetch, event bus); the first response is
+an authenticated GET /users/me/ right after it, which should not need to
+open a connection.  With ``--max-ms`` the script exits non-zero when the
+median time to the first response is over budget, so it can gate CI.
+
+    python benchmarks/bench_startup.py --runs 10 --max-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import seed
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import asyncio, json, time
+t0 = time.perf_counter()
+import main
+import httpx
+t_import = time.perf_counter()
+
+async def first_response():
+    async with main.app.router.lifespan_context(main.app):
+        t_ready = time.perf_counter()
+        opened = main.database.metrics()["open"]
+        token = main.token_cache.verifier.issue({"uid": "admin"})
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.get("/users/me/", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        t_first = time.perf_counter()
+        connects = main.database.metrics()["open"] - opened
+    return t_ready, t_first, opened, connects
+
+t_ready, t_first, opened, connects = asyncio.run(first_response())
+print(json.dumps({
+    "import_ms": (t_import - t0) * 1000,
+    "startup_ms": (t_ready - t_import) * 1000,
+    "first_response_ms": (t_first - t_ready) * 1000,
+    "warm_connections": opened,
+    "connects_on_first_request": connects,
+}))
+"""
+
+
+def run_once(path, driver):
+    env = dict(os.environ, DB_BACKEND="sqlite", SQLITE_PATH=path, DB_DRIVER=driver, AUTH_VERIFIER="local")
+    env.pop("SETTINGS_FILE", None)
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=BACKEND, env=env, capture_output=True, text=True)
+    wall = (time.perf_counter() - t0) * 1000
+    if out.returncode:
+        sys.exit(out.stderr)
+    result = json.loads(out.stdout.splitlines()[-1])
+    # From process launch (interpreter start included) to the first response
+    result["total_ms"] = wall
+    return result
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--driver", choices=["async", "thread"], default="async")
+    parser.add_argument("--max-ms", type=float, help="Fail if the median process-to-first-response time exceeds this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, 1000)
+        runs = [run_once(path, args.driver) for _ in range(args.runs)]
+
+    columns = ["import_ms", "startup_ms", "first_response_ms", "total_ms"]
+    print(" ".join(f"{column:>18}" for column in columns))
+    print(" ".join(f"{statistics.median(run[column] for run in runs):>18.1f}" for column in columns))
+    print(f"warm connections: {runs[-1]['warm_connections']}, "
+          f"opened by the first request: {runs[-1]['connects_on_first_request']}")
+
+    total = statistics.median(run["total_ms"] for run in runs)
+    if args.max_ms is not None and total > args.max_ms:
+        print(f"FAIL: median {total:.1f} ms to first response, budget {args.max_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
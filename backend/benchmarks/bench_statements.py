@@ -0,0 +1,166 @@
+"""Per-call overhead of repeated statements: prepared once per connection or every time.
+
+Runs the task updates of PUT /tasks/{task_id}/, with every combination of
+fields, and the reads around them (tasks.values, tasks.assignee) through the
+pool, in four setups: SQLite's per-connection statement cache off
+(DB_STATEMENT_CACHE_SIZE=0, every call prepares its statement) or on, and
+the updates built per combination of fields, as they were before the query
+catalog, or in the catalog's fixed shapes (statements.TASK_UPDATE_SHAPES).
+Per-statement times come from instrumentation.statement_stats.  The same
+updates are then timed on a bare sqlite3 connection, where preparing is the
+only difference.  With a cache smaller than the number of texts
+(``--cache-size 16``) the per-combination updates evict each other from
+it, and the catalog's three shapes do not.
+
+Exits non-zero if the catalog with the cache on is not faster per update
+than per-combination statements prepared every time.
+
+    python benchmarks/bench_statements.py --tasks 20000 --calls 5000 [--cache-size 16]
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("AUTH_VERIFIER", "local")
+
+from common import seed  # noqa: E402
+
+import db  # noqa: E402
+import instrumentation  # noqa: E402
+import statements  # noqa: E402
+from repositories import tasks  # noqa: E402
+
+# Every non-empty combination of updatable fields, 31 of them
+COMBINATIONS = [
+    columns for n in range(1, len(tasks.UPDATABLE_FIELDS) + 1)
+    for columns in itertools.combinations(tasks.UPDATABLE_FIELDS, n)
+]
+VALUES = {"title": "Renamed", "description": "Edited", "status": "in_progress", "assigned_to": 2,
+          "deadline": datetime(2030, 1, 1)}
+
+
+def legacy_update(fields, task_id, updated_at, owner_id=None):
+    """The SQLite update as statements.update_task built it before: one text per combination of fields."""
+    assignments = ", ".join(f"{column} = ?" for column in fields) + ", updated_at = ?"
+    params = list(fields.values()) + [updated_at, task_id]
+    sql = f"UPDATE tasks SET {assignments} WHERE id = ?"
+    if owner_id is not None:
+        sql += " AND assigned_to = ?"
+        params.append(owner_id)
+    return sql + statements._TASK_RETURNING, params
+
+
+def workload(n_tasks, calls, seed_value=1):
+    rng = random.Random(seed_value)
+    return [(rng.randint(1, n_tasks), {c: VALUES[c] for c in rng.choice(COMBINATIONS)}) for _ in range(calls)]
+
+
+async def run_pool(path, cache_size, legacy, work, driver):
+    backend = (db.AioSQLiteBackend if driver == "async" else db.SQLiteBackend)(
+        path, migrate=False, statement_cache_size=cache_size
+    )
+    database = (db.AsyncDriverDatabase if driver == "async" else db.Database)(backend, size=1, max_overflow=0)
+    instrumentation.statement_stats.reset()
+    conn = await database.acquire()
+    try:
+        started = time.perf_counter()
+        for task_id, fields in work:
+            await tasks.values(conn, task_id)
+            if legacy:
+                sql, params = legacy_update(fields, task_id, datetime.now())
+                await conn.fetchone(sql, *params)
+            else:
+                await tasks.update(conn, task_id, fields)
+            await tasks.assignee(conn, task_id)
+        elapsed = time.perf_counter() - started
+        await conn.rollback()
+    finally:
+        await database.release(conn)
+        await database.aclose()
+    stats = instrumentation.statement_stats.metrics()
+    updates = [s for s in stats if s["sql"].startswith("UPDATE tasks")]
+    reads = [s for s in stats if s["sql"].startswith("SELECT")]
+
+    def per_call(rows):
+        return sum(s["total_ms"] for s in rows) * 1000 / max(sum(s["calls"] for s in rows), 1)
+
+    return {"texts": len(updates), "update_us": per_call(updates), "read_us": per_call(reads),
+            "call_us": elapsed * 1e6 / (len(work) * 3)}
+
+
+def run_raw(path, cache_size, legacy, work):
+    """Microseconds per update on a bare sqlite3 connection."""
+    conn = sqlite3.connect(path, cached_statements=cache_size)
+    now = datetime.now()
+    prepared = []
+    for task_id, fields in work:
+        if legacy:
+            prepared.append(legacy_update(fields, task_id, now))
+        else:
+            shape = statements.task_update_shape(fields)
+            prepared.append((statements.update_task("sqlite", shape),
+                             [fields.get(c) for c in shape] + [now, task_id, None]))
+    started = time.perf_counter()
+    for sql, params in prepared:
+        conn.execute(sql, params).fetchone()
+    elapsed = time.perf_counter() - started
+    conn.rollback()
+    conn.close()
+    return elapsed * 1e6 / len(work)
+
+
+SETUPS = [
+    ("per combination, prepared every call", 0, True),
+    ("catalog shapes, prepared every call", 0, False),
+    ("per combination, cached", None, True),
+    ("catalog shapes, cached", None, False),
+]
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--internees", type=int, default=50)
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--cache-size", type=int, default=256, help="DB_STATEMENT_CACHE_SIZE when cached")
+    parser.add_argument("--driver", choices=["async", "thread"], default="thread")
+    args = parser.parse_args()
+
+    work = workload(args.tasks, args.calls)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.tasks, args.internees)
+        for label, cache_size, legacy in SETUPS:
+            cache_size = args.cache_size if cache_size is None else cache_size
+            # Untimed round first, so both setups start with the pages in memory
+            asyncio.run(run_pool(path, cache_size, legacy, work[:200], args.driver))
+            pooled = asyncio.run(run_pool(path, cache_size, legacy, work, args.driver))
+            pooled["raw_us"] = run_raw(path, cache_size, legacy, work)
+            results[label] = pooled
+
+    print(f"{args.calls} updates of {len(COMBINATIONS)} field combinations, {args.tasks} tasks, "
+          f"{args.driver} driver, cache of {args.cache_size}")
+    print(f"{'setup':<38} {'texts':>6} {'update us':>10} {'read us':>9} {'per call us':>12} {'sqlite3 us':>11}")
+    for label, r in results.items():
+        print(f"{label:<38} {r['texts']:>6} {r['update_us']:>10.1f} {r['read_us']:>9.1f} "
+              f"{r['call_us']:>12.1f} {r['raw_us']:>11.1f}")
+    baseline, catalog = results[SETUPS[0][0]], results[SETUPS[-1][0]]
+    print(f"update overhead: {baseline['update_us'] - catalog['update_us']:.1f} us less per call "
+          f"({1 - catalog['update_us'] / baseline['update_us']:.0%}); "
+          f"on sqlite3 {1 - catalog['raw_us'] / baseline['raw_us']:.0%}")
+    if catalog["update_us"] >= baseline["update_us"]:
+        print("FAIL: cached catalog statements are not faster than statements prepared every call")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -0,0 +1,106 @@
+"""Reconnect traffic with GET /sync/: a full sync against deltas after a few changes.
+
+Syncs everything from 0 (as a newly installed client would), then for each
+``--changes`` count updates and deletes that many tasks and syncs again from
+the version it had.  Reported are the bytes, pages and time of each sync.
+The delta must hold exactly the changes, and its size must follow the number
+of changes rather than the number of tasks.
+
+Exits non-zero if a delta is wrong or not proportional to the changes.
+
+    python benchmarks/bench_sync.py --tasks 50000 --changes 10 100 1000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("AUTH_VERIFIER", "local")
+
+from common import seed, sqlite_database  # noqa: E402
+
+import db  # noqa: E402
+import main  # noqa: E402
+import httpx  # noqa: E402
+
+
+async def sync_from(client, headers, since, limit):
+    """``(version, bytes, pages, ms, changes)`` of syncing everything after ``since``."""
+    size = pages = 0
+    changes = {"tasks": set(), "deleted": set()}
+    t0 = time.perf_counter()
+    while True:
+        response = await client.get("/sync/", params={"since": since, "limit": limit}, headers=headers)
+        assert response.status_code == 200, response.text
+        size += len(response.content)
+        pages += 1
+        page = response.json()
+        changes["tasks"].update(task["id"] for task in page["tasks"])
+        changes["deleted"].update(item["id"] for item in page["deleted"] if item["type"] == "task")
+        since = page["version"]
+        if not page["more"]:
+            return since, size, pages, (time.perf_counter() - t0) * 1000, changes
+
+
+async def run(args):
+    admin = {"Authorization": f"Bearer {main.token_cache.verifier.issue({'uid': 'admin'})}"}
+    transport = httpx.ASGITransport(app=main.app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        version, size, pages, ms, _ = await sync_from(client, admin, 0, args.limit)
+        results.append(("full", 0, size, pages, ms, True))
+        next_id = 1
+        for count in args.changes:
+            # Half updated, half deleted, from tasks not touched before
+            updated = list(range(next_id, next_id + count - count // 2))
+            deleted = list(range(next_id + len(updated), next_id + count))
+            next_id += count
+            for task_id in updated:
+                assert (await client.put(f"/tasks/{task_id}/", json={"status": "completed"},
+                                         headers=admin)).status_code == 200
+            for task_id in deleted:
+                assert (await client.delete(f"/tasks/{task_id}/", headers=admin)).status_code == 200
+            version, size, pages, ms, changes = await sync_from(client, admin, version, args.limit)
+            exact = changes["tasks"] == set(updated) and changes["deleted"] == set(deleted)
+            results.append((f"{count} changes", count, size, pages, ms, exact))
+    await db.database.aclose()
+    return results
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=50000)
+    parser.add_argument("--internees", type=int, default=200)
+    parser.add_argument("--changes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--driver", choices=["async", "thread"], default="async")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        # No submissions: deleting a task would remove them too and add tombstones
+        seed(path, args.tasks, args.internees)
+        db.database = main.database = sqlite_database(path, args.driver)
+        results = asyncio.run(run(args))
+
+    print(f"{args.tasks} tasks, pages of {args.limit}")
+    print(f"{'sync':<16} {'bytes':>12} {'bytes/change':>13} {'pages':>6} {'ms':>9}")
+    failures = []
+    full_size = results[0][2]
+    for label, count, size, pages, ms, exact in results:
+        per_change = f"{size / count:.0f}" if count else "-"
+        print(f"{label:<16} {size:>12} {per_change:>13} {pages:>6} {ms:>9.1f}")
+        if not exact:
+            failures.append(f"{label}: the delta does not hold exactly the changed and deleted tasks")
+        # A delta costs about a task's worth of bytes per change, however many tasks there are
+        if count and size > 2 * count * full_size / args.tasks + 200:
+            failures.append(f"{label}: {size} bytes is not proportional to the changes")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
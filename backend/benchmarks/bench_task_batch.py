@@ -0,0 +1,60 @@
+"""POST/PATCH /tasks/batch/ against the same work done with single-task calls.
+
+    python benchmarks/bench_task_batch.py --sizes 10 100 500
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import seed, use_sqlite
+
+import db  # noqa: E402
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+def run(n):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, 0)
+        use_sqlite(path, uid="admin")
+        tasks = [{"title": f"Task {i}", "description": "Batch", "assigned_to": 2 + i % 50} for i in range(n)]
+        with TestClient(main.app) as client:
+            t0 = time.perf_counter()
+            for task in tasks:
+                assert client.post("/tasks/", json=task).status_code == 200
+            single_create = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            response = client.post("/tasks/batch/", json=tasks)
+            batch_create = time.perf_counter() - t0
+            assert response.status_code == 200, response.text
+            ids = [r["id"] for r in response.json()["results"]]
+
+            t0 = time.perf_counter()
+            for task_id in ids:
+                assert client.put(f"/tasks/{task_id}/", json={"status": "in_progress"}).status_code == 200
+            single_update = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            response = client.patch("/tasks/batch/", json=[{"id": task_id, "status": "completed"} for task_id in ids])
+            batch_update = time.perf_counter() - t0
+            assert response.status_code == 200, response.text
+        db.database.close()
+    return single_create, batch_create, single_update, batch_update
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500])
+    args = parser.parse_args()
+
+    print(f"{'tasks':>6} {'N x POST ms':>12} {'batch POST ms':>14} {'N x PUT ms':>11} {'batch PATCH ms':>15}")
+    for n in args.sizes:
+        sc, bc, su, bu = run(n)
+        print(f"{n:>6} {sc * 1000:>12.1f} {bc * 1000:>14.1f} {su * 1000:>11.1f} {bu * 1000:>15.1f}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,64 @@
+"""Latency of GET /tasks/ pages as the tasks table grows.
+
+Seeds a SQLite database per table size and times the first page and a page
+deep into the keyset, with and without a status filter.  Keyset pagination
+should keep every column roughly flat regardless of table size.
+
+    python benchmarks/bench_task_pagination.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from common import seed, use_sqlite
+
+import db  # noqa: E402
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+def timed(client, url, repeat):
+    samples = []
+    response = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        response = client.get(url, headers={"Authorization": "Bearer bench"})
+        samples.append((time.perf_counter() - t0) * 1000)
+        assert response.status_code == 200, response.text
+    return statistics.median(samples), response
+
+
+def run(size, limit, depth, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, size)
+        use_sqlite(path, uid="admin")
+        with TestClient(main.app) as client:
+            first, response = timed(client, f"/tasks/?limit={limit}", repeat)
+            # Walk `depth` pages in to get a cursor far into the table
+            cursor = response.headers.get("X-Next-Cursor")
+            for _ in range(depth):
+                cursor = client.get(f"/tasks/?limit={limit}&cursor={cursor}", headers={"Authorization": "Bearer bench"}).headers.get("X-Next-Cursor")
+            deep, _ = timed(client, f"/tasks/?limit={limit}&cursor={cursor}", repeat)
+            filtered, _ = timed(client, f"/tasks/?limit={limit}&status=completed", repeat)
+        db.database.close()
+    return first, deep, filtered
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--depth", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'tasks':>10} {'first page ms':>14} {'deep page ms':>14} {'filtered ms':>12}")
+    for size in args.sizes:
+        first, deep, filtered = run(size, args.limit, args.depth, args.repeat)
+        print(f"{size:>10} {first:>14.2f} {deep:>14.2f} {filtered:>12.2f}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,294 @@
+"""Query plans of every statement the routes run, flagging scans and sorts.
+
+Seeds a SQLite database with ``--tasks`` tasks, calls the repository functions
+behind each route with arguments drawn from the data, and prints the plan of
+each statement they issue (EXPLAIN QUERY PLAN on SQLite, SHOWPLAN_XML on SQL
+Server).  Writes run too, inside a transaction that is rolled back.
+
+A step reading a whole table is flagged as a scan, and the exit status is 1
+if any was: ``SCAN <table>`` without an index on SQLite, Table Scan or
+Clustered Index Scan on SQL Server.  Sorts (``USE TEMP B-TREE``, Sort) are
+listed as warnings, as a few are inherent, e.g. ranking search hits.  SQLite
+plans an INSERT or UPDATE with foreign key checks of the child tables, which
+only run when a key is deleted or changed; those are not flagged, nor are
+reads of a subquery's own rows (``CO-ROUTINE``/``MATERIALIZE`` steps).  With
+``--existing`` the database configured by DB_BACKEND is checked as it is,
+without seeding.
+
+    python benchmarks/check_plans.py --tasks 20000
+    DB_BACKEND=mssql python benchmarks/check_plans.py --existing
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+import xml.etree.ElementTree as ElementTree
+from datetime import date, datetime
+
+from common import seed, sqlite_database
+
+import db  # noqa: E402
+import report_stats  # noqa: E402
+from archive import move_batch  # noqa: E402
+from identity import UserIdentity  # noqa: E402
+from repositories import activity, attachments, dashboard, jobs, reports, search, submissions, sync, tasks, users  # noqa: E402
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)$")
+_SQLITE_SUBQUERY = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (\w+)$")
+_MSSQL_SCANS = ("Table Scan", "Clustered Index Scan")
+_WRITE_TARGET = re.compile(r"^\s*(?:INSERT\s+INTO|UPDATE)\s+(\w+)", re.IGNORECASE)
+_SHOWPLAN = "{http://schemas.microsoft.com/sqlserver/2004/07/showplan}"
+
+
+def showplan_steps(xml):
+    """``"<operator> <table>.<index>"`` for every operator of a SHOWPLAN_XML document."""
+    steps = []
+    for op in ElementTree.fromstring(xml).iter(f"{_SHOWPLAN}RelOp"):
+        target = ""
+        for child in op:
+            obj = child.find(f"{_SHOWPLAN}Object")
+            if obj is not None:
+                target = obj.get("Table", "").strip("[]")
+                if obj.get("Index"):
+                    target += "." + obj.get("Index").strip("[]")
+                break
+        steps.append(f"{op.get('PhysicalOp')} {target}".rstrip())
+    return steps
+
+
+def classify(dialect, step, sql, foreign_keys, subqueries=()):
+    """``"scan"``, ``"sort"`` or None for one plan step of ``sql``."""
+    if dialect == "mssql":
+        if step.startswith(_MSSQL_SCANS):
+            return "scan"
+        return "sort" if step.startswith("Sort") else None
+    if step.startswith("USE TEMP B-TREE"):
+        return "sort"
+    scan = _SQLITE_SCAN.match(step)
+    if scan is None or scan.group(1) in subqueries:
+        return None
+    target = _WRITE_TARGET.match(sql)
+    if target and scan.group(1) in foreign_keys.get(target.group(1), ()):
+        return None
+    return "scan"
+
+
+async def foreign_keys(conn):
+    """``{table: {tables referencing it}}`` on SQLite."""
+    if conn.dialect != "sqlite":
+        return {}
+    children = {}
+    for child, parent in await conn.fetchall("""
+        SELECT m.name, f."table" FROM sqlite_master m, pragma_foreign_key_list(m.name) f WHERE m.type = 'table'
+    """):
+        children.setdefault(parent, set()).add(child)
+    return children
+
+
+class PlanConnection:
+    """Pooled connection stand-in that explains each statement before running it."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.dialect = conn.dialect
+        self.plans = []  # (sql, steps) in the order the statements ran
+
+    async def _explain(self, sql, params):
+        if self.dialect == "sqlite":
+            steps = [row[3] for row in await self._conn.fetchall("EXPLAIN QUERY PLAN " + sql, *params)]
+        else:
+            await self._conn.execute("SET SHOWPLAN_XML ON")
+            try:
+                rows = await self._conn.fetchall(sql, *params)
+            finally:
+                await self._conn.execute("SET SHOWPLAN_XML OFF")
+            steps = [step for row in rows for step in showplan_steps(row[0])]
+        self.plans.append((sql, steps))
+
+    async def execute(self, sql, *params):
+        await self._explain(sql, params)
+        return await self._conn.execute(sql, *params)
+
+    async def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        if seq_of_params:
+            await self._explain(sql, seq_of_params[0])
+        return await self._conn.executemany(sql, seq_of_params)
+
+    async def fetchone(self, sql, *params):
+        await self._explain(sql, params)
+        return await self._conn.fetchone(sql, *params)
+
+    async def fetchall(self, sql, *params):
+        await self._explain(sql, params)
+        return await self._conn.fetchall(sql, *params)
+
+    async def iterate(self, sql, *params, batch_size=1000):
+        await self._explain(sql, params)
+        async for rows in self._conn.iterate(sql, *params, batch_size=batch_size):
+            yield rows
+
+
+async def _drain(conn, sql, params):
+    async for _ in conn.iterate(sql, *params):
+        pass
+
+
+async def route_queries(conn):
+    """``(route, call)`` pairs, ``call`` running that route's queries on a connection."""
+    admin = await conn.fetchone("SELECT id, role, email, name FROM users WHERE role = 'admin' ORDER BY id")
+    internee = await conn.fetchone(
+        "SELECT id, role, email, name, firebase_id FROM users WHERE role = 'internee' ORDER BY id"
+    )
+    task = await conn.fetchone("SELECT id, created_at FROM tasks WHERE assigned_to = ? ORDER BY id", internee[0])
+    submitted = await conn.fetchone("SELECT task_id, submitted_by, id FROM task_submissions ORDER BY id")
+    if admin is None or task is None or submitted is None:
+        raise SystemExit("The database needs an admin, an internee with a task and a submission")
+    admin, uid, internee = UserIdentity(*admin), internee[4], UserIdentity(*internee[:4])
+    task_id, after = task[0], (task[1], task[0])
+    period = (date(2024, 1, 1), date(2024, 3, 31))
+    deadlines = (datetime(2024, 2, 1), datetime(2024, 3, 1))
+    now = datetime.now()
+    has_fulltext = await search.fulltext_available(conn)
+
+    async def search_hits(c, user):
+        internee_id = None if user.role == "admin" else user.id
+        if has_fulltext:
+            match = search.match_expression(c.dialect, ["task"], True)
+            await search.fulltext(c, match, internee_id, 21, 0)
+        await search.hit_rows(c, [task_id], [submitted[2]], internee_id)
+
+    return [
+        ("auth (token cache miss)", lambda c: users.fetch_identity(c, uid)),
+        ("POST /register/", lambda c: users.upsert(c, uid, "internee@example.com", "Internee", "internee")),
+        ("GET /users/internees/", lambda c: users.fetch_internees(c)),
+        ("POST /tasks/", lambda c: tasks.create(c, "Check", None, None, internee.id, admin.id)),
+        ("GET /tasks/", lambda c: tasks.fetch_page(c, *tasks.filters(admin), 51)),
+        ("GET /tasks/ next page", lambda c: tasks.fetch_page(c, *tasks.filters(admin), 51, after)),
+        ("GET /tasks/?assigned_to=",
+         lambda c: tasks.fetch_page(c, *tasks.filters(admin, assigned_to=internee.id), 51)),
+        ("GET /tasks/?status=", lambda c: tasks.fetch_page(c, *tasks.filters(admin, task_status="pending"), 51)),
+        ("GET /tasks/?deadline_from=&deadline_to=",
+         lambda c: tasks.fetch_page(c, *tasks.filters(admin, deadline_from=deadlines[0],
+                                                       deadline_to=deadlines[1]), 51)),
+        ("GET /tasks/?q=", lambda c: tasks.fetch_page(c, *tasks.filters(admin, q="task"), 51)),
+        ("GET /tasks/ as internee", lambda c: tasks.fetch_page(c, *tasks.filters(internee), 51)),
+        ("GET /tasks/?include_archived=",
+         lambda c: tasks.fetch_page(c, *tasks.filters(admin), 51, include_archived=True)),
+        ("GET /tasks/?include_archived= next page",
+         lambda c: tasks.fetch_page(c, *tasks.filters(admin), 51, after, include_archived=True)),
+        ("GET /tasks/?include_archived= as internee",
+         lambda c: tasks.fetch_page(c, *tasks.filters(internee), 51, include_archived=True)),
+        ("GET /tasks/?status= as internee",
+         lambda c: tasks.fetch_page(c, *tasks.filters(internee, task_status="pending"), 51)),
+        ("POST /tasks/batch/", lambda c: users.existing_ids(c, [internee.id])),
+        ("POST /tasks/batch/", lambda c: tasks.insert_many(c, [(0, "Check", None, admin.id, internee.id, None)])),
+        ("PUT /tasks/batch/", lambda c: tasks.values_many(c, [task_id])),
+        ("PUT /tasks/batch/", lambda c: tasks.update_many(c, [(task_id, {"status": "in_progress"})])),
+        ("PUT /tasks/{task_id}/", lambda c: tasks.assignee(c, task_id)),
+        ("PUT /tasks/{task_id}/", lambda c: tasks.update(c, task_id, {"status": "in_progress"})),
+        ("PUT /tasks/{task_id}/ as internee",
+         lambda c: tasks.update(c, task_id, {"status": "in_progress"}, internee.id)),
+        ("PUT /tasks/{task_id}/ reassigning",
+         lambda c: tasks.update(c, task_id, {"assigned_to": internee.id, "deadline": now})),
+        ("PUT /tasks/{task_id}/ renaming", lambda c: tasks.update(c, task_id, {"title": "Check"})),
+        ("POST /tasks/{task_id}/submit/", lambda c: attachments.used_bytes(c, internee.id)),
+        ("POST /tasks/{task_id}/submit/", lambda c: submissions.create(c, task_id, internee.id, "Check", None)),
+        ("POST /tasks/{task_id}/submit/",
+         lambda c: attachments.create(c, submitted[2], internee.id, "0" * 64, 1, "a.txt", "text/plain", 1 << 30)),
+        ("GET /attachments/{attachment_id}/", lambda c: attachments.fetch(c, 1)),
+        ("PUT /tasks/{task_id}/", lambda c: tasks.values(c, task_id)),
+        ("GET /tasks/{task_id}/history/", lambda c: tasks.assignee(c, task_id, include_archived=True)),
+        ("GET /tasks/{task_id}/history/", lambda c: activity.fetch_page(c, task_id, 101)),
+        ("GET /tasks/{task_id}/history/ next page", lambda c: activity.fetch_page(c, task_id, 101, after)),
+        ("activity log flush", lambda c: activity.insert_many(c, [(task_id, admin.id, "updated", "{}", now)])),
+        ("GET /tasks/{task_id}/submissions/", lambda c: submissions.fetch_for_task(c, submitted[0])),
+        ("GET /tasks/{task_id}/submissions/ as internee",
+         lambda c: submissions.fetch_for_task(c, submitted[0], submitted[1])),
+        ("GET /tasks/{task_id}/submissions/?include_archived=",
+         lambda c: submissions.fetch_for_task(c, submitted[0], None, True)),
+        ("GET /search/", lambda c: search_hits(c, admin)),
+        ("GET /search/ as internee", lambda c: search_hits(c, internee)),
+        ("POST /reports/", lambda c: reports.create(c, internee.id, admin.id, *period, 1, 1, "Good", None)),
+        ("GET /reports/", lambda c: reports.fetch_all(c)),
+        ("GET /reports/ as internee", lambda c: reports.fetch_all(c, internee.id)),
+        ("GET /reports/?include_archived=", lambda c: reports.fetch_all(c, None, True)),
+        ("GET /reports/?include_archived= as internee", lambda c: reports.fetch_all(c, internee.id, True)),
+        ("GET /reports/stats/", lambda c: report_stats.internee_stats(c, *period)),
+        ("POST /reports/generate/", lambda c: report_stats.internee_stats(c, *period, [internee.id])),
+        ("GET /tasks/export/ as internee", lambda c: _drain(c, *tasks.export_query(c.dialect, *tasks.filters(internee)))),
+        ("GET /tasks/{task_id}/submissions/export/",
+         lambda c: _drain(c, *submissions.export_query(c.dialect, submitted[0]))),
+        ("GET /reports/export/ as internee", lambda c: _drain(c, *reports.export_query(c.dialect, internee.id))),
+        ("GET /dashboard/", lambda c: dashboard.fetch(c, now)),
+        ("GET /sync/", lambda c: sync.changed_tasks(c, 1, None, 501)),
+        ("GET /sync/", lambda c: sync.changed_submissions(c, 1, None, 501)),
+        ("GET /sync/", lambda c: sync.changed_reports(c, 1, None, 501)),
+        ("GET /sync/", lambda c: sync.tombstones(c, 1, None, 501)),
+        ("GET /sync/ as internee", lambda c: sync.changed_tasks(c, 1, internee.id, 501)),
+        ("GET /sync/ as internee", lambda c: sync.changed_submissions(c, 1, internee.id, 501)),
+        ("GET /sync/ as internee", lambda c: sync.changed_reports(c, 1, internee.id, 501)),
+        ("GET /sync/ as internee", lambda c: sync.tombstones(c, 1, internee.id, 501)),
+        ("POST /reports/jobs/", lambda c: jobs.insert(c, "reports.generate", "{}", 5, now, admin.id)),
+        ("GET /jobs/{job_id}/", lambda c: jobs.get(c, 1)),
+        ("job worker claim", lambda c: jobs.claim(c, now, now)),
+        ("job worker finish", lambda c: jobs.finish(c, 1, 1, "succeeded", "{}", None, now)),
+        ("job worker retry", lambda c: jobs.retry(c, 1, 1, now, "error", now)),
+        ("job scheduler", lambda c: jobs.schedule(c, "tasks.flag_overdue", now)),
+        ("job scheduler", lambda c: jobs.advance_schedule(c, "tasks.flag_overdue", now, now, now)),
+        ("job tasks.flag_overdue", lambda c: tasks.flag_overdue(c, now)),
+        ("job tasks.remind_deadlines", lambda c: tasks.due_between(c, *deadlines)),
+        ("job sync.compact_tombstones", lambda c: sync.compact(c, 86400)),
+        ("job archive.completed_work", lambda c: move_batch(c, datetime(2024, 1, 2), 500)),
+        ("DELETE /tasks/{task_id}/", lambda c: tasks.delete(c, task_id)),
+    ]
+
+
+async def check(database, verbose):
+    conn = await database.acquire()
+    scans = sorts = 0
+    try:
+        children = await foreign_keys(conn)
+        for route, call in await route_queries(conn):
+            plan = PlanConnection(conn)
+            await call(plan)
+            for sql, steps in plan.plans:
+                subqueries = {m.group(1) for m in map(_SQLITE_SUBQUERY.match, steps) if m}
+                kinds = [classify(conn.dialect, step, sql, children, subqueries) for step in steps]
+                scans += "scan" in kinds
+                sorts += "sort" in kinds
+                if "scan" in kinds or "sort" in kinds or verbose:
+                    label = "SCAN" if "scan" in kinds else "sort" if "sort" in kinds else "ok"
+                    print(f"{label:<5}{route}: {' '.join(sql.split())[:100]}")
+                    for step, kind in zip(steps, kinds):
+                        print(f"       {'!' if kind == 'scan' else '~' if kind == 'sort' else ' '} {step}")
+        await conn.rollback()
+    finally:
+        await database.release(conn)
+        await database.aclose()
+    return scans, sorts
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--internees", type=int, default=50)
+    parser.add_argument("--existing", action="store_true", help="Check the DB_BACKEND database as it is")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Print every plan, not only flagged ones")
+    args = parser.parse_args()
+
+    if args.existing:
+        scans, sorts = asyncio.run(check(db.database_from_settings(), args.verbose))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "plans.db")
+            seed(path, args.tasks, args.internees, n_submissions=args.tasks // 4, n_reports=args.tasks // 10)
+            scans, sorts = asyncio.run(check(sqlite_database(path), args.verbose))
+    print(f"{scans} statement(s) with table scans, {sorts} with sorts")
+    return 1 if scans else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
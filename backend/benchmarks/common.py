@@ -0,0 +1,66 @@
+"""Shared setup for the benchmark scripts: SQLite seeding and app wiring."""
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_BACKEND", "sqlite")
+# Periodic jobs would rewrite the seeded tasks (overdue flags) mid-benchmark
+os.environ.setdefault("JOBS_SCHEDULER", "false")
+
+import db  # noqa: E402
+import main  # noqa: E402
+import migrations  # noqa: E402
+
+STATUSES = ["pending", "in_progress", "completed"]
+
+
+def seed(path, n_tasks, n_internees=50, n_submissions=0, n_reports=0):
+    """Create the schema at ``path`` with one admin (uid ``admin``), internees and tasks.
+
+    Internees have uids ``internee-<n>`` and ids from 2.  Submissions go to the
+    first ``n_submissions`` tasks, made by their assignee a day after creation.
+    """
+    conn = sqlite3.connect(path, uri=path.startswith("file:"))
+    migrations.upgrade(conn, "sqlite")
+    conn.execute("INSERT INTO users (firebase_id, email, name, role) VALUES ('admin', 'admin@example.com', 'Admin', 'admin')")
+    conn.executemany(
+        "INSERT INTO users (firebase_id, email, name, role) VALUES (?, ?, ?, 'internee')",
+        [(f"internee-{i}", f"internee{i}@example.com", f"Internee {i}") for i in range(n_internees)],
+    )
+    start = datetime(2024, 1, 1)
+    conn.executemany(
+        "INSERT INTO tasks (title, description, status, created_by, assigned_to, deadline, created_at) VALUES (?, ?, ?, 1, ?, ?, ?)",
+        (
+            (f"Task {i}", "Benchmark task", STATUSES[i % len(STATUSES)], 2 + i % n_internees,
+             start + timedelta(days=30 + i % 90), start + timedelta(seconds=i * 7))
+            for i in range(n_tasks)
+        ),
+    )
+    conn.execute(
+        "INSERT INTO task_submissions (task_id, submitted_by, description, submitted_at) "
+        "SELECT id, assigned_to, 'Benchmark submission', datetime(created_at, '+1 day') FROM tasks ORDER BY id LIMIT ?",
+        (n_submissions,),
+    )
+    conn.executemany(
+        "INSERT INTO progress_reports (internee_id, generated_by, period_start, period_end, tasks_completed, "
+        "tasks_pending, overall_performance) VALUES (?, 1, '2024-01-01', '2024-03-31', ?, ?, 'Good')",
+        ((2 + i % n_internees, i % 20, i % 7) for i in range(n_reports)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def sqlite_database(path, driver="thread", **pool):
+    """Pool over the SQLite file: sqlite3 on the executor, or aiosqlite with ``driver="async"``."""
+    if driver == "async":
+        return db.AsyncDriverDatabase(db.AioSQLiteBackend(path), **pool)
+    return db.Database(db.SQLiteBackend(path), **pool)
+
+
+def use_sqlite(path, uid="admin"):
+    """Point the app at the SQLite file and authenticate every request as ``uid``."""
+    db.database = sqlite_database(path)
+    main.app.dependency_overrides[main.get_current_user] = lambda: {"uid": uid}
+    return db.database
@@ -0,0 +1,276 @@
+"""Mixed read/write load test of the API, with results written as JSON.
+
+Boots the FastAPI app in process against a seeded SQLite database (a temp
+file on disk, or on tmpfs with ``--db memory``) and the local JWT verifier,
+then drives a weighted mix of requests from ``--concurrency`` concurrent
+clients.  For every operation it reports latency percentiles, throughput and
+database round-trips per request (read from the app's ``Server-Timing``
+header).  Runs are reproducible for a
+given ``--seed``; compare two runs (e.g. before and after a commit) with
+``--compare``.
+
+    python benchmarks/load_test.py --tasks 20000 --requests 5000 --concurrency 32 --output after.json
+    python benchmarks/load_test.py --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault("AUTH_VERIFIER", "local")
+
+from common import seed, sqlite_database  # noqa: E402
+
+import db  # noqa: E402
+import main  # noqa: E402
+import httpx  # noqa: E402
+
+DEFAULT_MIX = {
+    "list_tasks_admin": 25,
+    "list_tasks_internee": 25,
+    "list_internees": 5,
+    "list_reports": 5,
+    "report_stats": 5,
+    "create_task": 10,
+    "update_task": 15,
+    "submit_task": 8,
+    "delete_task": 2,
+}
+
+# Database round-trips the app reports for the request
+_DB_CALLS = re.compile(r'db;desc="(\d+) queries"')
+
+
+class Workload:
+    def __init__(self, args, rng):
+        self.args = args
+        self.rng = rng
+        verifier = main.token_cache.verifier
+        self.admin = {"Authorization": f"Bearer {verifier.issue({'uid': 'admin'}, ttl=86400)}"}
+        self.internees = [
+            {"Authorization": f"Bearer {verifier.issue({'uid': f'internee-{i}'}, ttl=86400)}"}
+            for i in range(args.internees)
+        ]
+        # Seeded tasks are deleted from the top of the id range down
+        self.next_delete = args.tasks
+
+    def owned_task(self, k):
+        # Seed assigns task i (id i + 1) to internee i % n
+        n = self.args.internees
+        return self.rng.randrange(k, self.args.tasks - self.args.delete_reserve, n) + 1
+
+    def request(self, op):
+        rng = self.rng
+        if op == "list_tasks_admin":
+            return "GET", "/tasks/", self.admin, {"params": {"limit": 50}}
+        if op == "list_tasks_internee":
+            return "GET", "/tasks/", rng.choice(self.internees), {"params": {"limit": 50}}
+        if op == "list_internees":
+            return "GET", "/users/internees/", self.admin, {}
+        if op == "list_reports":
+            return "GET", "/reports/", self.admin, {}
+        if op == "report_stats":
+            return "GET", "/reports/stats/", self.admin, {
+                "params": {"period_start": "2024-01-01", "period_end": "2024-03-31"}}
+        if op == "create_task":
+            body = {"title": "Load test task", "description": "Created by load_test.py",
+                    "assigned_to": 2 + rng.randrange(self.args.internees), "deadline": "2030-01-01T00:00:00"}
+            return "POST", "/tasks/", self.admin, {"json": body}
+        if op == "update_task":
+            task_id = rng.randrange(1, self.args.tasks - self.args.delete_reserve + 1)
+            body = {"status": rng.choice(["pending", "in_progress", "completed"])}
+            return "PUT", f"/tasks/{task_id}/", self.admin, {"json": body}
+        if op == "submit_task":
+            k = rng.randrange(self.args.internees)
+            return "POST", f"/tasks/{self.owned_task(k)}/submit/", self.internees[k], {
+                "json": {"description": "Load test submission"}}
+        if op == "delete_task":
+            task_id = self.next_delete
+            self.next_delete -= 1
+            return "DELETE", f"/tasks/{task_id}/", self.admin, {}
+        raise ValueError(f"Unknown operation: {op}")
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples, calls, errors, elapsed):
+    if not samples:
+        return {"count": 0, "errors": errors}
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "mean_ms": round(sum(samples) / len(samples), 3),
+        "rps": round(len(samples) / elapsed, 1),
+        "db_calls_per_request": round(sum(calls) / len(calls), 2),
+    }
+
+
+async def drive(args, workload, mix):
+    ops = list(mix)
+    weights = [mix[op] for op in ops]
+    plan = workload.rng.choices(ops, weights, k=args.warmup + args.requests)
+    requests = [workload.request(op) for op in plan]
+    stats = {op: ([], [], [0]) for op in ops}
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        position = 0
+        measured = {"start": None}
+
+        async def one(i):
+            method, url, headers, kwargs = requests[i]
+            t0 = time.perf_counter()
+            response = await client.request(method, url, headers=headers, **kwargs)
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            if i < args.warmup:
+                return
+            samples, db_calls, errors = stats[plan[i]]
+            if response.status_code >= 400:
+                errors[0] += 1
+            samples.append(elapsed_ms)
+            match = _DB_CALLS.search(response.headers.get("server-timing", ""))
+            db_calls.append(int(match.group(1)) if match else 0)
+
+        async def worker():
+            nonlocal position
+            while position < len(requests):
+                i = position
+                position += 1
+                if i == args.warmup and measured["start"] is None:
+                    measured["start"] = time.perf_counter()
+                await one(i)
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - (measured["start"] or time.perf_counter())
+    await db.database.aclose()
+
+    results = {op: summarize(s, c, e[0], elapsed) for op, (s, c, e) in stats.items()}
+    all_samples = [x for s, _, _ in stats.values() for x in s]
+    all_calls = [x for _, c, _ in stats.values() for x in c]
+    total = summarize(all_samples, all_calls, sum(e[0] for _, _, e in stats.values()), elapsed)
+    return results, total, elapsed
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    mix = dict(DEFAULT_MIX)
+    if args.mix:
+        mix = {name: int(weight) for name, weight in (item.split("=") for item in args.mix.split(","))}
+    # Keep a slice of seeded tasks for deletes so they never hit updated or submitted ones
+    args.delete_reserve = min(args.tasks // 2, int(args.requests * mix.get("delete_task", 0) / sum(mix.values())) + 50)
+
+    # SQLite's shared-cache in-memory mode locks whole tables between
+    # connections, so "memory" is a WAL database on tmpfs instead
+    tmp_root = "/dev/shm" if args.db == "memory" and os.path.isdir("/dev/shm") else None
+    with tempfile.TemporaryDirectory(dir=tmp_root) as tmp:
+        path = os.path.join(tmp, "load_test.db")
+        seed(path, args.tasks, args.internees, args.submissions, args.reports)
+
+        db.database = sqlite_database(path, args.driver, size=args.pool_size, max_overflow=0)
+        main.database = db.database
+        if not args.response_cache:
+            main.response_cache.max_bytes = 0
+
+        workload = Workload(args, random.Random(args.seed))
+        results, total, elapsed = asyncio.run(drive(args, workload, mix))
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "elapsed_s": round(elapsed, 3),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            "mix": mix,
+        },
+        "total": total,
+        "endpoints": results,
+    }
+
+
+def print_results(report):
+    print(f"{'operation':<22} {'count':>7} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rps':>9} {'db/req':>7}")
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["total"])]
+    for name, r in rows:
+        if not r["count"]:
+            continue
+        print(f"{name:<22} {r['count']:>7} {r['errors']:>5} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+              f"{r['p99_ms']:>9.2f} {r['rps']:>9.1f} {r['db_calls_per_request']:>7.2f}")
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before['meta']['commit']} -> {after['meta']['commit']}")
+    print(f"{'operation':<22} {'p50 ms':>17} {'p95 ms':>17} {'rps':>19} {'db/req':>13}")
+    rows = [(name, before["endpoints"].get(name), r) for name, r in after["endpoints"].items()]
+    rows.append(("TOTAL", before["total"], after["total"]))
+    for name, b, a in rows:
+        if not b or not b.get("count") or not a.get("count"):
+            continue
+        def delta(key, fmt):
+            change = (a[key] - b[key]) / b[key] * 100 if b[key] else 0.0
+            return f"{a[key]:{fmt}} ({change:+.0f}%)"
+        print(f"{name:<22} {delta('p50_ms', '>9.2f'):>17} {delta('p95_ms', '>9.2f'):>17} "
+              f"{delta('rps', '>9.1f'):>19} {a['db_calls_per_request']:>6.2f}/{b['db_calls_per_request']:<6.2f}")
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", choices=["file", "memory"], default="file")
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--internees", type=int, default=50)
+    parser.add_argument("--submissions", type=int, default=2000)
+    parser.add_argument("--reports", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--driver", choices=["thread", "async"], default="async",
+                        help="sqlite3 on the pool's executor, or aiosqlite")
+    parser.add_argument("--mix", help="Comma-separated op=weight pairs, e.g. list_tasks_admin=80,create_task=20")
+    parser.add_argument("--no-response-cache", dest="response_cache", action="store_false")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run(args)
+    print_results(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main_()
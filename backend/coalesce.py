@@ -0,0 +1,74 @@
+"""Single-flight coalescing of identical concurrent reads.
+
+While a query for a key is in flight, other requests for the same key await
+its result instead of running the query again, so a burst of identical
+polls costs the database one query.  Keys must capture everything the
+result depends on: the route, the caller's scope, the parameters and the
+table versions of response_cache, so a request that starts after a write
+never shares a result read before it.
+
+The query runs on the first caller's connection.  If that request is
+cancelled (the client went away), the callers waiting on it run the query
+themselves.  Results are shared objects and must not be mutated.
+"""
+import asyncio
+
+from settings import settings
+
+
+class _Abandoned(Exception):
+    """The leading request was cancelled before its query finished."""
+
+
+class SingleFlight:
+    def __init__(self, routes=()):
+        # "METHOD /template" of the routes that coalesce
+        self.routes = frozenset(routes)
+        self._flights = {}
+        self.leaders = {}
+        self.joined = {}
+
+    async def do(self, route, key, fn):
+        """Result of ``await fn()`` for ``key``, shared with concurrent callers."""
+        if route not in self.routes:
+            return await fn()
+        key = (route, key)
+        while True:
+            future = self._flights.get(key)
+            if future is None:
+                break
+            self.joined[route] = self.joined.get(route, 0) + 1
+            try:
+                return await asyncio.shield(future)
+            except _Abandoned:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark the outcome retrieved even when nobody joined
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._flights[key] = future
+        self.leaders[route] = self.leaders.get(route, 0) + 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(_Abandoned())
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+        future.set_result(result)
+        return result
+
+    def metrics(self):
+        return {
+            "routes": sorted(self.routes),
+            "in_flight": len(self._flights),
+            "queries": dict(self.leaders),
+            "joined": dict(self.joined),
+        }
+
+
+single_flight = SingleFlight(settings.coalesce_routes)
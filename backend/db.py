@@ -0,0 +1,693 @@
+import asyncio
+import importlib.util
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+import instrumentation
+import migrations
+from settings import DEFAULT_SQLITE_PATH, settings
+
+
+class DatabaseError(Exception):
+    """Raised for any driver error, whichever backend is in use."""
+
+
+class PoolTimeout(DatabaseError):
+    """Raised when no connection became free within the pool timeout."""
+
+
+# Backends
+class SQLServerBackend:
+    dialect = "mssql"
+
+    def __init__(self, connection_string):
+        self.connection_string = connection_string
+
+    @property
+    def errors(self):
+        import pyodbc
+        return (pyodbc.Error,)
+
+    def connect(self):
+        import pyodbc
+        return pyodbc.connect(self.connection_string, autocommit=False)
+
+    def ping(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        cursor.close()
+
+
+class SQLiteBackend:
+    """Local stand-in for SQL Server, used for development and load tests."""
+
+    dialect = "sqlite"
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH, migrate=True, statement_cache_size=256):
+        self.path = path
+        # Statements sqlite3 keeps prepared per connection, looked up by their
+        # text; the query catalog's fixed statements (statements.py) are reused
+        self.statement_cache_size = statement_cache_size
+        # Apply pending migrations (migrations.py) on the first connection
+        self.migrate = migrate
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, uri=self.path.startswith("file:"),
+                               cached_statements=self.statement_cache_size)
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA busy_timeout = 5000")
+        if not self.path.startswith("file:") and self.path != ":memory:":
+            conn.execute("PRAGMA journal_mode = WAL")
+        self._ensure_schema(conn)
+        return conn
+
+    def ping(self, conn):
+        conn.execute("SELECT 1").fetchone()
+
+    def _ensure_schema(self, conn):
+        if self._schema_ready or not self.migrate:
+            return
+        with self._schema_lock:
+            if not self._schema_ready:
+                migrations.upgrade(conn, self.dialect, optional=settings.migrations_optional)
+                self._schema_ready = True
+
+
+class AioODBCBackend(SQLServerBackend):
+    """SQL Server through aioodbc, for AsyncDriverDatabase."""
+
+    driver = "aioodbc"
+
+    async def connect(self):
+        import aioodbc
+        return await aioodbc.connect(dsn=self.connection_string, autocommit=False)
+
+    async def ping(self, conn):
+        cursor = await conn.cursor()
+        await cursor.execute("SELECT 1")
+        await cursor.fetchone()
+        await cursor.close()
+
+
+class AioSQLiteBackend(SQLiteBackend):
+    """SQLite through aiosqlite, for AsyncDriverDatabase."""
+
+    driver = "aiosqlite"
+    _schema_async_lock = None
+
+    async def connect(self):
+        import aiosqlite
+        if not self._schema_ready and self.migrate:
+            if self._schema_async_lock is None:
+                self._schema_async_lock = asyncio.Lock()
+            async with self._schema_async_lock:
+                if not self._schema_ready:
+                    # Migrations run on a sqlite3 connection of their own
+                    await asyncio.to_thread(self._upgrade)
+        conn = await aiosqlite.connect(self.path, uri=self.path.startswith("file:"),
+                                       cached_statements=self.statement_cache_size)
+        await conn.execute("PRAGMA foreign_keys = ON")
+        await conn.execute("PRAGMA busy_timeout = 5000")
+        if not self.path.startswith("file:") and self.path != ":memory:":
+            await conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def _upgrade(self):
+        SQLiteBackend.connect(self).close()
+
+    async def ping(self, conn):
+        async with conn.execute("SELECT 1") as cursor:
+            await cursor.fetchone()
+
+
+def backend_from_settings(native=False, config=settings):
+    """Backend named by DB_BACKEND; ``native`` picks its async driver variant."""
+    if config.db_backend == "sqlite":
+        backend = AioSQLiteBackend if native else SQLiteBackend
+        return backend(config.sqlite_path, statement_cache_size=config.db_statement_cache_size)
+    if native:
+        return AioODBCBackend(config.sql_server_dsn())
+    return SQLServerBackend(config.sql_server_dsn())
+
+
+# Pool
+class Database:
+    """Bounded connection pool whose blocking calls run on a dedicated executor.
+
+    At most ``size + max_overflow`` connections are checked out at once.  Waiting
+    for a free slot happens on the event loop, and the executor has one thread
+    per slot, so a caller holding a connection can always get a thread to use it.
+    """
+
+    def __init__(self, backend, size=10, max_overflow=5, timeout=30.0, recycle=1800.0, pre_ping=True):
+        self.backend = backend
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.executor = self._make_executor()
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = None
+        self._open = 0
+        self._in_use = 0
+        self._waiting = 0
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recycled = 0
+        self._failed_pings = 0
+
+    def _make_executor(self):
+        return ThreadPoolExecutor(max_workers=self.max_connections, thread_name_prefix="db")
+
+    @property
+    def max_connections(self):
+        return self.size + self.max_overflow
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def acquire(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_connections)
+
+        start = time.perf_counter()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise PoolTimeout(f"No database connection available after {self.timeout}s")
+        finally:
+            self._waiting -= 1
+        waited = time.perf_counter() - start
+        self._checkouts += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+        try:
+            raw = await self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+        self._in_use += 1
+        instrumentation.record_acquire(time.perf_counter() - start)
+        return self._wrap(raw)
+
+    async def warm(self, count=None):
+        """Open up to ``count`` connections (the pool size by default) and leave them idle.
+
+        Connects concurrently so startup waits about one connection's latency;
+        raises DatabaseError if the database cannot be reached.
+        """
+        count = self.size if count is None else min(count, self.size)
+        count -= len(self._idle) + self._in_use
+        if count <= 0:
+            return
+        results = await asyncio.gather(*(self.acquire() for _ in range(count)), return_exceptions=True)
+        for result in results:
+            if not isinstance(result, BaseException):
+                await self.release(result)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def release(self, conn):
+        raw, conn._raw = conn._raw, None
+        if raw is None:
+            return
+        try:
+            await self._checkin(raw)
+        finally:
+            self._in_use -= 1
+            self._slots.release()
+
+    def _wrap(self, raw):
+        return AsyncConnection(self, raw)
+
+    async def _checkout(self):
+        return await self.run(self._checkout_blocking)
+
+    async def _checkin(self, entry):
+        await self.run(self._checkin_blocking, entry)
+
+    def _checkout_blocking(self):
+        while True:
+            entry = self._take_idle()
+            if entry is None:
+                try:
+                    return _PooledConnection(self.backend.connect())
+                except self.backend.errors as e:
+                    self._connect_failed(e)
+
+            if self._expired(entry):
+                self._discard(entry)
+                continue
+            if self.pre_ping:
+                try:
+                    self.backend.ping(entry.conn)
+                except self.backend.errors:
+                    self._failed_pings += 1
+                    self._discard(entry)
+                    continue
+            return entry
+
+    def _checkin_blocking(self, entry):
+        try:
+            entry.conn.rollback()
+        except self.backend.errors:
+            self._discard(entry)
+            return
+        if not self._keep_idle(entry):
+            self._discard(entry)
+
+    def _discard(self, entry):
+        self._forget(entry)
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    # Bookkeeping shared with AsyncDriverDatabase
+    def _take_idle(self):
+        """Pop an idle connection, or reserve a slot for a new one and return None."""
+        with self._lock:
+            if self._idle:
+                return self._idle.popleft()
+            self._open += 1
+            return None
+
+    def _connect_failed(self, error):
+        with self._lock:
+            self._open -= 1
+        raise DatabaseError(f"Database connection failed: {error}") from error
+
+    def _expired(self, entry):
+        if time.monotonic() - entry.created > self.recycle:
+            self._recycled += 1
+            return True
+        return False
+
+    def _keep_idle(self, entry):
+        # Overflow connections are closed instead of being kept idle
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(entry)
+                return True
+        return False
+
+    def _forget(self, entry):
+        with self._lock:
+            self._open -= 1
+
+    def _drain_idle(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        return idle
+
+    def metrics(self):
+        return {
+            "driver": getattr(self.backend, "driver", "thread"),
+            "size": self.size,
+            "max_overflow": self.max_overflow,
+            "open": self._open,
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            "waiting": self._waiting,
+            "saturation": round(self._in_use / self.max_connections, 4),
+            "checkouts": self._checkouts,
+            "timeouts": self._timeouts,
+            "wait_time_total_ms": round(self._wait_total * 1000, 3),
+            "wait_time_avg_ms": round(self._wait_total * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+            "wait_time_max_ms": round(self._wait_max * 1000, 3),
+            "recycled": self._recycled,
+            "failed_pings": self._failed_pings,
+        }
+
+    def close(self):
+        self._close_idle()
+        self.executor.shutdown(wait=False)
+
+    def _close_idle(self):
+        for entry in self._drain_idle():
+            self._discard(entry)
+
+    async def aclose(self):
+        """Close the idle connections; the pool stays usable and reconnects on demand."""
+        await self.run(self._close_idle)
+
+
+class AsyncDriverDatabase(Database):
+    """The same pool over an async driver (``AioODBCBackend``, ``AioSQLiteBackend``).
+
+    Checkout, pings and statements are awaited on the driver directly instead
+    of being handed to the executor, so a worker is not limited to one thread
+    per query in flight.  Bounds, recycling and metrics are those of Database.
+    """
+
+    def _make_executor(self):
+        return None
+
+    async def run(self, fn, *args):
+        raise TypeError("AsyncDriverDatabase has no executor; await the connection's methods")
+
+    def _wrap(self, raw):
+        return DriverConnection(self, raw)
+
+    async def _checkout(self):
+        while True:
+            entry = self._take_idle()
+            if entry is None:
+                try:
+                    return _PooledConnection(await self.backend.connect())
+                except self.backend.errors as e:
+                    self._connect_failed(e)
+
+            if self._expired(entry):
+                await self._adiscard(entry)
+                continue
+            if self.pre_ping:
+                try:
+                    await self.backend.ping(entry.conn)
+                except self.backend.errors:
+                    self._failed_pings += 1
+                    await self._adiscard(entry)
+                    continue
+            return entry
+
+    async def _checkin(self, entry):
+        try:
+            await entry.conn.rollback()
+        except self.backend.errors:
+            await self._adiscard(entry)
+            return
+        if not self._keep_idle(entry):
+            await self._adiscard(entry)
+
+    async def _adiscard(self, entry):
+        self._forget(entry)
+        try:
+            await entry.conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        raise TypeError("AsyncDriverDatabase connections must be closed with 'await aclose()'")
+
+    async def aclose(self):
+        # aiosqlite keeps a non-daemon thread per connection until it is closed
+        for entry in self._drain_idle():
+            await self._adiscard(entry)
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created = time.monotonic()
+
+
+class AsyncConnection:
+    """Checked-out connection whose calls are executed on the pool's executor."""
+
+    def __init__(self, db, raw):
+        self._db = db
+        self._raw = raw
+
+    @property
+    def dialect(self):
+        return self._db.backend.dialect
+
+    def _call(self, fn, *args):
+        try:
+            return fn(self._raw.conn, *args)
+        except self._db.backend.errors as e:
+            raise DatabaseError(str(e)) from e
+
+    async def run(self, fn, *args):
+        """Run ``fn(raw_connection, *args)`` on the executor."""
+        started = time.perf_counter()
+        result = None
+        try:
+            result = await self._db.run(self._call, fn, *args)
+            return result
+        finally:
+            _record(fn, args, time.perf_counter() - started, result)
+
+    async def execute(self, sql, *params):
+        """Execute a statement and return the affected row count."""
+        return await self.run(_execute, sql, params)
+
+    async def executemany(self, sql, seq_of_params):
+        return await self.run(_executemany, sql, seq_of_params)
+
+    async def fetchone(self, sql, *params):
+        return await self.run(_fetchone, sql, params)
+
+    async def fetchall(self, sql, *params):
+        return await self.run(_fetchall, sql, params)
+
+    async def iterate(self, sql, *params, batch_size=1000):
+        """Yield the rows of a query in ``fetchmany(batch_size)`` batches."""
+        cursor = await self.run(_open_cursor, sql, params)
+        try:
+            while True:
+                rows = await self.run(_fetchmany, cursor, batch_size)
+                if not rows:
+                    return
+                instrumentation.statement_stats.add_rows(sql, len(rows))
+                yield rows
+        finally:
+            await self.run(_close_cursor, cursor)
+
+    async def commit(self):
+        await self.run(_commit)
+
+    async def rollback(self):
+        await self.run(_rollback)
+
+
+def _execute(conn, sql, params):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    rowcount = cursor.rowcount
+    cursor.close()
+    return rowcount
+
+
+def _executemany(conn, sql, seq_of_params):
+    cursor = conn.cursor()
+    if hasattr(cursor, "fast_executemany"):
+        cursor.fast_executemany = True
+    cursor.executemany(sql, seq_of_params)
+    rowcount = cursor.rowcount
+    cursor.close()
+    return rowcount
+
+
+def _fetchone(conn, sql, params):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    row = cursor.fetchone()
+    cursor.close()
+    return row
+
+
+def _fetchall(conn, sql, params):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def _open_cursor(conn, sql, params):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    return cursor
+
+
+def _fetchmany(conn, cursor, size):
+    return cursor.fetchmany(size)
+
+
+def _close_cursor(conn, cursor):
+    cursor.close()
+
+
+# Helpers whose first argument is the SQL text, used to label timings
+_STATEMENT_FUNCTIONS = {_execute, _executemany, _fetchone, _fetchall, _open_cursor}
+
+
+def _record(fn, args, seconds, result):
+    """Report a helper's call to instrumentation, with the rows of a statement."""
+    if fn not in _STATEMENT_FUNCTIONS:
+        instrumentation.record_query(fn.__name__.lstrip("_"), seconds)
+    elif result is None or fn is _open_cursor:
+        # Failed, or rows still to be fetched (counted by iterate)
+        instrumentation.record_query(args[0], seconds, 0)
+    elif fn is _fetchone:
+        instrumentation.record_query(args[0], seconds, 1)
+    elif fn is _fetchall:
+        instrumentation.record_query(args[0], seconds, len(result))
+    else:
+        instrumentation.record_query(args[0], seconds, max(result, 0))
+
+
+def _commit(conn):
+    conn.commit()
+
+
+def _rollback(conn):
+    conn.rollback()
+
+
+class DriverConnection(AsyncConnection):
+    """Checked-out connection of an async driver; statements are awaited directly."""
+
+    async def run(self, fn, *args):
+        """Run the async twin of the blocking helper ``fn`` on the driver connection."""
+        twin = _ASYNC_HELPERS.get(fn)
+        if twin is None:
+            raise TypeError(f"{fn.__name__} has no async equivalent")
+        started = time.perf_counter()
+        result = None
+        try:
+            result = await twin(self._raw.conn, *args)
+            return result
+        except self._db.backend.errors as e:
+            raise DatabaseError(str(e)) from e
+        finally:
+            _record(fn, args, time.perf_counter() - started, result)
+
+
+# Async twins of the helpers above, for aioodbc and aiosqlite connections
+async def _execute_async(conn, sql, params):
+    cursor = await conn.cursor()
+    await cursor.execute(sql, params)
+    rowcount = cursor.rowcount
+    await cursor.close()
+    return rowcount
+
+
+async def _executemany_async(conn, sql, seq_of_params):
+    cursor = await conn.cursor()
+    await cursor.executemany(sql, seq_of_params)
+    rowcount = cursor.rowcount
+    await cursor.close()
+    return rowcount
+
+
+async def _fetchone_async(conn, sql, params):
+    cursor = await conn.cursor()
+    await cursor.execute(sql, params)
+    row = await cursor.fetchone()
+    await cursor.close()
+    return row
+
+
+async def _fetchall_async(conn, sql, params):
+    cursor = await conn.cursor()
+    await cursor.execute(sql, params)
+    rows = await cursor.fetchall()
+    await cursor.close()
+    return rows
+
+
+async def _open_cursor_async(conn, sql, params):
+    cursor = await conn.cursor()
+    await cursor.execute(sql, params)
+    return cursor
+
+
+async def _fetchmany_async(conn, cursor, size):
+    return await cursor.fetchmany(size)
+
+
+async def _close_cursor_async(conn, cursor):
+    await cursor.close()
+
+
+async def _commit_async(conn):
+    await conn.commit()
+
+
+async def _rollback_async(conn):
+    await conn.rollback()
+
+
+_ASYNC_HELPERS = {
+    _execute: _execute_async,
+    _executemany: _executemany_async,
+    _fetchone: _fetchone_async,
+    _fetchall: _fetchall_async,
+    _open_cursor: _open_cursor_async,
+    _fetchmany: _fetchmany_async,
+    _close_cursor: _close_cursor_async,
+    _commit: _commit_async,
+    _rollback: _rollback_async,
+}
+
+
+def database_from_settings(config=settings):
+    """Pool for DB_BACKEND, on the async driver unless DB_DRIVER=thread.
+
+    Without the driver package (aioodbc or aiosqlite) installed, the blocking
+    driver is used on the executor instead.
+    """
+    native = config.db_driver == "async"
+    backend = backend_from_settings(native, config)
+    if native and importlib.util.find_spec(backend.driver) is None:
+        native, backend = False, backend_from_settings(config=config)
+    return (AsyncDriverDatabase if native else Database)(
+        backend,
+        size=config.db_pool_size,
+        max_overflow=config.db_pool_max_overflow,
+        timeout=config.db_pool_timeout,
+        recycle=config.db_pool_recycle,
+    )
+
+
+database = database_from_settings()
+
+
+@asynccontextmanager
+async def connection():
+    """A pooled connection for the length of a block, failing like get_db.
+
+    For routes that must not hold a connection for the whole request, such as
+    streams and uploads.
+    """
+    try:
+        conn = await database.acquire()
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except DatabaseError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    try:
+        yield conn
+    finally:
+        await database.release(conn)
+
+
+# FastAPI dependency
+async def get_db():
+    async with connection() as conn:
+        yield conn
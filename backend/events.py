@@ -0,0 +1,209 @@
+"""Task change feed: an in-process pub/sub bus streamed to clients as Server-Sent Events.
+
+Write routes publish deltas (the written task row, or just its id for a
+delete).  Each event names the internee it concerns; internees only receive
+their own, admins receive everything marked for admins.
+
+Every worker keeps the most recent events in a replay buffer, so a client that
+reconnects with ``Last-Event-ID`` gets what it missed.  If the id is no longer
+buffered, or a subscriber falls so far behind that its queue fills, it is sent
+a ``reset`` event instead and should reload the task list.
+
+The broker decides how events reach the workers.  ``MemoryBroker`` delivers in
+process; ``RedisBroker`` numbers events with INCR and fans them out over Redis
+pub/sub so that every worker's subscribers and replay buffer see all of them.
+"""
+import asyncio
+import json
+import uuid
+from collections import deque
+from typing import NamedTuple, Optional
+
+from settings import settings
+
+
+class Event(NamedTuple):
+    id: str
+    type: str
+    data: dict
+    internee_id: Optional[int]  # The internee allowed to see it, if any
+    admins: bool = True
+
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+# Brokers
+class MemoryBroker:
+    def __init__(self):
+        # Sequence numbers restart with the process, so ids carry an epoch
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._deliver = None
+
+    async def start(self, deliver):
+        self._deliver = deliver
+        return self._seq
+
+    async def stop(self):
+        self._deliver = None
+
+    async def publish(self, type, data, internee_id, admins):
+        self._seq += 1
+        event = Event(f"{self.epoch}-{self._seq}", type, data, internee_id, admins)
+        if self._deliver is not None:
+            self._deliver(event)
+
+
+class RedisBroker:
+    """Fans events out to every worker subscribed to ``channel``."""
+
+    def __init__(self, url, channel="task_events"):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self.channel = channel
+        self.epoch = "r"
+        self._listener = None
+
+    async def start(self, deliver):
+        if self._listener is None:
+            pubsub = self._redis.pubsub()
+            await pubsub.subscribe(self.channel)
+            self._listener = asyncio.create_task(self._listen(pubsub, deliver))
+        # Events numbered up to here were published before this worker listened
+        return int(await self._redis.get(f"{self.channel}:seq") or 0)
+
+    async def _listen(self, pubsub, deliver):
+        async for message in pubsub.listen():
+            if message["type"] == "message":
+                deliver(Event(*json.loads(message["data"])))
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    async def publish(self, type, data, internee_id, admins):
+        seq = await self._redis.incr(f"{self.channel}:seq")
+        event = Event(f"{self.epoch}-{seq}", type, data, internee_id, admins)
+        await self._redis.publish(self.channel, json.dumps(list(event), default=_json_default))
+
+
+class Subscription:
+    def __init__(self, user, queue_size):
+        self.user = user
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.lagged = False
+
+    def visible(self, event):
+        if self.user[1] == 'admin':
+            return event.admins
+        return event.internee_id == self.user[0]
+
+
+class EventBus:
+    def __init__(self, broker, replay_size=1000, queue_size=256, heartbeat=15.0):
+        self.broker = broker
+        self.replay = deque(maxlen=replay_size)
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._subscriptions = set()
+        self._started = False
+        # Sequence number of the newest event known to be missing from the buffer
+        self._floor = 0
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    async def start(self):
+        if not self._started:
+            self._floor = await self.broker.start(self._deliver)
+            self._started = True
+
+    async def stop(self):
+        await self.broker.stop()
+        self._started = False
+
+    async def publish(self, type, data, internee_id, admins=True):
+        await self.start()
+        await self.broker.publish(type, data, internee_id, admins)
+        self.published += 1
+
+    def _deliver(self, event):
+        if len(self.replay) == self.replay.maxlen:
+            self._floor = _seq(self.replay[0].id)
+        self.replay.append(event)
+        for sub in self._subscriptions:
+            if sub.lagged or not sub.visible(event):
+                continue
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Never let a slow client hold up publishers; it resyncs instead
+                sub.lagged = True
+                self.dropped_subscribers += 1
+
+    def _missed(self, sub, last_event_id):
+        """Buffered events after ``last_event_id``, or None if the gap cannot be filled."""
+        epoch, _, seq = last_event_id.rpartition("-")
+        if epoch != self.broker.epoch or not seq.isdigit() or int(seq) < self._floor:
+            return None
+        return [e for e in self.replay if _seq(e.id) > int(seq) and sub.visible(e)]
+
+    async def stream(self, user, last_event_id=None):
+        """Yield SSE frames for ``user`` until the client goes away or falls behind."""
+        await self.start()
+        sub = Subscription(user, self.queue_size)
+        self._subscriptions.add(sub)
+        # Taken before the first yield, so nothing is both replayed and queued
+        missed = self._missed(sub, last_event_id) if last_event_id else []
+        try:
+            yield "retry: 3000\n\n"
+            if missed is None:
+                yield _frame(None, "reset", {})
+            else:
+                for event in missed:
+                    yield _frame(event.id, event.type, event.data)
+
+            while not sub.lagged:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield _frame(event.id, event.type, event.data)
+
+            yield _frame(None, "reset", {})
+        finally:
+            self._subscriptions.discard(sub)
+
+    def metrics(self):
+        return {
+            "subscribers": len(self._subscriptions),
+            "published": self.published,
+            "buffered": len(self.replay),
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+def _seq(event_id):
+    return int(event_id.rpartition("-")[2])
+
+
+def _frame(event_id, type, data):
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {type}\ndata: {json.dumps(data, default=_json_default)}\n\n"
+
+
+def broker_from_settings(config=settings):
+    if config.events_broker == "redis":
+        return RedisBroker(config.redis_url)
+    return MemoryBroker()
+
+
+event_bus = EventBus(
+    broker_from_settings(),
+    replay_size=settings.events_replay_size,
+    queue_size=settings.events_queue_size,
+)
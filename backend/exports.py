@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+from fastapi.responses import StreamingResponse
+
+import db
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+BATCH_SIZE = 1000
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode_ndjson(columns, rows):
+    return "".join(
+        json.dumps(dict(zip(columns, row)), default=_json_default) + "\n" for row in rows
+    ).encode()
+
+
+def _encode_csv(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerows(
+        [value.isoformat() if isinstance(value, (datetime, date)) else value for value in row] for row in rows
+    )
+    return buf.getvalue().encode()
+
+
+async def _stream(sql, params, columns, fmt, compress):
+    # The connection is held for the lifetime of the stream, not the request
+    # handler, so it is checked out here rather than through get_db.
+    gz = zlib.compressobj(wbits=31) if compress else None
+    conn = await db.database.acquire()
+    try:
+        if fmt == "csv":
+            chunk = _encode_csv([columns])
+            yield gz.compress(chunk) if gz else chunk
+        async for rows in conn.iterate(sql, *params, batch_size=BATCH_SIZE):
+            chunk = _encode_csv(rows) if fmt == "csv" else _encode_ndjson(columns, rows)
+            yield gz.compress(chunk) if gz else chunk
+        if gz:
+            yield gz.flush()
+    finally:
+        await db.database.release(conn)
+
+
+def export_response(name, sql, params, columns, fmt="ndjson", compress=False):
+    """Stream the rows of ``sql`` as NDJSON or CSV, optionally gzip-encoded.
+
+    Rows are pulled with ``fetchmany`` and encoded one batch at a time, so
+    memory use does not depend on how many rows are exported.
+    """
+    media_type, extension = FORMATS[fmt]
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{extension}"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(_stream(sql, params, columns, fmt, compress), media_type=media_type, headers=headers)
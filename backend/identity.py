@@ -0,0 +1,116 @@
+import json
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from db import AsyncConnection
+from repositories import users
+from settings import settings
+
+
+class UserIdentity(NamedTuple):
+    # id and role come first so ``user[0]`` / ``user[1]`` keep working
+    id: int
+    role: str
+    email: str
+    name: str
+
+
+# Backends
+class MemoryIdentityBackend:
+    """Per-process TTL cache with an LRU size limit."""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    async def get(self, uid):
+        entry = self._entries.get(uid)
+        if entry is None:
+            return None
+        record, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[uid]
+            return None
+        self._entries.move_to_end(uid)
+        return record
+
+    async def set(self, uid, record, ttl):
+        self._entries[uid] = (record, time.monotonic() + ttl)
+        self._entries.move_to_end(uid)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def delete(self, uid):
+        self._entries.pop(uid, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisIdentityBackend:
+    """Shared cache so several uvicorn workers see the same entries and invalidations."""
+
+    def __init__(self, url, prefix="identity:"):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, uid):
+        raw = await self._redis.get(self.prefix + uid)
+        return UserIdentity(*json.loads(raw)) if raw else None
+
+    async def set(self, uid, record, ttl):
+        await self._redis.set(self.prefix + uid, json.dumps(list(record)), ex=max(1, int(ttl)))
+
+    async def delete(self, uid):
+        await self._redis.delete(self.prefix + uid)
+
+
+class IdentityCache:
+    def __init__(self, backend, ttl=300.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def resolve(self, uid, conn: AsyncConnection) -> Optional[UserIdentity]:
+        record = await self.backend.get(uid)
+        if record is not None:
+            self.hits += 1
+            return record
+
+        self.misses += 1
+        row = await users.fetch_identity(conn, uid)
+        if row is None:
+            # Not cached, so the user is found as soon as they register
+            return None
+        record = UserIdentity(row[0], row[1], row[2], row[3])
+        await self.backend.set(uid, record, self.ttl)
+        return record
+
+    async def peek(self, uid) -> Optional[UserIdentity]:
+        # The cached record only, for callers that must not touch the database
+        return await self.backend.get(uid)
+
+    async def invalidate(self, uid):
+        await self.backend.delete(uid)
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def backend_from_settings(config=settings):
+    if config.identity_cache_backend == "redis":
+        return RedisIdentityBackend(config.redis_url)
+    return MemoryIdentityBackend(max_size=config.identity_cache_size)
+
+
+identity_cache = IdentityCache(backend_from_settings(), ttl=settings.identity_cache_ttl)
+
@@ -0,0 +1,293 @@
+"""Per-request timings: auth, connection acquisition and every database call.
+
+The connection layer (db.py) and the token cache report into the timing of the
+request being served, found through a context variable, so no call signature
+changes.  main.py's middleware turns each timing into a ``Server-Timing``
+header and into Prometheus histograms labelled by route template, served from
+``/metrics``.  Server-Timing carries durations only, unless
+SERVER_TIMING_QUERIES lists that many statements too.  With ``SLOW_QUERY_MS`` set, slower calls are logged with a SQL
+fingerprint (literals replaced by ``?``) so that repeats of one statement
+group together.  The same grouping keeps calls, time and rows per statement
+(``statement_stats``, served from ``/metrics/statements/``), under the name
+the query catalog (statements.py) gives a statement, or its fingerprint's id.
+
+Recording costs a context variable lookup and a few counters per call, cheap
+enough to stay on in production.
+"""
+import bisect
+import hashlib
+import logging
+import re
+import time
+from contextvars import ContextVar
+
+from settings import settings
+
+logger = logging.getLogger("task_tracker.slow_query")
+
+SLOW_QUERY_MS = settings.slow_query_ms
+# Individual database calls listed in Server-Timing with their fingerprint;
+# none by default, as the header goes to every client
+SERVER_TIMING_QUERIES = settings.server_timing_queries
+
+_current = ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    __slots__ = ("path", "queries", "db_seconds", "acquire_seconds", "auth_seconds")
+
+    def __init__(self, path):
+        self.path = path
+        self.queries = []
+        self.db_seconds = 0.0
+        self.acquire_seconds = 0.0
+        self.auth_seconds = 0.0
+
+    def server_timing(self, total_seconds):
+        parts = [
+            f"auth;dur={self.auth_seconds * 1000:.2f}",
+            f"acquire;dur={self.acquire_seconds * 1000:.2f}",
+            f'db;desc="{len(self.queries)} queries";dur={self.db_seconds * 1000:.2f}',
+        ]
+        for i, (label, seconds) in enumerate(self.queries[:SERVER_TIMING_QUERIES], 1):
+            desc = fingerprint(label)[:60].replace('"', "'").replace("\\", "")
+            parts.append(f'q{i};desc="{desc}";dur={seconds * 1000:.2f}')
+        parts.append(f"total;dur={total_seconds * 1000:.2f}")
+        return ", ".join(parts)
+
+
+def start(path):
+    """Begin timing a request; returns the timing and a token for ``finish``."""
+    timing = RequestTiming(path)
+    return timing, _current.set(timing)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def record_query(label, seconds, rows=None):
+    """Record one database call; ``rows`` is given for SQL statements, which ``label`` is then."""
+    if rows is not None:
+        statement_stats.add(label, seconds, rows)
+    timing = _current.get()
+    if timing is not None:
+        timing.queries.append((label, seconds))
+        timing.db_seconds += seconds
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        fp = fingerprint(label)
+        logger.warning(
+            "slow query %.1fms path=%s fingerprint=%s sql=%s",
+            seconds * 1000, timing.path if timing else "-", fingerprint_id(fp), fp,
+        )
+
+
+def record_acquire(seconds):
+    timing = _current.get()
+    if timing is not None:
+        timing.acquire_seconds += seconds
+
+
+def record_auth(seconds):
+    timing = _current.get()
+    if timing is not None:
+        timing.auth_seconds += seconds
+
+
+class ServerTimingMiddleware:
+    """Plain ASGI middleware (no extra task per request, unlike ``@app.middleware``).
+
+    Adds the ``Server-Timing`` header and records the request's metrics when
+    the response starts.  ``route_template(scope)`` names the route for labels.
+    """
+
+    def __init__(self, app, route_template):
+        self.app = app
+        self.route_template = route_template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timing, token = start(scope["path"])
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                headers = list(message.get("headers", ()))
+                headers.append((b"server-timing", timing.server_timing(elapsed).encode("latin-1")))
+                message = {**message, "headers": headers}
+                metrics.observe(scope["method"], self.route_template(scope), message["status"], timing, elapsed)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            finish(token)
+
+
+# SQL fingerprints
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _SPACE.sub(" ", sql).strip()
+    return _IN_LIST.sub("(...)", sql)
+
+
+def fingerprint_id(fp):
+    return hashlib.sha1(fp.encode()).hexdigest()[:12]
+
+
+# Per-statement statistics
+class StatementStats:
+    """Calls, time and rows of every statement since the process started.
+
+    Calls are grouped by fingerprint, so IN lists of any length count as one
+    statement.  Fingerprints are worked out once per statement text and kept
+    for the next call, up to ``max_texts`` texts.  Statements of the query
+    catalog are listed under their names; the rest under their fingerprint's
+    id, which the slow query log prints too.  Up to ``max_statements``
+    statements are listed; calls of any statement first seen after that are
+    added up under "other", so a stream of distinct statements cannot grow
+    the list without bound.
+    """
+
+    OTHER = "other"
+
+    def __init__(self, max_texts=2048, max_statements=1000):
+        self.max_texts = max_texts
+        self.max_statements = max_statements
+        # Statement text -> catalog name (statements.py)
+        self.names = {}
+        self._keys = {}
+        self._stats = {}
+
+    def name(self, sql, name):
+        self.names[sql] = name
+
+    def add(self, sql, seconds, rows):
+        key = self._keys.get(sql)
+        if key is None:
+            if len(self._keys) >= self.max_texts:
+                self._keys.clear()
+            key = self._keys[sql] = fingerprint(sql)
+        stats = self._stats.get(key)
+        if stats is None:
+            if len(self._stats) >= self.max_statements:
+                stats = self._stats.setdefault(self.OTHER, [self.OTHER, 0, 0.0, 0])
+            else:
+                stats = self._stats[key] = [self.names.get(sql) or fingerprint_id(key), 0, 0.0, 0]
+        stats[1] += 1
+        stats[2] += seconds
+        stats[3] += rows
+
+    def add_rows(self, sql, rows):
+        """Count rows a statement streamed after it was executed (AsyncConnection.iterate)."""
+        key = self._keys.get(sql)
+        if key is None:
+            return
+        stats = self._stats.get(key) or self._stats.get(self.OTHER)
+        if stats is not None:
+            stats[3] += rows
+
+    def metrics(self):
+        """Every statement, the most time-consuming first."""
+        return [
+            {
+                "name": name,
+                "sql": key,
+                "calls": calls,
+                "total_ms": round(seconds * 1000, 3),
+                "mean_ms": round(seconds * 1000 / calls, 3),
+                "rows": rows,
+            }
+            for key, (name, calls, seconds, rows) in sorted(self._stats.items(), key=lambda item: -item[1][2])
+        ]
+
+    def reset(self):
+        self._stats.clear()
+
+
+statement_stats = StatementStats()
+
+
+# Prometheus metrics
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, label_values, value):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    def __init__(self):
+        self.request_seconds = Histogram(
+            "http_request_duration_seconds", "Time to the response headers.",
+            ("method", "route", "status"), DURATION_BUCKETS)
+        self.db_queries = Histogram(
+            "db_queries_per_request", "Database calls made by one request.", ("route",), COUNT_BUCKETS)
+        self.db_seconds = Histogram(
+            "db_query_duration_seconds", "Time spent in database calls per request.", ("route",), DURATION_BUCKETS)
+        self.acquire_seconds = Histogram(
+            "db_acquire_duration_seconds", "Time waiting for a pooled connection per request.", ("route",),
+            DURATION_BUCKETS)
+        self.auth_seconds = Histogram(
+            "auth_duration_seconds", "Time verifying the bearer token per request.", ("route",), DURATION_BUCKETS)
+
+    def observe(self, method, route, status, timing, total_seconds):
+        self.request_seconds.observe((method, route, str(status)), total_seconds)
+        self.db_queries.observe((route,), len(timing.queries))
+        self.db_seconds.observe((route,), timing.db_seconds)
+        self.acquire_seconds.observe((route,), timing.acquire_seconds)
+        self.auth_seconds.observe((route,), timing.auth_seconds)
+
+    def render(self, gauges=None):
+        lines = []
+        for histogram in (self.request_seconds, self.db_queries, self.db_seconds, self.acquire_seconds,
+                          self.auth_seconds):
+            lines.extend(histogram.render())
+        for name, (help, value) in (gauges or {}).items():
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"])
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
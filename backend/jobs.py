@@ -0,0 +1,338 @@
+"""Background jobs: a queue persisted in the database, run by in-process workers.
+
+Jobs live in the ``jobs`` table (migration 0007_jobs), so they survive a
+restart and any process sharing the database can run them.  A dispatcher in
+each process claims due jobs one statement at a time and runs up to
+``workers`` of them concurrently.  A claimed job holds a lease; if its worker
+dies, the job is taken over once the lease runs out.
+
+A handler is registered per job kind::
+
+    @job_queue.handler("reports.generate")
+    async def generate_reports(conn, job):
+        ...
+        return result, after
+
+It runs on a pooled connection and may commit as it goes.  The runner then
+records ``result`` (JSON) and commits, so work left uncommitted by the
+handler lands together with the job's success.  ``after``, if not None, is
+awaited once that commit is done, for cache bumps and events.  A handler
+that raises is retried with exponential backoff until ``max_attempts``;
+raising PermanentError fails the job at once.
+
+Periodic jobs are registered with ``every``.  Their schedules are rows of
+``job_schedules``; the process that moves a due row forward enqueues the
+run, in the same transaction, so each run is enqueued once however many
+processes are up.  The payload of a scheduled run carries ``since`` and
+``until``, the span of time since its previous run.
+"""
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+import db
+from events import event_bus
+from repositories import jobs as queries
+from settings import settings
+
+# Longest error message kept on a job
+MAX_ERROR_LENGTH = 2000
+
+
+class PermanentError(Exception):
+    """Raised by a handler for a job that would fail the same way on every attempt."""
+
+
+class Job(NamedTuple):
+    id: int
+    kind: str
+    payload: dict
+    attempt: int
+    max_attempts: int
+    created_by: Optional[int]
+
+
+def job_dict(row):
+    job = dict(zip(queries.FIELDS, row))
+    for field in ("payload", "result"):
+        if job[field] is not None:
+            job[field] = json.loads(job[field])
+    return job
+
+
+async def get_job(conn, job_id):
+    """A job as a dict of queries.FIELDS, or None."""
+    row = await queries.get(conn, job_id)
+    return job_dict(row) if row is not None else None
+
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dumps(value):
+    return json.dumps(value, default=_json_default)
+
+
+class JobQueue:
+    def __init__(self, workers=2, poll_interval=1.0, max_attempts=5, retry_base=2.0, retry_max=300.0,
+                 lease=300.0, scheduler=True):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease = lease
+        self.scheduler = scheduler
+        self.handlers = {}
+        self.schedules = {}
+
+        self._wakeup = None
+        self._slots = None
+        self._tasks = set()
+        self._running = set()
+        self._stopping = False
+
+        self.enqueued = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+        self.lost_leases = 0
+        self.scheduled_runs = 0
+
+    def handler(self, kind):
+        """Decorator registering the handler of a job kind."""
+        def register(fn):
+            self.handlers[kind] = fn
+            return fn
+        return register
+
+    def every(self, kind, seconds, payload=None):
+        """Enqueue a ``kind`` job every ``seconds``; a non-positive interval disables it."""
+        if seconds > 0:
+            self.schedules[kind] = (seconds, payload or {})
+
+    async def enqueue(self, conn, kind, payload, created_by=None, max_attempts=None, run_at=None):
+        """Insert a job on the caller's connection and return its id.
+
+        The caller commits, then calls wake() so a worker in this process
+        picks it up without waiting for the next poll.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"No handler for job kind {kind}")
+        self.enqueued += 1
+        return await queries.insert(
+            conn, kind, _dumps(payload), max_attempts or self.max_attempts, run_at or datetime.now(), created_by
+        )
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # Lifecycle
+    async def start(self):
+        if self._tasks or self._stopping:
+            return
+        self._wakeup = asyncio.Event()
+        if self.workers > 0:
+            self._slots = asyncio.Semaphore(self.workers)
+            self._spawn(self._dispatch())
+        if self.scheduler and self.schedules:
+            self._spawn(self._schedule())
+
+    async def stop(self, grace=5.0):
+        """Stop claiming jobs and wait up to ``grace`` seconds for running ones.
+
+        Jobs still running after that are cancelled; their leases expire and
+        another worker runs them again.
+        """
+        self._stopping = True
+        self.wake()
+        loops = self._tasks - self._running
+        for task in loops:
+            task.cancel()
+        await asyncio.gather(*loops, return_exceptions=True)
+        if self._running:
+            await asyncio.wait(set(self._running), timeout=grace)
+            for task in self._running:
+                task.cancel()
+            await asyncio.gather(*self._running, return_exceptions=True)
+        self._tasks.clear()
+        self._stopping = False
+
+    def _spawn(self, coro, running=False):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if running:
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        return task
+
+    async def _sleep(self, seconds):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    # Workers
+    async def _dispatch(self):
+        while not self._stopping:
+            await self._slots.acquire()
+            try:
+                job = await self._claim()
+            except Exception:
+                # Database unreachable; try again at the next poll
+                job = None
+            if job is None:
+                self._slots.release()
+                await self._sleep(self.poll_interval)
+                continue
+            self._spawn(self._run(job), running=True)
+
+    async def _claim(self):
+        now = datetime.now()
+        async with db.connection() as conn:
+            row = await queries.claim(conn, now, now + timedelta(seconds=self.lease))
+            await conn.commit()
+        if row is None:
+            return None
+        id, kind, payload, attempt, max_attempts, created_by = row
+        return Job(id, kind, json.loads(payload), attempt, max_attempts, created_by)
+
+    async def _run(self, job):
+        try:
+            await self._execute(job)
+        finally:
+            self._slots.release()
+
+    async def _execute(self, job):
+        handler = self.handlers.get(job.kind)
+        try:
+            async with db.connection() as conn:
+                try:
+                    if handler is None:
+                        raise PermanentError(f"No handler for job kind {job.kind}")
+                    if job.attempt > job.max_attempts:
+                        raise PermanentError(f"Gave up after {job.max_attempts} attempts")
+                    result, after = await handler(conn, job)
+                    if not await queries.finish(conn, job.id, job.attempt, "succeeded", _dumps(result), None,
+                                                datetime.now()):
+                        # Lease expired and another worker took the job over
+                        await conn.rollback()
+                        self.lost_leases += 1
+                        return
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+        except Exception as e:
+            await self._failed(job, e)
+            return
+        self.succeeded += 1
+        if after is not None:
+            await after()
+        await self._announce(job, "succeeded")
+
+    async def _failed(self, job, error):
+        message = f"{type(error).__name__}: {error}"[:MAX_ERROR_LENGTH]
+        now = datetime.now()
+        retry = not isinstance(error, PermanentError) and job.attempt < job.max_attempts
+        try:
+            async with db.connection() as conn:
+                if retry:
+                    delay = min(self.retry_max, self.retry_base * 2 ** (job.attempt - 1))
+                    # Jitter so jobs that failed together do not retry together
+                    run_at = now + timedelta(seconds=delay * random.uniform(0.5, 1.0))
+                    updated = await queries.retry(conn, job.id, job.attempt, run_at, message, now)
+                else:
+                    updated = await queries.finish(conn, job.id, job.attempt, "failed", None, message, now)
+                await conn.commit()
+        except Exception:
+            # Unrecorded; the lease expires and the attempt is made again
+            return
+        if not updated:
+            self.lost_leases += 1
+        elif retry:
+            self.retried += 1
+        else:
+            self.failed += 1
+            await self._announce(job, "failed")
+
+    async def _announce(self, job, status):
+        # Admins watching the change feed learn the outcome of jobs someone started without polling
+        if job.created_by is None:
+            return
+        await event_bus.publish("job.finished", {"id": job.id, "kind": job.kind, "status": status}, None)
+
+    # Scheduler
+    async def _schedule(self):
+        while not self._stopping:
+            next_due = None
+            for kind, (seconds, payload) in self.schedules.items():
+                try:
+                    due = await self._run_schedule(kind, seconds, payload)
+                except Exception:
+                    due = None
+                if due is not None and (next_due is None or due < next_due):
+                    next_due = due
+            if next_due is None:
+                wait = self.poll_interval
+            else:
+                # Re-read at least every minute, in case another process changed a schedule
+                wait = min(max((next_due - datetime.now()).total_seconds(), 0.0), 60.0)
+            await asyncio.sleep(wait)
+
+    async def _run_schedule(self, kind, seconds, payload):
+        """Enqueue ``kind`` if its schedule is due; returns when it is next due."""
+        now = datetime.now()
+        async with db.connection() as conn:
+            last_run_at, next_run_at = await queries.schedule(conn, kind, now)
+            if _as_datetime(next_run_at) > now:
+                await conn.commit()
+                return _as_datetime(next_run_at)
+            next_run_at = now + timedelta(seconds=seconds)
+            if await queries.advance_schedule(conn, kind, last_run_at, now, next_run_at):
+                await self.enqueue(conn, kind, {**payload, "since": _as_datetime(last_run_at), "until": now})
+                self.scheduled_runs += 1
+            await conn.commit()
+        self.wake()
+        return next_run_at
+
+    def metrics(self):
+        return {
+            "workers": self.workers,
+            "running": len(self._running),
+            "enqueued": self.enqueued,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "failed": self.failed,
+            "lost_leases": self.lost_leases,
+            "scheduled_runs": self.scheduled_runs,
+            "schedules": {kind: seconds for kind, (seconds, _) in self.schedules.items()},
+        }
+
+
+def _as_datetime(value):
+    # SQLite hands timestamps back as text
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def queue_from_settings(config=settings):
+    return JobQueue(
+        workers=config.jobs_workers,
+        poll_interval=config.jobs_poll_interval,
+        max_attempts=config.jobs_max_attempts,
+        retry_base=config.jobs_retry_base,
+        retry_max=config.jobs_retry_max,
+        lease=config.jobs_lease,
+        scheduler=config.jobs_scheduler,
+    )
+
+
+job_queue = queue_from_settings()
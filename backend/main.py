@@ -1,14 +1,139 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Request
+import asyncio
+import base64
+import hmac
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-import pyodbc
-from pydantic import BaseModel
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.datastructures import Headers
+from starlette.routing import Match
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional
-from datetime import datetime
-import firebase_admin
-from firebase_admin import credentials, auth
+from datetime import datetime, timedelta
 
-app = FastAPI()
+import activity
+from activity import activity_log
+import archive
+from archive import archive_stats
+from coalesce import single_flight
+from db import AsyncConnection, DatabaseError, connection, database, get_db
+from events import event_bus
+from identity import UserIdentity, identity_cache
+from jobs import PermanentError, get_job, job_queue
+from exports import export_response
+import instrumentation
+from pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, decode_cursor, decode_offset, encode_cursor, encode_offset,
+)
+from report_stats import internee_stats, parse_period, performance_rating
+from repositories import attachments, dashboard, reports, submissions, tasks, users
+from repositories import activity as activity_queries
+from repositories.tasks import MAX_BATCH_SIZE, UPDATABLE_FIELDS
+from response_cache import ADMIN_SCOPE, response_cache
+from ratelimit import RateLimitMiddleware, rate_limiter
+import search
+from search import search_index
+from serialization import FastJSONResponse, RowsResponse, parse_fields
+from settings import settings
+from storage import attachment_storage
+import sync
+from tokens import token_cache
+import statements
+import uploads
+
+logger = logging.getLogger("task_tracker.startup")
+
+
+async def prefetch_auth_keys():
+    # Fetch signing keys (and initialize Firebase) before the first request needs them
+    try:
+        await asyncio.to_thread(token_cache.verifier.warm)
+    except Exception as e:
+        logger.warning("Auth keys not prefetched: %s", e)
+
+
+async def warm_pool():
+    try:
+        await database.warm(settings.pool_warm)
+    except DatabaseError as e:
+        # Requests connect on demand and report the failure themselves
+        logger.warning("Database pool not warmed: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await asyncio.gather(prefetch_auth_keys(), warm_pool(), event_bus.start())
+    await job_queue.start()
+    await activity_log.start()
+    try:
+        yield
+    finally:
+        await job_queue.stop()
+        # Write the buffered activity while the pool is still open
+        await activity_log.stop()
+        await event_bus.stop()
+        # Async driver connections each hold a thread that would keep the process alive
+        await database.aclose()
+
+
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+
+# Middleware is registered before CORS so that CORS stays the outermost layer
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    # Answer unchanged polls of the list endpoints from the response cache
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if not response_cache.cacheable(request) or scheme.lower() != "bearer" or not token:
+        return await call_next(request)
+    try:
+        claims = await token_cache.verify(token)
+    except Exception:
+        # Let the route reject the credentials
+        return await call_next(request)
+    # Which writes invalidate the caller's entries depends on who they are; a
+    # caller not in the identity cache yet is resolved by the route as usual
+    identity = await identity_cache.peek(claims['uid'])
+    if identity is None:
+        return await call_next(request)
+    scope = ADMIN_SCOPE if identity[1] == 'admin' else identity[0]
+    return await response_cache.handle(request, call_next, claims['uid'], scope)
+
+# Time auth, pool waits and database calls; outside the cache so hits are measured too
+def route_template(scope):
+    # Label metrics by path template so ids do not create new series
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Not routed, e.g. answered by the response cache.  A route matching only
+    # the path (another method) is the template of a 405, used only if no
+    # route matches fully: GET /tasks/export/ also fits PUT /tasks/{task_id}/.
+    partial = None
+    for candidate in app.router.routes:
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return candidate.path
+        if match == Match.PARTIAL and partial is None:
+            partial = candidate.path
+    return partial or "unmatched"
+
+async def rate_limit_caller(scope):
+    # Buckets are per Firebase uid; requests without a valid token share one per client address
+    scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            return (await token_cache.verify(token))['uid']
+        except Exception:
+            pass
+    client = scope.get("client")
+    return f"address:{client[0] if client else 'unknown'}"
+
+# Outside the response cache, so polls answered from it are counted too
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, route_template=route_template, identify=rate_limit_caller)
+
+app.add_middleware(instrumentation.ServerTimingMiddleware, route_template=route_template)
 
 # CORS configuration
 app.add_middleware(
@@ -17,30 +142,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing", "Content-Disposition", "Content-Range", "Retry-After"],
 )
 
 
 
-# Database connection
-def get_db_connection():
-    try:
-        conn = pyodbc.connect(
-            "DRIVER={ODBC Driver 17 for SQL Server};"
-            "SERVER=DESKTOP-8BL3MIG\\SQLEXPRESS;"
-            "DATABASE=task_tracker;"
-            "Trusted_Connection=yes;"
-        )
-        return conn
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database connection failed: {str(e)}")
-
 # Security
 security = HTTPBearer()
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = await token_cache.verify(token)
         return decoded_token
     except Exception as e:
         raise HTTPException(
@@ -49,6 +162,28 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+async def require_metrics_access(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # Metrics name routes and SQL, so only admins and the scraper's METRICS_TOKEN may read them
+    if settings.metrics_token and hmac.compare_digest(credentials.credentials, settings.metrics_token):
+        return
+    current_user = await get_current_user(credentials)
+    async with connection() as conn:
+        user = await identity_cache.resolve(current_user['uid'], conn)
+    if not user or user[1] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can read metrics")
+
+async def coalesced(route, tables, key, query):
+    # Identical concurrent reads share one query; the table versions keep
+    # requests that start after a write from sharing a result read before it
+    if route not in single_flight.routes:
+        return await query()
+    versions = await response_cache.scoped(tables)
+    return await single_flight.do(route, (versions, key), query)
+
+async def get_identity(current_user: dict = Depends(get_current_user), conn: AsyncConnection = Depends(get_db)) -> Optional[UserIdentity]:
+    # Resolve the Firebase uid to (id, role, email, name), or None if not registered
+    return await identity_cache.resolve(current_user['uid'], conn)
+
 # Pydantic models
 class UserCreate(BaseModel):
     email: str
@@ -68,6 +203,9 @@ class TaskUpdate(BaseModel):
     assigned_to: Optional[int] = None  # Added this field
     deadline: Optional[datetime] = None
 
+class TaskBatchUpdate(TaskUpdate):
+    id: int
+
 class TaskSubmission(BaseModel):
     description: str
     attachment_url: Optional[str] = None
@@ -76,536 +214,1080 @@ class ProgressReportCreate(BaseModel):
     internee_id: int
     period_start: str
     period_end: str
+    # Computed from the internee's task history when omitted
+    tasks_completed: Optional[int] = None
+    tasks_pending: Optional[int] = None
+    overall_performance: Optional[str] = None
+    comments: Optional[str] = None
+
+class ProgressReportGenerate(BaseModel):
+    period_start: str
+    period_end: str
+    internee_ids: Optional[List[int]] = None  # All internees when omitted
+    comments: Optional[str] = None
+
+class ArchiveRun(BaseModel):
+    before: Optional[datetime] = None  # ARCHIVE_AFTER_DAYS ago when omitted
+
+# Response models of the list routes, for the OpenAPI schema; those routes
+# render rows directly (see serialization.py) and honour ?fields=
+class InterneeOut(BaseModel):
+    id: int
+    email: str
+    name: str
+
+class TaskOut(BaseModel):
+    id: int
+    title: str
+    description: Optional[str] = None
+    status: str
+    deadline: Optional[datetime] = None
+    created_by: str
+    assigned_to: str
+    assigned_to_id: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+class SubmissionOut(BaseModel):
+    id: int
+    description: Optional[str] = None
+    attachment_url: Optional[str] = None
+    submitted_at: datetime
+    submitted_by: str
+
+class ProgressReportOut(BaseModel):
+    id: int
+    internee_name: str
+    generated_by: str
+    period_start: str
+    period_end: str
     tasks_completed: int
     tasks_pending: int
     overall_performance: str
     comments: Optional[str] = None
+    created_at: datetime
+
+class SearchHitOut(BaseModel):
+    type: str  # task or submission
+    id: int
+    task_id: int
+    title: str
+    status: str
+    score: float  # Higher is better; only comparable within one result set
+
+FIELDS_QUERY = Query(None, description="Comma-separated fields to return, e.g. id,title,status")
+
+def projection(fields, available):
+    # Validated ?fields= projection, or None for every field
+    try:
+        return parse_fields(fields, available)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # Routes
 @app.post("/register/")
-async def register_user(user: UserCreate, current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+async def register_user(user: UserCreate, current_user: dict = Depends(get_current_user), conn: AsyncConnection = Depends(get_db)):
     try:
-        # Check if user already exists
-        cursor.execute("SELECT id FROM users WHERE firebase_id = ?", current_user['uid'])
-        existing_user = cursor.fetchone()
-        
-        if existing_user:
-            return {
-                "message": "User already registered", 
-                "user_id": existing_user[0],
-                "status": "existing"
-            }
-        
-        # Register new user
-        cursor.execute(
-            "INSERT INTO users (firebase_id, email, name, role) VALUES (?, ?, ?, ?)",
-            current_user['uid'], user.email, user.name, user.role
-        )
-        conn.commit()
+        # Insert the user unless the uid is already registered
+        row = await users.upsert(conn, current_user['uid'], user.email, user.name, user.role)
+        await conn.commit()
         
-        # Get the inserted user ID
-        cursor.execute("SELECT id FROM users WHERE firebase_id = ?", current_user['uid'])
-        user_id = cursor.fetchone()[0]
+        created = row[0] == 'INSERT'
+        if created:
+            await identity_cache.invalidate(current_user['uid'])
+            # Only admins list users
+            await response_cache.bump("users", users=())
         
         return {
-            "message": "User registered successfully",
-            "user_id": user_id,
-            "status": "created"
+            "message": "User registered successfully" if created else "User already registered",
+            "user_id": row[1],
+            "status": "created" if created else "existing",
+            "user": {
+                "id": row[1],
+                "email": row[2],
+                "name": row[3],
+                "role": row[4],
+                "firebase_id": current_user['uid']
+            }
         }
         
-    except pyodbc.Error as e:
-        conn.rollback()
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        await conn.rollback()
         raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        conn.close()
 
 @app.get("/users/me/")
-async def read_current_user(current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+async def read_current_user(current_user: dict = Depends(get_current_user), user: Optional[UserIdentity] = Depends(get_identity)):
     try:
-        cursor.execute(
-            "SELECT id, email, name, role FROM users WHERE firebase_id = ?", 
-            current_user['uid']
-        )
-        user = cursor.fetchone()
-        
         if not user:
             raise HTTPException(status_code=404, detail="User not found in database")
         
         return {
-            "id": user[0],
-            "email": user[1],
-            "name": user[2],
-            "role": user[3],
+            "id": user.id,
+            "email": user.email,
+            "name": user.name,
+            "role": user.role,
             "firebase_id": current_user['uid']
         }
-    except pyodbc.Error as e:
+    except HTTPException:
+        raise
+    except DatabaseError as e:
         raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        conn.close()
 
-@app.get("/users/internees/")
-async def get_all_internees(current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+@app.get("/users/internees/", response_model=List[InterneeOut])
+async def get_all_internees(fields: Optional[str] = FIELDS_QUERY, user: Optional[UserIdentity] = Depends(get_identity), conn: AsyncConnection = Depends(get_db)):
     try:
         # Verify user is admin
-        cursor.execute(
-            "SELECT role FROM users WHERE firebase_id = ?", 
-            current_user['uid']
-        )
-        user_role = cursor.fetchone()
-        
-        if not user_role or user_role[0] != 'admin':
+        if not user or user[1] != 'admin':
             raise HTTPException(status_code=403, detail="Only admins can access this resource")
+        only = projection(fields, users.INTERNEE_FIELDS)
         
-        # Get all internees
-        cursor.execute(
-            "SELECT id, email, name FROM users WHERE role = 'internee'"
-        )
-        internees = []
-        for row in cursor.fetchall():
-            internees.append({
-                "id": row[0],
-                "email": row[1],
-                "name": row[2]
-            })
-        
-        return internees
-    except pyodbc.Error as e:
+        # Get all internees; the list is the same for every admin
+        rows = await coalesced("GET /users/internees/", ("users",), None, lambda: users.fetch_internees(conn))
+        return RowsResponse(users.INTERNEE_FIELDS, rows, only)
+    except HTTPException:
+        raise
+    except DatabaseError as e:
         raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        conn.close()
 
 @app.post("/tasks/")
-async def create_task(task: TaskCreate, current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+async def create_task(task: TaskCreate, user: Optional[UserIdentity] = Depends(get_identity), conn: AsyncConnection = Depends(get_db)):
     try:
-        # Get current user ID
-        cursor.execute(
-            "SELECT id, role FROM users WHERE firebase_id = ?", 
-            current_user['uid']
-        )
-        user = cursor.fetchone()
-        
         if not user or user[1] != 'admin':
             raise HTTPException(status_code=403, detail="Only admins can create tasks")
         
-        # Create task
-        cursor.execute(
-            """INSERT INTO tasks 
-            (title, description, created_by, assigned_to, deadline) 
-            VALUES (?, ?, ?, ?, ?)""",
-            task.title, task.description, user[0], task.assigned_to, task.deadline
-        )
-        conn.commit()
+        # Create task and read it back in the same statement
+        created = await tasks.create(conn, task.title, task.description, task.deadline, task.assigned_to, user[0])
+        if created is None:
+            raise HTTPException(status_code=400, detail="Assigned user not found")
+        await conn.commit()
+        await response_cache.bump("tasks", users=[task.assigned_to])
+        search_index.tasks_changed([created["id"]])
+        await activity_log.record(created["id"], user[0], "created", activity.diff(None, tasks.field_values(created)))
         
-        return {"message": "Task created successfully"}
-    except pyodbc.Error as e:
-        conn.rollback()
+        await event_bus.publish("task.created", created, created["assigned_to_id"])
+        return {"message": "Task created successfully", "task": created}
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        await conn.rollback()
         raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        conn.close()
 
-@app.get("/tasks/")
-async def get_tasks(current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+async def publish_tasks_changed(assignees, event="tasks.changed"):
+    # Batch writes announce ids only: one event per affected internee, one for admins
+    ids_by_internee = {}
+    for task_id, internee_ids in assignees.items():
+        for internee_id in set(internee_ids):
+            ids_by_internee.setdefault(internee_id, []).append(task_id)
+    for internee_id, ids in ids_by_internee.items():
+        await event_bus.publish(event, {"ids": ids}, internee_id, admins=False)
+    if assignees:
+        await event_bus.publish(event, {"ids": list(assignees)}, None)
+
+@app.get("/tasks/", response_model=List[TaskOut])
+async def get_tasks(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    task_status: Optional[str] = Query(None, alias="status"),
+    assigned_to: Optional[int] = None,
+    deadline_from: Optional[datetime] = None,
+    deadline_to: Optional[datetime] = None,
+    q: Optional[str] = None,
+    include_archived: bool = False,
+    fields: Optional[str] = FIELDS_QUERY,
+    user: Optional[UserIdentity] = Depends(get_identity),
+    conn: AsyncConnection = Depends(get_db),
+):
     try:
-        # Get current user ID and role
-        cursor.execute(
-            "SELECT id, role FROM users WHERE firebase_id = ?", 
-            current_user['uid']
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        only = projection(fields, tasks.FIELDS)
+        
+        # The page is ordered by (created_at, id) so the cursor is a keyset
+        where, params = tasks.filters(user, task_status, assigned_to, deadline_from, deadline_to, q)
+        after = None
+        if cursor:
+            try:
+                after = decode_cursor(cursor)
+            except InvalidCursor as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
+        rows = await coalesced(
+            "GET /tasks/", ("tasks", "users"), (tuple(where), tuple(params), limit, after, include_archived),
+            lambda: tasks.fetch_page(conn, where, params, limit, after, include_archived),
         )
-        user = cursor.fetchone()
+        response = RowsResponse(tasks.FIELDS, rows, only)
+        
+        # A full page means there may be more; hand out a cursor for the next one
+        if len(rows) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(rows[-1][8], rows[-1][0])
+        
+        return response
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.post("/tasks/batch/")
+async def create_tasks_batch(batch: List[TaskCreate], atomic: bool = True, user: Optional[UserIdentity] = Depends(get_identity), conn: AsyncConnection = Depends(get_db)):
+    try:
+        if not user or user[1] != 'admin':
+            raise HTTPException(status_code=403, detail="Only admins can create tasks")
+        if len(batch) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_SIZE} tasks per batch")
+        
+        # Validate every assignee with one query
+        assignees = await users.existing_ids(conn, [t.assigned_to for t in batch])
+        results = [None] * len(batch)
+        rows = []
+        for i, task in enumerate(batch):
+            if task.assigned_to not in assignees:
+                results[i] = {"index": i, "status": "error", "detail": "Assigned user not found"}
+            else:
+                rows.append((i, task.title, task.description, user[0], task.assigned_to, task.deadline))
         
+        failed = len(batch) - len(rows)
+        if atomic and failed:
+            raise HTTPException(status_code=400, detail={
+                "message": "Batch rejected, no tasks were created",
+                "results": [r for r in results if r is not None]
+            })
+        
+        # Insert all valid tasks in one transaction, and read back their
+        # values, as stored, for the activity log
+        ids = await tasks.insert_many(conn, rows) if rows else {}
+        created = await tasks.values_many(conn, ids.values())
+        await conn.commit()
+        await response_cache.bump("tasks", users=[batch[i].assigned_to for i in ids])
+        search_index.tasks_changed(ids.values())
+        for task_id in ids.values():
+            await activity_log.record(task_id, user[0], "created", activity.diff(None, created[task_id]))
+        await publish_tasks_changed({ids[i]: [batch[i].assigned_to] for i in ids})
+        
+        for i, task_id in ids.items():
+            results[i] = {"index": i, "status": "created", "id": task_id}
+        return {"created": len(ids), "failed": failed, "results": results}
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        await conn.rollback()
+        raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        await conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.patch("/tasks/batch/")
+async def update_tasks_batch(batch: List[TaskBatchUpdate], atomic: bool = True, user: Optional[UserIdentity] = Depends(get_identity), conn: AsyncConnection = Depends(get_db)):
+    try:
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
+        if len(batch) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_SIZE} tasks per batch")
         
-        tasks = []
-        if user[1] == 'admin':
-            # Admin can see all tasks
-            cursor.execute("""
-                SELECT t.id, t.title, t.description, t.status, t.deadline, 
-                       u1.name as created_by, u2.name as assigned_to, t.assigned_to as assigned_to_id
-                FROM tasks t
-                JOIN users u1 ON t.created_by = u1.id
-                JOIN users u2 ON t.assigned_to = u2.id
-                ORDER BY t.created_at DESC
-            """)
-        else:
-            # Internee can only see their own tasks
-            cursor.execute("""
-                SELECT t.id, t.title, t.description, t.status, t.deadline, 
-                       u1.name as created_by, u2.name as assigned_to, t.assigned_to as assigned_to_id
-                FROM tasks t
-                JOIN users u1 ON t.created_by = u1.id
-                JOIN users u2 ON t.assigned_to = u2.id
-                WHERE t.assigned_to = ?
-                ORDER BY t.created_at DESC
-            """, user[0])
-        
-        for row in cursor.fetchall():
-            tasks.append({
-                "id": row[0],
-                "title": row[1],
-                "description": row[2],
-                "status": row[3],
-                "deadline": row[4],
-                "created_by": row[5],
-                "assigned_to": row[6],
-                "assigned_to_id": row[7]
+        # Look up every task and new assignee with one query each; the tasks'
+        # values before the update also go to the activity log
+        before = await tasks.values_many(conn, [t.id for t in batch])
+        owners = {task_id: values["assigned_to"] for task_id, values in before.items()}
+        assignees = await users.existing_ids(conn, [t.assigned_to for t in batch if t.assigned_to is not None])
+        
+        results = [None] * len(batch)
+        items = []
+        seen = set()
+        for i, task in enumerate(batch):
+            fields = {f: getattr(task, f) for f in UPDATABLE_FIELDS if getattr(task, f) is not None}
+            if task.id not in owners:
+                error = "Task not found"
+            elif task.id in seen:
+                error = "Task appears more than once in the batch"
+            elif not fields:
+                error = "No fields to update"
+            elif user[1] == 'internee' and set(fields) != {"status"}:
+                error = "Internees can only update task status"
+            elif user[1] == 'internee' and owners[task.id] != user[0]:
+                error = "Not authorized to update this task"
+            elif task.assigned_to is not None and task.assigned_to not in assignees:
+                error = "Assigned user not found"
+            else:
+                error = None
+            seen.add(task.id)
+            
+            if error:
+                results[i] = {"index": i, "id": task.id, "status": "error", "detail": error}
+            else:
+                results[i] = {"index": i, "id": task.id, "status": "updated"}
+                items.append((task.id, fields))
+        
+        failed = len(batch) - len(items)
+        if atomic and failed:
+            raise HTTPException(status_code=400, detail={
+                "message": "Batch rejected, no tasks were updated",
+                "results": [r for r in results if r["status"] == "error"]
             })
         
-        return tasks
-    except pyodbc.Error as e:
+        # Apply all valid updates in one transaction
+        after = {}
+        if items:
+            await tasks.update_many(conn, items)
+            after = await tasks.values_many(conn, [task_id for task_id, _ in items])
+        await conn.commit()
+        await response_cache.bump("tasks", users=[
+            user_id for task_id, fields in items for user_id in (owners[task_id], fields.get("assigned_to"))
+            if user_id is not None
+        ])
+        for task_id, fields in items:
+            search_index.tasks_changed([task_id], fields)
+            changes = activity.diff(before[task_id], after[task_id])
+            if changes:
+                await activity_log.record(task_id, user[0], "updated", changes)
+        await publish_tasks_changed({
+            task_id: [owners[task_id], fields.get("assigned_to", owners[task_id])] for task_id, fields in items
+        })
+        
+        return {"updated": len(items), "failed": failed, "results": results}
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        await conn.rollback()
         raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
     except Exception as e:
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        conn.close()
 
 @app.put("/tasks/{task_id}/")
-async def update_task(task_id: int, task: TaskUpdate, current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+async def update_task(task_id: int, task: TaskUpdate, user: Optional[UserIdentity] = Depends(get_identity), conn: AsyncConnection = Depends(get_db)):
     try:
-        # Get current user ID and role
-        cursor.execute(
-            "SELECT id, role FROM users WHERE firebase_id = ?", 
-            current_user['uid']
-        )
-        user = cursor.fetchone()
-        
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Build update query based on provided fields
-        update_fields = []
-        params = []
-        
-        if task.title is not None:
-            update_fields.append("title = ?")
-            params.append(task.title)
-        if task.description is not None:
-            update_fields.append("description = ?")
-            params.append(task.description)
-        if task.status is not None:
-            update_fields.append("status = ?")
-            params.append(task.status)
-        if task.assigned_to is not None:
-            update_fields.append("assigned_to = ?")
-            params.append(task.assigned_to)
-        if task.deadline is not None:
-            update_fields.append("deadline = ?")
-            params.append(task.deadline)
+        # Collect provided fields
+        fields = {f: getattr(task, f) for f in UPDATABLE_FIELDS if getattr(task, f) is not None}
             
-        if not update_fields:
+        if not fields:
             return {"message": "No fields to update"}
-            
-        # Add updated_at and task_id to params
-        update_fields.append("updated_at = ?")
-        params.append(datetime.now())
-        params.append(task_id)
         
         # Verify user has permission to update this task
+        owner_id = None
         if user[1] == 'internee':
-            # Internees can only update status
-            allowed_fields = ["status = ?", "updated_at = ?"]
-            if not all(field in allowed_fields for field in update_fields[:-1]):
+            # Internees can only update status, and only on their own tasks
+            if set(fields) != {"status"}:
                 raise HTTPException(status_code=403, detail="Internees can only update task status")
-            
-            # Verify task is assigned to this internee
-            cursor.execute(
-                "SELECT assigned_to FROM tasks WHERE id = ?",
-                task_id
-            )
-            task_assigned_to = cursor.fetchone()
-            
-            if not task_assigned_to or task_assigned_to[0] != user[0]:
-                raise HTTPException(status_code=403, detail="Not authorized to update this task")
-        
-        # Execute update
-        update_query = f"UPDATE tasks SET {', '.join(update_fields)} WHERE id = ?"
-        cursor.execute(update_query, params)
+            owner_id = user[0]
         
-        if cursor.rowcount == 0:
+        # Values before the update, for the activity log and to tell the
+        # previous assignee that the task left their list
+        before = await tasks.values(conn, task_id)
+        if before is None:
             raise HTTPException(status_code=404, detail="Task not found")
+        
+        # Execute update, returning the updated task
+        updated = await tasks.update(conn, task_id, fields, owner_id)
+        
+        if updated is None:
+            # Nothing matched; work out why
+            if owner_id is not None and before["assigned_to"] != owner_id:
+                raise HTTPException(status_code=403, detail="Not authorized to update this task")
+            raise HTTPException(status_code=400, detail="Assigned user not found")
             
-        conn.commit()
+        await conn.commit()
+        await response_cache.bump("tasks", users=[before["assigned_to"], updated["assigned_to_id"]])
+        search_index.tasks_changed([task_id], fields)
+        changes = activity.diff(before, tasks.field_values(updated))
+        if changes:
+            await activity_log.record(task_id, user[0], "updated", changes)
         
-        return {"message": "Task updated successfully"}
-    except pyodbc.Error as e:
-        conn.rollback()
+        previous_assignee = before["assigned_to"]
+        await event_bus.publish("task.updated", updated, updated["assigned_to_id"])
+        if previous_assignee != updated["assigned_to_id"]:
+            await event_bus.publish("task.deleted", {"id": task_id}, previous_assignee, admins=False)
+        return {"message": "Task updated successfully", "task": updated}
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        await conn.rollback()
         raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        conn.close()
 
 @app.delete("/tasks/{task_id}/")
-async def delete_task(task_id: int, current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+async def delete_task(task_id: int, user: Optional[UserIdentity] = Depends(get_identity), conn: AsyncConnection = Depends(get_db)):
     try:
-        # Get current user role
-        cursor.execute(
-            "SELECT role FROM users WHERE firebase_id = ?", 
-            current_user['uid']
-        )
-        user_role = cursor.fetchone()
-        
-        if not user_role or user_role[0] != 'admin':
+        if not user or user[1] != 'admin':
             raise HTTPException(status_code=403, detail="Only admins can delete tasks")
         
         # Delete task
-        cursor.execute("DELETE FROM tasks WHERE id = ?", task_id)
+        deleted = await tasks.delete(conn, task_id)
         
-        if cursor.rowcount == 0:
+        if deleted is None:
             raise HTTPException(status_code=404, detail="Task not found")
             
-        conn.commit()
+        await conn.commit()
+        await response_cache.bump("tasks", users=[deleted["assigned_to"]])
+        search_index.tasks_changed([task_id])
+        await activity_log.record(task_id, user[0], "deleted", activity.diff(deleted, None))
+        await event_bus.publish("task.deleted", {"id": task_id}, deleted["assigned_to"])
         
         return {"message": "Task deleted successfully"}
-    except pyodbc.Error as e:
-        conn.rollback()
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        await conn.rollback()
         raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        conn.close()
 
-@app.post("/tasks/{task_id}/submit/")
-async def submit_task(task_id: int, submission: TaskSubmission, current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+# JSON, or multipart/form-data with the same fields plus attachment files
+SUBMIT_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": TaskSubmission.model_json_schema()},
+            "multipart/form-data": {"schema": {
+                "type": "object",
+                "required": ["description"],
+                "properties": {
+                    "description": {"type": "string"},
+                    "attachment_url": {"type": "string"},
+                    "attachment": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                },
+            }},
+        },
+    },
+}
+
+def parse_submission(data):
+    # Validate a JSON body or form fields as FastAPI would a TaskSubmission body
     try:
-        # Get current user ID
-        cursor.execute(
-            "SELECT id, role FROM users WHERE firebase_id = ?", 
-            current_user['uid']
-        )
-        user = cursor.fetchone()
+        if isinstance(data, bytes):
+            return TaskSubmission.model_validate_json(data)
+        return TaskSubmission.model_validate(data)
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)])
+
+def attachment_url(attachment_id):
+    return f"/attachments/{attachment_id}/"
+
+async def record_submission(conn, user, task_id, submission, files=()):
+    try:
+        # Create submission; only inserts if the task is assigned to this internee
+        created = await submissions.create(conn, task_id, user[0], submission.description, submission.attachment_url)
         
-        if not user or user[1] != 'internee':
-            raise HTTPException(status_code=403, detail="Only internees can submit tasks")
+        if created is None:
+            if await tasks.assignee(conn, task_id) is None:
+                raise HTTPException(status_code=404, detail="Task not found")
+            raise HTTPException(status_code=403, detail="Not authorized to submit for this task")
         
-        # Verify task is assigned to this internee
-        cursor.execute(
-            "SELECT assigned_to FROM tasks WHERE id = ?",
-            task_id
-        )
-        task_assigned_to = cursor.fetchone()
+        # Each row re-checks the quota, so concurrent uploads cannot overrun it
+        stored = []
+        for upload in files:
+            attachment = await attachments.create(
+                conn, created["id"], user[0], upload.writer.key, upload.writer.size,
+                upload.filename, upload.content_type, uploads.QUOTA_BYTES
+            )
+            if attachment is None:
+                await conn.rollback()
+                raise HTTPException(status_code=413, detail="Attachment quota exceeded")
+            stored.append({**attachment, "url": attachment_url(attachment["id"])})
+        if stored and not created["attachment_url"]:
+            created["attachment_url"] = stored[0]["url"]
+            await submissions.set_attachment_url(conn, created["id"], created["attachment_url"])
         
-        if not task_assigned_to:
-            raise HTTPException(status_code=404, detail="Task not found")
+        # Update task status to completed
+        before = await tasks.values(conn, task_id)
+        task = await tasks.update(conn, task_id, {"status": "completed"})
+        
+        # Files are published before the rows naming them commit
+        await uploads.commit(files)
+        await conn.commit()
+        await response_cache.bump("tasks", users=[user[0]])
+        search_index.submissions_changed([created["id"]])
+        await activity_log.record(task_id, user[0], "submitted", {
+            **activity.diff(before, tasks.field_values(task)), "submission_id": [None, created["id"]],
+        })
+        
+        result = {
+            "submission": {**created, "submitted_by": user.name},
+            "task": task,
+            "attachments": stored,
+        }
+        await event_bus.publish("task.submitted", result, user[0])
+        return {"message": "Task submitted successfully", **result}
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        await conn.rollback()
+        raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        await conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.post("/tasks/{task_id}/submit/", openapi_extra=SUBMIT_REQUEST_BODY)
+async def submit_task(task_id: int, request: Request, current_user: dict = Depends(get_current_user)):
+    # Connections are checked out around the body, not for the whole request,
+    # so a slow upload does not hold one
+    try:
+        multipart = request.headers.get("content-type", "").lower().startswith("multipart/form-data")
+        if not multipart:
+            submission = parse_submission(await request.body())
+        
+        async with connection() as conn:
+            user = await identity_cache.resolve(current_user['uid'], conn)
+            if not user or user[1] != 'internee':
+                raise HTTPException(status_code=403, detail="Only internees can submit tasks")
+            if not multipart:
+                return await record_submission(conn, user, task_id, submission)
             
-        if task_assigned_to[0] != user[0]:
+            # Refuse before reading any of the upload
+            assignee = await tasks.assignee(conn, task_id)
+            used = await attachments.used_bytes(conn, user[0])
+        if assignee is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        if assignee != user[0]:
             raise HTTPException(status_code=403, detail="Not authorized to submit for this task")
         
-        # Create submission
-        cursor.execute(
-            """INSERT INTO task_submissions 
-            (task_id, submitted_by, description, attachment_url) 
-            VALUES (?, ?, ?, ?)""",
-            task_id, user[0], submission.description, submission.attachment_url
-        )
+        try:
+            form = await uploads.receive(request, attachment_storage, max(0, uploads.QUOTA_BYTES - used))
+        except uploads.UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except uploads.MalformedUpload as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        try:
+            submission = parse_submission(form.fields)
+            async with connection() as conn:
+                return await record_submission(conn, user, task_id, submission, form.files)
+        finally:
+            # Drops whatever was not committed
+            await uploads.abort(form.files)
+    except (HTTPException, RequestValidationError):
+        raise
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/attachments/{attachment_id}/")
+async def download_attachment(attachment_id: int, request: Request, current_user: dict = Depends(get_current_user)):
+    try:
+        # Not get_db, which would hold a pooled connection until the file is sent
+        async with connection() as conn:
+            user = await identity_cache.resolve(current_user['uid'], conn)
+            row = await attachments.fetch(conn, attachment_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
         
-        # Update task status to completed
-        cursor.execute(
-            "UPDATE tasks SET status = 'completed', updated_at = ? WHERE id = ?",
-            datetime.now(), task_id
-        )
+        # Internees can only download their own uploads
+        if row is None or (user[1] != 'admin' and row[4] != user[0]):
+            raise HTTPException(status_code=404, detail="Attachment not found")
+        sha256, size, filename, content_type = row[:4]
         
-        conn.commit()
+        # Content never changes under a hash, so the hash is a strong ETag
+        etag = f'"{sha256}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "private, max-age=31536000, immutable",
+            "Repr-Digest": f"sha-256=:{base64.b64encode(bytes.fromhex(sha256)).decode()}:",
+            "X-Content-Type-Options": "nosniff",
+        }
+        if etag in [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
         
-        return {"message": "Task submitted successfully"}
-    except pyodbc.Error as e:
-        conn.rollback()
+        # Range and If-Range requests are answered by the response
+        response = await attachment_storage.response(sha256, filename, content_type, headers)
+        if response is None:
+            raise HTTPException(status_code=404, detail="Attachment content is missing")
+        return response
+    except HTTPException:
+        raise
+    except DatabaseError as e:
         raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        conn.close()
 
-@app.get("/tasks/{task_id}/submissions/")
-async def get_task_submissions(task_id: int, current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+@app.get("/tasks/{task_id}/history/")
+async def get_task_history(
+    task_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user: Optional[UserIdentity] = Depends(get_identity),
+    conn: AsyncConnection = Depends(get_db),
+):
     try:
-        # Get current user ID and role
-        cursor.execute(
-            "SELECT id, role FROM users WHERE firebase_id = ?", 
-            current_user['uid']
-        )
-        user = cursor.fetchone()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
         
+        # Internee can only see the history of their own tasks; admins also that of deleted ones
+        if user[1] != 'admin' and await tasks.assignee(conn, task_id, include_archived=True) != user[0]:
+            raise HTTPException(status_code=404, detail="Task not found")
+        after = None
+        if cursor:
+            try:
+                after = decode_cursor(cursor)
+            except InvalidCursor as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
+        # Changes this process made are written first, so the caller sees their own
+        if activity_log.pending(task_id):
+            await activity_log.flush()
+        rows = await activity_queries.fetch_page(conn, task_id, limit, after)
+        response = FastJSONResponse([activity.entry_dict(row) for row in rows])
+        if len(rows) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(rows[-1][6], rows[-1][0])
+        return response
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/tasks/{task_id}/submissions/", response_model=List[SubmissionOut])
+async def get_task_submissions(task_id: int, include_archived: bool = False, fields: Optional[str] = FIELDS_QUERY, user: Optional[UserIdentity] = Depends(get_identity), conn: AsyncConnection = Depends(get_db)):
+    try:
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
+        only = projection(fields, submissions.FIELDS)
         
-        # Verify user has permission to view submissions
-        if user[1] == 'internee':
-            # Internee can only see their own submissions
-            cursor.execute("""
-                SELECT ts.id, ts.description, ts.attachment_url, ts.submitted_at, u.name
-                FROM task_submissions ts
-                JOIN users u ON ts.submitted_by = u.id
-                WHERE ts.task_id = ? AND ts.submitted_by = ?
-                ORDER BY ts.submitted_at DESC
-            """, task_id, user[0])
-        else:
-            # Admin can see all submissions for the task
-            cursor.execute("""
-                SELECT ts.id, ts.description, ts.attachment_url, ts.submitted_at, u.name
-                FROM task_submissions ts
-                JOIN users u ON ts.submitted_by = u.id
-                WHERE ts.task_id = ?
-                ORDER BY ts.submitted_at DESC
-            """, task_id)
-        
-        submissions = []
-        for row in cursor.fetchall():
-            submissions.append({
-                "id": row[0],
-                "description": row[1],
-                "attachment_url": row[2],
-                "submitted_at": row[3],
-                "submitted_by": row[4]
-            })
+        # Internee can only see their own submissions
+        submitted_by = user[0] if user[1] == 'internee' else None
+        rows = await submissions.fetch_for_task(conn, task_id, submitted_by, include_archived)
+        return RowsResponse(submissions.FIELDS, rows, only)
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/search/", response_model=List[SearchHitOut])
+async def search_tasks(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find; the last one may be a prefix"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = FIELDS_QUERY,
+    user: Optional[UserIdentity] = Depends(get_identity),
+    conn: AsyncConnection = Depends(get_db),
+):
+    try:
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        only = projection(fields, search.FIELDS)
+        try:
+            offset = decode_offset(cursor) if cursor else 0
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        return submissions
-    except pyodbc.Error as e:
+        # Tasks and submissions ranked together; internees only search their own
+        try:
+            rows = await search_index.search(conn, user, q, limit + 1, offset)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        response = RowsResponse(search.FIELDS, rows[:limit], only)
+        if len(rows) > limit:
+            response.headers["X-Next-Cursor"] = encode_offset(offset + limit)
+        return response
+    except HTTPException:
+        raise
+    except DatabaseError as e:
         raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        conn.close()
 
 @app.post("/reports/")
-async def create_progress_report(report: ProgressReportCreate, current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+async def create_progress_report(report: ProgressReportCreate, user: Optional[UserIdentity] = Depends(get_identity), conn: AsyncConnection = Depends(get_db)):
     try:
-        # Get current user role
-        cursor.execute(
-            "SELECT id, role FROM users WHERE firebase_id = ?", 
-            current_user['uid']
+        if not user or user[1] != 'admin':
+            raise HTTPException(status_code=403, detail="Only admins can create reports")
+        
+        tasks_completed, tasks_pending = report.tasks_completed, report.tasks_pending
+        overall_performance = report.overall_performance
+        if tasks_completed is None or tasks_pending is None or overall_performance is None:
+            # Fill in what the admin left out from the period's statistics
+            try:
+                stats = await internee_stats(conn, report.period_start, report.period_end, [report.internee_id])
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if not stats:
+                raise HTTPException(status_code=400, detail="Internee not found")
+            if tasks_completed is None:
+                tasks_completed = stats[0]["tasks_completed"]
+            if tasks_pending is None:
+                tasks_pending = stats[0]["tasks_pending"]
+            if overall_performance is None:
+                overall_performance = performance_rating(stats[0])
+        
+        # Create report and read it back in the same statement
+        created = await reports.create(
+            conn, report.internee_id, user[0], report.period_start, report.period_end,
+            tasks_completed, tasks_pending, overall_performance, report.comments
         )
-        user = cursor.fetchone()
+        if created is None:
+            raise HTTPException(status_code=400, detail="Internee not found")
+        await conn.commit()
+        await response_cache.bump("reports", users=[report.internee_id])
+        
+        return {"message": "Progress report created successfully", "report": created}
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        await conn.rollback()
+        raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        await conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/reports/stats/")
+async def get_report_stats(
+    period_start: str,
+    period_end: str,
+    internee_id: Optional[int] = None,
+    user: Optional[UserIdentity] = Depends(get_identity),
+    conn: AsyncConnection = Depends(get_db),
+):
+    try:
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
         
+        if user[1] == 'admin':
+            internee_ids = [internee_id] if internee_id is not None else None
+        else:
+            # Internee can only see their own statistics
+            internee_ids = [user[0]]
+        
+        try:
+            return await internee_stats(conn, period_start, period_end, internee_ids)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+async def insert_progress_reports(conn, request: ProgressReportGenerate, generated_by: int):
+    # One aggregate query for every internee, then one batched insert; ValueError for a bad period
+    period_start, period_end = parse_period(request.period_start, request.period_end)
+    stats = await internee_stats(conn, period_start, period_end, request.internee_ids)
+    for item in stats:
+        item["overall_performance"] = performance_rating(item)
+    if stats:
+        await reports.insert_many(conn, [
+            (item["internee_id"], generated_by, request.period_start, request.period_end,
+             item["tasks_completed"], item["tasks_pending"], item["overall_performance"], request.comments)
+            for item in stats
+        ])
+    return stats
+
+@app.post("/reports/generate/")
+async def generate_progress_reports(request: ProgressReportGenerate, user: Optional[UserIdentity] = Depends(get_identity), conn: AsyncConnection = Depends(get_db)):
+    try:
         if not user or user[1] != 'admin':
             raise HTTPException(status_code=403, detail="Only admins can create reports")
         
-        # Create report
-        cursor.execute(
-            """INSERT INTO progress_reports 
-            (internee_id, generated_by, period_start, period_end, 
-             tasks_completed, tasks_pending, overall_performance, comments) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-            report.internee_id, user[0], report.period_start, report.period_end,
-            report.tasks_completed, report.tasks_pending, report.overall_performance, report.comments
-        )
-        conn.commit()
+        try:
+            stats = await insert_progress_reports(conn, request, user[0])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        await conn.commit()
+        await response_cache.bump("reports", users=[item["internee_id"] for item in stats])
         
-        return {"message": "Progress report created successfully"}
-    except pyodbc.Error as e:
-        conn.rollback()
+        return {"message": f"Generated {len(stats)} progress reports", "count": len(stats), "reports": stats}
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        await conn.rollback()
         raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        conn.close()
 
-@app.get("/reports/")
-async def get_progress_reports(current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+@app.post("/reports/jobs/", status_code=202)
+async def enqueue_progress_reports(request: ProgressReportGenerate, user: Optional[UserIdentity] = Depends(get_identity), conn: AsyncConnection = Depends(get_db)):
+    try:
+        if not user or user[1] != 'admin':
+            raise HTTPException(status_code=403, detail="Only admins can create reports")
+        
+        # Reject a bad period now rather than in the job
+        try:
+            parse_period(request.period_start, request.period_end)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        job_id = await job_queue.enqueue(conn, "reports.generate", request.model_dump(), created_by=user[0])
+        await conn.commit()
+        job_queue.wake()
+        
+        return {"message": "Report generation queued", "job": await get_job(conn, job_id)}
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        await conn.rollback()
+        raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        await conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/reports/", response_model=List[ProgressReportOut])
+async def get_progress_reports(include_archived: bool = False, fields: Optional[str] = FIELDS_QUERY, user: Optional[UserIdentity] = Depends(get_identity), conn: AsyncConnection = Depends(get_db)):
+    try:
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        only = projection(fields, reports.FIELDS)
+        
+        # Admin can see all reports; internee can only see their own
+        internee_id = None if user[1] == 'admin' else user[0]
+        return RowsResponse(reports.FIELDS, await reports.fetch_all(conn, internee_id, include_archived), only)
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/dashboard/")
+async def get_dashboard(fields: Optional[str] = FIELDS_QUERY, user: Optional[UserIdentity] = Depends(get_identity), conn: AsyncConnection = Depends(get_db)):
     try:
-        # Get current user ID and role
-        cursor.execute(
-            "SELECT id, role FROM users WHERE firebase_id = ?", 
-            current_user['uid']
+        if not user or user[1] != 'admin':
+            raise HTTPException(status_code=403, detail="Only admins can access this resource")
+        only = projection(fields, dashboard.FIELDS)
+        
+        # Every internee's rollups in one query instead of the internee, task
+        # and report lists; the same for every admin, and cached for a short TTL
+        rows = await coalesced(
+            "GET /dashboard/", ("tasks", "users", "reports"), None, lambda: dashboard.fetch(conn, datetime.now())
         )
-        user = cursor.fetchone()
+        return RowsResponse(dashboard.FIELDS, rows, only)
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/sync/")
+async def sync_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(sync.PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user: Optional[UserIdentity] = Depends(get_identity),
+    conn: AsyncConnection = Depends(get_db),
+):
+    try:
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
         
+        # Admin syncs everything; internee only their own tasks, submissions and reports
+        owner_id = None if user[1] == 'admin' else user[0]
+        try:
+            return await sync.changes(conn, since, owner_id, limit)
+        except sync.SyncExpired as e:
+            raise HTTPException(status_code=410, detail=str(e))
+        except sync.SyncAhead as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+# Background jobs
+@app.get("/jobs/{job_id}/")
+async def get_job_status(job_id: int, user: Optional[UserIdentity] = Depends(get_identity), conn: AsyncConnection = Depends(get_db)):
+    try:
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        reports = []
-        if user[1] == 'admin':
-            # Admin can see all reports
-            cursor.execute("""
-                SELECT pr.id, u1.name as internee_name, u2.name as generated_by, 
-                       pr.period_start, pr.period_end, pr.tasks_completed, 
-                       pr.tasks_pending, pr.overall_performance, pr.comments, pr.created_at
-                FROM progress_reports pr
-                JOIN users u1 ON pr.internee_id = u1.id
-                JOIN users u2 ON pr.generated_by = u2.id
-                ORDER BY pr.created_at DESC
-            """)
-        else:
-            # Internee can only see their own reports
-            cursor.execute("""
-                SELECT pr.id, u1.name as internee_name, u2.name as generated_by, 
-                       pr.period_start, pr.period_end, pr.tasks_completed, 
-                       pr.tasks_pending, pr.overall_performance, pr.comments, pr.created_at
-                FROM progress_reports pr
-                JOIN users u1 ON pr.internee_id = u1.id
-                JOIN users u2 ON pr.generated_by = u2.id
-                WHERE pr.internee_id = ?
-                ORDER BY pr.created_at DESC
-            """, user[0])
-        
-        for row in cursor.fetchall():
-            reports.append({
-                "id": row[0],
-                "internee_name": row[1],
-                "generated_by": row[2],
-                "period_start": row[3],
-                "period_end": row[4],
-                "tasks_completed": row[5],
-                "tasks_pending": row[6],
-                "overall_performance": row[7],
-                "comments": row[8],
-                "created_at": row[9]
-            })
+        job = await get_job(conn, job_id)
+        # Only admins see jobs they did not start
+        if job is None or (user[1] != 'admin' and job["created_by"] != user[0]):
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@job_queue.handler("reports.generate")
+async def generate_reports_job(conn, job):
+    try:
+        stats = await insert_progress_reports(conn, ProgressReportGenerate(**job.payload), job.created_by)
+    except (ValueError, ValidationError) as e:
+        raise PermanentError(str(e))
+    return {"count": len(stats), "internee_ids": [item["internee_id"] for item in stats]}, \
+        lambda: response_cache.bump("reports", users=[item["internee_id"] for item in stats])
+
+@job_queue.handler("tasks.flag_overdue")
+async def flag_overdue_job(conn, job):
+    # Set-based batches, each committed and announced before the next.  The
+    # flag leaves the tasks' status and resources as they were: of the cached
+    # responses only the dashboard counts it, and that expires with its TTL.
+    now = datetime.now()
+    flagged = 0
+    while True:
+        rows = await tasks.flag_overdue(conn, now)
+        await conn.commit()
+        if rows:
+            flagged += len(rows)
+            for task_id, _ in rows:
+                await activity_log.record(task_id, None, "flagged_overdue", {})
+            await publish_tasks_changed({task_id: [assigned_to] for task_id, assigned_to in rows}, "tasks.overdue")
+        if len(rows) < MAX_BATCH_SIZE:
+            return {"flagged": flagged}, None
+
+@job_queue.handler("tasks.remind_deadlines")
+async def remind_deadlines_job(conn, job):
+    # Tasks that came within the reminder lead of their deadline since the previous run
+    lead = timedelta(seconds=settings.jobs_reminder_lead)
+    try:
+        since, until = datetime.fromisoformat(job.payload["since"]), datetime.fromisoformat(job.payload["until"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise PermanentError(f"Bad reminder window: {e}")
+    due = await tasks.due_between(conn, since + lead, until + lead)
+
+    async def notify():
+        for task_id, title, deadline, assigned_to in due:
+            await event_bus.publish(
+                "task.deadline_reminder", {"id": task_id, "title": title, "deadline": deadline}, assigned_to,
+                admins=False,
+            )
+    return {"reminded": len(due)}, notify
+
+@job_queue.handler("sync.compact_tombstones")
+async def compact_tombstones_job(conn, job):
+    removed, version = await sync.queries.compact(conn, settings.sync_tombstone_retention)
+    return {"removed": removed, "compacted_version": version}, None
+
+@job_queue.handler("archive.completed_work")
+async def archive_job(conn, job):
+    try:
+        before = datetime.fromisoformat(job.payload["before"]) if job.payload.get("before") else archive.cutoff()
+    except (TypeError, ValueError) as e:
+        raise PermanentError(f"Bad archive cutoff: {e}")
+
+    async def announce(batch):
+        # Each batch is committed, so a retry resumes with what is left; it
+        # spans internees, so every caller's entries are invalidated
+        await response_cache.bump("tasks", "reports")
+        search_index.tasks_changed(batch.task_ids)
+        search_index.submissions_changed(batch.submission_ids)
+        for task_id in batch.task_ids:
+            await activity_log.record(task_id, None, "archived", {})
+    return await archive.run(conn, before, settings.archive_batch_size, announce), None
+
+job_queue.every("tasks.flag_overdue", settings.jobs_overdue_interval)
+job_queue.every("tasks.remind_deadlines", settings.jobs_reminder_interval)
+job_queue.every("sync.compact_tombstones", settings.sync_compact_interval)
+job_queue.every("archive.completed_work", settings.archive_interval)
+
+@app.post("/archive/", status_code=202)
+async def enqueue_archive(request: ArchiveRun, user: Optional[UserIdentity] = Depends(get_identity), conn: AsyncConnection = Depends(get_db)):
+    try:
+        if not user or user[1] != 'admin':
+            raise HTTPException(status_code=403, detail="Only admins can archive")
+        
+        # Archive now rather than at the next periodic run, optionally up to another cutoff
+        payload = {"before": request.before.isoformat()} if request.before else {}
+        job_id = await job_queue.enqueue(conn, "archive.completed_work", payload, created_by=user[0])
+        await conn.commit()
+        job_queue.wake()
         
-        return reports
-    except pyodbc.Error as e:
+        return {"message": "Archival queued", "job": await get_job(conn, job_id)}
+    except HTTPException:
+        raise
+    except DatabaseError as e:
+        await conn.rollback()
         raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
     except Exception as e:
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        conn.close()
+
+# Streaming exports
+@app.get("/tasks/export/")
+async def export_tasks(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    compress: bool = Query(False, alias="gzip"),
+    task_status: Optional[str] = Query(None, alias="status"),
+    assigned_to: Optional[int] = None,
+    deadline_from: Optional[datetime] = None,
+    deadline_to: Optional[datetime] = None,
+    q: Optional[str] = None,
+    include_archived: bool = False,
+    user: Optional[UserIdentity] = Depends(get_identity),
+):
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    where, params = tasks.filters(user, task_status, assigned_to, deadline_from, deadline_to, q)
+    sql, params = tasks.export_query(database.backend.dialect, where, params, include_archived)
+    return export_response("tasks", sql, params, list(statements.TASK_FIELDS), fmt, compress)
+
+@app.get("/tasks/{task_id}/submissions/export/")
+async def export_task_submissions(
+    task_id: int,
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    compress: bool = Query(False, alias="gzip"),
+    include_archived: bool = False,
+    user: Optional[UserIdentity] = Depends(get_identity),
+):
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # Internee can only see their own submissions
+    submitted_by = user[0] if user[1] == 'internee' else None
+    sql, params = submissions.export_query(database.backend.dialect, task_id, submitted_by, include_archived)
+    return export_response(f"task_{task_id}_submissions", sql, params, submissions.EXPORT_COLUMNS, fmt, compress)
+
+@app.get("/reports/export/")
+async def export_progress_reports(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    compress: bool = Query(False, alias="gzip"),
+    include_archived: bool = False,
+    user: Optional[UserIdentity] = Depends(get_identity),
+):
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # Internee can only see their own reports
+    sql, params = reports.export_query(database.backend.dialect, None if user[1] == 'admin' else user[0], include_archived)
+    return export_response("progress_reports", sql, params, list(statements.REPORT_FIELDS), fmt, compress)
+
+# Task change feed
+@app.get("/events/")
+async def task_events(
+    request: Request,
+    last_event_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+):
+    # Resolve the caller without get_db, which would hold a pooled connection for the whole stream
+    async with connection() as conn:
+        user = await identity_cache.resolve(current_user['uid'], conn)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # EventSource sends Last-Event-ID on reconnect; the query parameter is for clients that cannot set headers
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        event_bus.stream(user, resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # Health check endpoint
 @app.get("/health/")
@@ -616,11 +1298,72 @@ async def health_check():
 @app.get("/test-db/")
 async def test_database():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        result = cursor.fetchone()
-        conn.close()
+        conn = await database.acquire()
+        try:
+            result = await conn.fetchone("SELECT 1")
+        finally:
+            await database.release(conn)
         return {"status": "Database connection successful", "result": result[0]}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database connection failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Database connection failed: {str(e)}")
+
+# Token and identity cache metrics endpoint
+@app.get("/metrics/auth/", dependencies=[Depends(require_metrics_access)])
+async def auth_metrics():
+    return {"tokens": token_cache.metrics(), "identity": identity_cache.metrics()}
+
+# Prometheus metrics endpoint (no trailing slash, the path scrapers expect)
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_access)])
+async def prometheus_metrics():
+    pool = database.metrics()
+    gauges = {
+        "db_pool_connections_open": ("Open pooled connections.", pool["open"]),
+        "db_pool_connections_in_use": ("Checked-out pooled connections.", pool["in_use"]),
+        "db_pool_waiting": ("Requests waiting for a pooled connection.", pool["waiting"]),
+        "event_stream_subscribers": ("Open change feed streams.", event_bus.metrics()["subscribers"]),
+        "response_cache_bytes": ("Bytes held by the response cache.", response_cache.metrics()["bytes"]),
+        "jobs_running": ("Background jobs running in this process.", job_queue.metrics()["running"]),
+        "activity_buffered": ("Task activity entries not yet written.", activity_log.metrics()["buffered"]),
+    }
+    return PlainTextResponse(instrumentation.metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+# Response cache metrics endpoint
+@app.get("/metrics/cache/", dependencies=[Depends(require_metrics_access)])
+async def cache_metrics():
+    return response_cache.metrics()
+
+# Change feed metrics endpoint
+@app.get("/metrics/events/", dependencies=[Depends(require_metrics_access)])
+async def event_metrics():
+    return event_bus.metrics()
+
+# Background job metrics endpoint
+@app.get("/metrics/jobs/", dependencies=[Depends(require_metrics_access)])
+async def job_metrics():
+    return job_queue.metrics()
+
+# Task activity log metrics endpoint
+@app.get("/metrics/activity/", dependencies=[Depends(require_metrics_access)])
+async def activity_metrics():
+    return activity_log.metrics()
+
+# Archival metrics endpoint
+@app.get("/metrics/archive/", dependencies=[Depends(require_metrics_access)])
+async def archive_metrics():
+    return archive_stats.metrics()
+
+# Rate limiting and request coalescing metrics endpoint
+@app.get("/metrics/load/", dependencies=[Depends(require_metrics_access)])
+async def load_metrics():
+    return {"rate_limit": rate_limiter.metrics(), "coalescing": single_flight.metrics()}
+
+# Connection pool metrics endpoint
+@app.get("/metrics/pool/", dependencies=[Depends(require_metrics_access)])
+async def pool_metrics():
+    return database.metrics()
+
+
+# Per-statement metrics endpoint
+@app.get("/metrics/statements/", dependencies=[Depends(require_metrics_access)])
+async def statement_metrics():
+    return instrumentation.statement_stats.metrics()
@@ -0,0 +1,316 @@
+"""Schema migrations for SQL Server and SQLite.
+
+Migrations are the numbered scripts in sql/mssql and sql/sqlite, one directory
+per dialect with the same numbers in both, applied in order.  Applied versions
+are recorded in schema_migrations with a checksum of the script.  Every script
+is idempotent (IF NOT EXISTS, IF OBJECT_ID(...) IS NULL), so a database created
+before migrations were tracked upgrades by replaying them all.
+
+A script's comments may carry directives:
+
+    -- requires: fts5         SQLite built with FTS5 (SQL Server: fulltext)
+    -- transaction: off       Run outside a transaction, as full-text DDL must
+
+An upgrade stops before the first migration whose requirement the database
+lacks, with MigrationBlocked naming it, so the schema is never applied around
+a gap.  Requirements listed in MIGRATIONS_OPTIONAL are the exception: their
+migrations stay pending, are retried by the next upgrade, and later ones
+still apply.  SQL Server scripts are split into batches on GO lines, as
+sqlcmd does.
+
+SQLite databases are upgraded when the pool first connects (db.SQLiteBackend).
+SQL Server ones by running this module with DB_BACKEND and the connection
+settings of db.py:
+
+    python migrations.py status
+    python migrations.py up [--to VERSION]
+
+benchmarks/check_plans.py checks the query plans of the routes against the
+resulting indexes.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+from typing import NamedTuple, Optional
+
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql")
+
+_FILENAME = re.compile(r"^(\d{4})_(\w+)\.sql$")
+_DIRECTIVE = re.compile(r"^--\s*(requires|transaction):\s*(\w+)\s*$", re.MULTILINE)
+_GO = re.compile(r"^\s*GO\s*$", re.IGNORECASE | re.MULTILINE)
+
+_CREATE_TABLE = {
+    "mssql": """
+        IF OBJECT_ID('schema_migrations') IS NULL
+            CREATE TABLE schema_migrations (
+                version INT PRIMARY KEY,
+                name NVARCHAR(255) NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                applied_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+            )
+    """,
+    "sqlite": """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+}
+_TABLE_EXISTS = {
+    "mssql": "SELECT OBJECT_ID('schema_migrations')",
+    "sqlite": "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_migrations'",
+}
+_REQUIREMENTS = {
+    ("sqlite", "fts5"): "SELECT sqlite_compileoption_used('ENABLE_FTS5')",
+    ("mssql", "fulltext"): "SELECT FULLTEXTSERVICEPROPERTY('IsFullTextInstalled')",
+}
+
+
+class MigrationBlocked(RuntimeError):
+    """Raised when a pending migration needs something the database lacks."""
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    script: str
+    checksum: str
+    requires: Optional[str]
+    transactional: bool
+
+
+def discover(dialect, directory=SCHEMA_DIR):
+    """Migrations of ``dialect`` in version order; raises ValueError for a malformed set."""
+    migrations = {}
+    for filename in sorted(os.listdir(os.path.join(directory, dialect))):
+        match = _FILENAME.match(filename)
+        if match is None:
+            raise ValueError(f"Not a migration file name: {dialect}/{filename}")
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Two {dialect} migrations numbered {version}")
+        with open(os.path.join(directory, dialect, filename), encoding="utf-8") as f:
+            script = f.read()
+        directives = dict(_DIRECTIVE.findall(script))
+        migrations[version] = Migration(
+            version, match.group(2), script, hashlib.sha256(script.encode()).hexdigest(),
+            directives.get("requires"), directives.get("transaction", "on") != "off",
+        )
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def _sqlite_statements(script):
+    # Complete statements in order; a trigger body's semicolons do not end it
+    statements, buffer = [], ""
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer)
+            buffer = ""
+    if any(line.strip() and not line.lstrip().startswith("--") for line in buffer.splitlines()):
+        statements.append(buffer)
+    return statements
+
+
+def _fetchone(conn, sql, *params):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def _execute(conn, sql, *params):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+    finally:
+        cursor.close()
+
+
+def applied(conn, dialect):
+    """``{version: (name, checksum, applied_at)}`` of the migrations recorded as applied."""
+    row = _fetchone(conn, _TABLE_EXISTS[dialect])
+    if row is None or row[0] is None:
+        return {}
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT version, name, checksum, applied_at FROM schema_migrations")
+        return {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def requirement_met(conn, dialect, requirement):
+    if requirement is None:
+        return True
+    sql = _REQUIREMENTS.get((dialect, requirement))
+    if sql is None:
+        raise ValueError(f"Unknown {dialect} migration requirement: {requirement}")
+    row = _fetchone(conn, sql)
+    return bool(row and row[0])
+
+
+def status(conn, dialect, optional=()):
+    """``(version, name, state)`` for every migration.
+
+    State is ``applied``, ``pending``, ``needs <requirement>``, ``blocked by
+    <version>`` after a migration whose requirement is missing and not in
+    ``optional``, or ``changed since applied`` when the script no longer
+    matches its checksum.
+    """
+    done = applied(conn, dialect)
+    rows = []
+    blocked_by = None
+    for migration in discover(dialect):
+        record = done.get(migration.version)
+        if record is not None:
+            state = "applied" if record[1] == migration.checksum else "changed since applied"
+        elif blocked_by is not None:
+            state = f"blocked by {blocked_by:04d}"
+        elif not requirement_met(conn, dialect, migration.requires):
+            state = f"needs {migration.requires}"
+            if migration.requires not in optional:
+                blocked_by = migration.version
+        else:
+            state = "pending"
+        rows.append((migration.version, migration.name, state))
+    return rows
+
+
+def upgrade(conn, dialect, target=None, optional=()):
+    """Apply the pending migrations up to ``target`` (all by default); returns those applied.
+
+    Works on a DB-API connection of either dialect, committing each migration
+    on its own.  Raises MigrationBlocked at a migration whose requirement is
+    missing, unless it is one of ``optional``; those before it stay applied.  Concurrent upgrades are serialized by a database lock, so
+    several workers starting at once apply each migration once.
+    """
+    _execute(conn, _CREATE_TABLE[dialect])
+    conn.commit()
+    if dialect == "mssql":
+        _lock_mssql(conn)
+    try:
+        done = applied(conn, dialect)
+        result = []
+        for migration in discover(dialect):
+            if target is not None and migration.version > target:
+                break
+            if migration.version in done:
+                continue
+            if not requirement_met(conn, dialect, migration.requires):
+                if migration.requires in optional:
+                    continue
+                raise MigrationBlocked(
+                    f"Migration {migration.version:04d} {migration.name} needs {migration.requires}, which "
+                    f"this {dialect} database lacks; later migrations were not applied (add "
+                    f"{migration.requires} to MIGRATIONS_OPTIONAL to run without it)"
+                )
+            apply = _apply_sqlite if dialect == "sqlite" else _apply_mssql
+            if apply(conn, migration):
+                result.append(migration)
+        return result
+    finally:
+        if dialect == "mssql":
+            _execute(conn, "EXEC sp_releaseapplock @Resource = 'schema_migrations', @LockOwner = 'Session'")
+
+
+def _record(conn, migration):
+    _execute(conn, "INSERT INTO schema_migrations (version, name, checksum) VALUES (?, ?, ?)",
+             migration.version, migration.name, migration.checksum)
+
+
+def _apply_sqlite(conn, migration):
+    isolation_level = conn.isolation_level
+    # Explicit transactions only: sqlite3 would otherwise commit before DDL
+    conn.isolation_level = None
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it while this one waited for the write lock
+            if conn.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (migration.version,)).fetchone():
+                conn.execute("ROLLBACK")
+                return False
+            for statement in _sqlite_statements(migration.script):
+                conn.execute(statement)
+            _record(conn, migration)
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.isolation_level = isolation_level
+
+
+def _lock_mssql(conn):
+    # Held by the session across the per-migration transactions
+    row = _fetchone(conn, """
+        DECLARE @result INT;
+        EXEC @result = sp_getapplock @Resource = 'schema_migrations', @LockMode = 'Exclusive',
+                                     @LockOwner = 'Session', @LockTimeout = 60000;
+        SELECT @result;
+    """)
+    if row is None or row[0] < 0:
+        raise RuntimeError("Timed out waiting for another migration run to finish")
+
+
+def _apply_mssql(conn, migration):
+    if not migration.transactional:
+        conn.autocommit = True
+    try:
+        for batch in _GO.split(migration.script):
+            if batch.strip():
+                _execute(conn, batch)
+        _record(conn, migration)
+        if migration.transactional:
+            conn.commit()
+        return True
+    except BaseException:
+        if migration.transactional:
+            conn.rollback()
+        raise
+    finally:
+        conn.autocommit = False
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="Apply or list schema migrations of the configured database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="List migrations and whether each is applied")
+    up = commands.add_parser("up", help="Apply pending migrations")
+    up.add_argument("--to", type=int, help="Last version to apply")
+    args = parser.parse_args(argv)
+
+    import db
+    from settings import settings
+    backend = db.backend_from_settings()
+    if backend.dialect == "sqlite":
+        backend.migrate = False
+    conn = backend.connect()
+    try:
+        if args.command == "status":
+            for version, name, state in status(conn, backend.dialect, settings.migrations_optional):
+                print(f"{version:04d} {name:<24} {state}")
+        else:
+            try:
+                migrations = upgrade(conn, backend.dialect, args.to, settings.migrations_optional)
+            except MigrationBlocked as e:
+                print(e, file=sys.stderr)
+                return 1
+            for migration in migrations:
+                print(f"applied {migration.version:04d} {migration.name}")
+            if not migrations:
+                print("up to date")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,50 @@
+import base64
+import json
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque keyset cursor pointing just past the row ``(created_at, row_id)``."""
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat(sep=" ")
+    raw = json.dumps([created_at, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def encode_offset(offset):
+    """Opaque cursor for ranked results, which page by position rather than by key."""
+    raw = json.dumps(["offset", offset], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_offset(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        kind, offset = json.loads(raw)
+        if kind != "offset" or int(offset) < 0:
+            raise ValueError(cursor)
+        return int(offset)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def like_pattern(text):
+    """Escape ``text`` for a ``LIKE ? ESCAPE '\\'`` substring match."""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("[", "\\[")
+    return f"%{escaped}%"
@@ -0,0 +1,165 @@
+"""Token-bucket rate limiting per caller and route.
+
+Each caller (the Firebase uid of the bearer token, or the client address
+without one) has a bucket per route template: it holds up to BURST tokens
+and refills at RATE per second, one token per request.  An empty bucket
+answers 429 with Retry-After before the route, or any database work, runs.
+Limits come from RATE_LIMITS (see settings.py).  A request counts against the
+limit of its route, or the "*" limit if its route has none; without a "*"
+entry, requests to routes without a limit of their own are not counted.
+
+Buckets live in process memory by default, so each worker allows the full
+rate.  With ``RATE_LIMIT_BACKEND=redis`` the workers share them, updated by
+one script per request so concurrent requests cannot both take the last token.
+"""
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from settings import settings
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    remaining: int
+    # Seconds until a token is available, when not allowed
+    retry_after: float
+
+
+# Bucket stores
+class MemoryBucketStore:
+    """Buckets in an LRU of at most ``max_keys``; an evicted caller starts with a full bucket."""
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+
+    async def take(self, key, rate, burst):
+        now = self.clock()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return Decision(allowed, int(tokens), 0.0 if allowed else (1 - tokens) / rate)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# Refill and take in one step, on the Redis clock so workers agree on the time
+_TAKE_SCRIPT = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketStore:
+    """Buckets shared by every worker; a bucket expires once it would be full again."""
+
+    def __init__(self, url, prefix="ratelimit:"):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+        self.prefix = prefix
+
+    async def take(self, key, rate, burst):
+        allowed, tokens = await self._take(keys=[self.prefix + key], args=[rate, burst])
+        tokens = float(tokens)
+        return Decision(bool(allowed), int(tokens), 0.0 if allowed else (1 - tokens) / rate)
+
+
+class RateLimiter:
+    def __init__(self, store, limits):
+        self.store = store
+        # "METHOD /template" -> (rate, burst); "*" for every other route
+        self.limits = dict(limits)
+        self.allowed = 0
+        self.limited = {}
+
+    def limit_for(self, route):
+        return self.limits.get(route, self.limits.get("*"))
+
+    async def take(self, route, caller):
+        """Decision for one request of ``caller`` to ``route``, or None if the route is not limited."""
+        limit = self.limit_for(route)
+        if limit is None:
+            return None
+        decision = await self.store.take(f"{route}|{caller}", *limit)
+        if decision.allowed:
+            self.allowed += 1
+        else:
+            self.limited[route] = self.limited.get(route, 0) + 1
+        return decision
+
+    def metrics(self):
+        return {
+            "limits": {route: {"rate": rate, "burst": burst} for route, (rate, burst) in self.limits.items()},
+            "allowed": self.allowed,
+            "limited": dict(self.limited),
+        }
+
+
+class RateLimitMiddleware:
+    """Plain ASGI middleware applying a RateLimiter before the route runs.
+
+    ``route_template(scope)`` names the route and ``identify(scope)`` (async)
+    the caller.
+    """
+
+    def __init__(self, app, limiter, route_template, identify):
+        self.app = app
+        self.limiter = limiter
+        self.route_template = route_template
+        self.identify = identify
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limiter.limits:
+            return await self.app(scope, receive, send)
+        route = f"{scope['method']} {self.route_template(scope)}"
+        if self.limiter.limit_for(route) is None:
+            return await self.app(scope, receive, send)
+        decision = await self.limiter.take(route, await self.identify(scope))
+        if decision.allowed:
+            return await self.app(scope, receive, send)
+
+        body = json.dumps({"detail": "Rate limit exceeded"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(decision.retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def store_from_settings(config=settings):
+    if config.rate_limit_backend == "redis":
+        return RedisBucketStore(config.redis_url)
+    return MemoryBucketStore(max_keys=config.rate_limit_max_keys)
+
+
+rate_limiter = RateLimiter(store_from_settings(), settings.rate_limits)
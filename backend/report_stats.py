@@ -0,0 +1,113 @@
+"""Per-internee progress statistics for a reporting period.
+
+Counts come from internee_stats_daily, which triggers on tasks and
+task_submissions keep current (migration 0003_report_stats in sql/), so
+a report reads one row per internee per day instead of rescanning history.
+Overdue work depends on the clock and is counted from tasks over the deadline
+index, bounded to deadlines inside the period.
+
+Within a period [period_start, period_end]:
+
+* tasks_total / tasks_completed / tasks_pending: tasks created in the period,
+  by their current assignee and status
+* tasks_overdue: open tasks whose deadline fell in the period and has passed
+* on_time_rate: share of the period's submissions (for tasks with a deadline)
+  made by the deadline
+* mean_hours_to_submit: average time from task creation to submission
+"""
+from datetime import date, datetime, time, timedelta
+
+from statements import catalog, in_lists, placeholders
+
+STATS_FIELDS = ("internee_id", "internee_name", "tasks_total", "tasks_completed", "tasks_pending",
+                "tasks_overdue", "submissions", "on_time_rate", "mean_hours_to_submit")
+
+PERFORMANCE_LEVELS = ((0.85, "Excellent"), (0.65, "Good"), (0.4, "Average"))
+
+
+def parse_period(period_start, period_end):
+    """Coerce ISO date strings to dates; raises ValueError for bad or reversed periods."""
+    start = period_start if isinstance(period_start, date) else date.fromisoformat(period_start)
+    end = period_end if isinstance(period_end, date) else date.fromisoformat(period_end)
+    if start > end:
+        raise ValueError("period_start must not be after period_end")
+    return start, end
+
+
+@catalog
+def _internee_stats(dialect, internees):
+    """Params: start, end, overdue_from, overdue_until, then ``internees`` ids unless it is ``all``."""
+    sql = """
+        SELECT u.id, u.name,
+               COALESCE(s.tasks_created, 0), COALESCE(s.tasks_completed, 0),
+               COALESCE(s.submissions, 0), COALESCE(s.submissions_with_deadline, 0),
+               COALESCE(s.submissions_on_time, 0), COALESCE(s.submit_seconds, 0),
+               COALESCE(o.overdue, 0)
+        FROM users u
+        LEFT JOIN (
+            SELECT internee_id, SUM(tasks_created) AS tasks_created, SUM(tasks_completed) AS tasks_completed,
+                   SUM(submissions) AS submissions, SUM(submissions_with_deadline) AS submissions_with_deadline,
+                   SUM(submissions_on_time) AS submissions_on_time, SUM(submit_seconds) AS submit_seconds
+            FROM internee_stats_daily
+            WHERE day >= ? AND day <= ?
+            GROUP BY internee_id
+        ) s ON s.internee_id = u.id
+        LEFT JOIN (
+            SELECT assigned_to, COUNT(*) AS overdue
+            FROM tasks
+            WHERE deadline >= ? AND deadline < ? AND status <> 'completed'
+            GROUP BY assigned_to
+        ) o ON o.assigned_to = u.id
+        WHERE u.role = 'internee'
+    """
+    if internees != "all":
+        sql += f" AND u.id IN ({placeholders(internees)})"
+    return sql + " ORDER BY u.name"
+
+
+async def internee_stats(conn, period_start, period_end, internee_ids=None, now=None):
+    """Statistics for every internee (or just ``internee_ids``) in one aggregate query."""
+    start, end = parse_period(period_start, period_end)
+    overdue_from = datetime.combine(start, time.min)
+    overdue_until = min(datetime.combine(end + timedelta(days=1), time.min), now or datetime.now())
+
+    params = [start, end, overdue_from, overdue_until]
+    if internee_ids is None:
+        rows = await conn.fetchall(_internee_stats(conn.dialect, "all"), *params)
+    else:
+        rows, chunks = [], list(in_lists(set(internee_ids)))
+        for chunk in chunks:
+            rows += await conn.fetchall(_internee_stats(conn.dialect, len(chunk)), *params, *chunk)
+        if len(chunks) > 1:
+            # Each query's rows are in name order
+            rows.sort(key=lambda row: row[1])
+    return [_stats_dict(row) for row in rows]
+
+
+def _stats_dict(row):
+    internee_id, name, created, completed, submissions, with_deadline, on_time, seconds, overdue = row
+    return {
+        "internee_id": internee_id,
+        "internee_name": name,
+        "tasks_total": created,
+        "tasks_completed": completed,
+        "tasks_pending": created - completed,
+        "tasks_overdue": overdue,
+        "submissions": submissions,
+        "on_time_rate": round(on_time / with_deadline, 4) if with_deadline else None,
+        "mean_hours_to_submit": round(seconds / submissions / 3600, 2) if submissions else None,
+    }
+
+
+def performance_rating(stats):
+    """Map completion and on-time rates to the ratings the client offers."""
+    if not stats["tasks_total"]:
+        return "Average"
+    rates = [stats["tasks_completed"] / stats["tasks_total"]]
+    if stats["on_time_rate"] is not None:
+        rates.append(stats["on_time_rate"])
+    score = sum(rates) / len(rates)
+    for threshold, rating in PERFORMANCE_LEVELS:
+        if score >= threshold:
+            return rating
+    return "Poor"
@@ -0,0 +1,9 @@
+"""Data access for the routes: every SQL statement main.py runs lives here.
+
+Each module groups the queries of one resource as async functions taking a
+checked-out connection first, like ``report_stats.internee_stats``.  They work
+on either pool in db.py (``AsyncConnection`` on the executor, or
+``DriverConnection`` on an async driver), leave transactions to the caller and
+return plain rows or dicts.
+"""
+from . import activity, archive, attachments, dashboard, jobs, reports, submissions, sync, tasks, users  # noqa: F401
@@ -0,0 +1,37 @@
+"""Task activity rows for activity.py (table of migration 0010_task_activity)."""
+import statements
+
+# Fields of a history entry, the column order of fetch_page rows; changes is JSON text
+FIELDS = ("id", "task_id", "action", "changes", "actor_id", "actor", "created_at")
+
+
+@statements.catalog
+def _insert_row(dialect):
+    """Params: task_id, actor_id, action, changes, created_at; for executemany."""
+    return "INSERT INTO task_activity (task_id, actor_id, action, changes, created_at) VALUES (?, ?, ?, ?, ?)"
+
+
+async def insert_many(conn, rows):
+    """Append ``(task_id, actor_id, action, changes, created_at)`` rows with one executemany."""
+    await conn.executemany(_insert_row(conn.dialect), rows)
+
+
+@statements.catalog
+def _fetch_page(dialect, page):
+    """Params: task_id, then created_at, created_at, id of the last entry seen for page ``after``, limit."""
+    after = " AND (a.created_at < ? OR (a.created_at = ? AND a.id < ?))" if page == "after" else ""
+    return f"""
+        SELECT a.id, a.task_id, a.action, a.changes, a.actor_id, u.name, a.created_at
+        FROM task_activity a
+        LEFT JOIN users u ON a.actor_id = u.id
+        WHERE a.task_id = ?{after}
+        ORDER BY a.created_at DESC, a.id DESC
+        {statements.limit_clause(dialect)}
+    """
+
+
+async def fetch_page(conn, task_id, limit, after=None):
+    """Up to ``limit`` entries of a task newest first, keyset-paginated after ``(created_at, id)``."""
+    if after is None:
+        return await conn.fetchall(_fetch_page(conn.dialect, "first"), task_id, limit)
+    return await conn.fetchall(_fetch_page(conn.dialect, "after"), task_id, after[0], after[0], after[1], limit)
@@ -0,0 +1,145 @@
+"""Moving finished work to the archive tables of migration 0011_archive.
+
+Rows are moved by id lists of at most a batch, which keeps every statement
+short; the caller commits each batch.  On SQL Server a row is moved by one
+DELETE ... OUTPUT INTO, so it cannot be archived and changed in between; on
+SQLite, which has one writer, by an INSERT ... SELECT and a DELETE.
+"""
+import statements
+from statements import placeholders
+
+# Columns copied to the archive tables, which add archived_at
+TASK_COLUMNS = ("id", "title", "description", "status", "created_by", "assigned_to", "deadline",
+                "created_at", "updated_at")
+SUBMISSION_COLUMNS = ("id", "task_id", "submitted_by", "description", "attachment_url", "submitted_at")
+ATTACHMENT_COLUMNS = ("id", "submission_id", "uploaded_by", "sha256", "size", "filename", "content_type",
+                      "created_at")
+REPORT_COLUMNS = ("id", "internee_id", "generated_by", "period_start", "period_end", "tasks_completed",
+                  "tasks_pending", "overall_performance", "comments", "created_at")
+
+# SQL Server takes at most 2100 parameters, and every id is one
+MAX_BATCH_SIZE = 1000
+
+
+# Table -> (columns, rows moved with a batch of ids); children are moved with
+# the tasks they belong to
+_MOVED = {
+    "tasks": (TASK_COLUMNS, "id IN ({ids})"),
+    "task_submissions": (SUBMISSION_COLUMNS, "task_id IN ({ids})"),
+    "submission_attachments": (
+        ATTACHMENT_COLUMNS, "submission_id IN (SELECT id FROM task_submissions WHERE task_id IN ({ids}))"
+    ),
+    "progress_reports": (REPORT_COLUMNS, "id IN ({ids})"),
+}
+
+
+@statements.catalog
+def _set_archiving(dialect):
+    """Params: 1 while archiving, None (0 on SQLite) after."""
+    if dialect == "mssql":
+        return "EXEC sp_set_session_context @key = N'archiving', @value = ?"
+    return "UPDATE archive_state SET archiving = ? WHERE id = 1"
+
+
+async def set_archiving(conn, archiving):
+    """Mark the deletes that follow as archival, which report statistics do not subtract."""
+    if conn.dialect == "mssql":
+        # Session state outlives the transaction, so the caller clears it whatever happens
+        await conn.execute(_set_archiving(conn.dialect), 1 if archiving else None)
+    else:
+        await conn.execute(_set_archiving(conn.dialect), int(archiving))
+
+
+@statements.catalog
+def _pick(dialect, table):
+    """Params: limit and then the cutoffs on SQL Server, the cutoffs and then limit on SQLite."""
+    where = {
+        "tasks": "status = 'completed' AND (updated_at < ? OR (updated_at IS NULL AND created_at < ?))",
+        "progress_reports": "period_end < ?",
+    }[table]
+    if dialect == "mssql":
+        # Locked until commit so they cannot change before they are moved;
+        # rows other transactions hold are left for the next batch
+        return f"SELECT TOP (?) id FROM {table} WITH (UPDLOCK, ROWLOCK, READPAST) WHERE {where}"
+    return f"SELECT id FROM {table} WHERE {where} LIMIT ?"
+
+
+async def _picked(conn, table, params, limit):
+    params = [limit, *params] if conn.dialect == "mssql" else [*params, limit]
+    return [row[0] for row in await conn.fetchall(_pick(conn.dialect, table), *params)]
+
+
+async def completed_tasks(conn, cutoff, limit):
+    """Ids of up to ``limit`` tasks completed before ``cutoff``: last updated (or created, if never) before it."""
+    return await _picked(conn, "tasks", [cutoff, cutoff], limit)
+
+
+async def old_reports(conn, cutoff, limit):
+    """Ids of up to ``limit`` reports whose period ended before ``cutoff``."""
+    return await _picked(conn, "progress_reports", [cutoff], limit)
+
+
+@statements.catalog
+def _move_rows(dialect, table, size):
+    """Params: ``size`` ids.  Moves the rows to ``archived_<table>`` on SQL Server, copies them on SQLite."""
+    columns, where = _MOVED[table]
+    listed, where = ", ".join(columns), where.format(ids=placeholders(size))
+    if dialect == "mssql":
+        deleted = ", ".join(f"DELETED.{column}" for column in columns)
+        return f"DELETE FROM {table} OUTPUT {deleted} INTO archived_{table} ({listed}) WHERE {where}"
+    return f"INSERT INTO archived_{table} ({listed}) SELECT {listed} FROM {table} WHERE {where}"
+
+
+@statements.catalog
+def _delete_rows(dialect, table, size):
+    """Params: ``size`` ids.  Deletes the rows _move_rows copied on SQLite."""
+    return f"DELETE FROM {table} WHERE {_MOVED[table][1].format(ids=placeholders(size))}"
+
+
+async def _move(conn, table, ids):
+    """Move the rows of ``table`` that go with ``ids`` to ``archived_<table>``; returns how many."""
+    moved = 0
+    for chunk in statements.in_lists(ids):
+        if conn.dialect == "mssql":
+            moved += await conn.execute(_move_rows(conn.dialect, table, len(chunk)), *chunk)
+        else:
+            await conn.execute(_move_rows(conn.dialect, table, len(chunk)), *chunk)
+            moved += await conn.execute(_delete_rows(conn.dialect, table, len(chunk)), *chunk)
+    return moved
+
+
+@statements.catalog
+def _submission_ids(dialect, size):
+    """Params: ``size`` task ids."""
+    return f"SELECT id FROM task_submissions WHERE task_id IN ({placeholders(size)})"
+
+
+async def move_tasks(conn, task_ids):
+    """Archive tasks with their submissions and attachments; returns ``(submission_ids, attachments)``."""
+    submission_ids = []
+    for chunk in statements.in_lists(task_ids):
+        submission_ids += [row[0] for row in await conn.fetchall(_submission_ids(conn.dialect, len(chunk)), *chunk)]
+    # Children first, so nothing is left for ON DELETE CASCADE to remove unarchived
+    attachments = await _move(conn, "submission_attachments", task_ids)
+    await _move(conn, "task_submissions", task_ids)
+    await _move(conn, "tasks", task_ids)
+    return submission_ids, attachments
+
+
+@statements.catalog
+def _report_tombstones(dialect, size):
+    """Params: ``size`` report ids."""
+    return f"""
+        INSERT INTO sync_tombstones (entity, entity_id, owner_id, reason)
+        SELECT 'report', id, internee_id, 'deleted' FROM archived_progress_reports WHERE id IN ({placeholders(size)})
+    """
+
+
+async def move_reports(conn, report_ids):
+    """Archive reports; returns how many were moved."""
+    moved = await _move(conn, "progress_reports", report_ids)
+    if conn.dialect == "mssql":
+        # SQLite has a delete trigger for these (0011_archive), SQL Server cannot
+        for chunk in statements.in_lists(report_ids):
+            await conn.execute(_report_tombstones(conn.dialect, len(chunk)), *chunk)
+    return moved
@@ -0,0 +1,50 @@
+import statements
+
+# Fields of an attachment resource, the column order of rows returned here
+FIELDS = statements.ATTACHMENT_FIELDS
+
+
+def attachment_dict(row):
+    return dict(zip(FIELDS, row))
+
+
+@statements.catalog
+def _used_bytes(dialect):
+    """Params: user_id, user_id."""
+    return (
+        "SELECT (SELECT COALESCE(SUM(size), 0) FROM submission_attachments WHERE uploaded_by = ?)"
+        " + (SELECT COALESCE(SUM(size), 0) FROM archived_submission_attachments WHERE uploaded_by = ?)"
+    )
+
+
+async def used_bytes(conn, user_id):
+    """Total size of the attachments ``user_id`` has uploaded, counted against their quota.
+
+    Archived attachments count too: their files are still stored.
+    """
+    row = await conn.fetchone(_used_bytes(conn.dialect), user_id, user_id)
+    return row[0]
+
+
+async def create(conn, submission_id, uploaded_by, sha256, size, filename, content_type, quota):
+    """Record an attachment unless it would take ``uploaded_by`` past ``quota`` bytes; returns it or None."""
+    row = await conn.fetchone(
+        statements.insert_attachment(conn.dialect),
+        submission_id, uploaded_by, sha256, size, filename, content_type, uploaded_by, uploaded_by, size, quota
+    )
+    return attachment_dict(row) if row is not None else None
+
+
+@statements.catalog
+def _fetch(dialect):
+    """Params: attachment_id, attachment_id."""
+    return """
+        SELECT sha256, size, filename, content_type, uploaded_by FROM submission_attachments WHERE id = ?
+        UNION ALL
+        SELECT sha256, size, filename, content_type, uploaded_by FROM archived_submission_attachments WHERE id = ?
+    """
+
+
+async def fetch(conn, attachment_id):
+    """``(sha256, size, filename, content_type, uploaded_by)`` of an attachment, archived or not, or None."""
+    return await conn.fetchone(_fetch(conn.dialect), attachment_id, attachment_id)
@@ -0,0 +1,58 @@
+"""Per-internee rollups for the admin dashboard, in one aggregate query."""
+import statements
+
+# Fields of a dashboard row, the column order of fetch rows.  The tasks_*
+# counts are by status, but tasks_overdue counts the unfinished tasks the
+# overdue job flagged; past_deadline counts those whose deadline has passed,
+# whether or not the job has flagged them yet.
+FIELDS = ("internee_id", "name", "email",
+          "tasks_total", "tasks_pending", "tasks_in_progress", "tasks_completed", "tasks_overdue",
+          "past_deadline", "next_deadline", "last_submitted_at",
+          "latest_report_id", "latest_report_period_start", "latest_report_period_end",
+          "latest_report_performance", "latest_report_created_at")
+
+# Each source is grouped once, so the cost does not grow with the number of
+# internees joined to it; ROW_NUMBER keeps only the newest report per internee.
+@statements.catalog
+def _fetch(dialect):
+    """Params: now, now."""
+    return """
+        WITH t AS (
+            SELECT assigned_to,
+                   COUNT(*) AS total,
+                   SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END) AS pending,
+                   SUM(CASE WHEN status = 'in_progress' THEN 1 ELSE 0 END) AS in_progress,
+                   SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) AS completed,
+                   SUM(CASE WHEN status <> 'completed' AND overdue_flagged_at > deadline THEN 1 ELSE 0 END) AS overdue,
+                   SUM(CASE WHEN status <> 'completed' AND deadline < ? THEN 1 ELSE 0 END) AS past_deadline,
+                   MIN(CASE WHEN status <> 'completed' AND deadline >= ? THEN deadline END) AS next_deadline
+            FROM tasks
+            GROUP BY assigned_to
+        ),
+        s AS (
+            SELECT submitted_by, MAX(submitted_at) AS last_submitted_at
+            FROM task_submissions
+            GROUP BY submitted_by
+        ),
+        r AS (
+            SELECT internee_id, id, period_start, period_end, overall_performance, created_at,
+                   ROW_NUMBER() OVER (PARTITION BY internee_id ORDER BY created_at DESC, id DESC) AS rn
+            FROM progress_reports
+        )
+        SELECT u.id, u.name, u.email,
+               COALESCE(t.total, 0), COALESCE(t.pending, 0), COALESCE(t.in_progress, 0),
+               COALESCE(t.completed, 0), COALESCE(t.overdue, 0),
+               COALESCE(t.past_deadline, 0), t.next_deadline, s.last_submitted_at,
+               r.id, r.period_start, r.period_end, r.overall_performance, r.created_at
+        FROM users u
+        LEFT JOIN t ON t.assigned_to = u.id
+        LEFT JOIN s ON s.submitted_by = u.id
+        LEFT JOIN r ON r.internee_id = u.id AND r.rn = 1
+        WHERE u.role = 'internee'
+        ORDER BY u.name
+    """
+
+
+async def fetch(conn, now):
+    """One row per internee in name order, in FIELDS order, with deadlines judged at ``now``."""
+    return await conn.fetchall(_fetch(conn.dialect), now, now)
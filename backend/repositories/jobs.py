@@ -0,0 +1,143 @@
+"""Job rows and schedules for jobs.py (tables of migration 0007_jobs)."""
+import statements
+
+# Fields of a job resource, the column order of get()
+FIELDS = ("id", "kind", "status", "attempts", "max_attempts", "run_at", "payload", "result", "error",
+          "created_by", "created_at", "updated_at", "finished_at")
+# Columns of a claimed job, as returned by claim()
+CLAIMED = ("id", "kind", "payload", "attempts", "max_attempts", "created_by")
+
+
+@statements.catalog
+def _insert(dialect):
+    """Params: kind, payload, max_attempts, run_at, created_by."""
+    if dialect == "mssql":
+        return """
+            INSERT INTO jobs (kind, payload, max_attempts, run_at, created_by)
+            OUTPUT INSERTED.id
+            VALUES (?, ?, ?, ?, ?)
+        """
+    return "INSERT INTO jobs (kind, payload, max_attempts, run_at, created_by) VALUES (?, ?, ?, ?, ?) RETURNING id"
+
+
+async def insert(conn, kind, payload, max_attempts, run_at, created_by=None):
+    """Queue a job and return its id; ``payload`` is JSON text."""
+    row = await conn.fetchone(_insert(conn.dialect), kind, payload, max_attempts, run_at, created_by)
+    return row[0]
+
+
+@statements.catalog
+def _get(dialect):
+    """Params: job_id."""
+    return f"SELECT {', '.join(FIELDS)} FROM jobs WHERE id = ?"
+
+
+async def get(conn, job_id):
+    """A job row in FIELDS order, or None."""
+    return await conn.fetchone(_get(conn.dialect), job_id)
+
+
+@statements.catalog
+def _claim(dialect):
+    """Params: now, lease_until, now on SQL Server; lease_until, now, now on SQLite."""
+    if dialect == "mssql":
+        # READPAST skips rows another worker is claiming instead of waiting on them
+        return """
+            WITH next AS (
+                SELECT TOP (1) * FROM jobs WITH (UPDLOCK, READPAST, ROWLOCK)
+                WHERE status IN ('queued', 'running') AND run_at <= ?
+                ORDER BY run_at, id
+            )
+            UPDATE next SET status = 'running', attempts = attempts + 1, run_at = ?, updated_at = ?
+            OUTPUT INSERTED.id, INSERTED.kind, INSERTED.payload, INSERTED.attempts, INSERTED.max_attempts,
+                   INSERTED.created_by
+        """
+    return """
+        UPDATE jobs SET status = 'running', attempts = attempts + 1, run_at = ?, updated_at = ?
+        WHERE id = (
+            SELECT id FROM jobs
+            WHERE status IN ('queued', 'running') AND run_at <= ?
+            ORDER BY run_at, id LIMIT 1
+        )
+        RETURNING id, kind, payload, attempts, max_attempts, created_by
+    """
+
+
+async def claim(conn, now, lease_until):
+    """Take the earliest due job, in CLAIMED order, or None if there is none.
+
+    Due means queued with ``run_at`` passed, or running with its lease
+    expired.  The job is marked running with one more attempt and a lease
+    until ``lease_until``.  Concurrent claims never take the same job.
+    """
+    if conn.dialect == "mssql":
+        return await conn.fetchone(_claim(conn.dialect), now, lease_until, now)
+    return await conn.fetchone(_claim(conn.dialect), lease_until, now, now)
+
+
+@statements.catalog
+def _finish(dialect):
+    """Params: status, result, error, now, now, job_id, attempt."""
+    return """
+        UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, finished_at = ?
+        WHERE id = ? AND attempts = ? AND status = 'running'
+    """
+
+
+async def finish(conn, job_id, attempt, status, result, error, now):
+    """Record the outcome of ``attempt``; returns 0 if the job has since been claimed again."""
+    return await conn.execute(_finish(conn.dialect), status, result, error, now, now, job_id, attempt)
+
+
+@statements.catalog
+def _retry(dialect):
+    """Params: run_at, error, now, job_id, attempt."""
+    return """
+        UPDATE jobs SET status = 'queued', run_at = ?, error = ?, updated_at = ?
+        WHERE id = ? AND attempts = ? AND status = 'running'
+    """
+
+
+async def retry(conn, job_id, attempt, run_at, error, now):
+    """Queue the job again at ``run_at`` after a failed ``attempt``; returns 0 if it was claimed again."""
+    return await conn.execute(_retry(conn.dialect), run_at, error, now, job_id, attempt)
+
+
+# Schedules
+@statements.catalog
+def _schedule(dialect):
+    """Params: name."""
+    return "SELECT last_run_at, next_run_at FROM job_schedules WHERE name = ?"
+
+
+@statements.catalog
+def _create_schedule(dialect):
+    """Params: name, last_run_at, next_run_at, name."""
+    return """
+        INSERT INTO job_schedules (name, last_run_at, next_run_at)
+        SELECT ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM job_schedules WHERE name = ?)
+    """
+
+
+async def schedule(conn, name, now):
+    """``(last_run_at, next_run_at)`` of a schedule, creating it due at ``now`` if missing."""
+    row = await conn.fetchone(_schedule(conn.dialect), name)
+    if row is not None:
+        return row
+    # Another process may create it first; then its row is the one to use
+    await conn.execute(_create_schedule(conn.dialect), name, now, now, name)
+    return await conn.fetchone(_schedule(conn.dialect), name)
+
+
+@statements.catalog
+def _advance_schedule(dialect):
+    """Params: now, next_run_at, name, last_run_at, now."""
+    return """
+        UPDATE job_schedules SET last_run_at = ?, next_run_at = ?
+        WHERE name = ? AND last_run_at = ? AND next_run_at <= ?
+    """
+
+
+async def advance_schedule(conn, name, last_run_at, now, next_run_at):
+    """Move a due schedule to ``next_run_at``; returns 0 if another process ran it since ``last_run_at``."""
+    return await conn.execute(_advance_schedule(conn.dialect), now, next_run_at, name, last_run_at, now)
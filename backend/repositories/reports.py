@@ -0,0 +1,78 @@
+import statements
+
+# Fields of a report resource, the column order of every report row returned here
+FIELDS = statements.REPORT_FIELDS
+
+# Report rows with internee and author names, in FIELDS order
+_SELECT = """
+    SELECT pr.id, u1.name as internee_name, u2.name as generated_by, 
+           pr.period_start, pr.period_end, pr.tasks_completed, 
+           pr.tasks_pending, pr.overall_performance, pr.comments, pr.created_at AS created_at
+    FROM progress_reports pr
+    JOIN users u1 ON pr.internee_id = u1.id
+    JOIN users u2 ON pr.generated_by = u2.id
+"""
+# The same from the archive (migration 0011_archive), for include_archived; the
+# alias names the column a UNION of the two is ordered by
+_ARCHIVED_SELECT = _SELECT.replace("FROM progress_reports pr", "FROM archived_progress_reports pr")
+
+
+def report_dict(row):
+    return dict(zip(FIELDS, row))
+
+
+async def create(conn, internee_id, generated_by, period_start, period_end, tasks_completed, tasks_pending,
+                 overall_performance, comments):
+    """Insert a report and return it, or None if the internee does not exist."""
+    row = await conn.fetchone(
+        statements.insert_report(conn.dialect),
+        period_start, period_end, tasks_completed, tasks_pending,
+        overall_performance, comments, internee_id, generated_by
+    )
+    return report_dict(row) if row is not None else None
+
+
+@statements.catalog
+def _insert_row(dialect):
+    """Params: internee_id, generated_by, period_start, period_end, tasks_completed,
+    tasks_pending, overall_performance, comments; for executemany."""
+    return """
+        INSERT INTO progress_reports (internee_id, generated_by, period_start, period_end,
+                                      tasks_completed, tasks_pending, overall_performance, comments)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+
+async def insert_many(conn, rows):
+    """Insert ``(internee_id, generated_by, period_start, period_end, tasks_completed,
+    tasks_pending, overall_performance, comments)`` rows with one executemany."""
+    await conn.executemany(_insert_row(conn.dialect), rows)
+
+
+@statements.catalog
+def _list(dialect, scope, tables):
+    """Params: internee_id once per table with scope ``internee``, none with ``all``."""
+    selects = (_SELECT, _ARCHIVED_SELECT)[:len(tables)]
+    if scope == "internee":
+        selects = [sql + " WHERE pr.internee_id = ?" for sql in selects]
+    if len(tables) == 1:
+        return selects[0] + " ORDER BY pr.created_at DESC"
+    return " UNION ALL ".join(selects) + " ORDER BY created_at DESC"
+
+
+def _query(dialect, internee_id, include_archived=False):
+    tables = ("progress_reports", "archived_progress_reports") if include_archived else ("progress_reports",)
+    if internee_id is None:
+        return _list(dialect, "all", tables), []
+    return _list(dialect, "internee", tables), [internee_id] * len(tables)
+
+
+async def fetch_all(conn, internee_id=None, include_archived=False):
+    """Report rows newest first; only the internee's own if ``internee_id`` is given."""
+    sql, params = _query(conn.dialect, internee_id, include_archived)
+    return await conn.fetchall(sql, *params)
+
+
+def export_query(dialect, internee_id=None, include_archived=False):
+    """``(sql, params)`` streaming the reports, for exports.export_response."""
+    return _query(dialect, internee_id, include_archived)
@@ -0,0 +1,158 @@
+import statements
+
+# Fields of a search hit, the column order of the rows returned here.  A
+# submission hit carries the title and status of its task.
+FIELDS = ("type", "id", "task_id", "title", "status", "score")
+
+
+@statements.catalog
+def _fulltext_indexes(dialect):
+    if dialect == "mssql":
+        return """
+            SELECT COUNT(*) FROM sys.fulltext_indexes
+            WHERE object_id IN (OBJECT_ID('tasks'), OBJECT_ID('task_submissions')) AND is_enabled = 1
+        """
+    return "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ('tasks_fts', 'task_submissions_fts')"
+
+
+async def fulltext_available(conn):
+    """Whether the database has the full-text indexes of migration 0005_search."""
+    row = await conn.fetchone(_fulltext_indexes(conn.dialect))
+    return row[0] == 2
+
+
+def match_expression(dialect, terms, prefix):
+    """Full-text query matching every term, the last one as a prefix if ``prefix``.
+
+    Terms come from search.tokenize, so they are word characters only and
+    need no escaping.
+    """
+    if dialect == "mssql":
+        quoted = [f'"{term}"' for term in terms]
+        if prefix:
+            quoted[-1] = f'"{terms[-1]}*"'
+        return " AND ".join(quoted)
+    quoted = [f'"{term}"' for term in terms]
+    if prefix:
+        quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+@statements.catalog
+def _fulltext(dialect, scope):
+    """Params: match, internee_id with scope ``internee``, match, internee_id again, then
+    offset, limit on SQL Server and limit, offset on SQLite."""
+    task_scope = submission_scope = ""
+    if scope == "internee":
+        task_scope, submission_scope = " AND t.assigned_to = ?", " AND ts.submitted_by = ?"
+    if dialect == "mssql":
+        return f"""
+            SELECT type, id, task_id, title, status, score FROM (
+                SELECT 'task' AS type, t.id, t.id AS task_id, t.title, t.status, CAST(k.RANK AS FLOAT) AS score
+                FROM CONTAINSTABLE(tasks, (title, description), ?) k
+                JOIN tasks t ON t.id = k.[KEY]
+                WHERE 1 = 1{task_scope}
+                UNION ALL
+                SELECT 'submission', ts.id, ts.task_id, t.title, t.status, CAST(k.RANK AS FLOAT)
+                FROM CONTAINSTABLE(task_submissions, description, ?) k
+                JOIN task_submissions ts ON ts.id = k.[KEY]
+                JOIN tasks t ON t.id = ts.task_id
+                WHERE 1 = 1{submission_scope}
+            ) hits
+            ORDER BY score DESC, type DESC, id DESC
+            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+        """
+    # bm25() is lower for better matches; title matches weigh double
+    return f"""
+        SELECT type, id, task_id, title, status, score FROM (
+            SELECT 'task' AS type, t.id, t.id AS task_id, t.title, t.status,
+                   -bm25(tasks_fts, 2.0, 1.0) AS score
+            FROM tasks_fts
+            JOIN tasks t ON t.id = tasks_fts.rowid
+            WHERE tasks_fts MATCH ?{task_scope}
+            UNION ALL
+            SELECT 'submission', ts.id, ts.task_id, t.title, t.status, -bm25(task_submissions_fts)
+            FROM task_submissions_fts
+            JOIN task_submissions ts ON ts.id = task_submissions_fts.rowid
+            JOIN tasks t ON t.id = ts.task_id
+            WHERE task_submissions_fts MATCH ?{submission_scope}
+        )
+        ORDER BY score DESC, type DESC, id DESC
+        LIMIT ? OFFSET ?
+    """
+
+
+async def fulltext(conn, match, internee_id, limit, offset):
+    """Hits for a match expression, best first; only the internee's own if ``internee_id`` is given."""
+    scope_params = [] if internee_id is None else [internee_id]
+    page = [offset, limit] if conn.dialect == "mssql" else [limit, offset]
+    sql = _fulltext(conn.dialect, "all" if internee_id is None else "internee")
+    return await conn.fetchall(sql, match, *scope_params, match, *scope_params, *page)
+
+
+@statements.catalog
+def _all(dialect, kind):
+    return {
+        "tasks": "SELECT id, title, description, assigned_to FROM tasks ORDER BY id",
+        "submissions": "SELECT id, task_id, description, submitted_by FROM task_submissions ORDER BY id",
+    }[kind]
+
+
+def iterate_tasks(conn, batch_size=5000):
+    """Batches of ``(id, title, description, assigned_to)`` for every task in id order, to build an index."""
+    return conn.iterate(_all(conn.dialect, "tasks"), batch_size=batch_size)
+
+
+def iterate_submissions(conn, batch_size=5000):
+    """Batches of ``(id, task_id, description, submitted_by)`` for every submission in id order."""
+    return conn.iterate(_all(conn.dialect, "submissions"), batch_size=batch_size)
+
+
+@statements.catalog
+def _by_id(dialect, kind, scope, size):
+    """Params: ``size`` ids, then internee_id with scope ``internee``."""
+    sql, owner = {
+        # Documents to index
+        "tasks": ("SELECT id, title, description, assigned_to FROM tasks t WHERE t.id IN ({ids})", None),
+        "submissions": (
+            "SELECT id, task_id, description, submitted_by FROM task_submissions ts WHERE ts.id IN ({ids})", None
+        ),
+        # Current rows of ranked hits
+        "task_hits": ("SELECT t.id, t.title, t.status FROM tasks t WHERE t.id IN ({ids})", "t.assigned_to"),
+        "submission_hits": ("""
+            SELECT ts.id, ts.task_id, t.title, t.status
+            FROM task_submissions ts JOIN tasks t ON t.id = ts.task_id
+            WHERE ts.id IN ({ids})""", "ts.submitted_by"),
+    }[kind]
+    sql = sql.format(ids=statements.placeholders(size))
+    if scope == "internee":
+        sql += f" AND {owner} = ?"
+    return sql
+
+
+async def _by_ids(conn, kind, ids, internee_id=None):
+    scope, params = ("all", []) if internee_id is None else ("internee", [internee_id])
+    rows = []
+    for chunk in statements.in_lists(ids):
+        rows.extend(await conn.fetchall(_by_id(conn.dialect, kind, scope, len(chunk)), *chunk, *params))
+    return rows
+
+
+async def tasks_by_id(conn, ids):
+    """``(id, title, description, assigned_to)`` of the tasks among ``ids`` that still exist."""
+    return await _by_ids(conn, "tasks", ids)
+
+
+async def submissions_by_id(conn, ids):
+    """``(id, task_id, description, submitted_by)`` of the submissions among ``ids`` that still exist."""
+    return await _by_ids(conn, "submissions", ids)
+
+
+async def hit_rows(conn, task_ids, submission_ids, internee_id):
+    """Current ``{(type, id): (task_id, title, status)}`` for ranked ids, re-checking visibility."""
+    found = {}
+    for row in await _by_ids(conn, "task_hits", task_ids, internee_id):
+        found[("task", row[0])] = (row[0], row[1], row[2])
+    for row in await _by_ids(conn, "submission_hits", submission_ids, internee_id):
+        found[("submission", row[0])] = (row[1], row[2], row[3])
+    return found
@@ -0,0 +1,70 @@
+import statements
+
+# Fields of a listed submission, the column order of fetch_for_task rows
+FIELDS = statements.SUBMISSION_FIELDS + ("submitted_by",)
+# Columns of the submission export
+EXPORT_COLUMNS = ["id", "task_id", "description", "attachment_url", "submitted_at", "submitted_by"]
+
+
+async def create(conn, task_id, submitted_by, description, attachment_url):
+    """Record a submission, only if the task is assigned to ``submitted_by``; returns it or None."""
+    row = await conn.fetchone(
+        statements.insert_submission(conn.dialect),
+        submitted_by, description, attachment_url, task_id, submitted_by
+    )
+    return dict(zip(statements.SUBMISSION_FIELDS, row)) if row is not None else None
+
+
+# Columns of a listed submission, and of an exported one (EXPORT_COLUMNS)
+_COLUMNS = {
+    "list": "ts.id, ts.description, ts.attachment_url, ts.submitted_at AS submitted_at, u.name",
+    "export": "ts.id, ts.task_id, ts.description, ts.attachment_url, ts.submitted_at AS submitted_at, u.name",
+}
+
+
+@statements.catalog
+def _list(dialect, columns, scope, tables):
+    """Params: task_id, and submitted_by with scope ``internee``, once per table."""
+    selects = []
+    for table in tables:
+        sql = f"""
+            SELECT {_COLUMNS[columns]}
+            FROM {table} ts
+            JOIN users u ON ts.submitted_by = u.id
+            WHERE ts.task_id = ?
+        """
+        if scope == "internee":
+            sql += " AND ts.submitted_by = ?"
+        selects.append(sql)
+    if len(tables) == 1:
+        return selects[0] + " ORDER BY ts.submitted_at DESC"
+    # A task's submissions are archived with it, so only one side has any
+    return " UNION ALL ".join(selects) + " ORDER BY submitted_at DESC"
+
+
+def _query(dialect, columns, task_id, submitted_by, include_archived=False):
+    tables = ("task_submissions", "archived_task_submissions") if include_archived else ("task_submissions",)
+    if submitted_by is None:
+        return _list(dialect, columns, "all", tables), [task_id] * len(tables)
+    return _list(dialect, columns, "internee", tables), [task_id, submitted_by] * len(tables)
+
+
+async def fetch_for_task(conn, task_id, submitted_by=None, include_archived=False):
+    """Submission rows of a task, newest first; only those by ``submitted_by`` if given."""
+    sql, params = _query(conn.dialect, "list", task_id, submitted_by, include_archived)
+    return await conn.fetchall(sql, *params)
+
+
+def export_query(dialect, task_id, submitted_by=None, include_archived=False):
+    """``(sql, params)`` streaming a task's submissions, for exports.export_response."""
+    return _query(dialect, "export", task_id, submitted_by, include_archived)
+
+
+@statements.catalog
+def _set_attachment_url(dialect):
+    """Params: attachment_url, submission_id."""
+    return "UPDATE task_submissions SET attachment_url = ? WHERE id = ?"
+
+
+async def set_attachment_url(conn, submission_id, attachment_url):
+    await conn.execute(_set_attachment_url(conn.dialect), attachment_url, submission_id)
@@ -0,0 +1,165 @@
+"""Rows changed since a version, and tombstones, for GET /sync/ (migration 0009_sync).
+
+Tasks, submissions and reports carry a ``version`` that every insert and
+update moves past every earlier one.  Deletes, and tasks reassigned away
+from an internee, leave a row in ``sync_tombstones`` with a version of its
+own.  Each function here returns the rows after ``since`` in version order,
+only the internee's own with ``owner_id``, at most ``limit`` of them.
+"""
+import statements
+
+# Fields of a changed task, submission or report: the resource's own fields and its version
+TASK_FIELDS = ("id", "title", "description", "status", "deadline", "created_by",
+               "assigned_to", "assigned_to_id", "created_at", "updated_at", "version")
+SUBMISSION_FIELDS = ("id", "task_id", "description", "attachment_url", "submitted_at",
+                     "submitted_by", "submitted_by_id", "version")
+REPORT_FIELDS = ("id", "internee_name", "internee_id", "generated_by", "period_start", "period_end",
+                 "tasks_completed", "tasks_pending", "overall_performance", "comments", "created_at", "version")
+TOMBSTONE_FIELDS = ("type", "id", "version")
+
+
+def _version(dialect, column):
+    # rowversion is binary(8) on SQL Server
+    return f"CAST({column} AS BIGINT)" if dialect == "mssql" else column
+
+
+def _after(dialect, column):
+    """Condition for versions after the one parameter."""
+    if dialect == "mssql":
+        # Cast the parameter rather than the column so the index is used, and
+        # stop below the oldest open transaction's version: it may still commit
+        return f"{column} > CAST(CAST(? AS BIGINT) AS BINARY(8)) AND {column} < MIN_ACTIVE_ROWVERSION()"
+    return f"{column} > ?"
+
+
+# Kind -> (SELECT of its changed rows, version column, owner column)
+_CHANGES = {
+    "tasks": ("""
+        SELECT t.id, t.title, t.description, t.status, t.deadline,
+               u1.name, u2.name, t.assigned_to, t.created_at, t.updated_at, {version}
+        FROM tasks t
+        JOIN users u1 ON t.created_by = u1.id
+        JOIN users u2 ON t.assigned_to = u2.id
+    """, "t.version", "t.assigned_to"),
+    "submissions": ("""
+        SELECT ts.id, ts.task_id, ts.description, ts.attachment_url, ts.submitted_at,
+               u.name, ts.submitted_by, {version}
+        FROM task_submissions ts
+        JOIN users u ON ts.submitted_by = u.id
+    """, "ts.version", "ts.submitted_by"),
+    "reports": ("""
+        SELECT pr.id, u1.name, pr.internee_id, u2.name, pr.period_start, pr.period_end,
+               pr.tasks_completed, pr.tasks_pending, pr.overall_performance, pr.comments,
+               pr.created_at, {version}
+        FROM progress_reports pr
+        JOIN users u1 ON pr.internee_id = u1.id
+        JOIN users u2 ON pr.generated_by = u2.id
+    """, "pr.version", "pr.internee_id"),
+    "tombstones": ("SELECT entity, entity_id, {version} FROM sync_tombstones", "version", "owner_id"),
+}
+
+
+@statements.catalog
+def _changes(dialect, kind, scope):
+    """Params: since, then owner_id with scope ``owner``, limit."""
+    select, column, owner_column = _CHANGES[kind]
+    where = [_after(dialect, column)]
+    if scope == "owner":
+        where.append(f"{owner_column} = ?")
+    elif kind == "tombstones":
+        where.append("reason = 'deleted'")
+    return f"""
+        {select.format(version=_version(dialect, column))}
+        WHERE {' AND '.join(where)}
+        ORDER BY {column}
+        {statements.limit_clause(dialect)}
+    """
+
+
+async def _changed(conn, kind, since, owner_id, limit):
+    if owner_id is None:
+        return await conn.fetchall(_changes(conn.dialect, kind, "all"), since, limit)
+    return await conn.fetchall(_changes(conn.dialect, kind, "owner"), since, owner_id, limit)
+
+
+async def changed_tasks(conn, since, owner_id=None, limit=1000):
+    return await _changed(conn, "tasks", since, owner_id, limit)
+
+
+async def changed_submissions(conn, since, owner_id=None, limit=1000):
+    return await _changed(conn, "submissions", since, owner_id, limit)
+
+
+async def changed_reports(conn, since, owner_id=None, limit=1000):
+    return await _changed(conn, "reports", since, owner_id, limit)
+
+
+async def tombstones(conn, since, owner_id=None, limit=1000):
+    """``(type, id, version)`` of rows gone since ``since``.
+
+    Admins see deletions only; an internee also sees the tasks reassigned to
+    someone else.
+    """
+    return await _changed(conn, "tombstones", since, owner_id, limit)
+
+
+@statements.catalog
+def _version_bounds(dialect):
+    # @@DBTS is the last rowversion the database handed out
+    current = "CAST(@@DBTS AS BIGINT)" if dialect == "mssql" else "version"
+    return f"SELECT compacted_version, {current} FROM sync_state WHERE id = 1"
+
+
+async def version_bounds(conn):
+    """``(compacted_version, current_version)``: the versions a client may sync from lie between them."""
+    row = await conn.fetchone(_version_bounds(conn.dialect))
+    return (row[0], row[1]) if row else (0, 0)
+
+
+@statements.catalog
+def _compacted_version(dialect):
+    return "SELECT compacted_version FROM sync_state WHERE id = 1"
+
+
+async def compacted_version(conn):
+    """Newest version whose tombstones compaction has removed; older versions cannot sync."""
+    row = await conn.fetchone(_compacted_version(conn.dialect))
+    return row[0] if row else 0
+
+
+@statements.catalog
+def _newest_expired(dialect):
+    """Params: retention_seconds, as an int on SQL Server and as a '-N seconds' modifier on SQLite."""
+    cutoff = "DATEADD(SECOND, -?, SYSDATETIME())" if dialect == "mssql" else "datetime('now', ?)"
+    return f"SELECT MAX({_version(dialect, 'version')}) FROM sync_tombstones WHERE deleted_at < {cutoff}"
+
+
+@statements.catalog
+def _delete_tombstones(dialect):
+    """Params: version."""
+    version = "CAST(CAST(? AS BIGINT) AS BINARY(8))" if dialect == "mssql" else "?"
+    return f"DELETE FROM sync_tombstones WHERE version <= {version}"
+
+
+@statements.catalog
+def _set_compacted_version(dialect):
+    """Params: version, version."""
+    return "UPDATE sync_state SET compacted_version = ? WHERE id = 1 AND compacted_version < ?"
+
+
+async def compact(conn, retention_seconds):
+    """Remove the tombstones older than ``retention_seconds``; returns ``(removed, compacted_version)``.
+
+    The cutoff is taken on the database clock, which stamped ``deleted_at``.
+    """
+    retention = int(retention_seconds)
+    row = await conn.fetchone(
+        _newest_expired(conn.dialect), retention if conn.dialect == "mssql" else f"-{retention} seconds"
+    )
+    newest = row[0] if row else None
+    if newest is None:
+        return 0, await compacted_version(conn)
+    # By version rather than by time, so what remains is exactly the tombstones after it
+    removed = await conn.execute(_delete_tombstones(conn.dialect), newest)
+    await conn.execute(_set_compacted_version(conn.dialect), newest, newest)
+    return removed, newest
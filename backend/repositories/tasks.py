@@ -0,0 +1,305 @@
+from datetime import datetime
+
+import statements
+from pagination import like_pattern
+from statements import placeholders
+
+# Fields of a task resource, the column order of every task row returned here
+FIELDS = statements.TASK_FIELDS
+
+MAX_BATCH_SIZE = 1000
+UPDATABLE_FIELDS = statements.UPDATABLE_TASK_FIELDS
+
+# Task rows with creator and assignee names, in FIELDS order
+_SELECT = """
+    SELECT t.id AS id, t.title, t.description, t.status, t.deadline, 
+           u1.name as created_by, u2.name as assigned_to, t.assigned_to as assigned_to_id,
+           t.created_at AS created_at, t.updated_at
+    FROM tasks t
+    JOIN users u1 ON t.created_by = u1.id
+    JOIN users u2 ON t.assigned_to = u2.id
+"""
+# The same from the archive (migration 0011_archive), for include_archived; the
+# aliases name the columns a UNION of the two is ordered by
+_ARCHIVED_SELECT = _SELECT.replace("FROM tasks t", "FROM archived_tasks t")
+
+
+def task_dict(row):
+    # Task resource as returned by the write routes
+    return dict(zip(FIELDS, row))
+
+
+# Conditions of the task list and export, by the name filters() gives them
+_CONDITIONS = {
+    "assigned_to": "t.assigned_to = ?",
+    "status": "t.status = ?",
+    "deadline_from": "t.deadline >= ?",
+    "deadline_to": "t.deadline < ?",
+    "q": "t.title LIKE ? ESCAPE '\\'",
+    # Keyset pagination after (created_at, id)
+    "after": "(t.created_at < ? OR (t.created_at = ? AND t.id < ?))",
+}
+
+
+def filters(user, task_status=None, assigned_to=None, deadline_from=None, deadline_to=None, q=None):
+    """Names of the _CONDITIONS and their parameters, shared by the task list and export."""
+    where = []
+    params = []
+    if user[1] != 'admin':
+        # Internee can only see their own tasks
+        where.append("assigned_to")
+        params.append(user[0])
+    elif assigned_to is not None:
+        where.append("assigned_to")
+        params.append(assigned_to)
+    if task_status is not None:
+        where.append("status")
+        params.append(task_status)
+    if deadline_from is not None:
+        where.append("deadline_from")
+        params.append(deadline_from)
+    if deadline_to is not None:
+        where.append("deadline_to")
+        params.append(deadline_to)
+    if q:
+        where.append("q")
+        params.append(like_pattern(q))
+    return tuple(where), params
+
+
+def _list(where, archived):
+    """Tasks matching the ``where`` conditions, newest first, with the archive if ``archived``."""
+    conditions = "WHERE " + " AND ".join(_CONDITIONS[name] for name in where) if where else ""
+    if not archived:
+        return f"""
+            {_SELECT}
+            {conditions}
+            ORDER BY t.created_at DESC, t.id DESC
+        """
+    # Both sides are read in index order and merged
+    return f"""
+        {_SELECT}
+        {conditions}
+        UNION ALL
+        {_ARCHIVED_SELECT}
+        {conditions}
+        ORDER BY created_at DESC, id DESC
+    """
+
+
+@statements.catalog
+def _fetch_page(dialect, where, tables):
+    """Params: the ``where`` conditions' (once per table), limit."""
+    return _list(where, len(tables) > 1) + statements.limit_clause(dialect)
+
+
+@statements.catalog
+def _export(dialect, where, tables):
+    """Params: the ``where`` conditions' (once per table)."""
+    return _list(where, len(tables) > 1)
+
+
+def _tables(include_archived):
+    return ("tasks", "archived_tasks") if include_archived else ("tasks",)
+
+
+async def fetch_page(conn, where, params, limit, after=None, include_archived=False):
+    """Rows of up to ``limit`` tasks newest first, keyset-paginated after ``(created_at, id)``.
+
+    ``where`` and ``params`` come from filters().  Archived tasks are
+    included only with ``include_archived``.
+    """
+    if after is not None:
+        where = (*where, "after")
+        params = [*params, after[0], after[0], after[1]]
+    tables = _tables(include_archived)
+    return await conn.fetchall(
+        _fetch_page(conn.dialect, tuple(where), tables), *params * len(tables), limit
+    )
+
+
+def export_query(dialect, where, params, include_archived=False):
+    """``(sql, params)`` streaming every matching task, for exports.export_response."""
+    tables = _tables(include_archived)
+    return _export(dialect, tuple(where), tables), [*params] * len(tables)
+
+
+async def create(conn, title, description, deadline, assigned_to, created_by):
+    """Insert a task and return it, or None if either user does not exist."""
+    row = await conn.fetchone(
+        statements.insert_task(conn.dialect),
+        title, description, deadline, assigned_to, created_by
+    )
+    return task_dict(row) if row is not None else None
+
+
+@statements.catalog
+def _assignee(dialect, table):
+    """Params: task_id."""
+    return f"SELECT assigned_to FROM {table} WHERE id = ?"
+
+
+async def assignee(conn, task_id, include_archived=False):
+    """Id of the internee the task is assigned to, or None if there is no such task."""
+    row = await conn.fetchone(_assignee(conn.dialect, "tasks"), task_id)
+    if row is None and include_archived:
+        row = await conn.fetchone(_assignee(conn.dialect, "archived_tasks"), task_id)
+    return row[0] if row else None
+
+
+@statements.catalog
+def _values(dialect):
+    """Params: task_id."""
+    return f"SELECT {', '.join(UPDATABLE_FIELDS)} FROM tasks WHERE id = ?"
+
+
+async def values(conn, task_id):
+    """The task's UPDATABLE_FIELDS as a dict, or None if there is no such task."""
+    row = await conn.fetchone(_values(conn.dialect), task_id)
+    return dict(zip(UPDATABLE_FIELDS, row)) if row else None
+
+
+def field_values(task):
+    """UPDATABLE_FIELDS of a task resource, as values() returns them."""
+    return {field: task["assigned_to_id" if field == "assigned_to" else field] for field in UPDATABLE_FIELDS}
+
+
+async def update(conn, task_id, fields, owner_id=None):
+    """Set ``fields`` on a task and return it.
+
+    With ``owner_id`` only a task assigned to that user is touched.  Returns
+    None if the task is missing, not owned, or the new assignee is unknown.
+    """
+    shape = statements.task_update_shape(fields)
+    row = await conn.fetchone(
+        statements.update_task(conn.dialect, shape),
+        *[fields.get(column) for column in shape], datetime.now(), task_id, owner_id
+    )
+    return task_dict(row) if row is not None else None
+
+
+async def delete(conn, task_id):
+    """Delete a task; returns its UPDATABLE_FIELDS as they were, or None if it did not exist."""
+    row = await conn.fetchone(statements.delete_task(conn.dialect), task_id)
+    return dict(zip(UPDATABLE_FIELDS, row)) if row else None
+
+
+# Batches
+@statements.catalog
+def _values_many(dialect, size):
+    """Params: ``size`` task ids."""
+    return f"SELECT id, {', '.join(UPDATABLE_FIELDS)} FROM tasks WHERE id IN ({placeholders(size)})"
+
+
+async def values_many(conn, task_ids):
+    """Map task id -> values() for the given ids, in one query per statements.IN_LIST_SIZES list."""
+    found = {}
+    for ids in statements.in_lists(set(task_ids)):
+        for task_id, *row in await conn.fetchall(_values_many(conn.dialect, len(ids)), *ids):
+            found[task_id] = dict(zip(UPDATABLE_FIELDS, row))
+    return found
+
+
+@statements.catalog
+def _create_batch_table(dialect):
+    return (
+        "CREATE TABLE #task_batch (idx INT PRIMARY KEY, title NVARCHAR(4000), description NVARCHAR(MAX), "
+        "created_by INT, assigned_to INT, deadline DATETIME2)"
+    )
+
+
+@statements.catalog
+def _insert_batch_row(dialect):
+    """Params: idx, title, description, created_by, assigned_to, deadline; for executemany."""
+    if dialect == "mssql":
+        return "INSERT INTO #task_batch VALUES (?, ?, ?, ?, ?, ?)"
+    return "INSERT INTO tasks (title, description, created_by, assigned_to, deadline) VALUES (?, ?, ?, ?, ?)"
+
+
+@statements.catalog
+def _merge_batch(dialect):
+    """Moves #task_batch into tasks; returns ``(idx, id)`` of each row."""
+    # OUTPUT needs INTO because tasks has triggers (sql/mssql/0003_report_stats.sql)
+    return """
+        SET NOCOUNT ON;
+        DECLARE @ids TABLE (idx INT, id INT);
+        MERGE INTO tasks USING #task_batch AS src ON 1 = 0
+        WHEN NOT MATCHED THEN
+            INSERT (title, description, created_by, assigned_to, deadline)
+            VALUES (src.title, src.description, src.created_by, src.assigned_to, src.deadline)
+        OUTPUT src.idx, INSERTED.id INTO @ids;
+        SELECT idx, id FROM @ids;
+    """
+
+
+@statements.catalog
+def _drop_batch_table(dialect):
+    return "DROP TABLE #task_batch"
+
+
+@statements.catalog
+def _last_insert_id(dialect):
+    return "SELECT last_insert_rowid()"
+
+
+async def insert_many(conn, rows):
+    """Insert ``(idx, title, description, created_by, assigned_to, deadline)`` rows.
+
+    Returns ``{idx: new task id}``.  On SQL Server the rows are bulk-loaded into
+    a temp table and moved with one MERGE, whose OUTPUT clause can refer to the
+    source index; on SQLite they go in with one executemany.  Either way the
+    statements are the same whatever the number of rows.
+    """
+    if not rows:
+        return {}
+    if conn.dialect == "mssql":
+        await conn.execute(_create_batch_table(conn.dialect))
+        await conn.executemany(_insert_batch_row(conn.dialect), rows)
+        ids = await conn.fetchall(_merge_batch(conn.dialect))
+        await conn.execute(_drop_batch_table(conn.dialect))
+        return {row[0]: row[1] for row in ids}
+
+    await conn.executemany(_insert_batch_row(conn.dialect), [values for _, *values in rows])
+    # The first insert took the write lock, so no other connection inserted
+    # in between: the rows got consecutive ids, in order, up to the last one
+    last = (await conn.fetchone(_last_insert_id(conn.dialect)))[0]
+    return {row[0]: last - len(rows) + 1 + i for i, row in enumerate(rows)}
+
+
+async def flag_overdue(conn, now, limit=MAX_BATCH_SIZE):
+    """Flag up to ``limit`` open tasks past their deadline overdue in one statement.
+
+    Returns ``(id, assigned_to)`` of the tasks flagged; fewer than ``limit``
+    means none are left.
+    """
+    return await conn.fetchall(statements.flag_overdue(conn.dialect), limit, now, now)
+
+
+@statements.catalog
+def _due_between(dialect):
+    """Params: start, end."""
+    return """
+        SELECT id, title, deadline, assigned_to FROM tasks
+        WHERE deadline >= ? AND deadline < ? AND status IN ('pending', 'in_progress')
+    """
+
+
+async def due_between(conn, start, end):
+    """``(id, title, deadline, assigned_to)`` of open tasks due in ``[start, end)``."""
+    return await conn.fetchall(_due_between(conn.dialect), start, end)
+
+
+async def update_many(conn, items):
+    """Apply ``(task_id, {field: value})`` updates with one executemany per statement shape.
+
+    The shapes are those of statements.TASK_UPDATE_SHAPES, so a batch runs at
+    most three statements, whichever fields it sets.
+    """
+    now = datetime.now()
+    shapes = {}
+    for task_id, fields in items:
+        shape = statements.task_update_shape(fields)
+        shapes.setdefault(shape, []).append([fields.get(column) for column in shape] + [now, task_id])
+
+    for shape, params in shapes.items():
+        await conn.executemany(statements.update_task_values(conn.dialect, shape), params)
@@ -0,0 +1,58 @@
+import statements
+from statements import placeholders
+
+# Fields of a listed internee, the column order of fetch_internees rows
+INTERNEE_FIELDS = ("id", "email", "name")
+
+
+@statements.catalog
+def _registered(dialect):
+    """Params: firebase_id."""
+    return "SELECT 'UPDATE', id, email, name, role FROM users WHERE firebase_id = ?"
+
+
+async def upsert(conn, firebase_id, email, name, role):
+    """Register ``firebase_id`` unless it already exists.
+
+    Returns ``(action, id, email, name, role)`` with action ``INSERT`` for a
+    new user and ``UPDATE`` for an existing one.
+    """
+    row = await conn.fetchone(statements.upsert_user(conn.dialect), firebase_id, email, name, role)
+    if row is None:
+        # SQLite returns nothing for an existing user
+        row = await conn.fetchone(_registered(conn.dialect), firebase_id)
+    return row
+
+
+@statements.catalog
+def _identity(dialect):
+    """Params: firebase_id."""
+    return "SELECT id, role, email, name FROM users WHERE firebase_id = ?"
+
+
+async def fetch_identity(conn, firebase_id):
+    """``(id, role, email, name)`` of the user with ``firebase_id``, or None."""
+    return await conn.fetchone(_identity(conn.dialect), firebase_id)
+
+
+@statements.catalog
+def _internees(dialect):
+    return "SELECT id, email, name FROM users WHERE role = 'internee' ORDER BY name"
+
+
+async def fetch_internees(conn):
+    return await conn.fetchall(_internees(conn.dialect))
+
+
+@statements.catalog
+def _existing_ids(dialect, size):
+    """Params: ``size`` user ids."""
+    return f"SELECT id FROM users WHERE id IN ({placeholders(size)})"
+
+
+async def existing_ids(conn, ids):
+    """Subset of ``ids`` that are users, in one query per statements.IN_LIST_SIZES list."""
+    found = set()
+    for chunk in statements.in_lists(set(ids)):
+        found.update(row[0] for row in await conn.fetchall(_existing_ids(conn.dialect, len(chunk)), *chunk))
+    return found
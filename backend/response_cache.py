@@ -0,0 +1,203 @@
+"""Per-user response cache for the polled list endpoints, validated by table versions.
+
+Write routes bump the version of every table they change.  A cached GET is
+keyed by the caller's uid and URL and tagged with the versions of the tables it
+reads, so an unchanged poll is answered with a 304 (or the stored body) before
+any route dependency runs, without checking a connection out of the pool.
+
+Internees only see their own tasks and reports, so a write that names the
+internees it touches bumps their scope of each table (``tasks@7``) and the
+admins' (``tasks@all``) rather than the table: the other internees' polls
+stay cached.  A caller's entries are tagged with the table versions and those
+of its scope, and a write that names nobody bumps the table for everyone.
+
+Routes whose responses also depend on the clock (the dashboard counts tasks
+past their deadline at the time of the request) have a TTL as well: the
+current TTL period is appended to their versions, so entries and ETags expire
+with it even when nothing is written.
+
+Versions live in process memory by default.  When several workers serve the
+app they must share them (``RESPONSE_CACHE_BACKEND=redis``), otherwise a write
+handled by one worker would not invalidate the others.
+"""
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+
+from starlette.responses import Response
+
+from settings import settings
+
+# Path -> tables whose contents appear in the response
+CACHED_ROUTES = {
+    "/tasks/": ("tasks", "users"),
+    "/reports/": ("reports", "users"),
+    "/users/internees/": ("users",),
+    "/dashboard/": ("tasks", "users", "reports"),
+}
+# Path -> seconds a response stays valid without a write; at most that stale
+ROUTE_TTLS = {
+    "/dashboard/": settings.dashboard_cache_ttl,
+}
+# Scope of the versions an admin's entries are tagged with
+ADMIN_SCOPE = "all"
+
+
+# Version stores
+class MemoryVersionStore:
+    def __init__(self):
+        # Counters restart at zero, so ETags from an earlier process must not match
+        self.epoch = uuid.uuid4().hex
+        self._versions = {}
+
+    async def get(self, tables):
+        return tuple(self._versions.get(table, 0) for table in tables)
+
+    async def bump(self, tables):
+        for table in tables:
+            self._versions[table] = self._versions.get(table, 0) + 1
+
+
+class RedisVersionStore:
+    """Counters shared by every worker, kept with INCR."""
+
+    def __init__(self, url, prefix="version:"):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self.prefix = prefix
+        self.epoch = "redis"
+
+    async def get(self, tables):
+        values = await self._redis.mget([self.prefix + table for table in tables])
+        return tuple(int(value or 0) for value in values)
+
+    async def bump(self, tables):
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for table in tables:
+                pipe.incr(self.prefix + table)
+            await pipe.execute()
+
+
+class ResponseCache:
+    """LRU of response bodies bounded by their total size in bytes."""
+
+    def __init__(self, versions, max_bytes=32 * 1024 * 1024, routes=CACHED_ROUTES, ttls=ROUTE_TTLS, clock=time.time):
+        self.versions = versions
+        self.max_bytes = max_bytes
+        self.routes = routes
+        self.ttls = ttls
+        self.clock = clock
+        self._entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.not_modified = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cacheable(self, request):
+        return request.method == "GET" and request.url.path in self.routes
+
+    async def bump(self, *tables, users=None):
+        """Invalidate ``tables`` for the internee ids in ``users`` and the admins, or for everyone."""
+        if users is None:
+            await self.versions.bump(tables)
+            return
+        scopes = [ADMIN_SCOPE, *set(users)]
+        await self.versions.bump([f"{table}@{scope}" for table in tables for scope in scopes])
+
+    async def scoped(self, tables, scope=ADMIN_SCOPE):
+        """Versions of ``tables`` as seen by ``scope``; every scoped bump changes the admins'."""
+        return await self.versions.get((*tables, *(f"{table}@{scope}" for table in tables)))
+
+    async def current(self, path, scope=ADMIN_SCOPE):
+        """Versions of the tables ``path`` reads, and its TTL period if it has one."""
+        versions = await self.scoped(self.routes[path], scope)
+        ttl = self.ttls.get(path)
+        if ttl:
+            versions += (int(self.clock() // ttl),)
+        return versions
+
+    def _etag(self, key, versions):
+        raw = f"{self.versions.epoch}|{key}|{versions}".encode()
+        return f'"{hashlib.sha256(raw).hexdigest()[:32]}"'
+
+    async def handle(self, request, call_next, uid, scope=ADMIN_SCOPE):
+        """Serve ``request`` for ``uid`` from the cache, or run it and store a 200 response.
+
+        ``scope`` is ``ADMIN_SCOPE`` for an admin and the user id for an internee.
+        """
+        key = f"{uid}|{request.url.path}?{request.url.query}"
+        versions = await self.current(request.url.path, scope)
+        etag = self._etag(key, versions)
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        if etag in _parse_if_none_match(request.headers.get("if-none-match")):
+            self.not_modified += 1
+            return Response(status_code=304, headers=cache_headers)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == versions:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            _, status_code, headers, body = entry
+            return Response(body, status_code=status_code, headers=headers)
+
+        self.misses += 1
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+
+        # Versions were read before the route ran, so a write that races with
+        # it leaves this entry already stale rather than wrongly current.
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+        headers.update(cache_headers)
+        self._store(key, (versions, response.status_code, headers, body))
+        return Response(body, status_code=response.status_code, headers=headers)
+
+    def _store(self, key, entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old[3])
+        if len(entry[3]) > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.size += len(entry[3])
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted[3])
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def metrics(self):
+        lookups = self.hits + self.not_modified + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.not_modified) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+def _parse_if_none_match(value):
+    if not value:
+        return ()
+    return {tag.strip().removeprefix("W/") for tag in value.split(",")}
+
+
+def versions_from_settings(config=settings):
+    if config.response_cache_backend == "redis":
+        return RedisVersionStore(config.redis_url)
+    return MemoryVersionStore()
+
+
+response_cache = ResponseCache(versions_from_settings(), max_bytes=settings.response_cache_max_bytes)
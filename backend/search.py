@@ -0,0 +1,338 @@
+"""Full-text search over task titles and descriptions and submission descriptions.
+
+GET /search/ is answered from the database's own full-text index where it has
+one: FTS5 on SQLite or Full-Text Search on SQL Server (migration 0005_search
+in sql/).  Both are kept current by the database as rows change.
+
+Otherwise (a database without it, whose requirement is then listed in
+MIGRATIONS_OPTIONAL) ``MemorySearch``, an inverted index held in process, is built from
+the tables on first use.  Write routes report the ids they change, and the
+next search re-reads just those rows.  Every worker has its own index and only
+hears about its own writes, so with several workers set
+``SEARCH_INDEX_MAX_AGE`` to rebuild periodically, or use the database index.
+
+A query matches documents containing every term, with the last term also
+matching as a prefix (search-as-you-type).  Hits are ranked by BM25 (FTS5, and
+the memory index) or by SQL Server's RANK, with title matches weighing double
+where the backend allows it.  Internees only find tasks assigned to them and
+their own submissions.
+"""
+import asyncio
+import heapq
+import math
+import re
+import sys
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+
+from repositories import search as queries
+from settings import settings
+
+FIELDS = queries.FIELDS
+# The last term is only expanded as a prefix from this many characters
+MIN_PREFIX = 2
+MAX_TERMS = 10
+# Task fields whose changes need re-indexing
+INDEXED_TASK_FIELDS = frozenset(("title", "description", "assigned_to"))
+
+_WORD = re.compile(r"\w+")
+
+# A document key is its id with the kind above it, so every task key sorts
+# before every submission key and a build reading tasks then submissions in id
+# order only ever appends to the posting arrays
+TASK, SUBMISSION = 0, 1
+_KINDS = ("task", "submission")
+_KIND_SHIFT = 40
+_ID_MASK = (1 << _KIND_SHIFT) - 1
+
+
+def tokenize(text):
+    """Lowercased words with diacritics removed, as FTS5's unicode61 tokenizer splits them."""
+    if not text:
+        return []
+    text = text.casefold()
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return _WORD.findall(text)
+
+
+def parse_query(query):
+    """``(terms, prefix)`` of a search string; raises ValueError if it has no words."""
+    terms = tokenize(query)[:MAX_TERMS]
+    if not terms:
+        raise ValueError("The query has no searchable words")
+    return terms, len(terms[-1]) >= MIN_PREFIX
+
+
+def _key(kind, id):
+    return kind << _KIND_SHIFT | id
+
+
+class MemorySearch:
+    """Inverted index ranked with BM25.
+
+    Each term's postings are two parallel arrays, document keys in ascending
+    order and their term frequencies, a fraction of the memory of a dict per
+    term.  Lookups bisect; changes after the build insert and delete in place.
+    """
+
+    def __init__(self, max_age=0.0, k1=1.2, b=0.75):
+        self.max_age = max_age
+        self.k1 = k1
+        self.b = b
+        self._lock = asyncio.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.postings = {}  # term -> (array of keys, array of frequencies)
+        self.vocabulary = []  # Sorted, for prefix matches
+        self.documents = {}  # key -> (length, owner, terms)
+        self.task_submissions = {}  # task id -> submission ids, dropped with the task
+        self.lengths = [0, 0]  # Total length per kind
+        self.counts = [0, 0]  # Documents per kind
+        self.built_at = None
+        self._building = False
+        self._dirty_tasks = set()
+        self._dirty_submissions = set()
+
+    # Changes
+    def tasks_changed(self, ids):
+        if self.built_at is not None or self._building:
+            self._dirty_tasks.update(ids)
+
+    def submissions_changed(self, ids):
+        if self.built_at is not None or self._building:
+            self._dirty_submissions.update(ids)
+
+    def _index(self, key, weighted_terms, owner, append=False):
+        """Index a document, replacing its previous version unless ``append`` (the build)."""
+        frequencies = {}
+        for term, weight in weighted_terms:
+            # Interned, so the many documents holding a term share one string
+            term = sys.intern(term)
+            frequencies[term] = frequencies.get(term, 0) + weight
+        previous = None if append else self.documents.get(key)
+        kind = key >> _KIND_SHIFT
+        length = sum(frequencies.values())
+        if previous is None:
+            old_terms = ()
+            self.counts[kind] += 1
+        else:
+            old_terms = previous[2]
+            self.lengths[kind] -= previous[0]
+        self.documents[key] = (length, owner, tuple(frequencies))
+        self.lengths[kind] += length
+        for term in old_terms:
+            if term not in frequencies:
+                self._unpost(term, key)
+        old_terms = set(old_terms)
+        for term, frequency in frequencies.items():
+            frequency = min(frequency, 0xFFFF)
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array("q"), array("H"))
+                if not append:
+                    insort(self.vocabulary, term)
+            keys, counts = posting
+            if append:
+                keys.append(key)
+                counts.append(frequency)
+                continue
+            i = bisect_left(keys, key)
+            if term in old_terms:
+                # Kept terms are updated in place, sparing the arrays a shift
+                counts[i] = frequency
+            else:
+                keys.insert(i, key)
+                counts.insert(i, frequency)
+
+    def _unpost(self, term, key):
+        keys, counts = self.postings[term]
+        i = bisect_left(keys, key)
+        del keys[i], counts[i]
+        if not keys:
+            del self.postings[term]
+            del self.vocabulary[bisect_left(self.vocabulary, term)]
+
+    def _remove(self, key):
+        document = self.documents.pop(key, None)
+        if document is None:
+            return
+        length, _, terms = document
+        kind = key >> _KIND_SHIFT
+        self.lengths[kind] -= length
+        self.counts[kind] -= 1
+        for term in terms:
+            self._unpost(term, key)
+
+    def _index_task(self, task_id, title, description, assigned_to, append=False):
+        terms = [(term, 2) for term in tokenize(title)] + [(term, 1) for term in tokenize(description)]
+        self._index(_key(TASK, task_id), terms, assigned_to, append)
+
+    def _index_submission(self, submission_id, task_id, description, submitted_by, append=False):
+        self._index(_key(SUBMISSION, submission_id), [(term, 1) for term in tokenize(description)], submitted_by,
+                    append)
+        self.task_submissions.setdefault(task_id, set()).add(submission_id)
+
+    def _remove_task(self, task_id):
+        self._remove(_key(TASK, task_id))
+        for submission_id in self.task_submissions.pop(task_id, ()):
+            self._remove(_key(SUBMISSION, submission_id))
+
+    async def _build(self, conn):
+        self._reset()
+        self._building = True
+        async for rows in queries.iterate_tasks(conn):
+            for row in rows:
+                self._index_task(*row, append=True)
+        async for rows in queries.iterate_submissions(conn):
+            for row in rows:
+                self._index_submission(*row, append=True)
+        self.vocabulary = sorted(self.postings)
+        self._building = False
+        self.built_at = time.monotonic()
+
+    async def _refresh(self, conn):
+        task_ids, self._dirty_tasks = self._dirty_tasks, set()
+        submission_ids, self._dirty_submissions = self._dirty_submissions, set()
+        if task_ids:
+            found = set()
+            for row in await queries.tasks_by_id(conn, task_ids):
+                self._index_task(*row)
+                found.add(row[0])
+            for task_id in task_ids - found:
+                self._remove_task(task_id)
+        if submission_ids:
+            found = set()
+            for row in await queries.submissions_by_id(conn, submission_ids):
+                self._index_submission(*row)
+                found.add(row[0])
+            for submission_id in submission_ids - found:
+                self._remove(_key(SUBMISSION, submission_id))
+
+    async def ensure_current(self, conn):
+        """Build the index, or rebuild it when older than ``max_age``, and apply pending changes."""
+        async with self._lock:
+            stale = self.max_age and self.built_at is not None and time.monotonic() - self.built_at > self.max_age
+            if self.built_at is None or stale:
+                await self._build(conn)
+            if self._dirty_tasks or self._dirty_submissions:
+                await self._refresh(conn)
+
+    # Queries
+    def _postings(self, term, prefix):
+        if not prefix:
+            return self.postings.get(term, ((), ()))
+        i = bisect_left(self.vocabulary, term)
+        matches = []
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(term):
+            matches.append(self.postings[self.vocabulary[i]])
+            i += 1
+        if len(matches) == 1:
+            return matches[0]
+        # Every term starting with ``term``, frequencies summed per document
+        merged = {}
+        for keys, counts in matches:
+            for key, frequency in zip(keys, counts):
+                merged[key] = merged.get(key, 0) + frequency
+        keys = sorted(merged)
+        return keys, [merged[key] for key in keys]
+
+    def rank(self, terms, prefix, owner=None, count=10):
+        """Best ``count`` document keys as ``(score, key)``, highest first; ``owner``'s only if given."""
+        lists = [self._postings(term, prefix and i == len(terms) - 1) for i, term in enumerate(terms)]
+        lists.sort(key=lambda posting: len(posting[0]))
+        if not lists[0][0]:
+            return []
+        total = self.counts[0] + self.counts[1]
+        idfs = [math.log(1 + (total - len(keys) + 0.5) / (len(keys) + 0.5)) for keys, _ in lists]
+        averages = [self.lengths[kind] / self.counts[kind] if self.counts[kind] else 1.0 for kind in (0, 1)]
+        k1, b, documents = self.k1, self.b, self.documents
+        first_idf, others = idfs[0], list(zip(lists[1:], idfs[1:]))
+
+        def scored():
+            keys, counts = lists[0]
+            for key, frequency in zip(keys, counts):
+                length, doc_owner, _ = documents[key]
+                if owner is not None and doc_owner != owner:
+                    continue
+                norm = k1 * (1 - b + b * length / averages[key >> _KIND_SHIFT])
+                score = first_idf * frequency * (k1 + 1) / (frequency + norm)
+                for (other_keys, other_counts), idf in others:
+                    i = bisect_left(other_keys, key)
+                    if i == len(other_keys) or other_keys[i] != key:
+                        break
+                    frequency = other_counts[i]
+                    score += idf * frequency * (k1 + 1) / (frequency + norm)
+                else:
+                    # Ties go to tasks, then newer ids, as in the SQL backends
+                    yield -score, key >> _KIND_SHIFT, -(key & _ID_MASK), key
+
+        return [(-score, key) for score, _, _, key in heapq.nsmallest(count, scored())]
+
+
+class SearchIndex:
+    """Chooses the database's full-text index or the memory index, per ``backend``.
+
+    ``backend`` is ``auto`` (the database index if present), ``fulltext`` or
+    ``memory``.
+    """
+
+    def __init__(self, backend="auto", max_age=0.0):
+        if backend not in ("auto", "fulltext", "memory"):
+            raise ValueError(f"Unknown SEARCH_BACKEND: {backend}")
+        self.backend = backend
+        self.memory = MemorySearch(max_age)
+        self._fulltext = {}  # dialect -> whether the database has the index
+
+    async def uses_fulltext(self, conn):
+        if self.backend == "memory":
+            return False
+        available = self._fulltext.get(conn.dialect)
+        if available is None:
+            available = self._fulltext[conn.dialect] = await queries.fulltext_available(conn)
+        if not available and self.backend == "fulltext":
+            raise RuntimeError("SEARCH_BACKEND is fulltext but the database has no full-text index")
+        return available
+
+    def tasks_changed(self, ids, fields=None):
+        """Note written tasks; ``fields`` are the ones changed, if not all."""
+        if fields is None or INDEXED_TASK_FIELDS.intersection(fields):
+            self.memory.tasks_changed(ids)
+
+    def submissions_changed(self, ids):
+        self.memory.submissions_changed(ids)
+
+    async def search(self, conn, user, query, limit, offset=0):
+        """Rows of FIELDS for the hits ranked ``offset`` to ``offset + limit``.
+
+        Raises ValueError for a query without words.
+        """
+        terms, prefix = parse_query(query)
+        internee_id = user[0] if user[1] != 'admin' else None
+        if await self.uses_fulltext(conn):
+            return await queries.fulltext(
+                conn, queries.match_expression(conn.dialect, terms, prefix), internee_id, limit, offset
+            )
+
+        await self.memory.ensure_current(conn)
+        ranked = self.memory.rank(terms, prefix, internee_id, offset + limit)[offset:]
+        if not ranked:
+            return []
+        # Titles and statuses are read now; rows deleted through another worker drop out
+        ids = {TASK: [], SUBMISSION: []}
+        for _, key in ranked:
+            ids[key >> _KIND_SHIFT].append(key & _ID_MASK)
+        found = await queries.hit_rows(conn, ids[TASK], ids[SUBMISSION], internee_id)
+        rows = []
+        for score, key in ranked:
+            kind, id = _KINDS[key >> _KIND_SHIFT], key & _ID_MASK
+            hit = found.get((kind, id))
+            if hit is not None:
+                rows.append((kind, id, hit[0], hit[1], hit[2], round(score, 4)))
+        return rows
+
+
+search_index = SearchIndex(settings.search_backend, max_age=settings.search_index_max_age)
@@ -0,0 +1,78 @@
+"""JSON responses encoded with orjson, straight from database rows.
+
+A route that returns plain dicts has each one walked by FastAPI's
+``jsonable_encoder`` before the stdlib encoder walks it again.  List routes
+instead return ``RowsResponse(fields, rows)``: each row tuple is zipped with
+the field names and the whole list goes to orjson in one call, which encodes
+datetimes itself.  The routes keep their declared response models for the
+OpenAPI schema; FastAPI does not re-validate a returned Response.
+
+orjson is optional; without it the stdlib encoder is used.
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from operator import itemgetter
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def _default(value):
+    # Types orjson (or json) cannot encode natively; matches jsonable_encoder
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, tuple):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson when it is installed."""
+
+    def render(self, content):
+        return dumps(content)
+
+
+def parse_fields(value, fields):
+    """Validate a ``?fields=a,b`` projection against ``fields``; None means all of them.
+
+    Raises ValueError naming any unknown field.
+    """
+    if not value:
+        return None
+    requested = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(fields)}")
+    # Keep the resource's field order and drop duplicates
+    return tuple(name for name in fields if name in requested)
+
+
+class RowsResponse(FastJSONResponse):
+    """A JSON array with one object per row, keyed by ``fields``, limited to ``only`` if given."""
+
+    def __init__(self, fields, rows, only=None, **kwargs):
+        if only is not None and tuple(only) != tuple(fields):
+            getter = itemgetter(*[fields.index(name) for name in only])
+            if len(only) == 1:
+                content = [{only[0]: getter(row)} for row in rows]
+            else:
+                content = [dict(zip(only, getter(row))) for row in rows]
+        else:
+            content = [dict(zip(fields, row)) for row in rows]
+        super().__init__(content, **kwargs)
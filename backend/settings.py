@@ -0,0 +1,240 @@
+"""Settings of the backend, read once at import.
+
+Each field is set by the environment variable of the same name in upper
+case (``db_pool_size`` by DB_POOL_SIZE).  SETTINGS_FILE may name a file of
+``NAME=value`` lines, ``#`` comments and blank lines, with the same names;
+variables set in the environment take precedence over it.  Values are
+validated here, so a typo fails at startup with the variable it came from
+instead of at the first request that needs it.
+
+SQL Server is reached through DB_DSN, a complete ODBC connection string,
+or one composed from DB_SERVER, DB_NAME and ODBC_DRIVER with DB_USER and
+DB_PASSWORD (Windows authentication without them).
+"""
+import os
+from typing import Dict, Literal, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+
+# The SQLite database and the local attachment store live next to the code,
+# wherever the app is started from
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "task_tracker.db")
+DEFAULT_ATTACHMENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "attachments")
+
+
+class SettingsError(ValueError):
+    """Raised for a missing, unreadable or invalid setting."""
+
+
+class Settings(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    # Database
+    db_backend: Literal["mssql", "sqlite"] = "mssql"
+    db_driver: Literal["async", "thread"] = "async"
+    sqlite_path: str = DEFAULT_SQLITE_PATH
+    db_dsn: Optional[str] = None
+    db_server: Optional[str] = None
+    db_name: str = "task_tracker"
+    odbc_driver: str = "ODBC Driver 17 for SQL Server"
+    db_user: Optional[str] = None
+    db_password: Optional[str] = None
+    db_pool_size: int = Field(10, ge=1)
+    db_pool_max_overflow: int = Field(5, ge=0)
+    db_pool_timeout: float = Field(30.0, gt=0)
+    db_pool_recycle: float = Field(1800.0, gt=0)
+    # Migration requirements (fts5, fulltext) a database may lack: their
+    # migrations stay pending and later ones apply, as "fts5, ..."; any other
+    # unmet requirement stops the upgrade before it
+    migrations_optional: Tuple[str, ...] = ()
+    # Connections opened before the first request; the pool size by default
+    db_pool_warm: Optional[int] = Field(None, ge=0)
+    # Prepared statements kept per SQLite connection (sqlite3's cached_statements)
+    db_statement_cache_size: int = Field(256, ge=0)
+
+    # Authentication
+    auth_verifier: Literal["firebase", "local"] = "firebase"
+    auth_local_kid: str = "local"
+    auth_local_secret: str = "dev-secret"
+    auth_cache_size: int = Field(10000, ge=0)
+
+    # Caches
+    redis_url: str = "redis://localhost:6379/0"
+    identity_cache_backend: Literal["memory", "redis"] = "memory"
+    identity_cache_size: int = Field(10000, ge=0)
+    identity_cache_ttl: float = Field(300.0, ge=0)
+    response_cache_backend: Literal["memory", "redis"] = "memory"
+    response_cache_max_bytes: int = Field(32 * 1024 * 1024, ge=0)
+    # Seconds a cached GET /dashboard/ is served without a write; 0 leaves only writes to expire it
+    dashboard_cache_ttl: float = Field(30.0, ge=0)
+
+    # Token buckets per uid and route, as "GET /tasks/=RATE/BURST; *=RATE/BURST" with
+    # RATE in requests per second; "*" applies to every other route.  Empty disables.
+    rate_limits: Dict[str, Tuple[float, int]] = {}
+    rate_limit_backend: Literal["memory", "redis"] = "memory"
+    rate_limit_max_keys: int = Field(100000, ge=1)
+    # Routes whose concurrent identical reads share one query, as "GET /tasks/, ..."
+    coalesce_routes: Tuple[str, ...] = ("GET /tasks/", "GET /users/internees/", "GET /dashboard/")
+
+    # Change feed
+    events_broker: Literal["memory", "redis"] = "memory"
+    events_replay_size: int = Field(1000, ge=0)
+    events_queue_size: int = Field(256, ge=1)
+
+    # Search
+    search_backend: Literal["auto", "fulltext", "memory"] = "auto"
+    search_index_max_age: float = Field(0.0, ge=0)
+
+    # Attachments
+    attachment_storage: Literal["local"] = "local"
+    attachment_dir: str = DEFAULT_ATTACHMENT_DIR
+    attachment_max_bytes: int = Field(25 * 1024 * 1024, ge=0)
+    attachment_quota_bytes: int = Field(500 * 1024 * 1024, ge=0)
+    attachment_max_files: int = Field(10, ge=0)
+
+    # Background jobs (jobs.py); JOBS_WORKERS=0 leaves jobs to other processes
+    jobs_workers: int = Field(2, ge=0)
+    jobs_poll_interval: float = Field(1.0, gt=0)
+    jobs_max_attempts: int = Field(5, ge=1)
+    jobs_retry_base: float = Field(2.0, ge=0)
+    jobs_retry_max: float = Field(300.0, ge=0)
+    jobs_lease: float = Field(300.0, gt=0)
+    jobs_scheduler: bool = True
+    # Seconds between periodic runs; 0 disables one
+    jobs_overdue_interval: float = Field(300.0, ge=0)
+    jobs_reminder_interval: float = Field(3600.0, ge=0)
+    # How long before its deadline an internee is reminded of a task
+    jobs_reminder_lead: float = Field(86400.0, ge=0)
+
+    # Delta sync: seconds tombstones are kept (clients offline longer sync again
+    # from 0), and between compactions; 0 disables compaction
+    sync_tombstone_retention: float = Field(30 * 86400.0, ge=0)
+    sync_compact_interval: float = Field(3600.0, ge=0)
+
+    # Task activity log: entries buffered before the oldest is dropped, entries
+    # per insert batch, seconds between flushes, and seconds a write waits for
+    # room in a full buffer
+    activity_buffer_size: int = Field(10000, ge=1)
+    activity_batch_size: int = Field(500, ge=1)
+    activity_flush_interval: float = Field(1.0, gt=0)
+    activity_block_timeout: float = Field(1.0, ge=0)
+
+    # Archival (archive.py): days after which completed tasks and finished
+    # reports move to the archive, tasks per batch (SQL Server takes at most
+    # 2100 parameters), and seconds between runs; 0 disables the periodic run
+    archive_after_days: float = Field(180.0, ge=0)
+    archive_batch_size: int = Field(500, ge=1, le=1000)
+    archive_interval: float = Field(86400.0, ge=0)
+
+    # Instrumentation: the slow query log threshold, statements listed with
+    # their SQL fingerprint in the Server-Timing header (development only: the
+    # header is sent to every client), and the bearer token a metrics scraper
+    # uses instead of an admin's ID token
+    slow_query_ms: float = Field(0.0, ge=0)
+    server_timing_queries: int = Field(0, ge=0)
+    metrics_token: Optional[str] = None
+
+    @field_validator("rate_limits", mode="before")
+    @classmethod
+    def _parse_rate_limits(cls, value):
+        if not isinstance(value, str):
+            return value
+        limits = {}
+        for entry in filter(None, (part.strip() for part in value.split(";"))):
+            route, sep, limit = entry.rpartition("=")
+            rate, slash, burst = limit.partition("/")
+            route = " ".join(route.split())
+            if not sep or not slash or (route != "*" and len(route.split(" ")) != 2):
+                raise ValueError(f"expected 'METHOD /path/=RATE/BURST' or '*=RATE/BURST', got {entry!r}")
+            try:
+                rate, burst = float(rate), int(burst)
+            except ValueError:
+                raise ValueError(f"RATE must be a number and BURST an integer in {entry!r}") from None
+            if rate <= 0 or burst < 1:
+                raise ValueError(f"RATE must be positive and BURST at least 1 in {entry!r}")
+            limits[route] = (rate, burst)
+        return limits
+
+    @field_validator("coalesce_routes", mode="before")
+    @classmethod
+    def _parse_routes(cls, value):
+        if isinstance(value, str):
+            return tuple(" ".join(route.split()) for route in value.split(",") if route.strip())
+        return value
+
+    @field_validator("migrations_optional", mode="before")
+    @classmethod
+    def _parse_requirements(cls, value):
+        if isinstance(value, str):
+            return tuple(part.strip() for part in value.split(",") if part.strip())
+        return value
+
+    @property
+    def pool_warm(self):
+        return self.db_pool_size if self.db_pool_warm is None else min(self.db_pool_warm, self.db_pool_size)
+
+    def sql_server_dsn(self):
+        """ODBC connection string for SQL Server; raises SettingsError when none is configured."""
+        if self.db_dsn:
+            return self.db_dsn
+        if not self.db_server:
+            raise SettingsError("DB_BACKEND=mssql needs DB_DSN or DB_SERVER")
+        parts = [f"DRIVER={{{self.odbc_driver}}}", f"SERVER={self.db_server}", f"DATABASE={self.db_name}"]
+        if self.db_user:
+            parts += [f"UID={self.db_user}", f"PWD={{{(self.db_password or '').replace('}', '}}')}}}"]
+        else:
+            parts.append("Trusted_Connection=yes")
+        return ";".join(parts) + ";"
+
+
+def read_file(path):
+    """``{name: value}`` of a settings file; values may be quoted."""
+    values = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = f.readlines()
+    except OSError as e:
+        raise SettingsError(f"Cannot read SETTINGS_FILE {path}: {e}") from e
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        name, sep, value = line.partition("=")
+        name, value = name.strip().removeprefix("export ").strip(), value.strip()
+        if not sep or not name:
+            raise SettingsError(f"{path}:{number}: expected NAME=value")
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+            value = value[1:-1]
+        values[name.upper()] = value
+    return values
+
+
+def load(environ=os.environ):
+    """Settings from ``environ`` over the SETTINGS_FILE it names, if any."""
+    names = {name.upper(): name for name in Settings.model_fields}
+    values = {}
+    path = environ.get("SETTINGS_FILE")
+    if path:
+        for name, value in read_file(path).items():
+            if name not in names:
+                raise SettingsError(f"Unknown setting {name} in {path}")
+            values[names[name]] = value
+    for name, field in names.items():
+        if name in environ:
+            values[field] = environ[name]
+    # An empty value (NAME=) counts as unset
+    values = {field: value for field, value in values.items() if value != ""}
+    try:
+        loaded = Settings(**values)
+    except ValidationError as e:
+        problems = "; ".join(
+            f"{'.'.join(map(str, error['loc'])).upper()}: {error['msg']}" for error in e.errors()
+        )
+        raise SettingsError(f"Invalid settings: {problems}") from None
+    if loaded.db_backend == "mssql":
+        loaded.sql_server_dsn()
+    return loaded
+
+
+settings = load()
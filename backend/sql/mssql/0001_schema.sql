@@ -0,0 +1,52 @@
+-- Base tables of the task_tracker schema, SQL Server version (see
+-- sql/sqlite/0001_schema.sql for SQLite).  Tables that already exist are left
+-- as they are, so this is safe on a database created before migrations were
+-- tracked.
+
+IF OBJECT_ID('users') IS NULL
+    CREATE TABLE users (
+        id INT IDENTITY(1,1) PRIMARY KEY,
+        -- Unique through IX_users_firebase_id (0006_covering_indexes)
+        firebase_id NVARCHAR(128) NOT NULL,
+        email NVARCHAR(255) NOT NULL,
+        name NVARCHAR(255) NOT NULL,
+        role NVARCHAR(20) NOT NULL,
+        created_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+    );
+
+IF OBJECT_ID('tasks') IS NULL
+    CREATE TABLE tasks (
+        id INT IDENTITY(1,1) PRIMARY KEY,
+        title NVARCHAR(255) NOT NULL,
+        description NVARCHAR(MAX),
+        status NVARCHAR(20) NOT NULL DEFAULT 'pending',
+        created_by INT NOT NULL REFERENCES users(id),
+        assigned_to INT NOT NULL REFERENCES users(id),
+        deadline DATETIME2,
+        created_at DATETIME2 NOT NULL DEFAULT SYSDATETIME(),
+        updated_at DATETIME2
+    );
+
+IF OBJECT_ID('task_submissions') IS NULL
+    CREATE TABLE task_submissions (
+        id INT IDENTITY(1,1) PRIMARY KEY,
+        task_id INT NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+        submitted_by INT NOT NULL REFERENCES users(id),
+        description NVARCHAR(MAX) NOT NULL,
+        attachment_url NVARCHAR(2048),
+        submitted_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+    );
+
+IF OBJECT_ID('progress_reports') IS NULL
+    CREATE TABLE progress_reports (
+        id INT IDENTITY(1,1) PRIMARY KEY,
+        internee_id INT NOT NULL REFERENCES users(id),
+        generated_by INT NOT NULL REFERENCES users(id),
+        period_start DATE NOT NULL,
+        period_end DATE NOT NULL,
+        tasks_completed INT NOT NULL DEFAULT 0,
+        tasks_pending INT NOT NULL DEFAULT 0,
+        overall_performance NVARCHAR(50) NOT NULL,
+        comments NVARCHAR(MAX),
+        created_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+    );
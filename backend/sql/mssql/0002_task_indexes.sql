@@ -0,0 +1,22 @@
+-- Indexes backing keyset pagination and filters on GET /tasks/.
+-- Safe to re-run against the SQL Server task_tracker database.
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_tasks_created_at_id' AND object_id = OBJECT_ID('tasks'))
+    CREATE INDEX IX_tasks_created_at_id
+        ON tasks (created_at DESC, id DESC)
+        INCLUDE (title, status, deadline, created_by, assigned_to);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_tasks_assigned_to_created_at_id' AND object_id = OBJECT_ID('tasks'))
+    CREATE INDEX IX_tasks_assigned_to_created_at_id
+        ON tasks (assigned_to, created_at DESC, id DESC)
+        INCLUDE (title, status, deadline, created_by);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_tasks_status_created_at_id' AND object_id = OBJECT_ID('tasks'))
+    CREATE INDEX IX_tasks_status_created_at_id
+        ON tasks (status, created_at DESC, id DESC)
+        INCLUDE (title, deadline, created_by, assigned_to);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_tasks_deadline' AND object_id = OBJECT_ID('tasks'))
+    CREATE INDEX IX_tasks_deadline
+        ON tasks (deadline)
+        INCLUDE (status, assigned_to);
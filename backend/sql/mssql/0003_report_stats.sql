@@ -0,0 +1,111 @@
+-- Per-internee daily counters behind report statistics (see report_stats.py).
+-- Task counters are keyed by the day the task was created and follow its
+-- current assignee and status; submission counters are keyed by the submitter
+-- and the day of the submission.  Triggers keep the table current, so reports
+-- never rescan tasks or task_submissions.
+-- Safe to re-run against the SQL Server task_tracker database (sqlcmd / SSMS).
+
+IF OBJECT_ID('internee_stats_daily') IS NULL
+BEGIN
+    CREATE TABLE internee_stats_daily (
+        internee_id INT NOT NULL,
+        day DATE NOT NULL,
+        tasks_created INT NOT NULL DEFAULT 0,
+        tasks_completed INT NOT NULL DEFAULT 0,
+        submissions INT NOT NULL DEFAULT 0,
+        submissions_with_deadline INT NOT NULL DEFAULT 0,
+        submissions_on_time INT NOT NULL DEFAULT 0,
+        submit_seconds FLOAT NOT NULL DEFAULT 0,
+        CONSTRAINT PK_internee_stats_daily PRIMARY KEY (internee_id, day)
+    );
+
+    -- One-off backfill from the existing history
+    INSERT INTO internee_stats_daily (internee_id, day, tasks_created, tasks_completed, submissions,
+                                      submissions_with_deadline, submissions_on_time, submit_seconds)
+    SELECT internee_id, day, SUM(tasks_created), SUM(tasks_completed), SUM(submissions),
+           SUM(submissions_with_deadline), SUM(submissions_on_time), SUM(submit_seconds)
+    FROM (
+        SELECT assigned_to AS internee_id, CAST(created_at AS DATE) AS day, 1 AS tasks_created,
+               CASE WHEN status = 'completed' THEN 1 ELSE 0 END AS tasks_completed,
+               0 AS submissions, 0 AS submissions_with_deadline, 0 AS submissions_on_time,
+               CAST(0 AS FLOAT) AS submit_seconds
+        FROM tasks
+        UNION ALL
+        SELECT ts.submitted_by, CAST(ts.submitted_at AS DATE), 0, 0, 1,
+               CASE WHEN t.deadline IS NOT NULL THEN 1 ELSE 0 END,
+               CASE WHEN ts.submitted_at <= t.deadline THEN 1 ELSE 0 END,
+               DATEDIFF_BIG(SECOND, t.created_at, ts.submitted_at)
+        FROM task_submissions ts JOIN tasks t ON t.id = ts.task_id
+    ) AS history
+    GROUP BY internee_id, day;
+END
+GO
+
+-- Triggers add the contribution of inserted rows and subtract that of deleted
+-- rows; an UPDATE is both, restricted to rows whose assignee, creation day or
+-- completion changed.
+CREATE OR ALTER TRIGGER trg_tasks_stats ON tasks AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF NOT EXISTS (SELECT 1 FROM inserted) AND NOT EXISTS (SELECT 1 FROM deleted)
+        RETURN;
+
+    MERGE INTO internee_stats_daily AS s
+    USING (
+        SELECT internee_id, day, SUM(created) AS created, SUM(completed) AS completed
+        FROM (
+            SELECT i.assigned_to AS internee_id, CAST(i.created_at AS DATE) AS day, 1 AS created,
+                   CASE WHEN i.status = 'completed' THEN 1 ELSE 0 END AS completed
+            FROM inserted i
+            LEFT JOIN deleted d ON d.id = i.id
+            WHERE d.id IS NULL OR d.assigned_to <> i.assigned_to
+               OR CAST(d.created_at AS DATE) <> CAST(i.created_at AS DATE)
+               OR (CASE WHEN d.status = 'completed' THEN 1 ELSE 0 END) <> (CASE WHEN i.status = 'completed' THEN 1 ELSE 0 END)
+            UNION ALL
+            SELECT d.assigned_to, CAST(d.created_at AS DATE), -1,
+                   CASE WHEN d.status = 'completed' THEN -1 ELSE 0 END
+            FROM deleted d
+            LEFT JOIN inserted i ON i.id = d.id
+            WHERE i.id IS NULL OR d.assigned_to <> i.assigned_to
+               OR CAST(d.created_at AS DATE) <> CAST(i.created_at AS DATE)
+               OR (CASE WHEN d.status = 'completed' THEN 1 ELSE 0 END) <> (CASE WHEN i.status = 'completed' THEN 1 ELSE 0 END)
+        ) AS delta
+        GROUP BY internee_id, day
+    ) AS src ON s.internee_id = src.internee_id AND s.day = src.day
+    WHEN MATCHED THEN
+        UPDATE SET tasks_created = s.tasks_created + src.created,
+                   tasks_completed = s.tasks_completed + src.completed
+    WHEN NOT MATCHED THEN
+        INSERT (internee_id, day, tasks_created, tasks_completed)
+        VALUES (src.internee_id, src.day, src.created, src.completed);
+END
+GO
+
+CREATE OR ALTER TRIGGER trg_task_submissions_stats ON task_submissions AFTER INSERT
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF NOT EXISTS (SELECT 1 FROM inserted)
+        RETURN;
+
+    MERGE INTO internee_stats_daily AS s
+    USING (
+        SELECT i.submitted_by AS internee_id, CAST(i.submitted_at AS DATE) AS day,
+               COUNT(*) AS submissions,
+               SUM(CASE WHEN t.deadline IS NOT NULL THEN 1 ELSE 0 END) AS with_deadline,
+               SUM(CASE WHEN i.submitted_at <= t.deadline THEN 1 ELSE 0 END) AS on_time,
+               SUM(CAST(DATEDIFF_BIG(SECOND, t.created_at, i.submitted_at) AS FLOAT)) AS seconds
+        FROM inserted i JOIN tasks t ON t.id = i.task_id
+        GROUP BY i.submitted_by, CAST(i.submitted_at AS DATE)
+    ) AS src ON s.internee_id = src.internee_id AND s.day = src.day
+    WHEN MATCHED THEN
+        UPDATE SET submissions = s.submissions + src.submissions,
+                   submissions_with_deadline = s.submissions_with_deadline + src.with_deadline,
+                   submissions_on_time = s.submissions_on_time + src.on_time,
+                   submit_seconds = s.submit_seconds + src.seconds
+    WHEN NOT MATCHED THEN
+        INSERT (internee_id, day, submissions, submissions_with_deadline, submissions_on_time, submit_seconds)
+        VALUES (src.internee_id, src.day, src.submissions, src.with_deadline, src.on_time, src.seconds);
+END
+GO
@@ -0,0 +1,27 @@
+-- Files uploaded with task submissions.  The content lives in the attachment
+-- store (storage.py) under its SHA-256, so identical files share one blob.
+-- Safe to re-run against the SQL Server task_tracker database (sqlcmd / SSMS).
+
+IF OBJECT_ID('submission_attachments') IS NULL
+BEGIN
+    CREATE TABLE submission_attachments (
+        id INT IDENTITY(1,1) PRIMARY KEY,
+        submission_id INT NOT NULL REFERENCES task_submissions(id) ON DELETE CASCADE,
+        uploaded_by INT NOT NULL REFERENCES users(id),
+        sha256 CHAR(64) NOT NULL,
+        size BIGINT NOT NULL,
+        filename NVARCHAR(255) NOT NULL,
+        content_type NVARCHAR(255) NOT NULL,
+        created_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+    );
+END;
+
+-- Per-user quota sums, read on every upload
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_submission_attachments_uploaded_by' AND object_id = OBJECT_ID('submission_attachments'))
+    CREATE INDEX IX_submission_attachments_uploaded_by
+        ON submission_attachments (uploaded_by)
+        INCLUDE (size);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_submission_attachments_submission_id' AND object_id = OBJECT_ID('submission_attachments'))
+    CREATE INDEX IX_submission_attachments_submission_id
+        ON submission_attachments (submission_id);
@@ -0,0 +1,26 @@
+-- Full-text indexes behind GET /search/ (see search.py).  Without them the
+-- API falls back to an in-process index per worker.
+-- Left pending until the Full-Text Search feature is installed; full-text DDL
+-- cannot run inside a transaction.  Safe to re-run (sqlcmd / SSMS).
+-- requires: fulltext
+-- transaction: off
+
+IF NOT EXISTS (SELECT 1 FROM sys.fulltext_catalogs WHERE name = 'task_tracker_search')
+    CREATE FULLTEXT CATALOG task_tracker_search;
+
+-- A full-text index names the table's unique key index, whose generated name differs per database
+DECLARE @key sysname;
+
+IF NOT EXISTS (SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('tasks'))
+BEGIN
+    SELECT @key = name FROM sys.indexes WHERE object_id = OBJECT_ID('tasks') AND is_primary_key = 1;
+    EXEC('CREATE FULLTEXT INDEX ON tasks (title, description) KEY INDEX ' + QUOTENAME(@key)
+         + ' ON task_tracker_search WITH CHANGE_TRACKING AUTO');
+END;
+
+IF NOT EXISTS (SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('task_submissions'))
+BEGIN
+    SELECT @key = name FROM sys.indexes WHERE object_id = OBJECT_ID('task_submissions') AND is_primary_key = 1;
+    EXEC('CREATE FULLTEXT INDEX ON task_submissions (description) KEY INDEX ' + QUOTENAME(@key)
+         + ' ON task_tracker_search WITH CHANGE_TRACKING AUTO');
+END;
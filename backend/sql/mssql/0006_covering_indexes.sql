@@ -0,0 +1,42 @@
+-- Covering indexes for the route queries that scanned or sorted, as reported
+-- by benchmarks/check_plans.py (see sql/sqlite/0006_covering_indexes.sql for
+-- SQLite).  Safe to re-run against the SQL Server task_tracker database.
+
+-- Token cache misses: one seek per identity lookup
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_users_firebase_id' AND object_id = OBJECT_ID('users'))
+    CREATE UNIQUE INDEX IX_users_firebase_id
+        ON users (firebase_id)
+        INCLUDE (role, email, name);
+
+-- GET /users/internees/ and report statistics, internees in name order
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_users_role_name' AND object_id = OBJECT_ID('users'))
+    CREATE INDEX IX_users_role_name
+        ON users (role, name)
+        INCLUDE (email);
+
+-- GET /tasks/{task_id}/submissions/ and its export, newest first; also the
+-- ON DELETE CASCADE lookup when a task is deleted
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_task_submissions_task_id_submitted_at' AND object_id = OBJECT_ID('task_submissions'))
+    CREATE INDEX IX_task_submissions_task_id_submitted_at
+        ON task_submissions (task_id, submitted_at DESC)
+        INCLUDE (submitted_by, description, attachment_url);
+
+-- GET /reports/ newest first, for everyone or for one internee
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_progress_reports_created_at' AND object_id = OBJECT_ID('progress_reports'))
+    CREATE INDEX IX_progress_reports_created_at
+        ON progress_reports (created_at DESC)
+        INCLUDE (internee_id, generated_by, period_start, period_end, tasks_completed, tasks_pending,
+                 overall_performance, comments);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_progress_reports_internee_id_created_at' AND object_id = OBJECT_ID('progress_reports'))
+    CREATE INDEX IX_progress_reports_internee_id_created_at
+        ON progress_reports (internee_id, created_at DESC)
+        INCLUDE (generated_by, period_start, period_end, tasks_completed, tasks_pending,
+                 overall_performance, comments);
+
+-- Report statistics sum a range of days across internees
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_internee_stats_daily_day' AND object_id = OBJECT_ID('internee_stats_daily'))
+    CREATE INDEX IX_internee_stats_daily_day
+        ON internee_stats_daily (day)
+        INCLUDE (tasks_created, tasks_completed, submissions, submissions_with_deadline,
+                 submissions_on_time, submit_seconds);
@@ -0,0 +1,36 @@
+-- Background jobs and periodic schedules (see jobs.py, and
+-- sql/sqlite/0007_jobs.sql for SQLite).
+-- Safe to re-run against the SQL Server task_tracker database (sqlcmd / SSMS).
+
+-- Payload and result are JSON.  A queued job runs at run_at; a running job's
+-- run_at is the end of its lease, after which another worker may take it over.
+IF OBJECT_ID('jobs') IS NULL
+    CREATE TABLE jobs (
+        id INT IDENTITY(1,1) PRIMARY KEY,
+        kind NVARCHAR(100) NOT NULL,
+        payload NVARCHAR(MAX) NOT NULL,
+        status NVARCHAR(20) NOT NULL DEFAULT 'queued',
+        attempts INT NOT NULL DEFAULT 0,
+        max_attempts INT NOT NULL,
+        run_at DATETIME2 NOT NULL,
+        result NVARCHAR(MAX),
+        error NVARCHAR(MAX),
+        created_by INT REFERENCES users(id),
+        created_at DATETIME2 NOT NULL DEFAULT SYSDATETIME(),
+        updated_at DATETIME2,
+        finished_at DATETIME2
+    );
+
+-- Workers claim the earliest due job that is queued or whose lease expired
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_jobs_due' AND object_id = OBJECT_ID('jobs'))
+    CREATE INDEX IX_jobs_due
+        ON jobs (run_at, id)
+        WHERE status IN ('queued', 'running');
+
+-- One row per periodic job; a process runs it by moving next_run_at forward
+IF OBJECT_ID('job_schedules') IS NULL
+    CREATE TABLE job_schedules (
+        name NVARCHAR(100) PRIMARY KEY,
+        last_run_at DATETIME2 NOT NULL,
+        next_run_at DATETIME2 NOT NULL
+    );
@@ -0,0 +1,26 @@
+-- Indexes for the GET /dashboard/ rollups (see repositories/dashboard.py, and
+-- sql/sqlite/0008_dashboard.sql for SQLite).
+-- Safe to re-run against the SQL Server task_tracker database (sqlcmd / SSMS).
+
+-- Task counts per internee and status, with the deadlines, read from the index
+-- alone in assigned_to order so the grouping needs no sort
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_tasks_assigned_to_status' AND object_id = OBJECT_ID('tasks'))
+    CREATE INDEX IX_tasks_assigned_to_status
+        ON tasks (assigned_to, status)
+        INCLUDE (deadline);
+
+-- Last submission per internee
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_task_submissions_submitted_by_submitted_at' AND object_id = OBJECT_ID('task_submissions'))
+    CREATE INDEX IX_task_submissions_submitted_by_submitted_at
+        ON task_submissions (submitted_by, submitted_at);
+
+-- Latest report per internee, ties on created_at broken by id without a sort;
+-- replaces the 0006 index, which GET /reports/ for one internee reads the same way
+IF EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_progress_reports_internee_id_created_at' AND object_id = OBJECT_ID('progress_reports'))
+    DROP INDEX IX_progress_reports_internee_id_created_at ON progress_reports;
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_progress_reports_internee_id_latest' AND object_id = OBJECT_ID('progress_reports'))
+    CREATE INDEX IX_progress_reports_internee_id_latest
+        ON progress_reports (internee_id, created_at DESC, id DESC)
+        INCLUDE (generated_by, period_start, period_end, tasks_completed, tasks_pending,
+                 overall_performance, comments);
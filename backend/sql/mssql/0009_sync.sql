@@ -0,0 +1,89 @@
+-- Change versions and tombstones for GET /sync/ (see repositories/sync.py, and
+-- sql/sqlite/0009_sync.sql for SQLite).
+-- Safe to re-run against the SQL Server task_tracker database (sqlcmd / SSMS).
+
+-- rowversion columns take a database-wide increasing value on every insert
+-- and update, so a version orders every change without triggers.  Versions
+-- are assigned before commit; GET /sync/ only returns those below
+-- MIN_ACTIVE_ROWVERSION(), so a transaction still open cannot be skipped.
+IF COL_LENGTH('tasks', 'version') IS NULL
+    ALTER TABLE tasks ADD version ROWVERSION;
+IF COL_LENGTH('task_submissions', 'version') IS NULL
+    ALTER TABLE task_submissions ADD version ROWVERSION;
+IF COL_LENGTH('progress_reports', 'version') IS NULL
+    ALTER TABLE progress_reports ADD version ROWVERSION;
+
+-- compacted_version is the newest tombstone removed by compaction
+IF OBJECT_ID('sync_state') IS NULL
+    CREATE TABLE sync_state (
+        id INT PRIMARY KEY CHECK (id = 1),
+        compacted_version BIGINT NOT NULL DEFAULT 0
+    );
+IF NOT EXISTS (SELECT 1 FROM sync_state)
+    INSERT INTO sync_state (id) VALUES (1);
+
+-- A deleted row, or (reason 'unassigned') a task its owner no longer sees.
+-- owner_id is the internee the row belonged to.
+IF OBJECT_ID('sync_tombstones') IS NULL
+    CREATE TABLE sync_tombstones (
+        id INT IDENTITY(1,1) PRIMARY KEY,
+        entity NVARCHAR(20) NOT NULL,
+        entity_id INT NOT NULL,
+        owner_id INT NOT NULL,
+        reason NVARCHAR(20) NOT NULL,
+        version ROWVERSION,
+        deleted_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+    );
+GO
+
+-- Changes since a version, for admins and for one internee
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_tasks_version' AND object_id = OBJECT_ID('tasks'))
+    CREATE INDEX IX_tasks_version ON tasks (version);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_tasks_assigned_to_version' AND object_id = OBJECT_ID('tasks'))
+    CREATE INDEX IX_tasks_assigned_to_version ON tasks (assigned_to, version);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_task_submissions_version' AND object_id = OBJECT_ID('task_submissions'))
+    CREATE INDEX IX_task_submissions_version ON task_submissions (version);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_task_submissions_submitted_by_version' AND object_id = OBJECT_ID('task_submissions'))
+    CREATE INDEX IX_task_submissions_submitted_by_version ON task_submissions (submitted_by, version);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_progress_reports_version' AND object_id = OBJECT_ID('progress_reports'))
+    CREATE INDEX IX_progress_reports_version ON progress_reports (version);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_progress_reports_internee_id_version' AND object_id = OBJECT_ID('progress_reports'))
+    CREATE INDEX IX_progress_reports_internee_id_version ON progress_reports (internee_id, version);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_sync_tombstones_version' AND object_id = OBJECT_ID('sync_tombstones'))
+    CREATE INDEX IX_sync_tombstones_version ON sync_tombstones (version) INCLUDE (entity, entity_id, reason);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_sync_tombstones_owner_id_version' AND object_id = OBJECT_ID('sync_tombstones'))
+    CREATE INDEX IX_sync_tombstones_owner_id_version ON sync_tombstones (owner_id, version) INCLUDE (entity, entity_id);
+-- Compaction finds the newest tombstone past the retention period
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_sync_tombstones_deleted_at' AND object_id = OBJECT_ID('sync_tombstones'))
+    CREATE INDEX IX_sync_tombstones_deleted_at ON sync_tombstones (deleted_at) INCLUDE (version);
+GO
+
+-- Tasks and submissions already have triggers (0003), so their statements use
+-- OUTPUT INTO and another trigger changes nothing for them.  progress_reports
+-- has none and its inserts use a plain OUTPUT, which a trigger would forbid;
+-- reports are never deleted, so they need no tombstones.
+CREATE OR ALTER TRIGGER trg_tasks_sync ON tasks AFTER UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF NOT EXISTS (SELECT 1 FROM deleted)
+        RETURN;
+
+    INSERT INTO sync_tombstones (entity, entity_id, owner_id, reason)
+    SELECT 'task', d.id, d.assigned_to, CASE WHEN i.id IS NULL THEN 'deleted' ELSE 'unassigned' END
+    FROM deleted d
+    LEFT JOIN inserted i ON i.id = d.id
+    WHERE i.id IS NULL OR i.assigned_to <> d.assigned_to;
+END
+GO
+
+-- Also fires for the submissions of a deleted task (ON DELETE CASCADE)
+CREATE OR ALTER TRIGGER trg_task_submissions_sync ON task_submissions AFTER DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    INSERT INTO sync_tombstones (entity, entity_id, owner_id, reason)
+    SELECT 'submission', d.id, d.submitted_by, 'deleted'
+    FROM deleted d;
+END
+GO
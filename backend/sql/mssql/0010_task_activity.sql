@@ -0,0 +1,32 @@
+-- Append-only task activity log written by activity.py (see
+-- sql/sqlite/0010_task_activity.sql for SQLite).
+-- Safe to re-run against the SQL Server task_tracker database (sqlcmd / SSMS).
+
+-- One row per change to a task: the action, who made it, and a JSON object of
+-- the changed fields as [old, new].  task_id has no foreign key, so the
+-- history of a deleted task is kept.  created_at is when the change was made,
+-- not when its batch was written.
+IF OBJECT_ID('task_activity') IS NULL
+    CREATE TABLE task_activity (
+        id BIGINT IDENTITY(1,1) PRIMARY KEY,
+        task_id INT NOT NULL,
+        actor_id INT,
+        action NVARCHAR(20) NOT NULL,
+        changes NVARCHAR(MAX) NOT NULL,
+        created_at DATETIME2 NOT NULL
+    );
+GO
+
+-- GET /tasks/{task_id}/history/, newest first
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_task_activity_task_id_created_at' AND object_id = OBJECT_ID('task_activity'))
+    CREATE INDEX IX_task_activity_task_id_created_at
+        ON task_activity (task_id, created_at DESC, id DESC)
+        INCLUDE (actor_id, action, changes);
+GO
+
+CREATE OR ALTER TRIGGER trg_task_activity_append_only ON task_activity INSTEAD OF UPDATE, DELETE
+AS
+BEGIN
+    THROW 50000, 'task_activity is append-only', 1;
+END
+GO
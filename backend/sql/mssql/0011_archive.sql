@@ -0,0 +1,134 @@
+-- Cold storage for finished work, filled by the archive.completed_work job
+-- (see archive.py, and sql/sqlite/0011_archive.sql for SQLite).  Rows keep
+-- their ids, so a row is in the hot table or in its archive, never in both.
+-- No foreign keys, triggers or identities: the job moves rows with
+-- DELETE ... OUTPUT INTO, whose target allows none of them.
+-- Safe to re-run against the SQL Server task_tracker database (sqlcmd / SSMS).
+
+IF OBJECT_ID('archived_tasks') IS NULL
+    CREATE TABLE archived_tasks (
+        id INT PRIMARY KEY,
+        title NVARCHAR(255) NOT NULL,
+        description NVARCHAR(MAX),
+        status NVARCHAR(20) NOT NULL,
+        created_by INT NOT NULL,
+        assigned_to INT NOT NULL,
+        deadline DATETIME2,
+        created_at DATETIME2 NOT NULL,
+        updated_at DATETIME2,
+        archived_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+    );
+
+IF OBJECT_ID('archived_task_submissions') IS NULL
+    CREATE TABLE archived_task_submissions (
+        id INT PRIMARY KEY,
+        task_id INT NOT NULL,
+        submitted_by INT NOT NULL,
+        description NVARCHAR(MAX) NOT NULL,
+        attachment_url NVARCHAR(2048),
+        submitted_at DATETIME2 NOT NULL,
+        archived_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+    );
+
+-- The files stay in the attachment store and can still be downloaded
+IF OBJECT_ID('archived_submission_attachments') IS NULL
+    CREATE TABLE archived_submission_attachments (
+        id INT PRIMARY KEY,
+        submission_id INT NOT NULL,
+        uploaded_by INT NOT NULL,
+        sha256 CHAR(64) NOT NULL,
+        size BIGINT NOT NULL,
+        filename NVARCHAR(255) NOT NULL,
+        content_type NVARCHAR(255) NOT NULL,
+        created_at DATETIME2 NOT NULL,
+        archived_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+    );
+
+IF OBJECT_ID('archived_progress_reports') IS NULL
+    CREATE TABLE archived_progress_reports (
+        id INT PRIMARY KEY,
+        internee_id INT NOT NULL,
+        generated_by INT NOT NULL,
+        period_start DATE NOT NULL,
+        period_end DATE NOT NULL,
+        tasks_completed INT NOT NULL,
+        tasks_pending INT NOT NULL,
+        overall_performance NVARCHAR(50) NOT NULL,
+        comments NVARCHAR(MAX),
+        created_at DATETIME2 NOT NULL,
+        archived_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+    );
+GO
+
+-- include_archived reads the archives the way the hot tables are read (0002, 0006, 0008)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_archived_tasks_created_at_id' AND object_id = OBJECT_ID('archived_tasks'))
+    CREATE INDEX IX_archived_tasks_created_at_id ON archived_tasks (created_at DESC, id DESC);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_archived_tasks_assigned_to_created_at_id' AND object_id = OBJECT_ID('archived_tasks'))
+    CREATE INDEX IX_archived_tasks_assigned_to_created_at_id ON archived_tasks (assigned_to, created_at DESC, id DESC);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_archived_tasks_status_created_at_id' AND object_id = OBJECT_ID('archived_tasks'))
+    CREATE INDEX IX_archived_tasks_status_created_at_id ON archived_tasks (status, created_at DESC, id DESC);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_archived_tasks_deadline' AND object_id = OBJECT_ID('archived_tasks'))
+    CREATE INDEX IX_archived_tasks_deadline ON archived_tasks (deadline);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_archived_task_submissions_task_id_submitted_at' AND object_id = OBJECT_ID('archived_task_submissions'))
+    CREATE INDEX IX_archived_task_submissions_task_id_submitted_at ON archived_task_submissions (task_id, submitted_at DESC);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_archived_submission_attachments_uploaded_by' AND object_id = OBJECT_ID('archived_submission_attachments'))
+    CREATE INDEX IX_archived_submission_attachments_uploaded_by ON archived_submission_attachments (uploaded_by) INCLUDE (size);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_archived_progress_reports_created_at' AND object_id = OBJECT_ID('archived_progress_reports'))
+    CREATE INDEX IX_archived_progress_reports_created_at ON archived_progress_reports (created_at DESC);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_archived_progress_reports_internee_id_latest' AND object_id = OBJECT_ID('archived_progress_reports'))
+    CREATE INDEX IX_archived_progress_reports_internee_id_latest ON archived_progress_reports (internee_id, created_at DESC, id DESC);
+
+-- The job picks completed tasks by when they were last updated (or created,
+-- if never), and reports by the end of their period
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_tasks_status_updated_at' AND object_id = OBJECT_ID('tasks'))
+    CREATE INDEX IX_tasks_status_updated_at ON tasks (status, updated_at, created_at);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_progress_reports_period_end' AND object_id = OBJECT_ID('progress_reports'))
+    CREATE INDEX IX_progress_reports_period_end ON progress_reports (period_end);
+GO
+
+-- As in 0003, except that deletes made by the archive job, which sets the
+-- session context key 'archiving' for its transaction, are not subtracted:
+-- report statistics describe the work done, and archiving does not undo it.
+CREATE OR ALTER TRIGGER trg_tasks_stats ON tasks AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF NOT EXISTS (SELECT 1 FROM inserted) AND NOT EXISTS (SELECT 1 FROM deleted)
+        RETURN;
+    IF NOT EXISTS (SELECT 1 FROM inserted) AND CAST(SESSION_CONTEXT(N'archiving') AS INT) = 1
+        RETURN;
+
+    MERGE INTO internee_stats_daily AS s
+    USING (
+        SELECT internee_id, day, SUM(created) AS created, SUM(completed) AS completed
+        FROM (
+            SELECT i.assigned_to AS internee_id, CAST(i.created_at AS DATE) AS day, 1 AS created,
+                   CASE WHEN i.status = 'completed' THEN 1 ELSE 0 END AS completed
+            FROM inserted i
+            LEFT JOIN deleted d ON d.id = i.id
+            WHERE d.id IS NULL OR d.assigned_to <> i.assigned_to
+               OR CAST(d.created_at AS DATE) <> CAST(i.created_at AS DATE)
+               OR (CASE WHEN d.status = 'completed' THEN 1 ELSE 0 END) <> (CASE WHEN i.status = 'completed' THEN 1 ELSE 0 END)
+            UNION ALL
+            SELECT d.assigned_to, CAST(d.created_at AS DATE), -1,
+                   CASE WHEN d.status = 'completed' THEN -1 ELSE 0 END
+            FROM deleted d
+            LEFT JOIN inserted i ON i.id = d.id
+            WHERE i.id IS NULL OR d.assigned_to <> i.assigned_to
+               OR CAST(d.created_at AS DATE) <> CAST(i.created_at AS DATE)
+               OR (CASE WHEN d.status = 'completed' THEN 1 ELSE 0 END) <> (CASE WHEN i.status = 'completed' THEN 1 ELSE 0 END)
+        ) AS delta
+        GROUP BY internee_id, day
+    ) AS src ON s.internee_id = src.internee_id AND s.day = src.day
+    WHEN MATCHED THEN
+        UPDATE SET tasks_created = s.tasks_created + src.created,
+                   tasks_completed = s.tasks_completed + src.completed
+    WHEN NOT MATCHED THEN
+        INSERT (internee_id, day, tasks_created, tasks_completed)
+        VALUES (src.internee_id, src.day, src.created, src.completed);
+END
+GO
+
+-- progress_reports gets no delete trigger for its tombstones: its inserts use
+-- a plain OUTPUT, which any trigger would forbid (see 0009).  The archive job
+-- writes them itself.
@@ -0,0 +1,22 @@
+-- When the tasks.flag_overdue job found a task past its deadline (see
+-- sql/sqlite/0012_overdue_flag.sql for SQLite).
+-- Safe to re-run against the SQL Server task_tracker database (sqlcmd / SSMS).
+
+-- The job used to set status = 'overdue', which lost whether the task was
+-- pending or in progress; status now only changes when a user changes it.  A
+-- flag older than the deadline is from before the deadline was moved, and is
+-- flagged again.
+IF COL_LENGTH('tasks', 'overdue_flagged_at') IS NULL
+    ALTER TABLE tasks ADD overdue_flagged_at DATETIME2 NULL;
+GO
+
+-- The status before the flag is lost, so flagged tasks go back to pending
+UPDATE tasks SET status = 'pending', overdue_flagged_at = COALESCE(updated_at, SYSDATETIME())
+WHERE status = 'overdue';
+GO
+
+-- The job and the overdue counts read the flag from the index too (0002)
+CREATE INDEX IX_tasks_deadline
+    ON tasks (deadline)
+    INCLUDE (status, assigned_to, overdue_flagged_at)
+    WITH (DROP_EXISTING = ON);
@@ -0,0 +1,46 @@
+-- Base tables of the task_tracker schema, SQLite version (see
+-- sql/mssql/0001_schema.sql for SQL Server).  Every migration here is safe to
+-- apply to a database created before migrations were tracked.
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    firebase_id TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL,
+    name TEXT NOT NULL,
+    role TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    description TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_by INTEGER NOT NULL REFERENCES users(id),
+    assigned_to INTEGER NOT NULL REFERENCES users(id),
+    deadline TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS task_submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id INTEGER NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    submitted_by INTEGER NOT NULL REFERENCES users(id),
+    description TEXT NOT NULL,
+    attachment_url TEXT,
+    submitted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS progress_reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    internee_id INTEGER NOT NULL REFERENCES users(id),
+    generated_by INTEGER NOT NULL REFERENCES users(id),
+    period_start DATE NOT NULL,
+    period_end DATE NOT NULL,
+    tasks_completed INTEGER NOT NULL DEFAULT 0,
+    tasks_pending INTEGER NOT NULL DEFAULT 0,
+    overall_performance TEXT NOT NULL,
+    comments TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,5 @@
+-- Keyset pagination on GET /tasks/ (see sql/mssql/0002_task_indexes.sql for SQL Server)
+CREATE INDEX IF NOT EXISTS ix_tasks_created_at_id ON tasks (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_tasks_assigned_to_created_at_id ON tasks (assigned_to, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_tasks_status_created_at_id ON tasks (status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_tasks_deadline ON tasks (deadline);
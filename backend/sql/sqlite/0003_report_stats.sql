@@ -0,0 +1,79 @@
+-- Per-internee daily counters behind report statistics (see report_stats.py and
+-- sql/mssql/0003_report_stats.sql for SQL Server).  Task counters are keyed by
+-- the day the task was created and follow its current assignee and status;
+-- submission counters are keyed by the submitter and the day of the submission.
+CREATE TABLE IF NOT EXISTS internee_stats_daily (
+    internee_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    tasks_created INTEGER NOT NULL DEFAULT 0,
+    tasks_completed INTEGER NOT NULL DEFAULT 0,
+    submissions INTEGER NOT NULL DEFAULT 0,
+    submissions_with_deadline INTEGER NOT NULL DEFAULT 0,
+    submissions_on_time INTEGER NOT NULL DEFAULT 0,
+    submit_seconds REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (internee_id, day)
+);
+
+-- One-off backfill when the table is new on an existing database
+INSERT INTO internee_stats_daily (internee_id, day, tasks_created, tasks_completed, submissions,
+                                  submissions_with_deadline, submissions_on_time, submit_seconds)
+SELECT internee_id, day, SUM(tasks_created), SUM(tasks_completed), SUM(submissions),
+       SUM(submissions_with_deadline), SUM(submissions_on_time), SUM(submit_seconds)
+FROM (
+    SELECT assigned_to AS internee_id, date(created_at) AS day, 1 AS tasks_created,
+           status = 'completed' AS tasks_completed, 0 AS submissions, 0 AS submissions_with_deadline,
+           0 AS submissions_on_time, 0 AS submit_seconds
+    FROM tasks
+    UNION ALL
+    SELECT ts.submitted_by, date(ts.submitted_at), 0, 0, 1, t.deadline IS NOT NULL,
+           COALESCE(julianday(ts.submitted_at) <= julianday(t.deadline), 0),
+           (julianday(ts.submitted_at) - julianday(t.created_at)) * 86400
+    FROM task_submissions ts JOIN tasks t ON t.id = ts.task_id
+)
+WHERE NOT EXISTS (SELECT 1 FROM internee_stats_daily)
+GROUP BY internee_id, day;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_stats_insert AFTER INSERT ON tasks
+BEGIN
+    INSERT INTO internee_stats_daily (internee_id, day, tasks_created, tasks_completed)
+    VALUES (NEW.assigned_to, date(NEW.created_at), 1, NEW.status = 'completed')
+    ON CONFLICT (internee_id, day) DO UPDATE SET
+        tasks_created = tasks_created + excluded.tasks_created,
+        tasks_completed = tasks_completed + excluded.tasks_completed;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_stats_delete AFTER DELETE ON tasks
+BEGIN
+    UPDATE internee_stats_daily
+    SET tasks_created = tasks_created - 1, tasks_completed = tasks_completed - (OLD.status = 'completed')
+    WHERE internee_id = OLD.assigned_to AND day = date(OLD.created_at);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_stats_update AFTER UPDATE OF status, assigned_to, created_at ON tasks
+WHEN OLD.assigned_to IS NOT NEW.assigned_to OR date(OLD.created_at) IS NOT date(NEW.created_at)
+     OR (OLD.status = 'completed') IS NOT (NEW.status = 'completed')
+BEGIN
+    UPDATE internee_stats_daily
+    SET tasks_created = tasks_created - 1, tasks_completed = tasks_completed - (OLD.status = 'completed')
+    WHERE internee_id = OLD.assigned_to AND day = date(OLD.created_at);
+    INSERT INTO internee_stats_daily (internee_id, day, tasks_created, tasks_completed)
+    VALUES (NEW.assigned_to, date(NEW.created_at), 1, NEW.status = 'completed')
+    ON CONFLICT (internee_id, day) DO UPDATE SET
+        tasks_created = tasks_created + excluded.tasks_created,
+        tasks_completed = tasks_completed + excluded.tasks_completed;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_task_submissions_stats_insert AFTER INSERT ON task_submissions
+BEGIN
+    INSERT INTO internee_stats_daily (internee_id, day, submissions, submissions_with_deadline,
+                                      submissions_on_time, submit_seconds)
+    SELECT NEW.submitted_by, date(NEW.submitted_at), 1, t.deadline IS NOT NULL,
+           COALESCE(julianday(NEW.submitted_at) <= julianday(t.deadline), 0),
+           (julianday(NEW.submitted_at) - julianday(t.created_at)) * 86400
+    FROM tasks t WHERE t.id = NEW.task_id
+    ON CONFLICT (internee_id, day) DO UPDATE SET
+        submissions = submissions + excluded.submissions,
+        submissions_with_deadline = submissions_with_deadline + excluded.submissions_with_deadline,
+        submissions_on_time = submissions_on_time + excluded.submissions_on_time,
+        submit_seconds = submit_seconds + excluded.submit_seconds;
+END;
@@ -0,0 +1,16 @@
+-- Uploaded files; the content lives in the attachment store under its sha256 (see
+-- sql/mssql/0004_attachments.sql for SQL Server)
+CREATE TABLE IF NOT EXISTS submission_attachments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    submission_id INTEGER NOT NULL REFERENCES task_submissions(id) ON DELETE CASCADE,
+    uploaded_by INTEGER NOT NULL REFERENCES users(id),
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Per-user quota sums and attachments by submission
+CREATE INDEX IF NOT EXISTS ix_submission_attachments_uploaded_by ON submission_attachments (uploaded_by, size);
+CREATE INDEX IF NOT EXISTS ix_submission_attachments_submission_id ON submission_attachments (submission_id);
@@ -0,0 +1,49 @@
+-- FTS5 index behind GET /search/ (see search.py).  Left pending while SQLite
+-- is built without FTS5, and search falls back to the in-process index.  See
+-- sql/mssql/0005_search.sql for SQL Server.
+-- requires: fts5
+
+-- External content tables: the text stays in tasks and task_submissions
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+    title, description, content='tasks', content_rowid='id'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS task_submissions_fts USING fts5(
+    description, content='task_submissions', content_rowid='id'
+);
+
+CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks
+BEGIN
+    INSERT INTO tasks_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks
+BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+END;
+
+-- Status and assignment changes leave the index alone
+CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks
+BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+    INSERT INTO tasks_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS task_submissions_fts_insert AFTER INSERT ON task_submissions
+BEGIN
+    INSERT INTO task_submissions_fts (rowid, description) VALUES (NEW.id, NEW.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS task_submissions_fts_delete AFTER DELETE ON task_submissions
+BEGIN
+    INSERT INTO task_submissions_fts (task_submissions_fts, rowid, description) VALUES ('delete', OLD.id, OLD.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS task_submissions_fts_update AFTER UPDATE OF description ON task_submissions
+BEGIN
+    INSERT INTO task_submissions_fts (task_submissions_fts, rowid, description) VALUES ('delete', OLD.id, OLD.description);
+    INSERT INTO task_submissions_fts (rowid, description) VALUES (NEW.id, NEW.description);
+END;
+
+-- Index the rows written before the tables existed
+INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild');
+INSERT INTO task_submissions_fts (task_submissions_fts) VALUES ('rebuild');
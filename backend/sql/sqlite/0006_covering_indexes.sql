@@ -0,0 +1,25 @@
+-- Indexes for the route queries that scanned or sorted, as reported by
+-- benchmarks/check_plans.py (see sql/mssql/0006_covering_indexes.sql for SQL
+-- Server).
+
+-- Token cache misses read the identity from the index alone
+CREATE INDEX IF NOT EXISTS ix_users_firebase_id_identity ON users (firebase_id, role, email, name);
+
+-- GET /users/internees/ and report statistics, internees in name order
+CREATE INDEX IF NOT EXISTS ix_users_role_name ON users (role, name, email);
+
+-- GET /tasks/{task_id}/submissions/ and its export, newest first; also the
+-- ON DELETE CASCADE lookup when a task is deleted
+CREATE INDEX IF NOT EXISTS ix_task_submissions_task_id_submitted_at ON task_submissions (task_id, submitted_at DESC);
+
+-- GET /reports/ newest first, for everyone or for one internee
+CREATE INDEX IF NOT EXISTS ix_progress_reports_created_at ON progress_reports (created_at DESC);
+CREATE INDEX IF NOT EXISTS ix_progress_reports_internee_id_created_at ON progress_reports (internee_id, created_at DESC);
+
+-- Report statistics sum a range of days across internees
+CREATE INDEX IF NOT EXISTS ix_internee_stats_daily_day ON internee_stats_daily (day);
+
+-- Overdue counts read deadline, status and assignee from the index alone, as
+-- the INCLUDE columns of IX_tasks_deadline allow on SQL Server
+DROP INDEX IF EXISTS ix_tasks_deadline;
+CREATE INDEX IF NOT EXISTS ix_tasks_deadline_status_assigned_to ON tasks (deadline, status, assigned_to);
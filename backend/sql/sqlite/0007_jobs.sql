@@ -0,0 +1,30 @@
+-- Background jobs and periodic schedules (see jobs.py, and
+-- sql/mssql/0007_jobs.sql for SQL Server).
+
+-- Payload and result are JSON.  A queued job runs at run_at; a running job's
+-- run_at is the end of its lease, after which another worker may take it over.
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at TIMESTAMP NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_by INTEGER REFERENCES users(id),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Workers claim the earliest due job that is queued or whose lease expired
+CREATE INDEX IF NOT EXISTS ix_jobs_due ON jobs (run_at, id) WHERE status IN ('queued', 'running');
+
+-- One row per periodic job; a process runs it by moving next_run_at forward
+CREATE TABLE IF NOT EXISTS job_schedules (
+    name TEXT PRIMARY KEY,
+    last_run_at TIMESTAMP NOT NULL,
+    next_run_at TIMESTAMP NOT NULL
+);
@@ -0,0 +1,14 @@
+-- Indexes for the GET /dashboard/ rollups (see repositories/dashboard.py, and
+-- sql/mssql/0008_dashboard.sql for SQL Server).
+
+-- Task counts per internee and status, with the deadlines, read from the index
+-- alone in assigned_to order so the grouping needs no sort
+CREATE INDEX IF NOT EXISTS ix_tasks_assigned_to_status_deadline ON tasks (assigned_to, status, deadline);
+
+-- Last submission per internee
+CREATE INDEX IF NOT EXISTS ix_task_submissions_submitted_by_submitted_at ON task_submissions (submitted_by, submitted_at);
+
+-- Latest report per internee, ties on created_at broken by id without a sort;
+-- replaces the 0006 index, which GET /reports/ for one internee reads the same way
+DROP INDEX IF EXISTS ix_progress_reports_internee_id_created_at;
+CREATE INDEX IF NOT EXISTS ix_progress_reports_internee_id_latest ON progress_reports (internee_id, created_at DESC, id DESC);
@@ -0,0 +1,101 @@
+-- Change versions and tombstones for GET /sync/ (see repositories/sync.py, and
+-- sql/mssql/0009_sync.sql for SQL Server).
+
+-- One counter for tasks, submissions, reports and tombstones, so a version
+-- orders every change; SQLite has one writer, so versions commit in order.
+-- compacted_version is the newest tombstone removed by compaction.
+CREATE TABLE IF NOT EXISTS sync_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    compacted_version INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO sync_state (id, version) VALUES (1, 1);
+
+-- Rows written before versions existed are all version 1
+ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE task_submissions ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE progress_reports ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+
+-- A deleted row, or (reason 'unassigned') a task its owner no longer sees.
+-- owner_id is the internee the row belonged to.
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity TEXT NOT NULL,
+    entity_id INTEGER NOT NULL,
+    owner_id INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Changes since a version, for admins and for one internee
+CREATE INDEX IF NOT EXISTS ix_tasks_version ON tasks (version);
+CREATE INDEX IF NOT EXISTS ix_tasks_assigned_to_version ON tasks (assigned_to, version);
+CREATE INDEX IF NOT EXISTS ix_task_submissions_version ON task_submissions (version);
+CREATE INDEX IF NOT EXISTS ix_task_submissions_submitted_by_version ON task_submissions (submitted_by, version);
+CREATE INDEX IF NOT EXISTS ix_progress_reports_version ON progress_reports (version);
+CREATE INDEX IF NOT EXISTS ix_progress_reports_internee_id_version ON progress_reports (internee_id, version);
+CREATE INDEX IF NOT EXISTS ix_sync_tombstones_version ON sync_tombstones (version);
+CREATE INDEX IF NOT EXISTS ix_sync_tombstones_owner_id_version ON sync_tombstones (owner_id, version);
+-- Compaction finds the newest tombstone past the retention period
+CREATE INDEX IF NOT EXISTS ix_sync_tombstones_deleted_at ON sync_tombstones (deleted_at, version);
+
+-- Every insert and update takes the next version.  The triggers' own updates
+-- change version, which the WHEN clauses skip, so they do not fire again.
+CREATE TRIGGER IF NOT EXISTS trg_tasks_sync_insert AFTER INSERT ON tasks
+BEGIN
+    UPDATE sync_state SET version = version + 1;
+    UPDATE tasks SET version = (SELECT version FROM sync_state) WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_sync_update AFTER UPDATE ON tasks
+WHEN NEW.version = OLD.version
+BEGIN
+    UPDATE sync_state SET version = version + 1;
+    UPDATE tasks SET version = (SELECT version FROM sync_state) WHERE id = NEW.id;
+    INSERT INTO sync_tombstones (entity, entity_id, owner_id, reason, version)
+    SELECT 'task', OLD.id, OLD.assigned_to, 'unassigned', version FROM sync_state
+    WHERE OLD.assigned_to <> NEW.assigned_to;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_sync_delete AFTER DELETE ON tasks
+BEGIN
+    UPDATE sync_state SET version = version + 1;
+    INSERT INTO sync_tombstones (entity, entity_id, owner_id, reason, version)
+    SELECT 'task', OLD.id, OLD.assigned_to, 'deleted', version FROM sync_state;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_task_submissions_sync_insert AFTER INSERT ON task_submissions
+BEGIN
+    UPDATE sync_state SET version = version + 1;
+    UPDATE task_submissions SET version = (SELECT version FROM sync_state) WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_task_submissions_sync_update AFTER UPDATE ON task_submissions
+WHEN NEW.version = OLD.version
+BEGIN
+    UPDATE sync_state SET version = version + 1;
+    UPDATE task_submissions SET version = (SELECT version FROM sync_state) WHERE id = NEW.id;
+END;
+
+-- Also fires for the submissions of a deleted task (ON DELETE CASCADE)
+CREATE TRIGGER IF NOT EXISTS trg_task_submissions_sync_delete AFTER DELETE ON task_submissions
+BEGIN
+    UPDATE sync_state SET version = version + 1;
+    INSERT INTO sync_tombstones (entity, entity_id, owner_id, reason, version)
+    SELECT 'submission', OLD.id, OLD.submitted_by, 'deleted', version FROM sync_state;
+END;
+
+-- Reports are never deleted, so they have no tombstones
+CREATE TRIGGER IF NOT EXISTS trg_progress_reports_sync_insert AFTER INSERT ON progress_reports
+BEGIN
+    UPDATE sync_state SET version = version + 1;
+    UPDATE progress_reports SET version = (SELECT version FROM sync_state) WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_progress_reports_sync_update AFTER UPDATE ON progress_reports
+WHEN NEW.version = OLD.version
+BEGIN
+    UPDATE sync_state SET version = version + 1;
+    UPDATE progress_reports SET version = (SELECT version FROM sync_state) WHERE id = NEW.id;
+END;
@@ -0,0 +1,28 @@
+-- Append-only task activity log written by activity.py (see
+-- sql/mssql/0010_task_activity.sql for SQL Server).
+
+-- One row per change to a task: the action, who made it, and a JSON object of
+-- the changed fields as [old, new].  task_id has no foreign key, so the
+-- history of a deleted task is kept.  created_at is when the change was made,
+-- not when its batch was written.
+CREATE TABLE IF NOT EXISTS task_activity (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id INTEGER NOT NULL,
+    actor_id INTEGER,
+    action TEXT NOT NULL,
+    changes TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL
+);
+
+-- GET /tasks/{task_id}/history/, newest first
+CREATE INDEX IF NOT EXISTS ix_task_activity_task_id_created_at ON task_activity (task_id, created_at DESC, id DESC);
+
+CREATE TRIGGER IF NOT EXISTS trg_task_activity_no_update BEFORE UPDATE ON task_activity
+BEGIN
+    SELECT RAISE(ABORT, 'task_activity is append-only');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_task_activity_no_delete BEFORE DELETE ON task_activity
+BEGIN
+    SELECT RAISE(ABORT, 'task_activity is append-only');
+END;
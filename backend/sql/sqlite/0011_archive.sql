@@ -0,0 +1,98 @@
+-- Cold storage for finished work, filled by the archive.completed_work job
+-- (see archive.py, and sql/mssql/0011_archive.sql for SQL Server).  Rows keep
+-- their ids, so a row is in the hot table or in its archive, never in both.
+-- No foreign keys: archived rows are only read, and moving them must not
+-- check or cascade anything.
+
+CREATE TABLE IF NOT EXISTS archived_tasks (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT,
+    status TEXT NOT NULL,
+    created_by INTEGER NOT NULL,
+    assigned_to INTEGER NOT NULL,
+    deadline TIMESTAMP,
+    created_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS archived_task_submissions (
+    id INTEGER PRIMARY KEY,
+    task_id INTEGER NOT NULL,
+    submitted_by INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    attachment_url TEXT,
+    submitted_at TIMESTAMP NOT NULL,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- The files stay in the attachment store and can still be downloaded
+CREATE TABLE IF NOT EXISTS archived_submission_attachments (
+    id INTEGER PRIMARY KEY,
+    submission_id INTEGER NOT NULL,
+    uploaded_by INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS archived_progress_reports (
+    id INTEGER PRIMARY KEY,
+    internee_id INTEGER NOT NULL,
+    generated_by INTEGER NOT NULL,
+    period_start DATE NOT NULL,
+    period_end DATE NOT NULL,
+    tasks_completed INTEGER NOT NULL,
+    tasks_pending INTEGER NOT NULL,
+    overall_performance TEXT NOT NULL,
+    comments TEXT,
+    created_at TIMESTAMP NOT NULL,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- include_archived reads the archives the way the hot tables are read (0002, 0006, 0008)
+CREATE INDEX IF NOT EXISTS ix_archived_tasks_created_at_id ON archived_tasks (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_archived_tasks_assigned_to_created_at_id ON archived_tasks (assigned_to, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_archived_tasks_status_created_at_id ON archived_tasks (status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_archived_tasks_deadline ON archived_tasks (deadline);
+CREATE INDEX IF NOT EXISTS ix_archived_task_submissions_task_id_submitted_at ON archived_task_submissions (task_id, submitted_at DESC);
+CREATE INDEX IF NOT EXISTS ix_archived_submission_attachments_uploaded_by ON archived_submission_attachments (uploaded_by, size);
+CREATE INDEX IF NOT EXISTS ix_archived_progress_reports_created_at ON archived_progress_reports (created_at DESC);
+CREATE INDEX IF NOT EXISTS ix_archived_progress_reports_internee_id_latest ON archived_progress_reports (internee_id, created_at DESC, id DESC);
+
+-- The job picks completed tasks by when they were last updated (or created,
+-- if never), and reports by the end of their period
+CREATE INDEX IF NOT EXISTS ix_tasks_status_updated_at ON tasks (status, updated_at, created_at);
+CREATE INDEX IF NOT EXISTS ix_progress_reports_period_end ON progress_reports (period_end);
+
+-- Set while the job's transaction moves rows.  Report statistics describe
+-- the work done, so archiving a task must not take it out of them the way
+-- deleting one does; SQLite triggers cannot read temp tables or connection
+-- state, hence a row, which the transaction sets and clears before commit.
+CREATE TABLE IF NOT EXISTS archive_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    archiving INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO archive_state (id) VALUES (1);
+
+DROP TRIGGER IF EXISTS trg_tasks_stats_delete;
+CREATE TRIGGER IF NOT EXISTS trg_tasks_stats_delete AFTER DELETE ON tasks
+WHEN NOT (SELECT archiving FROM archive_state WHERE id = 1)
+BEGIN
+    UPDATE internee_stats_daily
+    SET tasks_created = tasks_created - 1, tasks_completed = tasks_completed - (OLD.status = 'completed')
+    WHERE internee_id = OLD.assigned_to AND day = date(OLD.created_at);
+END;
+
+-- Archived reports leave GET /sync/ like archived tasks and submissions do,
+-- whose delete triggers (0009) already write their tombstones
+CREATE TRIGGER IF NOT EXISTS trg_progress_reports_sync_delete AFTER DELETE ON progress_reports
+BEGIN
+    UPDATE sync_state SET version = version + 1;
+    INSERT INTO sync_tombstones (entity, entity_id, owner_id, reason, version)
+    SELECT 'report', OLD.id, OLD.internee_id, 'deleted', version FROM sync_state;
+END;
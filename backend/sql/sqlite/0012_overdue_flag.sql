@@ -0,0 +1,15 @@
+-- When the tasks.flag_overdue job found a task past its deadline (see
+-- sql/mssql/0012_overdue_flag.sql for SQL Server).  The job used to set
+-- status = 'overdue', which lost whether the task was pending or in progress;
+-- status now only changes when a user changes it.  A flag older than the
+-- deadline is from before the deadline was moved, and is flagged again.
+ALTER TABLE tasks ADD COLUMN overdue_flagged_at TIMESTAMP;
+
+-- The status before the flag is lost, so flagged tasks go back to pending
+UPDATE tasks SET status = 'pending', overdue_flagged_at = COALESCE(updated_at, CURRENT_TIMESTAMP)
+WHERE status = 'overdue';
+
+-- The job and the overdue counts read the flag from the index too (0006)
+DROP INDEX IF EXISTS ix_tasks_deadline_status_assigned_to;
+CREATE INDEX IF NOT EXISTS ix_tasks_deadline_status_assigned_to_overdue_flagged_at
+    ON tasks (deadline, status, assigned_to, overdue_flagged_at);
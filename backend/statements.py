@@ -0,0 +1,379 @@
+"""Write statements that hand back the written row in the same round-trip.
+
+SQL Server uses OUTPUT (with MERGE where the output needs joined columns such
+as user names); SQLite uses RETURNING, which allows scalar subqueries.  Each
+function documents its parameter order, which is the same for both dialects.
+
+tasks and task_submissions carry triggers on SQL Server
+(sql/mssql/0003_report_stats.sql), which rules out a bare OUTPUT clause there,
+so those statements capture their rows with OUTPUT ... INTO a table variable
+and select it at the end.
+
+This module is the query catalog: each function builds its statement once per
+set of arguments and hands back the same text afterwards, so the driver's
+statement cache (db.SQLiteBackend) and SQL Server's plan cache see one text
+per statement, and names it for the statement statistics (instrumentation.py)
+after the function.  The repositories build their reads and maintenance
+statements the same way with ``@catalog``, named after their module
+(``tasks.assignee``); CATALOG lists every builder by name.
+
+The arguments a statement varies by are few: updates of a varying set of
+columns come in the fixed shapes of TASK_UPDATE_SHAPES rather than one text
+per combination, filtered reads are built per set of filters, and IN lists
+are padded to one of IN_LIST_SIZES (in_lists) rather than one text per
+length.
+"""
+import functools
+
+from instrumentation import statement_stats
+
+# Column order of a task resource, shared with GET /tasks/
+TASK_FIELDS = ("id", "title", "description", "status", "deadline", "created_by",
+               "assigned_to", "assigned_to_id", "created_at", "updated_at")
+SUBMISSION_FIELDS = ("id", "description", "attachment_url", "submitted_at")
+ATTACHMENT_FIELDS = ("id", "filename", "content_type", "size", "sha256", "created_at")
+REPORT_FIELDS = ("id", "internee_name", "generated_by", "period_start", "period_end", "tasks_completed",
+                 "tasks_pending", "overall_performance", "comments", "created_at")
+
+_TASK_OUTPUT_TABLE = """
+    id INT, title NVARCHAR(MAX), description NVARCHAR(MAX), status NVARCHAR(50), deadline DATETIME2,
+    created_by NVARCHAR(255), assigned_to NVARCHAR(255), assigned_to_id INT,
+    created_at DATETIME2, updated_at DATETIME2
+"""
+_SUBMISSION_OUTPUT_TABLE = "id INT, description NVARCHAR(MAX), attachment_url NVARCHAR(MAX), submitted_at DATETIME2"
+
+_TASK_RETURNING = """
+    RETURNING id, title, description, status, deadline,
+              (SELECT name FROM users WHERE id = tasks.created_by),
+              (SELECT name FROM users WHERE id = tasks.assigned_to),
+              assigned_to, created_at, updated_at
+"""
+
+
+# Columns a task update may set, and the statement shapes that set them: an
+# update uses the first shape holding all of its columns, the others keep
+# their values.  Status changes, the common case, leave the text columns and
+# their full-text index alone.
+UPDATABLE_TASK_FIELDS = ("title", "description", "status", "assigned_to", "deadline")
+TASK_UPDATE_SHAPES = (
+    ("status",),
+    ("status", "assigned_to", "deadline"),
+    UPDATABLE_TASK_FIELDS,
+)
+
+
+# Lengths IN lists are padded to; the longest stays under SQL Server's 2100
+# parameters with room for the statement's others
+IN_LIST_SIZES = (1, 4, 16, 64, 256, 1000)
+
+# Name -> builder of every catalogued statement
+CATALOG = {}
+
+
+def placeholders(n):
+    return ", ".join("?" * n)
+
+
+def in_lists(ids, sizes=IN_LIST_SIZES):
+    """Split ``ids`` into lists whose lengths are all in ``sizes``, for ``IN`` lists.
+
+    Each list holds up to the longest size; the last is padded to the next
+    size up by repeating its last id, which an IN list ignores.
+    """
+    ids = list(ids)
+    for start in range(0, len(ids), sizes[-1]):
+        chunk = ids[start:start + sizes[-1]]
+        size = next(size for size in sizes if size >= len(chunk))
+        yield chunk + chunk[-1:] * (size - len(chunk))
+
+
+def limit_clause(dialect):
+    """Row limit to append after ORDER BY; takes the limit as its one parameter."""
+    if dialect == "mssql":
+        return "OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY"
+    return "LIMIT ?"
+
+
+def _variant_name(value):
+    if isinstance(value, tuple):
+        return "+".join(map(str, value)) or "-"
+    return str(value)
+
+
+def catalog(builder):
+    """Build a statement once per set of arguments, named after ``builder`` and its variant.
+
+    Builders outside this module are named after their module too, and a
+    leading underscore is dropped: ``_values`` in repositories/tasks.py is
+    ``tasks.values``.
+    """
+    module = builder.__module__.rpartition(".")[2]
+    base = builder.__name__.lstrip("_")
+    if module != __name__:
+        base = f"{module}.{base}"
+    if base in CATALOG:
+        raise ValueError(f"Two statements named {base}")
+
+    @functools.lru_cache(maxsize=None)
+    def build(dialect, *variant):
+        sql = builder(dialect, *variant)
+        name = base
+        if variant:
+            name += "(" + ", ".join(map(_variant_name, variant)) + ")"
+        statement_stats.name(sql, name)
+        return sql
+    CATALOG[base] = build
+    return functools.wraps(builder)(build)
+
+
+def task_update_shape(fields):
+    """The first of TASK_UPDATE_SHAPES that holds every column in ``fields``."""
+    for shape in TASK_UPDATE_SHAPES:
+        if fields.keys() <= set(shape):
+            return shape
+    raise ValueError(f"Not updatable: {', '.join(sorted(set(fields) - set(UPDATABLE_TASK_FIELDS)))}")
+
+
+def _output_into(columns, statement):
+    """Batch running ``statement`` (which outputs INTO @out) and selecting the captured rows."""
+    return f"SET NOCOUNT ON; DECLARE @out TABLE ({columns});\n{statement.rstrip()};\nSELECT * FROM @out;"
+
+
+@catalog
+def upsert_user(dialect):
+    """Params: firebase_id, email, name, role.
+
+    Returns ``(action, id, email, name, role)`` where action is ``INSERT`` for a
+    new user.  On SQLite an existing user yields no row and must be read back.
+    """
+    if dialect == "mssql":
+        return """
+            MERGE INTO users WITH (HOLDLOCK) AS u
+            USING (SELECT ? AS firebase_id, ? AS email, ? AS name, ? AS role) AS src
+            ON u.firebase_id = src.firebase_id
+            WHEN MATCHED THEN UPDATE SET u.firebase_id = src.firebase_id
+            WHEN NOT MATCHED THEN
+                INSERT (firebase_id, email, name, role)
+                VALUES (src.firebase_id, src.email, src.name, src.role)
+            OUTPUT $action, INSERTED.id, INSERTED.email, INSERTED.name, INSERTED.role;
+        """
+    return """
+        INSERT INTO users (firebase_id, email, name, role) VALUES (?, ?, ?, ?)
+        ON CONFLICT (firebase_id) DO NOTHING
+        RETURNING 'INSERT', id, email, name, role
+    """
+
+
+@catalog
+def insert_task(dialect):
+    """Params: title, description, deadline, assigned_to, created_by.
+
+    Returns a task row, or nothing if either user does not exist.
+    """
+    if dialect == "mssql":
+        return _output_into(_TASK_OUTPUT_TABLE, """
+            MERGE INTO tasks USING (
+                SELECT ? AS title, ? AS description, ? AS deadline,
+                       a.id AS assigned_to, a.name AS assigned_to_name,
+                       c.id AS created_by, c.name AS created_by_name
+                FROM users a, users c
+                WHERE a.id = ? AND c.id = ?
+            ) AS src ON 1 = 0
+            WHEN NOT MATCHED THEN
+                INSERT (title, description, deadline, assigned_to, created_by)
+                VALUES (src.title, src.description, src.deadline, src.assigned_to, src.created_by)
+            OUTPUT INSERTED.id, INSERTED.title, INSERTED.description, INSERTED.status, INSERTED.deadline,
+                   src.created_by_name, src.assigned_to_name, INSERTED.assigned_to,
+                   INSERTED.created_at, INSERTED.updated_at
+            INTO @out
+        """)
+    return """
+        INSERT INTO tasks (title, description, deadline, assigned_to, created_by)
+        SELECT ?, ?, ?, a.id, c.id FROM users a, users c WHERE a.id = ? AND c.id = ?
+    """ + _TASK_RETURNING
+
+
+@catalog
+def update_task(dialect, shape):
+    """Params: the ``shape`` columns' values (None keeps a column's value),
+    updated_at, task_id, owner_id.
+
+    Updates one task and returns its row.  With an ``owner_id`` only a task
+    assigned to that user is touched.  No row comes back if the task is
+    missing, not owned, or the new assignee is unknown.
+    """
+    if dialect == "mssql":
+        # The values come in through a derived table, so each is bound once
+        assignments = ", ".join(f"{column} = COALESCE(src.{column}, t.{column})" for column in shape)
+        values = ", ".join(f"? AS {column}" for column in shape)
+        assignee = "COALESCE(src.assigned_to, t.assigned_to)" if "assigned_to" in shape else "t.assigned_to"
+        return _output_into(_TASK_OUTPUT_TABLE, f"""
+            UPDATE t SET {assignments}, updated_at = src.updated_at
+            OUTPUT INSERTED.id, INSERTED.title, INSERTED.description, INSERTED.status, INSERTED.deadline,
+                   u1.name, u2.name, INSERTED.assigned_to, INSERTED.created_at, INSERTED.updated_at
+            INTO @out
+            FROM tasks t
+            CROSS JOIN (SELECT {values}, ? AS updated_at) AS src
+            JOIN users u1 ON u1.id = t.created_by
+            JOIN users u2 ON u2.id = {assignee}
+            WHERE t.id = ? AND t.assigned_to = COALESCE(?, t.assigned_to)
+        """)
+    # Numbered, so the new assignee can be bound once and used twice
+    assignments = ", ".join(f"{column} = COALESCE(?{i}, {column})" for i, column in enumerate(shape, 1))
+    n = len(shape)
+    where = f"id = ?{n + 2} AND assigned_to = COALESCE(?{n + 3}, assigned_to)"
+    if "assigned_to" in shape:
+        # An unknown assignee matches no row, as the JOIN does on SQL Server,
+        # instead of failing the foreign key
+        assignee = f"?{shape.index('assigned_to') + 1}"
+        where += f" AND ({assignee} IS NULL OR EXISTS (SELECT 1 FROM users WHERE id = {assignee}))"
+    return f"""
+        UPDATE tasks SET {assignments}, updated_at = ?{n + 1}
+        WHERE {where}
+    """ + _TASK_RETURNING
+
+
+@catalog
+def update_task_values(dialect, shape):
+    """Params: the ``shape`` columns' values (None keeps a column's value),
+    updated_at, task_id.
+
+    The batch form of update_task, for executemany: returns nothing.
+    """
+    assignments = ", ".join(f"{column} = COALESCE(?, {column})" for column in shape)
+    return f"UPDATE tasks SET {assignments}, updated_at = ? WHERE id = ?"
+
+
+@catalog
+def delete_task(dialect):
+    """Params: task_id.
+
+    Returns ``(title, description, status, assigned_to, deadline)`` as they
+    were, or nothing if the task does not exist.
+    """
+    if dialect == "mssql":
+        return _output_into(
+            "title NVARCHAR(MAX), description NVARCHAR(MAX), status NVARCHAR(50), assigned_to INT, deadline DATETIME2",
+            """
+                DELETE FROM tasks
+                OUTPUT DELETED.title, DELETED.description, DELETED.status, DELETED.assigned_to, DELETED.deadline
+                INTO @out
+                WHERE id = ?
+            """,
+        )
+    return "DELETE FROM tasks WHERE id = ? RETURNING title, description, status, assigned_to, deadline"
+
+
+@catalog
+def insert_submission(dialect):
+    """Params: submitted_by, description, attachment_url, task_id, owner_id.
+
+    Inserts only if the task is assigned to ``owner_id``; returns a submission row.
+    """
+    if dialect == "mssql":
+        return _output_into(_SUBMISSION_OUTPUT_TABLE, """
+            INSERT INTO task_submissions (task_id, submitted_by, description, attachment_url)
+            OUTPUT INSERTED.id, INSERTED.description, INSERTED.attachment_url, INSERTED.submitted_at
+            INTO @out
+            SELECT t.id, ?, ?, ? FROM tasks t WHERE t.id = ? AND t.assigned_to = ?
+        """)
+    return """
+        INSERT INTO task_submissions (task_id, submitted_by, description, attachment_url)
+        SELECT t.id, ?, ?, ? FROM tasks t WHERE t.id = ? AND t.assigned_to = ?
+        RETURNING id, description, attachment_url, submitted_at
+    """
+
+
+@catalog
+def insert_report(dialect):
+    """Params: period_start, period_end, tasks_completed, tasks_pending,
+    overall_performance, comments, internee_id, generated_by.
+
+    Returns a report row, or nothing if the internee does not exist.
+    """
+    if dialect == "mssql":
+        return """
+            MERGE INTO progress_reports USING (
+                SELECT ? AS period_start, ? AS period_end, ? AS tasks_completed, ? AS tasks_pending,
+                       ? AS overall_performance, ? AS comments,
+                       i.id AS internee_id, i.name AS internee_name,
+                       g.id AS generated_by, g.name AS generated_by_name
+                FROM users i, users g
+                WHERE i.id = ? AND g.id = ?
+            ) AS src ON 1 = 0
+            WHEN NOT MATCHED THEN
+                INSERT (period_start, period_end, tasks_completed, tasks_pending,
+                        overall_performance, comments, internee_id, generated_by)
+                VALUES (src.period_start, src.period_end, src.tasks_completed, src.tasks_pending,
+                        src.overall_performance, src.comments, src.internee_id, src.generated_by)
+            OUTPUT INSERTED.id, src.internee_name, src.generated_by_name, INSERTED.period_start,
+                   INSERTED.period_end, INSERTED.tasks_completed, INSERTED.tasks_pending,
+                   INSERTED.overall_performance, INSERTED.comments, INSERTED.created_at;
+        """
+    return """
+        INSERT INTO progress_reports (period_start, period_end, tasks_completed, tasks_pending,
+                                      overall_performance, comments, internee_id, generated_by)
+        SELECT ?, ?, ?, ?, ?, ?, i.id, g.id FROM users i, users g WHERE i.id = ? AND g.id = ?
+        RETURNING id,
+                  (SELECT name FROM users WHERE id = progress_reports.internee_id),
+                  (SELECT name FROM users WHERE id = progress_reports.generated_by),
+                  period_start, period_end, tasks_completed, tasks_pending,
+                  overall_performance, comments, created_at
+    """
+
+
+@catalog
+def insert_attachment(dialect):
+    """Params: submission_id, uploaded_by, sha256, size, filename, content_type,
+    uploaded_by, uploaded_by, size, quota.
+
+    Inserts only while the uploader's attachments, archived ones and this one
+    included, stay within ``quota`` bytes; returns an attachment row.
+    """
+    if dialect == "mssql":
+        # UPDLOCK/HOLDLOCK keep two uploads by one user from both passing the check
+        return """
+            INSERT INTO submission_attachments (submission_id, uploaded_by, sha256, size, filename, content_type)
+            OUTPUT INSERTED.id, INSERTED.filename, INSERTED.content_type, INSERTED.size, INSERTED.sha256,
+                   INSERTED.created_at
+            SELECT ?, ?, ?, ?, ?, ?
+            WHERE (SELECT COALESCE(SUM(size), 0) FROM submission_attachments WITH (UPDLOCK, HOLDLOCK)
+                   WHERE uploaded_by = ?)
+                  + (SELECT COALESCE(SUM(size), 0) FROM archived_submission_attachments WHERE uploaded_by = ?)
+                  + ? <= ?
+        """
+    return """
+        INSERT INTO submission_attachments (submission_id, uploaded_by, sha256, size, filename, content_type)
+        SELECT ?, ?, ?, ?, ?, ?
+        WHERE (SELECT COALESCE(SUM(size), 0) FROM submission_attachments WHERE uploaded_by = ?)
+              + (SELECT COALESCE(SUM(size), 0) FROM archived_submission_attachments WHERE uploaded_by = ?)
+              + ? <= ?
+        RETURNING id, filename, content_type, size, sha256, created_at
+    """
+
+
+@catalog
+def flag_overdue(dialect):
+    """Params: limit, flagged_at, now.
+
+    Flags up to ``limit`` pending or in-progress tasks whose deadline has
+    passed, and which were not flagged since it was set; their status is left
+    alone.  Returns ``(id, assigned_to)`` of each.
+    """
+    if dialect == "mssql":
+        return _output_into("id INT, assigned_to INT", """
+            UPDATE TOP (?) tasks SET overdue_flagged_at = ?
+            OUTPUT INSERTED.id, INSERTED.assigned_to INTO @out
+            WHERE deadline < ? AND status IN ('pending', 'in_progress')
+              AND (overdue_flagged_at IS NULL OR overdue_flagged_at <= deadline)
+        """)
+    return """
+        UPDATE tasks SET overdue_flagged_at = ?2
+        WHERE id IN (
+            SELECT id FROM tasks
+            WHERE deadline < ?3 AND status IN ('pending', 'in_progress')
+              AND (overdue_flagged_at IS NULL OR overdue_flagged_at <= deadline)
+            LIMIT ?1
+        )
+        RETURNING id, assigned_to
+    """
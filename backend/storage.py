@@ -0,0 +1,150 @@
+"""Content-addressed blob storage for submission attachments.
+
+Blobs are keyed by the SHA-256 of their content, so a file uploaded twice (by
+one internee or several) is stored once; rows in ``submission_attachments``
+reference the key.  A store provides:
+
+- ``await create()``, a writer taking the content in chunks:
+  ``await write(data)``, then ``await finish()`` (returns the key; the blob is
+  not visible yet), then ``await commit()`` to publish it or ``await abort()``
+  to drop it.
+- ``await response(key, filename, media_type, headers)``, the HTTP response
+  serving the blob, or None if it is missing.
+- ``await delete(key)``.
+
+``LocalStorage`` keeps blobs on the local filesystem and serves them with
+Starlette's FileResponse, which answers Range requests and uses the server's
+``http.response.pathsend`` extension (zero-copy) where it is offered.  Disk
+I/O runs on worker threads, batched into ``chunk_size`` writes.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+
+from fastapi.responses import FileResponse
+
+from settings import settings
+
+CHUNK_SIZE = 1024 * 1024
+
+_KEY = re.compile(r"[0-9a-f]{64}")
+
+
+class LocalBlobWriter:
+    def __init__(self, storage, temp_path, file):
+        self.storage = storage
+        self.size = 0
+        self.key = None
+        self._temp_path = temp_path
+        self._file = file
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+
+    async def write(self, data):
+        self._buffer += data
+        self.size += len(data)
+        if len(self._buffer) >= self.storage.chunk_size:
+            await self._flush()
+
+    async def _flush(self):
+        chunk, self._buffer = self._buffer, bytearray()
+        if chunk:
+            await asyncio.to_thread(self._write_chunk, chunk)
+
+    def _write_chunk(self, chunk):
+        # hashlib releases the GIL for large buffers, so hash here rather than on the loop
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def _close(self, sync):
+        if sync:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._file.close()
+
+    async def finish(self):
+        """Flush and close the temporary file; returns the content's key."""
+        await self._flush()
+        # Synced before it can be published, since a key is trusted to name complete content
+        await asyncio.to_thread(self._close, True)
+        self.key = self._hash.hexdigest()
+        return self.key
+
+    async def commit(self):
+        if self._temp_path is None:
+            return
+        await asyncio.to_thread(self.storage._publish, self._temp_path, self.key)
+        self._temp_path = None
+
+    async def abort(self):
+        if self._temp_path is None:
+            return
+        temp_path, self._temp_path = self._temp_path, None
+        await asyncio.to_thread(self.storage._discard, self._file, temp_path)
+
+
+class LocalStorage:
+    """Blobs under ``root`` as ``<root>/<key[:2]>/<key>``; uploads in progress sit in ``<root>/tmp``."""
+
+    def __init__(self, root, chunk_size=CHUNK_SIZE):
+        self.root = os.path.abspath(root)
+        self.chunk_size = chunk_size
+        self._temp_dir = os.path.join(self.root, "tmp")
+
+    def path(self, key):
+        if not _KEY.fullmatch(key):
+            raise ValueError(f"Invalid blob key: {key!r}")
+        return os.path.join(self.root, key[:2], key)
+
+    def _open_temp(self):
+        os.makedirs(self._temp_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self._temp_dir)
+        return temp_path, os.fdopen(fd, "wb", buffering=0)
+
+    async def create(self):
+        temp_path, file = await asyncio.to_thread(self._open_temp)
+        return LocalBlobWriter(self, temp_path, file)
+
+    def _publish(self, temp_path, key):
+        path = self.path(key)
+        if os.path.exists(path):
+            # Same content already stored
+            os.unlink(temp_path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Atomic; a concurrent upload of the same content writes identical bytes
+        os.replace(temp_path, path)
+
+    def _discard(self, file, temp_path):
+        file.close()
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+
+    async def response(self, key, filename, media_type, headers=None):
+        path = self.path(key)
+        try:
+            stat_result = await asyncio.to_thread(os.stat, path)
+        except FileNotFoundError:
+            return None
+        response = FileResponse(path, headers=headers, media_type=media_type, filename=filename,
+                                stat_result=stat_result)
+        response.chunk_size = self.chunk_size
+        return response
+
+    async def delete(self, key):
+        try:
+            await asyncio.to_thread(os.unlink, self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+def storage_from_settings(config=settings):
+    # ATTACHMENT_STORAGE is validated by settings.py; "local" is the only store so far
+    return LocalStorage(config.attachment_dir)
+
+
+attachment_storage = storage_from_settings()
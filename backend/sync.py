@@ -0,0 +1,76 @@
+"""Delta sync: what changed for a caller since the version it last saw.
+
+A client keeps the ``version`` of its last sync and sends it back as
+``since``; the answer holds the tasks, submissions and reports written after
+it and the ids of rows deleted since (tombstones), each with its version, so
+reconnecting costs what changed rather than the whole data set.  A client
+with nothing stored syncs from 0, which returns every row and no tombstones.
+
+A page holds the ``limit`` oldest changes across all kinds.  Its ``version``
+is the newest of them: the next ``since``, with ``more`` telling whether to
+ask again at once.  A client applies a page's rows and tombstones in version
+order, so a task deleted after an update is deleted and one reassigned back
+to an internee after a tombstone is restored.
+
+Tombstones are compacted after SYNC_TOMBSTONE_RETENTION; a ``since`` older
+than the newest removed one raises SyncExpired, and the client starts over
+from 0.  A ``since`` past the current version was never handed out by this
+database (a client restored from another one, or a corrupted store) and
+raises SyncAhead: answering it would skip every change up to it.
+"""
+from repositories import sync as queries
+
+# Changes per page unless the client asks for fewer or more
+PAGE_SIZE = 500
+
+# Response key of each kind of change, with the fields of its rows
+_KINDS = {
+    "tasks": queries.TASK_FIELDS,
+    "submissions": queries.SUBMISSION_FIELDS,
+    "reports": queries.REPORT_FIELDS,
+    "deleted": queries.TOMBSTONE_FIELDS,
+}
+
+
+class SyncExpired(Exception):
+    """The tombstones after ``since`` have been compacted away."""
+
+
+class SyncAhead(Exception):
+    """``since`` is newer than any version of this database."""
+
+
+async def changes(conn, since, owner_id=None, limit=PAGE_SIZE):
+    """One sync page after ``since``; only the internee's own rows with ``owner_id``.
+
+    Returns ``{"version", "more", "tasks", "submissions", "reports",
+    "deleted"}``, the last four lists of dicts.
+    """
+    compacted, current = await queries.version_bounds(conn)
+    if since > current:
+        raise SyncAhead(f"Version {since} is newer than the current version {current}; sync again from 0")
+    if since > 0 and since < compacted:
+        raise SyncExpired(f"Changes before version {since} are no longer kept; sync again from 0")
+
+    # One more than a page of each kind: then the page's oldest changes across
+    # kinds are all among them, and a longer list means there is more
+    fetched = {
+        "tasks": await queries.changed_tasks(conn, since, owner_id, limit + 1),
+        "submissions": await queries.changed_submissions(conn, since, owner_id, limit + 1),
+        "reports": await queries.changed_reports(conn, since, owner_id, limit + 1),
+        # Nothing stored locally yet, so nothing to delete
+        "deleted": await queries.tombstones(conn, since, owner_id, limit + 1) if since > 0 else [],
+    }
+    merged = sorted(((row[-1], kind, row) for kind, rows in fetched.items() for row in rows),
+                    key=lambda item: item[0])
+    more = len(merged) > limit
+    page = merged[:limit]
+    if more and page and merged[limit][0] == page[-1][0]:
+        # Never end a page inside a version, or the next one would skip the rest of it
+        cut = page[-1][0]
+        page = [item for item in page if item[0] != cut] or [item for item in merged if item[0] <= cut]
+
+    result = {"version": page[-1][0] if page else since, "more": more}
+    for kind, fields in _KINDS.items():
+        result[kind] = [dict(zip(fields, row)) for _, item_kind, row in page if item_kind == kind]
+    return result
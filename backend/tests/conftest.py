@@ -0,0 +1,80 @@
+"""App and database fixtures: each test gets a fresh SQLite file and empty caches.
+
+Settings are read once at import, so the environment is set here before any
+app module is imported.  Tokens are issued by the local verifier
+(AUTH_VERIFIER=local) for the seeded users.
+"""
+import os
+import sqlite3
+import sys
+
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("AUTH_VERIFIER", "local")
+os.environ.setdefault("JOBS_SCHEDULER", "false")
+os.environ.setdefault("JOBS_WORKERS", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+import db  # noqa: E402
+import main  # noqa: E402
+import migrations  # noqa: E402
+from identity import IdentityCache, MemoryIdentityBackend  # noqa: E402
+from response_cache import MemoryVersionStore, ResponseCache  # noqa: E402
+
+# uid -> (id, role) of the seeded users
+USERS = {"admin": (1, "admin"), "internee-1": (2, "internee"), "internee-2": (3, "internee")}
+# Tasks per internee, assigned in turn
+TASKS = 10
+
+
+def seed(path):
+    conn = sqlite3.connect(path)
+    migrations.upgrade(conn, "sqlite")
+    conn.executemany(
+        "INSERT INTO users (id, firebase_id, email, name, role) VALUES (?, ?, ?, ?, ?)",
+        [(id, uid, f"{uid}@example.com", uid.title(), role) for uid, (id, role) in USERS.items()],
+    )
+    conn.executemany(
+        "INSERT INTO tasks (title, description, status, created_by, assigned_to, deadline) "
+        "VALUES (?, 'Seeded', 'pending', 1, ?, '2030-01-01 00:00:00')",
+        [(f"Task {i}", 2 + i % 2) for i in range(2 * TASKS)],
+    )
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def database(tmp_path, monkeypatch):
+    path = str(tmp_path / "test.db")
+    seed(path)
+    database = db.Database(db.SQLiteBackend(path))
+    monkeypatch.setattr(db, "database", database)
+    monkeypatch.setattr(main, "database", database)
+    monkeypatch.setattr(main, "identity_cache", IdentityCache(MemoryIdentityBackend()))
+    monkeypatch.setattr(main, "response_cache", ResponseCache(MemoryVersionStore()))
+    yield database
+    # Routes start the activity writer on this test's event loop
+    await main.activity_log.stop()
+    await database.aclose()
+    database.close()
+
+
+@pytest.fixture
+async def client(database):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def auth():
+    """``auth(uid)``: headers carrying a bearer token for ``uid``."""
+    def headers(uid):
+        return {"Authorization": f"Bearer {main.token_cache.verifier.issue({'uid': uid})}"}
+    return headers
@@ -0,0 +1,127 @@
+"""The task activity log (activity.py) and GET /tasks/{task_id}/history/."""
+import asyncio
+
+import pytest
+
+import main
+from activity import ActivityLog
+from repositories import activity as queries
+
+pytestmark = pytest.mark.anyio
+
+
+async def history(client, auth, task_id):
+    response = await client.get(f"/tasks/{task_id}/history/", headers=auth("admin"))
+    assert response.status_code == 200
+    return [(entry["action"], entry["actor_id"], entry["changes"]) for entry in response.json()]
+
+
+async def written(database):
+    conn = await database.acquire()
+    try:
+        return await conn.fetchall("SELECT task_id, action FROM task_activity ORDER BY id")
+    finally:
+        await database.release(conn)
+
+
+async def test_buffered_entries_are_written_on_stop(database):
+    log = ActivityLog(batch_size=100, flush_interval=60)
+    for task_id in (1, 2, 3):
+        await log.record(task_id, 1, "updated", {})
+    await asyncio.sleep(0.05)
+    assert await written(database) == []
+    assert log.metrics()["buffered"] == 3
+
+    await log.stop()
+    assert await written(database) == [(1, "updated"), (2, "updated"), (3, "updated")]
+    assert (log.written, log.metrics()["buffered"]) == (3, 0)
+
+
+async def test_full_batch_is_written_without_waiting_for_the_interval(database):
+    log = ActivityLog(batch_size=2, flush_interval=60)
+    try:
+        await log.record(1, 1, "updated", {})
+        await log.record(2, 1, "updated", {})
+        await asyncio.sleep(0.05)
+        assert await written(database) == [(1, "updated"), (2, "updated")]
+    finally:
+        await log.stop()
+
+
+async def test_full_buffer_waits_for_the_writer(database):
+    log = ActivityLog(capacity=2, batch_size=100, flush_interval=60, block_timeout=1.0)
+    try:
+        for task_id in (1, 2, 3):
+            await log.record(task_id, 1, "updated", {})
+        # The third entry made room by having the first two written
+        assert await written(database) == [(1, "updated"), (2, "updated")]
+        assert (log.blocked, log.dropped, log.metrics()["buffered"]) == (1, 0, 1)
+    finally:
+        await log.stop()
+    assert len(await written(database)) == 3
+
+
+async def test_full_buffer_drops_the_oldest_while_the_database_is_down(database, monkeypatch):
+    async def unavailable(conn, rows):
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(queries, "insert_many", unavailable)
+    log = ActivityLog(capacity=2, batch_size=100, flush_interval=60, block_timeout=0.05)
+    for task_id in (1, 2, 3):
+        await log.record(task_id, 1, "updated", {})
+    assert (log.dropped, log.failed_flushes >= 1) == (1, True)
+    assert not log.pending(1) and log.pending(3)
+
+    monkeypatch.undo()
+    await log.stop()
+    assert await written(database) == [(2, "updated"), (3, "updated")]
+
+
+async def test_history_is_newest_first_across_pages(client, auth):
+    for status in ("in_progress", "completed", "pending"):
+        assert (await client.put("/tasks/1/", headers=auth("admin"), json={"status": status})).status_code == 200
+
+    first = await client.get("/tasks/1/history/?limit=2", headers=auth("internee-1"))
+    rest = await client.get(f"/tasks/1/history/?limit=2&cursor={first.headers['x-next-cursor']}",
+                            headers=auth("internee-1"))
+    entries = first.json() + rest.json()
+    assert [entry["changes"]["status"] for entry in entries] == [
+        ["completed", "pending"], ["in_progress", "completed"], ["pending", "in_progress"],
+    ]
+    assert len({entry["id"] for entry in entries}) == 3
+    # Not someone else's task
+    assert (await client.get("/tasks/1/history/", headers=auth("internee-2"))).status_code == 404
+
+
+async def test_batch_writes_record_one_entry_per_task(client, auth):
+    created = await client.post("/tasks/batch/", headers=auth("admin"), json=[
+        {"title": "First", "assigned_to": 2}, {"title": "Second", "assigned_to": 3},
+    ])
+    first, second = (result["id"] for result in created.json()["results"])
+    assert await history(client, auth, second) == [("created", 1, {
+        "title": [None, "Second"], "status": [None, "pending"], "assigned_to": [None, 3],
+    })]
+
+    updated = await client.patch("/tasks/batch/", headers=auth("admin"), json=[
+        {"id": first, "status": "in_progress"}, {"id": 1, "title": "Renamed", "assigned_to": 3},
+        # Sets the value the task already has
+        {"id": second, "status": "pending"},
+    ])
+    assert updated.json()["updated"] == 3
+
+    assert (await history(client, auth, first))[0] == ("updated", 1, {"status": ["pending", "in_progress"]})
+    assert (await history(client, auth, 1))[0] == ("updated", 1, {
+        "title": ["Task 0", "Renamed"], "assigned_to": [2, 3],
+    })
+    assert len(await history(client, auth, second)) == 1
+
+
+async def test_overdue_job_records_its_flags_without_an_actor(client, auth, database):
+    await client.put("/tasks/1/", headers=auth("admin"), json={"deadline": "2020-01-01T00:00:00"})
+    conn = await database.acquire()
+    try:
+        await main.flag_overdue_job(conn, None)
+    finally:
+        await database.release(conn)
+
+    assert (await history(client, auth, 1))[0] == ("flagged_overdue", None, {})
@@ -0,0 +1,97 @@
+"""Archiving finished work to the cold tables (archive.py) and reading it back with include_archived."""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import main
+from jobs import Job
+from storage import LocalStorage
+
+pytestmark = pytest.mark.anyio
+
+BOUNDARY = "test-boundary"
+
+
+@pytest.fixture
+def archive_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "attachment_storage", LocalStorage(str(tmp_path / "attachments")))
+    monkeypatch.setattr(main, "settings", main.settings.model_copy(update={"archive_batch_size": 2}))
+
+
+async def finish_work(client, auth):
+    """internee-1 submits tasks 1 (with an attachment) and 3, the admin completes 2 and 4; returns the attachment URL."""
+    body = (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="description"\r\n\r\nDone\r\n'
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="attachment"; filename="a.txt"\r\n\r\n'
+        f"attached\r\n--{BOUNDARY}--\r\n"
+    ).encode()
+    submitted = await client.post("/tasks/1/submit/", content=body, headers={
+        **auth("internee-1"), "Content-Type": f"multipart/form-data; boundary={BOUNDARY}",
+    })
+    assert submitted.status_code == 200
+    assert (await client.post("/tasks/3/submit/", headers=auth("internee-1"), json={"description": "Done"})).status_code == 200
+    for task_id in (2, 4):
+        assert (await client.put(f"/tasks/{task_id}/", headers=auth("admin"), json={"status": "completed"})).status_code == 200
+    report = await client.post("/reports/", headers=auth("admin"), json={
+        "internee_id": 2, "period_start": "2026-01-01", "period_end": "2026-01-31",
+        "tasks_completed": 2, "tasks_pending": 8, "overall_performance": "Good",
+    })
+    assert report.status_code == 200
+    return submitted.json()["attachments"][0]["url"]
+
+
+async def archive_now(database):
+    job = Job(1, "archive.completed_work", {"before": (datetime.now() + timedelta(days=1)).isoformat()}, 1, 1, None)
+    conn = await database.acquire()
+    try:
+        result, _ = await main.archive_job(conn, job)
+    finally:
+        await database.release(conn)
+    return result
+
+
+async def ids(client, auth, path, uid="admin", **params):
+    response = await client.get(path, params=params, headers=auth(uid))
+    assert response.status_code == 200
+    return {row["id"] for row in response.json()}
+
+
+async def test_archive_round_trip(client, auth, database, archive_settings):
+    attachment = await finish_work(client, auth)
+    today = date.today()
+    stats_params = {"period_start": str(today - timedelta(days=1)), "period_end": str(today + timedelta(days=1))}
+    stats = (await client.get("/reports/stats/", params=stats_params, headers=auth("admin"))).json()
+    version = (await client.get("/sync/", headers=auth("admin"))).json()["version"]
+
+    result = await archive_now(database)
+    assert {k: result[k] for k in ("batches", "tasks", "submissions", "attachments", "reports")} == {
+        "batches": 2, "tasks": 4, "submissions": 2, "attachments": 1, "reports": 1,
+    }
+    assert main.archive_stats.metrics()["last_run"] == result
+
+    # The hot lists no longer have them; include_archived reads both
+    archived = {1, 2, 3, 4}
+    assert not archived & await ids(client, auth, "/tasks/", limit=100)
+    assert archived <= await ids(client, auth, "/tasks/", limit=100, include_archived="true")
+    assert not archived & await ids(client, auth, "/tasks/", "internee-1", limit=100)
+    assert {1, 3} <= await ids(client, auth, "/tasks/", "internee-1", limit=100, include_archived="true")
+    assert await ids(client, auth, "/tasks/1/submissions/") == set()
+    assert len(await ids(client, auth, "/tasks/1/submissions/", include_archived="true")) == 1
+    assert await ids(client, auth, "/reports/") == set()
+    assert len(await ids(client, auth, "/reports/", "internee-1", include_archived="true")) == 1
+
+    # Attachments still download; statistics still count the archived tasks
+    download = await client.get(attachment, headers=auth("internee-1"))
+    assert (download.status_code, download.content) == (200, b"attached")
+    assert (await client.get("/reports/stats/", params=stats_params, headers=auth("admin"))).json() == stats
+
+    # Sync clients see the archived rows as deleted
+    deleted = (await client.get("/sync/", params={"since": version}, headers=auth("admin"))).json()["deleted"]
+    assert {(d["type"], d["id"]) for d in deleted if d["type"] != "submission"} == {
+        ("task", 1), ("task", 2), ("task", 3), ("task", 4), ("report", 1),
+    }
+    assert len([d for d in deleted if d["type"] == "submission"]) == 2
+
+    assert (await client.get("/tasks/1/history/", headers=auth("admin"))).json()[0]["action"] == "archived"
+    # Nothing is left to move
+    assert (await archive_now(database))["tasks"] == 0
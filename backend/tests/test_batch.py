@@ -0,0 +1,70 @@
+"""POST and PATCH /tasks/batch/: all-or-nothing (atomic=true) or a result for each item (atomic=false)."""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+NEW_TASKS = [{"title": "Kept", "assigned_to": 2}, {"title": "Orphan", "assigned_to": 999}, {"title": "Also", "assigned_to": 3}]
+
+
+async def titles(client, auth):
+    return {task["title"] for task in (await client.get("/tasks/?limit=100", headers=auth("admin"))).json()}
+
+
+async def test_atomic_create_rolls_back_every_item(client, auth):
+    response = await client.post("/tasks/batch/", headers=auth("admin"), json=NEW_TASKS)
+    assert response.status_code == 400
+    assert response.json()["detail"] == {
+        "message": "Batch rejected, no tasks were created",
+        "results": [{"index": 1, "status": "error", "detail": "Assigned user not found"}],
+    }
+    assert not {"Kept", "Orphan", "Also"} & await titles(client, auth)
+
+
+async def test_non_atomic_create_reports_each_item(client, auth):
+    response = await client.post("/tasks/batch/?atomic=false", headers=auth("admin"), json=NEW_TASKS)
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 1)
+    assert [(r["index"], r["status"]) for r in body["results"]] == [(0, "created"), (1, "error"), (2, "created")]
+    assert body["results"][1]["detail"] == "Assigned user not found"
+    assert {"Kept", "Also"} <= await titles(client, auth)
+    assert "Orphan" not in await titles(client, auth)
+
+
+UPDATES = [{"id": 1, "title": "Renamed"}, {"id": 2, "assigned_to": 999}, {"id": 404, "status": "completed"}]
+
+
+async def test_atomic_update_rolls_back_every_item(client, auth):
+    response = await client.patch("/tasks/batch/", headers=auth("admin"), json=UPDATES)
+    assert response.status_code == 400
+    assert response.json()["detail"] == {
+        "message": "Batch rejected, no tasks were updated",
+        "results": [
+            {"index": 1, "id": 2, "status": "error", "detail": "Assigned user not found"},
+            {"index": 2, "id": 404, "status": "error", "detail": "Task not found"},
+        ],
+    }
+    assert "Renamed" not in await titles(client, auth)
+
+
+async def test_non_atomic_update_reports_each_item(client, auth):
+    response = await client.patch("/tasks/batch/?atomic=false", headers=auth("admin"), json=UPDATES)
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["updated"], body["failed"]) == (1, 2)
+    assert [r["status"] for r in body["results"]] == ["updated", "error", "error"]
+    assert "Renamed" in await titles(client, auth)
+    # The failed item's task is unchanged
+    internee = (await client.get("/tasks/?limit=100", headers=auth("internee-2"))).json()
+    assert 2 in {task["id"] for task in internee}
+
+
+async def test_internee_batch_update_is_limited_to_own_task_status(client, auth):
+    response = await client.patch("/tasks/batch/?atomic=false", headers=auth("internee-1"), json=[
+        {"id": 1, "status": "in_progress"}, {"id": 2, "status": "in_progress"}, {"id": 3, "title": "Mine now"},
+    ])
+    assert [(r["status"], r.get("detail")) for r in response.json()["results"]] == [
+        ("updated", None),
+        ("error", "Not authorized to update this task"),
+        ("error", "Internees can only update task status"),
+    ]
@@ -0,0 +1,109 @@
+"""The task change feed (events.py): replay from Last-Event-ID, the replay floor and slow subscribers."""
+import asyncio
+import json
+
+import pytest
+
+from events import EventBus, MemoryBroker
+
+pytestmark = pytest.mark.anyio
+
+ADMIN = (1, "admin")
+INTERNEE = (2, "internee")
+
+
+def parse(frame):
+    """``(id, type, data)`` of an SSE frame."""
+    fields = dict(line.split(": ", 1) for line in frame.strip().splitlines())
+    return fields.get("id"), fields["event"], json.loads(fields["data"])
+
+
+async def frames(stream, n):
+    """The next ``n`` event frames of ``stream``, skipping the retry line."""
+    received = []
+    while len(received) < n:
+        frame = await asyncio.wait_for(stream.__anext__(), 1)
+        if not frame.startswith("retry:"):
+            received.append(parse(frame))
+    return received
+
+
+@pytest.fixture
+async def bus():
+    bus = EventBus(MemoryBroker(), replay_size=3, queue_size=2, heartbeat=60)
+    yield bus
+    await bus.stop()
+
+
+async def publish(bus, n, internee_id=2):
+    ids = []
+    for i in range(n):
+        await bus.publish("task.updated", {"id": i}, internee_id)
+        ids.append(bus.replay[-1].id)
+    return ids
+
+
+async def test_reconnect_replays_what_was_missed(bus):
+    ids = await publish(bus, 3)
+    stream = bus.stream(INTERNEE, ids[0])
+    try:
+        assert await frames(stream, 2) == [(ids[1], "task.updated", {"id": 1}), (ids[2], "task.updated", {"id": 2})]
+        # Then live events follow
+        await publish(bus, 1)
+        assert (await frames(stream, 1))[0][2] == {"id": 0}
+    finally:
+        await stream.aclose()
+
+
+async def test_reconnect_past_the_replay_buffer_resets(bus):
+    ids = await publish(bus, 5)
+    # Events 1 and 2 left the buffer; the client that saw event 2 misses nothing
+    assert [event.id for event in bus.replay] == ids[2:]
+
+    resumed = bus.stream(ADMIN, ids[1])
+    gap = bus.stream(ADMIN, ids[0])
+    other_epoch = bus.stream(ADMIN, "0000-1")
+    try:
+        assert [frame[2] for frame in await frames(resumed, 3)] == [{"id": 2}, {"id": 3}, {"id": 4}]
+        # Not a silent gap: event 2 is gone, so the client is told to reload
+        assert await frames(gap, 1) == [(None, "reset", {})]
+        assert await frames(other_epoch, 1) == [(None, "reset", {})]
+    finally:
+        for stream in (resumed, gap, other_epoch):
+            await stream.aclose()
+
+
+async def test_replay_only_includes_visible_events(bus):
+    first, = await publish(bus, 1)
+    await bus.publish("task.updated", {"id": "theirs"}, 3)
+    await bus.publish("task.updated", {"id": "mine"}, 2, admins=False)
+    internee, admin = bus.stream(INTERNEE, first), bus.stream(ADMIN, first)
+    try:
+        assert [frame[2] for frame in await frames(internee, 1)] == [{"id": "mine"}]
+        assert [frame[2] for frame in await frames(admin, 1)] == [{"id": "theirs"}]
+    finally:
+        await internee.aclose()
+        await admin.aclose()
+
+
+async def test_slow_subscriber_is_dropped_with_a_reset(bus):
+    stream = bus.stream(ADMIN)
+    try:
+        assert await stream.__anext__() == "retry: 3000\n\n"
+        # Waiting for the first event, so the subscription is registered
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        ids = await publish(bus, 4)
+
+        # Its queue held two of them; the third dropped it, so what is still
+        # queued is skipped and the client is told to reload
+        assert parse(await pending)[0] == ids[0]
+        assert await frames(stream, 1) == [(None, "reset", {})]
+        assert bus.dropped_subscribers == 1
+        # The stream ends after the reset, and publishing goes on without it
+        with pytest.raises(StopAsyncIteration):
+            await stream.__anext__()
+        await publish(bus, 1)
+        assert bus.metrics()["subscribers"] == 0
+    finally:
+        await stream.aclose()
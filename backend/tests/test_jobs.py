@@ -0,0 +1,154 @@
+"""The background job queue (jobs.py) and the periodic jobs of main.py."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+from jobs import JobQueue, PermanentError, _as_datetime, get_job
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def conn(database):
+    conn = await database.acquire()
+    yield conn
+    await conn.rollback()
+    await database.release(conn)
+
+
+@pytest.fixture
+def queue(database):
+    # Run by hand through _claim and _execute, as the dispatcher would
+    return JobQueue(workers=0, max_attempts=3, retry_base=10.0, retry_max=15.0, lease=60.0, scheduler=False)
+
+
+def flaky(queue, failures, error=RuntimeError):
+    """Register a ``test.flaky`` handler failing its first ``failures`` calls; returns the attempts it saw."""
+    attempts = []
+
+    @queue.handler("test.flaky")
+    async def run(conn, job):
+        attempts.append(job.attempt)
+        if len(attempts) <= failures:
+            raise error(f"failure {len(attempts)}")
+        return {"attempt": job.attempt}, None
+    return attempts
+
+
+async def enqueue(queue, conn, **kwargs):
+    job_id = await queue.enqueue(conn, "test.flaky", {}, **kwargs)
+    await conn.commit()
+    return job_id
+
+
+async def make_due(conn, job_id):
+    """Move a retry or a lease forward to now, as waiting for it would."""
+    await conn.execute("UPDATE jobs SET run_at = ? WHERE id = ?", datetime.now() - timedelta(seconds=1), job_id)
+    await conn.commit()
+
+
+async def test_failed_job_is_retried_with_backoff_until_it_succeeds(queue, conn):
+    attempts = flaky(queue, 2)
+    job_id = await enqueue(queue, conn)
+
+    for attempt, delay in ((1, 10.0), (2, 15.0)):
+        started = datetime.now()
+        await queue._execute(await queue._claim())
+        job = await get_job(conn, job_id)
+        assert (job["status"], job["attempts"], job["error"]) == ("queued", attempt, f"RuntimeError: failure {attempt}")
+        # Doubling from retry_base, capped at retry_max, less up to half of jitter
+        wait = (_as_datetime(job["run_at"]) - started).total_seconds()
+        assert delay / 2 - 1 <= wait <= delay + 1
+        assert await queue._claim() is None
+        await make_due(conn, job_id)
+
+    await queue._execute(await queue._claim())
+    job = await get_job(conn, job_id)
+    assert (job["status"], job["attempts"], job["result"], job["error"]) == ("succeeded", 3, {"attempt": 3}, None)
+    assert attempts == [1, 2, 3]
+    assert (queue.retried, queue.succeeded, queue.failed) == (2, 1, 0)
+
+
+async def test_job_fails_after_max_attempts(queue, conn):
+    flaky(queue, 5)
+    job_id = await enqueue(queue, conn, max_attempts=2)
+    for _ in range(2):
+        await queue._execute(await queue._claim())
+        await make_due(conn, job_id)
+
+    job = await get_job(conn, job_id)
+    assert (job["status"], job["attempts"], job["error"]) == ("failed", 2, "RuntimeError: failure 2")
+    assert job["finished_at"] is not None
+    assert await queue._claim() is None
+    assert (queue.retried, queue.failed) == (1, 1)
+
+
+async def test_permanent_error_fails_at_once(queue, conn):
+    flaky(queue, 1, PermanentError)
+    job_id = await enqueue(queue, conn)
+    await queue._execute(await queue._claim())
+
+    job = await get_job(conn, job_id)
+    assert (job["status"], job["attempts"], job["error"]) == ("failed", 1, "PermanentError: failure 1")
+    assert (queue.retried, queue.failed) == (0, 1)
+
+
+async def test_expired_lease_is_taken_over(queue, conn):
+    attempts = flaky(queue, 1)
+    job_id = await enqueue(queue, conn)
+    stale = await queue._claim()
+    # The first worker stalls past its lease, and another claims the job
+    await make_due(conn, job_id)
+    current = await queue._claim()
+    assert (stale.id, stale.attempt, current.id, current.attempt) == (job_id, 1, job_id, 2)
+
+    # The stalled attempt's failure is not recorded over the running one
+    await queue._execute(stale)
+    job = await get_job(conn, job_id)
+    assert (job["status"], job["attempts"], job["error"]) == ("running", 2, None)
+    assert (queue.lost_leases, queue.retried) == (1, 0)
+
+    await queue._execute(current)
+    assert (await get_job(conn, job_id))["status"] == "succeeded"
+    # Nor is a late success over the finished job
+    await queue._execute(stale)
+    assert (await get_job(conn, job_id))["result"] == {"attempt": 2}
+    assert attempts == [1, 2, 1]
+    assert (queue.lost_leases, queue.succeeded) == (2, 1)
+
+
+async def test_lease_expiring_after_the_last_attempt_fails_the_job(queue, conn):
+    attempts = flaky(queue, 0)
+    job_id = await enqueue(queue, conn, max_attempts=1)
+    await queue._claim()
+    await make_due(conn, job_id)
+    await queue._execute(await queue._claim())
+
+    job = await get_job(conn, job_id)
+    assert (job["status"], job["attempts"], job["error"]) == ("failed", 2, "PermanentError: Gave up after 1 attempts")
+    assert attempts == []
+
+
+async def test_overdue_job_flags_without_changing_status(client, auth, conn):
+    admin = auth("admin")
+    # Seeded tasks 1 and 2 are pending, 20 is done; all past their deadline
+    for task_id, status in ((1, "in_progress"), (2, None), (20, "completed")):
+        fields = {"deadline": "2020-01-01T00:00:00"}
+        if status:
+            fields["status"] = status
+        assert (await client.put(f"/tasks/{task_id}/", headers=admin, json=fields)).status_code == 200
+
+    assert await main.flag_overdue_job(conn, None) == ({"flagged": 2}, None)
+    statuses = await conn.fetchall("SELECT id, status FROM tasks WHERE overdue_flagged_at IS NOT NULL ORDER BY id")
+    assert statuses == [(1, "in_progress"), (2, "pending")]
+    # Each deadline is flagged once
+    assert await main.flag_overdue_job(conn, None) == ({"flagged": 0}, None)
+
+    dashboard = {row["internee_id"]: row for row in (await client.get("/dashboard/", headers=admin)).json()}
+    assert (dashboard[2]["tasks_in_progress"], dashboard[2]["tasks_overdue"]) == (1, 1)
+    assert dashboard[3]["tasks_overdue"] == 1
+
+    # A moved deadline is flagged again once it passes
+    await client.put("/tasks/1/", headers=admin, json={"deadline": datetime.now().isoformat()})
+    assert await main.flag_overdue_job(conn, None) == ({"flagged": 1}, None)
@@ -0,0 +1,133 @@
+"""Rate limiting (ratelimit.py) and single-flight coalescing (coalesce.py) through the app."""
+import asyncio
+
+import pytest
+
+import main
+from ratelimit import MemoryBucketStore
+from repositories import tasks
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """``limits({route: (rate, burst)})`` applies those limits with fresh buckets."""
+    def apply(limits):
+        monkeypatch.setattr(main.rate_limiter, "limits", dict(limits))
+        monkeypatch.setattr(main.rate_limiter, "store", MemoryBucketStore())
+        monkeypatch.setattr(main.rate_limiter, "limited", {})
+    return apply
+
+
+async def test_bucket_allows_burst_then_refills_at_rate():
+    clock = Clock()
+    store = MemoryBucketStore(clock=clock)
+    decisions = [await store.take("k", 2.0, 3) for _ in range(4)]
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert decisions[-1].retry_after == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert (await store.take("k", 2.0, 3)).allowed
+    assert not (await store.take("k", 2.0, 3)).allowed
+
+    # Refilling stops at the burst
+    clock.now += 60
+    assert [(await store.take("k", 2.0, 3)).allowed for _ in range(4)] == [True, True, True, False]
+
+
+async def test_evicted_bucket_starts_full():
+    store = MemoryBucketStore(max_keys=1, clock=Clock())
+    assert (await store.take("a", 1.0, 1)).allowed
+    assert not (await store.take("a", 1.0, 1)).allowed
+    await store.take("b", 1.0, 1)
+    assert len(store) == 1
+    assert (await store.take("a", 1.0, 1)).allowed
+
+
+async def test_empty_bucket_answers_429_with_retry_after(client, auth, limits):
+    limits({"GET /tasks/": (0.5, 2)})
+    statuses = [(await client.get("/tasks/", headers=auth("admin"))).status_code for _ in range(2)]
+    assert statuses == [200, 200]
+
+    response = await client.get("/tasks/", headers=auth("admin"))
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "2"
+    assert response.json() == {"detail": "Rate limit exceeded"}
+    assert main.rate_limiter.limited == {"GET /tasks/": 1}
+
+
+async def test_callers_have_separate_buckets(client, auth, limits):
+    limits({"GET /tasks/": (0.001, 1)})
+    assert (await client.get("/tasks/", headers=auth("admin"))).status_code == 200
+    assert (await client.get("/tasks/", headers=auth("admin"))).status_code == 429
+    assert (await client.get("/tasks/", headers=auth("internee-1"))).status_code == 200
+
+
+async def test_routes_have_separate_buckets_under_the_default(client, auth, limits):
+    limits({"*": (0.001, 1)})
+    assert (await client.get("/tasks/", headers=auth("admin"))).status_code == 200
+    assert (await client.get("/tasks/", headers=auth("admin"))).status_code == 429
+    assert (await client.get("/reports/", headers=auth("admin"))).status_code == 200
+    assert (await client.get("/tasks/1/submissions/", headers=auth("admin"))).status_code == 200
+    # Another id is the same route template
+    assert (await client.get("/tasks/2/submissions/", headers=auth("admin"))).status_code == 429
+
+
+async def test_path_overlapping_a_parameterised_route_is_limited_as_itself(client, auth, limits):
+    # GET /tasks/export/ also matches the path of PUT/DELETE /tasks/{task_id}/
+    assert main.route_template({"type": "http", "method": "GET", "path": "/tasks/export/"}) == "/tasks/export/"
+    assert main.route_template({"type": "http", "method": "PUT", "path": "/tasks/7/"}) == "/tasks/{task_id}/"
+    # A method no route has still gets the template of the path it matches
+    assert main.route_template({"type": "http", "method": "PATCH", "path": "/tasks/7/"}) == "/tasks/{task_id}/"
+
+    limits({"GET /tasks/export/": (0.001, 1)})
+    assert (await client.get("/tasks/export/", headers=auth("admin"))).status_code == 200
+    assert (await client.get("/tasks/export/", headers=auth("admin"))).status_code == 429
+    assert main.rate_limiter.limited == {"GET /tasks/export/": 1}
+
+
+async def test_concurrent_identical_reads_share_one_query(client, auth, monkeypatch):
+    assert "GET /tasks/" in main.single_flight.routes
+    queries = []
+    fetch_page = tasks.fetch_page
+
+    async def counted(conn, *args, **kwargs):
+        queries.append(args)
+        # Long enough for every request to arrive while the first is in flight
+        await asyncio.sleep(0.2)
+        return await fetch_page(conn, *args, **kwargs)
+
+    monkeypatch.setattr(tasks, "fetch_page", counted)
+    headers = auth("admin")
+    responses = await asyncio.gather(*(client.get("/tasks/?limit=5", headers=headers) for _ in range(8)))
+
+    assert [r.status_code for r in responses] == [200] * 8
+    assert len({r.content for r in responses}) == 1
+    assert len(queries) == 1
+
+
+async def test_concurrent_reads_of_different_scopes_do_not_share(client, auth, monkeypatch):
+    queries = []
+    fetch_page = tasks.fetch_page
+
+    async def counted(conn, *args, **kwargs):
+        queries.append(args)
+        await asyncio.sleep(0.2)
+        return await fetch_page(conn, *args, **kwargs)
+
+    monkeypatch.setattr(tasks, "fetch_page", counted)
+    admin, internee = await asyncio.gather(
+        client.get("/tasks/", headers=auth("admin")), client.get("/tasks/", headers=auth("internee-1"))
+    )
+    assert len(queries) == 2
+    assert len(admin.json()) == 20
+    assert {task["assigned_to_id"] for task in internee.json()} == {2}
@@ -0,0 +1,127 @@
+"""Conditional GETs and scoped invalidation of the per-user response cache (response_cache.py)."""
+import pytest
+
+import main
+from response_cache import MemoryVersionStore, ResponseCache
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def poll(client, auth):
+    """``poll(uid, path)``: GET ``path`` as ``uid`` once the caller's identity is cached, with its ETag."""
+    async def get(uid, path, etag=None):
+        headers = auth(uid)
+        if await main.identity_cache.peek(uid) is None:
+            # Uncached callers bypass the response cache until a route resolves them
+            assert (await client.get(path, headers=headers)).status_code == 200
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        return await client.get(path, headers=headers)
+    return get
+
+
+async def test_matching_if_none_match_answers_304(poll):
+    first = await poll("internee-1", "/tasks/")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    again = await poll("internee-1", "/tasks/", etag)
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert again.content == b""
+    assert (await poll("internee-1", "/tasks/", '"stale", W/' + etag)).status_code == 304
+    assert (await poll("internee-1", "/tasks/", '"stale"')).status_code == 200
+    assert main.response_cache.not_modified == 2
+
+
+async def test_task_write_invalidates_the_assignee_and_admins_only(client, auth, poll):
+    etags = {uid: (await poll(uid, "/tasks/")).headers["etag"] for uid in ("admin", "internee-1", "internee-2")}
+
+    response = await client.post("/tasks/", headers=auth("admin"), json={"title": "New", "assigned_to": 2})
+    assert response.status_code == 200
+
+    admin = await poll("admin", "/tasks/", etags["admin"])
+    assert admin.status_code == 200
+    assert len(admin.json()) == 21
+    internee = await poll("internee-1", "/tasks/", etags["internee-1"])
+    assert internee.status_code == 200
+    assert "New" in {task["title"] for task in internee.json()}
+    assert (await poll("internee-2", "/tasks/", etags["internee-2"])).status_code == 304
+
+
+async def test_reassignment_invalidates_both_internees(client, auth, poll):
+    etags = {uid: (await poll(uid, "/tasks/")).headers["etag"] for uid in ("internee-1", "internee-2")}
+    # Task 1 is seeded for internee-1
+    response = await client.put("/tasks/1/", headers=auth("admin"), json={"assigned_to": 3})
+    assert response.status_code == 200
+
+    assert 1 not in {task["id"] for task in (await poll("internee-1", "/tasks/", etags["internee-1"])).json()}
+    assert 1 in {task["id"] for task in (await poll("internee-2", "/tasks/", etags["internee-2"])).json()}
+
+
+async def test_report_write_invalidates_the_internee_and_admins_only(client, auth, poll):
+    etags = {uid: (await poll(uid, "/reports/")).headers["etag"] for uid in ("admin", "internee-1", "internee-2")}
+    response = await client.post("/reports/", headers=auth("admin"), json={
+        "internee_id": 3, "period_start": "2026-01-01", "period_end": "2026-01-31",
+        "tasks_completed": 1, "tasks_pending": 2, "overall_performance": "Good",
+    })
+    assert response.status_code == 200
+
+    assert len((await poll("admin", "/reports/", etags["admin"])).json()) == 1
+    assert len((await poll("internee-2", "/reports/", etags["internee-2"])).json()) == 1
+    assert (await poll("internee-1", "/reports/", etags["internee-1"])).status_code == 304
+
+
+async def test_registration_invalidates_admin_lists_only(client, auth, poll):
+    internees = (await poll("admin", "/users/internees/")).headers["etag"]
+    tasks = (await poll("internee-1", "/tasks/")).headers["etag"]
+
+    response = await client.post("/register/", headers=auth("internee-3"), json={
+        "email": "internee-3@example.com", "name": "Internee-3", "role": "internee",
+    })
+    assert response.json()["status"] == "created"
+
+    listed = await poll("admin", "/users/internees/", internees)
+    assert listed.status_code == 200
+    assert "internee-3@example.com" in {user["email"] for user in listed.json()}
+    assert (await poll("internee-1", "/tasks/", tasks)).status_code == 304
+
+
+async def test_dashboard_expires_with_its_ttl(poll, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(main, "response_cache", ResponseCache(MemoryVersionStore(), clock=clock))
+    ttl = main.response_cache.ttls["/dashboard/"]
+    clock.now = 100 * ttl
+    first = await poll("admin", "/dashboard/")
+
+    # Unchanged within the TTL period, though nothing was written
+    clock.now += ttl / 2
+    assert (await poll("admin", "/dashboard/", first.headers["etag"])).status_code == 304
+    clock.now += ttl
+    expired = await poll("admin", "/dashboard/", first.headers["etag"])
+    assert expired.status_code == 200
+    assert expired.headers["etag"] != first.headers["etag"]
+
+
+async def test_entries_are_never_served_to_another_user(poll):
+    mine = await poll("internee-1", "/tasks/")
+    assert (await poll("internee-1", "/tasks/", mine.headers["etag"])).status_code == 304
+
+    # Same URL and versions, another caller: neither the ETag nor the body carries over
+    theirs = await poll("internee-2", "/tasks/", mine.headers["etag"])
+    assert theirs.status_code == 200
+    assert theirs.headers["etag"] != mine.headers["etag"]
+    assert {task["assigned_to_id"] for task in mine.json()} == {2}
+    assert {task["assigned_to_id"] for task in theirs.json()} == {3}
+    # A cached entry is served from the store to its owner only
+    assert (await poll("internee-2", "/tasks/")).json() == theirs.json()
+    assert main.response_cache.hits == 1
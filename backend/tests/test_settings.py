@@ -0,0 +1,91 @@
+"""Settings validation (settings.load) and the startup lifespan against SQLite."""
+import os
+import time
+
+import httpx
+import pytest
+
+import db
+import main
+import settings as settings_module
+from settings import SettingsError, load
+
+# Seconds the lifespan may take against a local SQLite file
+STARTUP_BUDGET = 2.0
+
+
+def test_environment_overrides_the_settings_file(tmp_path):
+    path = tmp_path / "backend.env"
+    path.write_text("# pool\nDB_POOL_SIZE=4\nexport DB_POOL_TIMEOUT='5'\n\n")
+    loaded = load({"SETTINGS_FILE": str(path), "DB_BACKEND": "sqlite", "DB_POOL_SIZE": "6"})
+    assert (loaded.db_pool_size, loaded.db_pool_timeout) == (6, 5.0)
+
+
+def test_default_paths_do_not_depend_on_the_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    loaded = load({"DB_BACKEND": "sqlite"})
+    backend = os.path.dirname(os.path.abspath(settings_module.__file__))
+    assert loaded.sqlite_path == os.path.join(backend, "task_tracker.db")
+    assert loaded.attachment_dir == os.path.join(backend, "attachments")
+
+
+def test_rate_limits_are_parsed():
+    loaded = load({"DB_BACKEND": "sqlite", "RATE_LIMITS": "GET  /tasks/=5/10; *=20/40"})
+    assert loaded.rate_limits == {"GET /tasks/": (5.0, 10), "*": (20.0, 40)}
+
+
+@pytest.mark.parametrize("value", ["GET /tasks/", "GET /tasks/=5", "/tasks/=5/10", "*=fast/10", "*=0/10", "*=5/0"])
+def test_bad_rate_limits_name_the_variable(value):
+    with pytest.raises(SettingsError, match="RATE_LIMITS"):
+        load({"DB_BACKEND": "sqlite", "RATE_LIMITS": value})
+
+
+def test_bad_value_names_the_variable():
+    with pytest.raises(SettingsError, match="DB_POOL_SIZE"):
+        load({"DB_BACKEND": "sqlite", "DB_POOL_SIZE": "0"})
+
+
+def test_unknown_name_in_settings_file(tmp_path):
+    path = tmp_path / "backend.env"
+    path.write_text("DB_BACKEND=sqlite\nDB_POOLSIZE=4\n")
+    with pytest.raises(SettingsError, match=f"Unknown setting DB_POOLSIZE in {path}"):
+        load({"SETTINGS_FILE": str(path)})
+
+
+def test_malformed_settings_file_line(tmp_path):
+    path = tmp_path / "backend.env"
+    path.write_text("DB_BACKEND=sqlite\nDB_POOL_SIZE\n")
+    with pytest.raises(SettingsError, match=":2: expected NAME=value"):
+        load({"SETTINGS_FILE": str(path)})
+
+
+def test_mssql_needs_a_dsn_or_server():
+    with pytest.raises(SettingsError, match="DB_BACKEND=mssql needs DB_DSN or DB_SERVER"):
+        load({"DB_BACKEND": "mssql"})
+    assert load({"DB_BACKEND": "mssql", "DB_SERVER": "db.local"}).sql_server_dsn().startswith("DRIVER=")
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("driver", ["thread", "async"])
+async def test_lifespan_starts_within_budget_and_warms_the_pool(database, driver, auth, monkeypatch):
+    if driver == "async":
+        database = db.AsyncDriverDatabase(db.AioSQLiteBackend(database.backend.path))
+        monkeypatch.setattr(main, "database", database)
+        monkeypatch.setattr(db, "database", database)
+    warm = settings_module.settings.pool_warm
+    assert warm > 0
+
+    started = time.perf_counter()
+    async with main.app.router.lifespan_context(main.app):
+        elapsed = time.perf_counter() - started
+        assert database.metrics()["open"] == warm
+        assert database.metrics()["idle"] == warm
+
+        # The first request is served from a warm connection
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            response = await client.get("/users/me/", headers=auth("admin"))
+        assert response.status_code == 200
+        assert database.metrics()["open"] == warm
+    assert elapsed < STARTUP_BUDGET
+    # Shutting down closes the idle connections
+    assert database.metrics()["open"] == 0
@@ -0,0 +1,90 @@
+"""The query catalog (statements.py) and per-statement metrics (instrumentation.StatementStats)."""
+import re
+
+import pytest
+
+import statements
+from instrumentation import StatementStats, statement_stats
+from repositories import tasks
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def stats():
+    statement_stats.reset()
+    yield statement_stats
+    statement_stats.reset()
+
+
+def test_in_lists_pad_to_fixed_sizes():
+    assert list(statements.in_lists([], (1, 4))) == []
+    assert list(statements.in_lists([7], (1, 4))) == [[7]]
+    assert list(statements.in_lists([1, 2], (1, 4))) == [[1, 2, 2, 2]]
+    assert list(statements.in_lists(range(6), (1, 4))) == [[0, 1, 2, 3], [4, 5, 5, 5]]
+
+
+def test_catalog_names_are_unique():
+    def _values(dialect):
+        return "SELECT 1"
+
+    _values.__module__ = tasks.__name__
+    with pytest.raises(ValueError):
+        statements.catalog(_values)
+
+
+async def test_unknown_assignee_is_rejected_on_update(client, auth):
+    response = await client.put("/tasks/1/", headers=auth("admin"), json={"assigned_to": 999})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Assigned user not found"}
+
+    # A known assignee still goes through
+    task = await client.put("/tasks/1/", headers=auth("admin"), json={"assigned_to": 3, "title": "Moved"})
+    assert task.status_code == 200
+    assert (task.json()["task"]["assigned_to_id"], task.json()["task"]["title"]) == (3, "Moved")
+
+
+async def test_batch_insert_uses_one_statement_for_any_size(client, auth, database, stats):
+    created = []
+    for size in (1, 3, 5):
+        batch = [{"title": f"Batch {size}-{i}", "assigned_to": 2 + i % 2} for i in range(size)]
+        response = await client.post("/tasks/batch/", headers=auth("admin"), json=batch)
+        assert response.json()["created"] == size
+        created += [(r["id"], item["title"]) for r, item in zip(response.json()["results"], batch)]
+
+    # Ids follow the seeded tasks in order, each with its own row
+    assert [task_id for task_id, _ in created] == list(range(21, 30))
+    conn = await database.acquire()
+    try:
+        for task_id, title in created:
+            assert (await tasks.values(conn, task_id))["title"] == title
+    finally:
+        await database.release(conn)
+    inserts = [s for s in stats.metrics() if s["sql"].startswith("INSERT INTO tasks")]
+    # One executemany per batch, all with the same text
+    assert [(s["name"], s["calls"]) for s in inserts] == [("tasks.insert_batch_row", 3)]
+
+
+async def test_metrics_list_catalog_statements_by_name(client, auth, stats):
+    await client.get("/tasks/", headers=auth("internee-1"))
+    await client.put("/tasks/1/", headers=auth("admin"), json={"status": "in_progress"})
+    await client.get("/tasks/1/history/", headers=auth("admin"))
+
+    names = {s["name"] for s in (await client.get("/metrics/statements/", headers=auth("admin"))).json()}
+    assert {name.partition("(")[0] for name in names} >= {
+        "users.identity", "tasks.fetch_page", "tasks.values", "update_task", "activity.fetch_page"
+    }
+    # Every statement the requests ran is in the catalog, none under a bare fingerprint id
+    assert not [name for name in names if re.fullmatch("[0-9a-f]{12}", name)], names
+
+
+def test_statements_past_the_cap_are_counted_as_other():
+    stats = StatementStats(max_statements=2)
+    for table in ("tasks", "users", "reports", "jobs", "tasks"):
+        stats.add(f"SELECT id FROM {table}", 0.001, 1)
+    stats.add_rows("SELECT id FROM jobs", 5)
+
+    metrics = {s["name"]: (s["calls"], s["rows"]) for s in stats.metrics()}
+    assert len(metrics) == 3
+    assert metrics["other"] == (2, 7)
+    assert sum(calls for calls, _ in metrics.values()) == 5
@@ -0,0 +1,33 @@
+"""GET /sync/: delta pages and the range of versions a client may sync from (sync.py)."""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_sync_from_the_current_version_is_empty(client, auth):
+    full = (await client.get("/sync/", headers=auth("internee-1"))).json()
+    assert len(full["tasks"]) == 10
+    assert not full["more"]
+
+    again = await client.get("/sync/", params={"since": full["version"]}, headers=auth("internee-1"))
+    assert again.status_code == 200
+    assert again.json() == {"version": full["version"], "more": False, "tasks": [], "submissions": [],
+                            "reports": [], "deleted": []}
+
+
+async def test_sync_returns_changes_after_since(client, auth):
+    version = (await client.get("/sync/", headers=auth("internee-1"))).json()["version"]
+    assert (await client.put("/tasks/1/", headers=auth("admin"), json={"assigned_to": 3})).status_code == 200
+
+    page = (await client.get("/sync/", params={"since": version}, headers=auth("internee-1"))).json()
+    assert page["version"] > version
+    assert page["tasks"] == []
+    assert [(d["type"], d["id"]) for d in page["deleted"]] == [("task", 1)]
+
+
+async def test_since_past_the_current_version_is_rejected(client, auth):
+    version = (await client.get("/sync/", headers=auth("admin"))).json()["version"]
+
+    response = await client.get("/sync/", params={"since": version + 1}, headers=auth("admin"))
+    assert response.status_code == 400
+    assert "sync again from 0" in response.json()["detail"]
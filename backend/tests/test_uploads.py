@@ -0,0 +1,137 @@
+"""Streaming multipart submissions (uploads.py) and the attachment store (storage.py)."""
+import hashlib
+import os
+
+import pytest
+
+import main
+import uploads
+from storage import LocalStorage
+
+pytestmark = pytest.mark.anyio
+
+BOUNDARY = "test-boundary"
+
+
+def multipart(description, files):
+    """A multipart/form-data body with a description field and ``(filename, content)`` files."""
+    parts = [
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="description"\r\n\r\n{description}\r\n'.encode()
+    ]
+    for filename, content in files:
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="attachment"; filename="{filename}"\r\n'
+            f"Content-Type: text/plain\r\n\r\n".encode() + content + b"\r\n"
+        )
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+def chunked(body, size):
+    async def chunks():
+        for start in range(0, len(body), size):
+            yield body[start:start + size]
+    return chunks()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Small chunks, so an upload is written to disk in several
+    store = LocalStorage(str(tmp_path / "attachments"), chunk_size=16)
+    monkeypatch.setattr(main, "attachment_storage", store)
+    return store
+
+
+def blobs(store):
+    return sorted(name for _, dirs, files in os.walk(store.root) for name in files)
+
+
+@pytest.fixture
+def submit(client, auth, store):
+    """``submit(task_id, files, chunk_size)``: submit ``files`` as internee-1, the body in chunks."""
+    async def post(task_id, files, chunk_size=7):
+        return await client.post(
+            f"/tasks/{task_id}/submit/", headers={
+                **auth("internee-1"), "Content-Type": f"multipart/form-data; boundary={BOUNDARY}",
+            }, content=chunked(multipart("Done", files), chunk_size),
+        )
+    return post
+
+
+async def test_parser_finds_delimiters_split_across_chunks():
+    body = multipart("Done", [("a.txt", b"--test-boundar\r\n" * 3), ("b.txt", b"")])
+    for size in (1, 2, 5, 17, len(body)):
+        parts, data = [], b""
+        async for event, value in uploads.parse(chunked(body, size), BOUNDARY.encode()):
+            if event == "headers":
+                parts.append(value["content-disposition"])
+            elif event == "data":
+                data += value
+            else:
+                parts.append(data)
+                data = b""
+        assert parts == [
+            'form-data; name="description"', b"Done",
+            'form-data; name="attachment"; filename="a.txt"', b"--test-boundar\r\n" * 3,
+            'form-data; name="attachment"; filename="b.txt"', b"",
+        ], size
+
+
+async def test_multi_chunk_upload_is_stored_and_served(client, auth, store, submit):
+    content = bytes(range(256)) * 4
+    response = await submit(1, [("notes.txt", content)])
+    assert response.status_code == 200
+    attachment, = response.json()["attachments"]
+    assert (attachment["size"], attachment["sha256"]) == (len(content), hashlib.sha256(content).hexdigest())
+    assert blobs(store) == [attachment["sha256"]]
+
+    download = await client.get(attachment["url"], headers=auth("internee-1"))
+    assert download.status_code == 200
+    assert download.content == content
+    assert response.json()["submission"]["attachment_url"] == attachment["url"]
+
+
+async def test_upload_over_quota_is_rejected_without_a_partial_file(client, auth, store, submit, monkeypatch):
+    monkeypatch.setattr(uploads, "QUOTA_BYTES", 100)
+    response = await submit(1, [("big.txt", b"x" * 101)])
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Attachment quota exceeded (100 bytes remaining)"
+    assert blobs(store) == []
+
+    # Nothing was recorded, and what is left of the quota can still be used
+    assert (await client.get("/tasks/1/submissions/", headers=auth("internee-1"))).json() == []
+    assert (await submit(1, [("small.txt", b"x" * 100)])).status_code == 200
+    assert (await submit(3, [("more.txt", b"y")])).status_code == 413
+
+
+async def test_duplicate_upload_is_stored_once(client, auth, store, submit):
+    content = b"same content " * 10
+    first = (await submit(1, [("a.txt", content)])).json()["attachments"][0]
+    second = (await submit(3, [("b.txt", content)])).json()["attachments"][0]
+
+    assert first["id"] != second["id"]
+    assert first["sha256"] == second["sha256"]
+    assert blobs(store) == [first["sha256"]]
+    for attachment, filename in ((first, "a.txt"), (second, "b.txt")):
+        download = await client.get(attachment["url"], headers=auth("admin"))
+        assert download.content == content
+        assert filename in download.headers["content-disposition"]
+
+
+async def test_range_requests(client, auth, store, submit):
+    content = b"0123456789" * 5
+    url = (await submit(1, [("digits.txt", content)])).json()["attachments"][0]["url"]
+
+    partial = await client.get(url, headers={**auth("internee-1"), "Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == content[10:20]
+    assert partial.headers["content-range"] == f"bytes 10-19/{len(content)}"
+
+    suffix = await client.get(url, headers={**auth("internee-1"), "Range": "bytes=-5"})
+    assert (suffix.status_code, suffix.content) == (206, content[-5:])
+
+    unsatisfiable = await client.get(url, headers={**auth("internee-1"), "Range": "bytes=100-200"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == f"bytes */{len(content)}"
+
+    # Another internee does not see it at all
+    assert (await client.get(url, headers={**auth("internee-2"), "Range": "bytes=0-1"})).status_code == 404
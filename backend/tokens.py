@@ -0,0 +1,280 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import re
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+
+import instrumentation
+from settings import settings
+
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _b64decode(segment):
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def token_header(token):
+    try:
+        return json.loads(_b64decode(token.split(".", 1)[0]))
+    except (ValueError, IndexError):
+        raise InvalidToken("Malformed token header")
+
+
+# Public keys
+class PublicKeyCache:
+    """Signing keys fetched from a JWKS-style URL, kept until their max-age runs out.
+
+    ``refresh()`` blocks and is meant to be called from a worker thread (or at
+    startup to prefetch); ``key_ids()`` never blocks and is what the token cache
+    uses to notice that a key has been rotated out.
+    """
+
+    def __init__(self, url, fetch=None, default_max_age=3600):
+        self.url = url
+        self._fetch = fetch or self._fetch_url
+        self.default_max_age = default_max_age
+        self._keys = {}
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def _fetch_url(self):
+        with urllib.request.urlopen(self.url, timeout=10) as resp:
+            match = re.search(r"max-age=(\d+)", resp.headers.get("Cache-Control", ""))
+            max_age = int(match.group(1)) if match else self.default_max_age
+            return json.loads(resp.read()), max_age
+
+    @property
+    def stale(self):
+        return time.time() >= self._expires_at
+
+    def refresh(self, force=False):
+        with self._lock:
+            if force or self.stale:
+                keys, max_age = self._fetch()
+                self._keys = keys
+                self._expires_at = time.time() + max_age
+                self.fetches += 1
+            return self._keys
+
+    def keys(self):
+        return self.refresh()
+
+    def key_ids(self):
+        return self._keys.keys()
+
+
+# Verifiers
+class FirebaseVerifier:
+    """Verifies Firebase ID tokens with firebase_admin."""
+
+    def __init__(self, app=None, key_cache=None):
+        self.app = app
+        self.key_cache = key_cache or PublicKeyCache(FIREBASE_CERTS_URL)
+
+    def _get_app(self):
+        if self.app is None:
+            import firebase_admin
+            try:
+                self.app = firebase_admin.get_app()
+            except ValueError:
+                self.app = firebase_admin.initialize_app()
+        return self.app
+
+    def warm(self):
+        self._get_app()
+        self.key_cache.refresh()
+
+    def key_ids(self):
+        return self.key_cache.key_ids()
+
+    def verify(self, token):
+        from firebase_admin import auth
+
+        if self.key_cache.stale:
+            try:
+                self.key_cache.refresh()
+            except OSError:
+                # firebase_admin fetches the certificates itself as well
+                pass
+        try:
+            return auth.verify_id_token(token, app=self._get_app())
+        except (ValueError, auth.InvalidIdTokenError, auth.ExpiredIdTokenError) as e:
+            raise InvalidToken(str(e)) from e
+
+
+class LocalJWTVerifier:
+    """Stand-in for Firebase that checks HS256 or RS256 tokens against local keys.
+
+    ``keys`` maps key ids to an HMAC secret (HS256) or a PEM public key (RS256).
+    Used for benchmarks and local development; ``issue()`` mints matching tokens.
+    """
+
+    def __init__(self, keys, algorithm="HS256", audience=None, issuer=None, leeway=0):
+        if algorithm not in ("HS256", "RS256"):
+            raise ValueError(f"Unsupported algorithm: {algorithm}")
+        self.keys = dict(keys)
+        self.algorithm = algorithm
+        self.audience = audience
+        self.issuer = issuer
+        self.leeway = leeway
+
+    def warm(self):
+        pass
+
+    def key_ids(self):
+        return self.keys.keys()
+
+    def issue(self, claims, kid=None, signing_key=None, ttl=3600):
+        kid = kid or next(iter(self.keys))
+        now = int(time.time())
+        payload = {"iat": now, "exp": now + ttl, **claims}
+        payload.setdefault("sub", payload.get("uid"))
+        if self.audience:
+            payload.setdefault("aud", self.audience)
+        if self.issuer:
+            payload.setdefault("iss", self.issuer)
+        header = {"alg": self.algorithm, "typ": "JWT", "kid": kid}
+        signing_input = f"{_b64encode(json.dumps(header).encode())}.{_b64encode(json.dumps(payload).encode())}"
+        if self.algorithm == "HS256":
+            signature = hmac.new(self.keys[kid].encode(), signing_input.encode(), hashlib.sha256).digest()
+        else:
+            from cryptography.hazmat.primitives import hashes, serialization
+            from cryptography.hazmat.primitives.asymmetric import padding
+
+            private_key = serialization.load_pem_private_key(signing_key.encode(), password=None)
+            signature = private_key.sign(signing_input.encode(), padding.PKCS1v15(), hashes.SHA256())
+        return f"{signing_input}.{_b64encode(signature)}"
+
+    def verify(self, token):
+        try:
+            header_b64, payload_b64, signature_b64 = token.split(".")
+            header = json.loads(_b64decode(header_b64))
+            payload = json.loads(_b64decode(payload_b64))
+            signature = _b64decode(signature_b64)
+        except ValueError:
+            raise InvalidToken("Malformed token")
+
+        if header.get("alg") != self.algorithm:
+            raise InvalidToken("Unexpected signing algorithm")
+        key = self.keys.get(header.get("kid"))
+        if key is None:
+            raise InvalidToken("Unknown signing key")
+
+        signing_input = f"{header_b64}.{payload_b64}".encode()
+        if self.algorithm == "HS256":
+            expected = hmac.new(key.encode(), signing_input, hashlib.sha256).digest()
+            if not hmac.compare_digest(expected, signature):
+                raise InvalidToken("Invalid signature")
+        else:
+            from cryptography.exceptions import InvalidSignature
+            from cryptography.hazmat.primitives import hashes, serialization
+            from cryptography.hazmat.primitives.asymmetric import padding
+
+            public_key = serialization.load_pem_public_key(key.encode())
+            try:
+                public_key.verify(signature, signing_input, padding.PKCS1v15(), hashes.SHA256())
+            except InvalidSignature:
+                raise InvalidToken("Invalid signature")
+
+        now = time.time()
+        if payload.get("exp", 0) + self.leeway < now:
+            raise InvalidToken("Token expired")
+        if self.audience and payload.get("aud") != self.audience:
+            raise InvalidToken("Unexpected audience")
+        if self.issuer and payload.get("iss") != self.issuer:
+            raise InvalidToken("Unexpected issuer")
+        if not payload.get("sub"):
+            raise InvalidToken("Token has no subject")
+        payload.setdefault("uid", payload["sub"])
+        return payload
+
+
+# Cache
+class TokenCache:
+    """LRU of verified token claims keyed by the SHA-256 of the token.
+
+    An entry is served until the token's ``exp`` claim passes or its signing
+    key (``kid``) disappears from the verifier's current key set.  Misses are
+    verified on a worker thread so the RSA check never runs on the event loop.
+    """
+
+    def __init__(self, verifier, max_size=10000):
+        self.verifier = verifier
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    async def verify(self, token):
+        started = time.perf_counter()
+        try:
+            return await self._verify(token)
+        finally:
+            instrumentation.record_auth(time.perf_counter() - started)
+
+    async def _verify(self, token):
+        key = hashlib.sha256(token.encode()).digest()
+        entry = self._entries.get(key)
+        if entry is not None:
+            claims, exp, kid = entry
+            key_ids = self.verifier.key_ids()
+            if exp > time.time() and (kid is None or not key_ids or kid in key_ids):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return claims
+            del self._entries[key]
+
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        try:
+            claims = await loop.run_in_executor(None, self.verifier.verify, token)
+        except Exception:
+            self.rejected += 1
+            raise
+        kid = token_header(token).get("kid")
+        self._entries[key] = (claims, claims.get("exp", 0), kid)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return claims
+
+    def clear(self):
+        self._entries.clear()
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "rejected": self.rejected,
+        }
+
+
+def verifier_from_settings(config=settings):
+    if config.auth_verifier == "local":
+        return LocalJWTVerifier({config.auth_local_kid: config.auth_local_secret}, algorithm="HS256")
+    return FirebaseVerifier()
+
+
+token_cache = TokenCache(verifier_from_settings(), max_size=settings.auth_cache_size)
@@ -0,0 +1,193 @@
+"""Streaming ``multipart/form-data`` for submissions with attachments.
+
+The request body is parsed as it arrives and file parts are written straight
+to the attachment store, so an upload never sits in memory (or in a spooled
+temporary file, as with Starlette's ``request.form()``) beyond one chunk.
+Sizes are enforced while streaming: a file over ``ATTACHMENT_MAX_BYTES`` or
+past the uploader's remaining quota is rejected as soon as the limit is
+crossed, not after the whole body has been read.
+
+Stored files are left unpublished (see storage.py); the caller commits them
+once the rows referencing them are written, or aborts them.
+"""
+import os
+from email.message import Message
+from email.utils import collapse_rfc2231_value
+from typing import NamedTuple
+
+from settings import settings
+
+MAX_FILE_BYTES = settings.attachment_max_bytes
+QUOTA_BYTES = settings.attachment_quota_bytes
+MAX_FILES = settings.attachment_max_files
+MAX_FIELD_BYTES = 64 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+
+
+class MalformedUpload(ValueError):
+    """The body is not valid multipart/form-data, or breaks a field or file count limit."""
+
+
+class UploadTooLarge(ValueError):
+    """A file is over the size limit or the uploader's quota."""
+
+
+class Upload(NamedTuple):
+    field: str
+    filename: str
+    content_type: str
+    writer: object  # A finished storage writer; writer.key and writer.size describe the content
+
+
+class UploadForm(NamedTuple):
+    fields: dict
+    files: list
+
+
+# Parser events
+_HEADERS, _DATA, _END = "headers", "data", "end"
+
+
+def _param(header, name):
+    msg = Message()
+    msg["content-type"] = header
+    value = msg.get_param(name)
+    return collapse_rfc2231_value(value) if value is not None else None
+
+
+def boundary(content_type):
+    value = _param(content_type, "boundary")
+    if not value or len(value) > 70:
+        raise MalformedUpload("Missing or invalid multipart boundary")
+    return value.encode("latin-1")
+
+
+def _parse_headers(block):
+    headers = {}
+    for line in bytes(block).split(b"\r\n"):
+        name, sep, value = line.partition(b":")
+        if not sep:
+            raise MalformedUpload("Malformed part header")
+        try:
+            text = value.decode()
+        except UnicodeDecodeError:
+            text = value.decode("latin-1")
+        headers[name.strip().lower().decode("latin-1")] = text.strip()
+    return headers
+
+
+async def parse(chunks, separator, max_header_bytes=MAX_HEADER_BYTES):
+    """Yield ``(_HEADERS, dict)``, ``(_DATA, bytes)`` and ``(_END, None)`` for each part of a body.
+
+    Only a delimiter's length of data is held back between chunks, in case a
+    delimiter straddles them.
+    """
+    delimiter = b"\r\n--" + separator
+    # The first delimiter is not preceded by a line break
+    buffer = bytearray(b"\r\n")
+    in_body = in_headers = False
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            if in_headers:
+                # Starts with the line break after the delimiter, so an empty header block also matches
+                index = buffer.find(b"\r\n\r\n")
+                if index < 0:
+                    if len(buffer) > max_header_bytes:
+                        raise MalformedUpload("Part headers are too large")
+                    break
+                headers = _parse_headers(buffer[2:index]) if index else {}
+                del buffer[:index + 4]
+                in_headers, in_body = False, True
+                yield _HEADERS, headers
+                continue
+
+            index = buffer.find(delimiter)
+            if index < 0:
+                keep = len(delimiter) - 1
+                if len(buffer) > keep:
+                    if in_body:
+                        yield _DATA, bytes(buffer[:-keep])
+                    del buffer[:-keep]
+                break
+            # Two bytes after the delimiter say whether another part follows
+            if len(buffer) < index + len(delimiter) + 2:
+                break
+            if in_body:
+                if index:
+                    yield _DATA, bytes(buffer[:index])
+                yield _END, None
+            suffix = bytes(buffer[index + len(delimiter):index + len(delimiter) + 2])
+            if suffix == b"--":
+                return
+            if suffix != b"\r\n":
+                raise MalformedUpload("Malformed multipart boundary")
+            del buffer[:index + len(delimiter)]
+            in_body, in_headers = False, True
+    raise MalformedUpload("Multipart body ended before the closing boundary")
+
+
+async def receive(request, storage, quota_bytes, max_file_bytes=MAX_FILE_BYTES, max_files=MAX_FILES):
+    """Read a multipart submission, streaming its files into ``storage``.
+
+    ``quota_bytes`` is what the uploader may still store across all files.
+    Returns an UploadForm; on any error the files stored so far are aborted.
+    """
+    separator = boundary(request.headers.get("content-type", ""))
+    fields, files = {}, []
+    name = filename = content_type = writer = value = None
+    total = 0
+    try:
+        async for event, data in parse(request.stream(), separator):
+            if event == _HEADERS:
+                disposition = data.get("content-disposition", "")
+                name = _param(disposition, "name")
+                if not disposition.lower().startswith("form-data") or name is None:
+                    raise MalformedUpload("Part without a form-data name")
+                filename = _param(disposition, "filename")
+                content_type = data.get("content-type", "application/octet-stream")
+                if filename:
+                    if len(files) >= max_files:
+                        raise MalformedUpload(f"At most {max_files} attachments per submission")
+                    writer = await storage.create()
+                else:
+                    # A form field, or a file input left empty (filename="")
+                    value = bytearray()
+            elif event == _DATA:
+                if writer is not None:
+                    if writer.size + len(data) > max_file_bytes:
+                        raise UploadTooLarge(f"{filename} is larger than {max_file_bytes} bytes")
+                    total += len(data)
+                    if total > quota_bytes:
+                        raise UploadTooLarge(f"Attachment quota exceeded ({quota_bytes} bytes remaining)")
+                    await writer.write(data)
+                elif filename is None:
+                    value += data
+                    if len(value) > MAX_FIELD_BYTES:
+                        raise MalformedUpload(f"Field {name} is larger than {MAX_FIELD_BYTES} bytes")
+            else:
+                if writer is not None:
+                    await writer.finish()
+                    files.append(Upload(name, os.path.basename(filename.replace("\\", "/")), content_type, writer))
+                    writer = None
+                elif filename is None:
+                    try:
+                        fields[name] = value.decode()
+                    except UnicodeDecodeError:
+                        raise MalformedUpload(f"Field {name} is not valid UTF-8")
+    except BaseException:
+        if writer is not None:
+            await writer.abort()
+        await abort(files)
+        raise
+    return UploadForm(fields, files)
+
+
+async def commit(files):
+    for upload in files:
+        await upload.writer.commit()
+
+
+async def abort(files):
+    for upload in files:
+        await upload.writer.abort()
@@ -1,3 +1,4 @@
+import 'dart:async';
 import 'package:flutter/material.dart';
 import 'package:provider/provider.dart';
 import '../../auth/auth_service.dart';
@@ -16,11 +17,13 @@ class AdminDashboard extends StatefulWidget {
 class _AdminDashboardState extends State<AdminDashboard> {
   late Future<List<Task>> _tasksFuture;
   final ApiService _apiService = ApiService();
+  StreamSubscription<Map<String, dynamic>>? _taskEvents;
 
   @override
   void initState() {
     super.initState();
     _tasksFuture = _apiService.getTasks(context);
+    _taskEvents = _apiService.taskEvents(context).listen(_onTaskEvent);
   }
 
   void _refreshTasks() {
@@ -29,6 +32,52 @@ class _AdminDashboardState extends State<AdminDashboard> {
     });
   }
 
+  // Apply a task returned by a write without reloading the whole list
+  void _applyTask(Task task) {
+    setState(() {
+      _tasksFuture = _tasksFuture.then((tasks) {
+        final index = tasks.indexWhere((t) => t.id == task.id);
+        if (index == -1) return [task, ...tasks];
+        return [...tasks]..[index] = task;
+      });
+    });
+  }
+
+  void _removeTask(int taskId) {
+    setState(() {
+      _tasksFuture = _tasksFuture.then(
+        (tasks) => tasks.where((t) => t.id != taskId).toList(),
+      );
+    });
+  }
+
+  // Keep the list current from the backend's change feed instead of polling
+  void _onTaskEvent(Map<String, dynamic> event) {
+    final data = event['data'];
+    switch (event['type']) {
+      case 'task.created':
+      case 'task.updated':
+        _applyTask(Task.fromJson(data));
+        break;
+      case 'task.submitted':
+        _applyTask(Task.fromJson(data['task']));
+        break;
+      case 'task.deleted':
+        _removeTask(data['id']);
+        break;
+      case 'tasks.changed':
+      case 'reset':
+        _refreshTasks();
+        break;
+    }
+  }
+
+  @override
+  void dispose() {
+    _taskEvents?.cancel();
+    super.dispose();
+  }
+
   @override
   Widget build(BuildContext context) {
     return Scaffold(
@@ -192,7 +241,9 @@ class _AdminDashboardState extends State<AdminDashboard> {
             Navigator.push(
               context,
               MaterialPageRoute(builder: (context) => CreateTaskScreen()),
-            ).then((_) => _refreshTasks());
+            ).then((result) {
+              if (result is Task) _applyTask(result);
+            });
           },
         ),
       ),
@@ -344,6 +395,8 @@ class _AdminDashboardState extends State<AdminDashboard> {
                               ).then((_) => _refreshTasks());
                             },
                             onTaskUpdated: _refreshTasks,
+                            onTaskChanged: _applyTask,
+                            onTaskDeleted: _removeTask,
                             userRole: 'admin',
                             // Admin doesn't need userId for task operations
                             userId: null,
@@ -181,6 +181,29 @@ class _CreateReportScreenState extends State<CreateReportScreen> {
     }
   }
 
+  // Prefill the task counts from the backend once the period and internee are known
+  Future<void> _loadStats() async {
+    if (_selectedInterneeId == null || _periodStart == null || _periodEnd == null) return;
+    if (_periodStart!.isAfter(_periodEnd!)) return;
+
+    try {
+      final stats = await Provider.of<ApiService>(context, listen: false).getReportStats(
+        context,
+        periodStart: _formatDate(_periodStart!),
+        periodEnd: _formatDate(_periodEnd!),
+        interneeId: _selectedInterneeId,
+      );
+      if (!mounted || stats.isEmpty) return;
+      setState(() {
+        _tasksCompletedController.text = stats.first['tasks_completed'].toString();
+        _tasksPendingController.text = stats.first['tasks_pending'].toString();
+      });
+    } catch (e) {
+      // The counts can still be entered by hand
+      print('Load report stats error: $e');
+    }
+  }
+
   String _formatDate(DateTime date) {
     return '${date.year}-${date.month.toString().padLeft(2, '0')}-${date.day.toString().padLeft(2, '0')}';
   }
@@ -215,6 +238,7 @@ class _CreateReportScreenState extends State<CreateReportScreen> {
         }
       });
     }
+    _loadStats();
   }
 
   @override
@@ -463,6 +487,7 @@ class _CreateReportScreenState extends State<CreateReportScreen> {
                                       );
                                       _selectedInterneeName = selectedInternee['name'];
                                     });
+                                    _loadStats();
                                   },
                                   validator: (value) {
                                     if (value == null) {
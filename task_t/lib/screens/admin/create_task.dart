@@ -149,12 +149,12 @@ class _CreateTaskScreenState extends State<CreateTaskScreen> {
         'deadline': _deadline?.toIso8601String(),
       };
 
-      await Provider.of<ApiService>(context, listen: false)
+      final task = await Provider.of<ApiService>(context, listen: false)
           .createTask(context, taskData);
 
       if (mounted) {
         _showSuccessSnackBar('Task created and assigned to $_selectedInterneeName');
-        Navigator.pop(context, true); // Return true to indicate success
+        Navigator.pop(context, task); // Return the created task
       }
     } catch (e) {
       print('Create task error: $e');
@@ -139,12 +139,12 @@ class _EditTaskScreenState extends State<EditTaskScreen> {
         'deadline': _deadline?.toIso8601String(),
       };
 
-      await Provider.of<ApiService>(context, listen: false)
+      final task = await Provider.of<ApiService>(context, listen: false)
           .updateTask(context, widget.task.id, updates);
 
       if (mounted) {
         _showSuccessSnackBar('Task updated and assigned to $_selectedInterneeName');
-        Navigator.pop(context, true); // Return true to indicate success
+        Navigator.pop(context, task); // Return the updated task
       }
     } catch (e) {
       print('Update task error: $e');
@@ -1,4 +1,6 @@
+import 'dart:async';
 import 'dart:convert';
+import 'dart:io';
 import 'package:http/http.dart' as http;
 import 'package:flutter/material.dart';
 import 'package:provider/provider.dart';
@@ -11,6 +13,28 @@ import '../models/submission.dart';
 class ApiService {
   static const String baseUrl = 'http://127.0.0.1:8000'; // Replace with your API URL
 
+  // Last 200 response per URL that carried an ETag, replayed when the backend answers 304
+  final Map<String, http.Response> _etagCache = {};
+
+  Future<http.Response> _conditionalGet(Uri uri, Map<String, String> headers) async {
+    final cached = _etagCache[uri.toString()];
+    final response = await http.get(
+      uri,
+      headers: {
+        ...headers,
+        if (cached != null) 'If-None-Match': cached.headers['etag']!,
+      },
+    ).timeout(Duration(seconds: 15));
+
+    if (response.statusCode == 304 && cached != null) {
+      return cached;
+    }
+    if (response.statusCode == 200 && response.headers['etag'] != null) {
+      _etagCache[uri.toString()] = response;
+    }
+    return response;
+  }
+
   Future<Map<String, String>> _getHeaders(BuildContext context) async {
     try {
       final authService = Provider.of<AuthService>(context, listen: false);
@@ -127,31 +151,109 @@ class ApiService {
   }
 
   // Tasks
-  Future<List<Task>> getTasks(BuildContext context) async {
+  // Completed tasks archived by the backend are left out unless includeArchived
+  Future<List<Task>> getTasks(BuildContext context, {bool includeArchived = false}) async {
     try {
       final headers = await _getHeaders(context);
-      final response = await http.get(
-        Uri.parse('$baseUrl/tasks/'),
-        headers: headers,
-      ).timeout(Duration(seconds: 15));
-
-      print('Get tasks response: ${response.statusCode}');
+      final tasks = <Task>[];
+      String? cursor;
+
+      // The backend pages tasks; follow X-Next-Cursor until the last page
+      do {
+        final response = await _conditionalGet(
+          Uri.parse('$baseUrl/tasks/').replace(queryParameters: {
+            'limit': '500',
+            if (cursor != null) 'cursor': cursor,
+            if (includeArchived) 'include_archived': 'true',
+          }),
+          headers,
+        );
+
+        print('Get tasks response: ${response.statusCode}');
+
+        if (response.statusCode == 200) {
+          final List<dynamic> data = json.decode(response.body);
+          tasks.addAll(data.map((json) => Task.fromJson(json)));
+          cursor = response.headers['x-next-cursor'];
+        } else if (response.statusCode == 401) {
+          throw Exception('Authentication failed - please login again');
+        } else {
+          throw Exception('Failed to load tasks: ${response.statusCode}');
+        }
+      } while (cursor != null);
 
-      if (response.statusCode == 200) {
-        final List<dynamic> data = json.decode(response.body);
-        return data.map((json) => Task.fromJson(json)).toList();
-      } else if (response.statusCode == 401) {
-        throw Exception('Authentication failed - please login again');
-      } else {
-        throw Exception('Failed to load tasks: ${response.statusCode}');
-      }
+      return tasks;
     } catch (e) {
       print('Get tasks error: $e');
       rethrow;
     }
   }
 
-  Future<void> createTask(BuildContext context, Map<String, dynamic> taskData) async {
+  // Task change feed from GET /events/ (Server-Sent Events). Each event is
+  // {'type': ..., 'data': ...}; the connection is reopened after errors and
+  // resumes from the last event id it saw.
+  Stream<Map<String, dynamic>> taskEvents(BuildContext context) {
+    late StreamController<Map<String, dynamic>> controller;
+    http.Client? client;
+    String? lastEventId;
+    var cancelled = false;
+
+    Future<void> connect() async {
+      while (!cancelled) {
+        client = http.Client();
+        try {
+          final request = http.Request('GET', Uri.parse('$baseUrl/events/'));
+          request.headers.addAll(await _getHeaders(context));
+          request.headers['Accept'] = 'text/event-stream';
+          if (lastEventId != null) request.headers['Last-Event-ID'] = lastEventId!;
+
+          final response = await client!.send(request);
+          if (response.statusCode != 200) {
+            throw Exception('Failed to open event stream: ${response.statusCode}');
+          }
+
+          String? id;
+          String? type;
+          final data = StringBuffer();
+          final lines = response.stream.transform(utf8.decoder).transform(const LineSplitter());
+          await for (final line in lines) {
+            if (line.isEmpty) {
+              if (type != null) {
+                if (id != null) lastEventId = id;
+                controller.add({'type': type, 'data': json.decode(data.toString())});
+              }
+              id = null;
+              type = null;
+              data.clear();
+            } else if (line.startsWith('id:')) {
+              id = line.substring(3).trim();
+            } else if (line.startsWith('event:')) {
+              type = line.substring(6).trim();
+            } else if (line.startsWith('data:')) {
+              data.write(line.substring(5).trim());
+            }
+          }
+        } catch (e) {
+          if (!cancelled) print('Task events error: $e');
+        } finally {
+          client?.close();
+        }
+        if (!cancelled) await Future.delayed(Duration(seconds: 3));
+      }
+    }
+
+    controller = StreamController<Map<String, dynamic>>(
+      onListen: connect,
+      onCancel: () {
+        cancelled = true;
+        client?.close();
+      },
+    );
+    return controller.stream;
+  }
+
+  // Returns the created task, so callers can add it without reloading the list
+  Future<Task> createTask(BuildContext context, Map<String, dynamic> taskData) async {
     try {
       final headers = await _getHeaders(context);
       final response = await http.post(
@@ -163,8 +265,7 @@ class ApiService {
       print('Create task response: ${response.statusCode} - ${response.body}');
 
       if (response.statusCode == 200) {
-        // Task created successfully
-        return;
+        return Task.fromJson(json.decode(response.body)['task']);
       } else if (response.statusCode == 401) {
         throw Exception('Authentication failed - please login again');
       } else {
@@ -177,7 +278,8 @@ class ApiService {
     }
   }
 
-  Future<void> updateTask(BuildContext context, int taskId, Map<String, dynamic> updates) async {
+  // Returns the updated task, so callers can replace it without reloading the list
+  Future<Task> updateTask(BuildContext context, int taskId, Map<String, dynamic> updates) async {
     try {
       final headers = await _getHeaders(context);
       final response = await http.put(
@@ -189,8 +291,7 @@ class ApiService {
       print('Update task response: ${response.statusCode} - ${response.body}');
 
       if (response.statusCode == 200) {
-        // Task updated successfully
-        return;
+        return Task.fromJson(json.decode(response.body)['task']);
       } else if (response.statusCode == 401) {
         throw Exception('Authentication failed - please login again');
       } else {
@@ -241,10 +342,7 @@ class ApiService {
       final headers = await _getHeaders(context);
       print('Request headers: $headers');
       
-      final response = await http.get(
-        Uri.parse('$baseUrl/users/internees/'),
-        headers: headers,
-      ).timeout(Duration(seconds: 15));
+      final response = await _conditionalGet(Uri.parse('$baseUrl/users/internees/'), headers);
 
       print('Get internees response: ${response.statusCode}');
       print('Response body: ${response.body}');
@@ -318,7 +416,8 @@ class ApiService {
   }
 
   // Updated submitTask method with proper error handling
-  Future<void> submitTask(BuildContext context, int taskId, Map<String, dynamic> submissionData) async {
+  // Returns the task as updated by the submission (status is set to completed)
+  Future<Task> submitTask(BuildContext context, int taskId, Map<String, dynamic> submissionData) async {
     try {
       print('Submitting task $taskId with data: $submissionData'); // Debug log
       
@@ -341,8 +440,7 @@ class ApiService {
       print('Submit task response: ${response.statusCode} - ${response.body}');
 
       if (response.statusCode == 200 || response.statusCode == 201) {
-        // Task submitted successfully
-        return;
+        return Task.fromJson(json.decode(response.body)['task']);
       } else if (response.statusCode == 401) {
         throw Exception('Authentication failed - please login again');
       } else if (response.statusCode == 422) {
@@ -367,6 +465,34 @@ class ApiService {
     }
   }
 
+  // Submits with an optional file as multipart/form-data; the file is streamed
+  // from disk and the server stores it as the submission's attachment
+  static Future<bool> submitTaskWithFile(String taskId, String description, File? file) async {
+    final user = FirebaseAuth.instance.currentUser;
+    if (user == null) {
+      throw Exception('User not authenticated');
+    }
+    final token = await user.getIdToken();
+
+    final request = http.MultipartRequest('POST', Uri.parse('$baseUrl/tasks/$taskId/submit/'))
+      ..headers['Authorization'] = 'Bearer $token'
+      ..fields['description'] = description;
+    if (file != null) {
+      request.files.add(await http.MultipartFile.fromPath('attachment', file.path));
+    }
+
+    final response = await http.Response.fromStream(await request.send()).timeout(Duration(minutes: 5));
+    if (response.statusCode == 200) {
+      return true;
+    } else if (response.statusCode == 401) {
+      throw Exception('Authentication failed - please login again');
+    } else if (response.statusCode == 413) {
+      throw Exception(json.decode(response.body)['detail'] ?? 'Attachment is too large');
+    }
+    final errorBody = json.decode(response.body);
+    throw Exception(errorBody['detail'] ?? 'Failed to submit task');
+  }
+
   // Method to mark task as completed (status update)
   Future<void> markTaskAsCompleted(BuildContext context, int taskId) async {
     try {
@@ -401,28 +527,25 @@ class ApiService {
   }
 
   // Method to submit task and mark as completed in one operation
-  Future<void> submitAndCompleteTask(BuildContext context, int taskId, String description) async {
+  Future<Task> submitAndCompleteTask(BuildContext context, int taskId, String description) async {
     try {
-      // First submit the task
-      await submitTask(context, taskId, {
+      // Submitting also marks the task as completed on the server
+      return await submitTask(context, taskId, {
         'description': description,
         'attachment_url': null,
       });
-      
-      // Then mark as completed
-      await markTaskAsCompleted(context, taskId);
-      
     } catch (e) {
       print('Submit and complete error: $e');
       rethrow;
     }
   }
 
-  Future<List<TaskSubmission>> getTaskSubmissions(BuildContext context, int taskId) async {
+  Future<List<TaskSubmission>> getTaskSubmissions(BuildContext context, int taskId,
+      {bool includeArchived = false}) async {
     try {
       final headers = await _getHeaders(context);
       final response = await http.get(
-        Uri.parse('$baseUrl/tasks/$taskId/submissions/'),
+        Uri.parse('$baseUrl/tasks/$taskId/submissions/${includeArchived ? '?include_archived=true' : ''}'),
         headers: headers,
       ).timeout(Duration(seconds: 15));
 
@@ -443,13 +566,13 @@ class ApiService {
   }
 
   // Reports - FIXED METHOD
-  Future<List<ProgressReport>> getProgressReports(BuildContext context) async {
+  Future<List<ProgressReport>> getProgressReports(BuildContext context, {bool includeArchived = false}) async {
     try {
       final headers = await _getHeaders(context);
-      final response = await http.get(
-        Uri.parse('$baseUrl/reports/'),
-        headers: headers,
-      ).timeout(Duration(seconds: 15));
+      final response = await _conditionalGet(
+        Uri.parse('$baseUrl/reports/${includeArchived ? '?include_archived=true' : ''}'),
+        headers,
+      );
 
       print('Get reports response: ${response.statusCode}');
 
@@ -467,6 +590,56 @@ class ApiService {
     }
   }
 
+  // Per-internee task counts, deadlines, last submission and latest report (admin only)
+  Future<List<Map<String, dynamic>>> getDashboard(BuildContext context) async {
+    try {
+      final headers = await _getHeaders(context);
+      final response = await _conditionalGet(Uri.parse('$baseUrl/dashboard/'), headers);
+
+      print('Get dashboard response: ${response.statusCode}');
+
+      if (response.statusCode == 200) {
+        final List<dynamic> data = json.decode(response.body);
+        return data.cast<Map<String, dynamic>>();
+      } else if (response.statusCode == 401) {
+        throw Exception('Authentication failed - please login again');
+      } else {
+        throw Exception('Failed to load dashboard');
+      }
+    } catch (e) {
+      print('Get dashboard error: $e');
+      rethrow;
+    }
+  }
+
+  // Tasks, submissions, reports and deletions since [since], the version of the
+  // previous sync (0 for everything).  Pass the returned 'version' next time
+  // and ask again at once while 'more' is true; a 410 means start over from 0.
+  Future<Map<String, dynamic>> syncChanges(BuildContext context, int since) async {
+    try {
+      final headers = await _getHeaders(context);
+      final response = await http.get(
+        Uri.parse('$baseUrl/sync/').replace(queryParameters: {'since': '$since'}),
+        headers: headers,
+      ).timeout(Duration(seconds: 30));
+
+      print('Sync response: ${response.statusCode}');
+
+      if (response.statusCode == 200) {
+        return json.decode(response.body) as Map<String, dynamic>;
+      } else if (response.statusCode == 401) {
+        throw Exception('Authentication failed - please login again');
+      } else if (response.statusCode == 410) {
+        throw Exception('Sync expired - sync again from 0');
+      } else {
+        throw Exception('Failed to sync: ${response.statusCode}');
+      }
+    } catch (e) {
+      print('Sync error: $e');
+      rethrow;
+    }
+  }
+
   // FIXED: Create Progress Report with correct data structure
   Future<void> createProgressReport(BuildContext context, Map<String, dynamic> reportData) async {
     try {
@@ -523,6 +696,38 @@ class ApiService {
     }
   }
 
+  // Per-internee statistics for a report period, computed by the backend
+  Future<List<Map<String, dynamic>>> getReportStats(
+    BuildContext context, {
+    required String periodStart,
+    required String periodEnd,
+    int? interneeId,
+  }) async {
+    try {
+      final headers = await _getHeaders(context);
+      final response = await http.get(
+        Uri.parse('$baseUrl/reports/stats/').replace(queryParameters: {
+          'period_start': periodStart,
+          'period_end': periodEnd,
+          if (interneeId != null) 'internee_id': interneeId.toString(),
+        }),
+        headers: headers,
+      ).timeout(Duration(seconds: 15));
+
+      if (response.statusCode == 200) {
+        final List<dynamic> data = json.decode(response.body);
+        return data.cast<Map<String, dynamic>>();
+      } else if (response.statusCode == 401) {
+        throw Exception('Authentication failed - please login again');
+      } else {
+        throw Exception('Failed to load report statistics');
+      }
+    } catch (e) {
+      print('Get report stats error: $e');
+      rethrow;
+    }
+  }
+
   // Health check
   Future<bool> checkHealth() async {
     try {
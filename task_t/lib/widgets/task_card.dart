@@ -9,6 +9,8 @@ class TaskCard extends StatefulWidget {
   final Task task;
   final VoidCallback onTap;
   final VoidCallback? onTaskUpdated;
+  final ValueChanged<Task>? onTaskChanged; // Receives the task returned by the server
+  final ValueChanged<int>? onTaskDeleted;
   final String userRole;
   final int? userId;
 
@@ -16,6 +18,8 @@ class TaskCard extends StatefulWidget {
     required this.task,
     required this.onTap,
     this.onTaskUpdated,
+    this.onTaskChanged,
+    this.onTaskDeleted,
     required this.userRole,
     this.userId,
   });
@@ -309,8 +313,10 @@ class _TaskCardState extends State<TaskCard> {
       ),
     );
     
-    // If task was updated, refresh the parent list
-    if (result == true && widget.onTaskUpdated != null) {
+    // If task was updated, patch it into the parent list; otherwise refresh it
+    if (result is Task && widget.onTaskChanged != null) {
+      widget.onTaskChanged!(result);
+    } else if (result != null && widget.onTaskUpdated != null) {
       widget.onTaskUpdated!();
     }
   }
@@ -542,8 +548,10 @@ class _TaskCardState extends State<TaskCard> {
           ),
         );
         
-        // Refresh the parent list
-        if (widget.onTaskUpdated != null) {
+        // Remove it from the parent list, or refresh the list
+        if (widget.onTaskDeleted != null) {
+          widget.onTaskDeleted!(widget.task.id);
+        } else if (widget.onTaskUpdated != null) {
           widget.onTaskUpdated!();
         }
       }
@@ -573,17 +581,12 @@ class _TaskCardState extends State<TaskCard> {
       // Use the new combined method from ApiService
       final apiService = Provider.of<ApiService>(context, listen: false);
       
-      // First submit the task with description
-      await apiService.submitTask(context, widget.task.id, {
+      // Submitting also marks the task as completed on the server
+      final task = await apiService.submitTask(context, widget.task.id, {
         'description': description,
         'attachment_url': null,
       });
       
-      // Then update task status to completed
-      await apiService.updateTask(context, widget.task.id, {
-        'status': 'completed',
-      });
-      
       if (mounted) {
         ScaffoldMessenger.of(context).showSnackBar(
           SnackBar(
@@ -599,8 +602,10 @@ class _TaskCardState extends State<TaskCard> {
           ),
         );
         
-        // Refresh the parent list
-        if (widget.onTaskUpdated != null) {
+        // Patch the completed task into the parent list, or refresh the list
+        if (widget.onTaskChanged != null) {
+          widget.onTaskChanged!(task);
+        } else if (widget.onTaskUpdated != null) {
           widget.onTaskUpdated!();
         }
       }